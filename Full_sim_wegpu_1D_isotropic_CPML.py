@@ -3,7 +3,7 @@ import numpy as np
 from numpy import pi
 import ast
 from scipy.signal import gausspulse
-from simul_utils import SimulationROI, SimulationProbeLinearArray
+from simul_utils import SimulationROI, SimulationProbeLinearArray, get_shader_code
 import matplotlib.pyplot as plt
 import json
 
@@ -80,7 +80,7 @@ dt = configs["simul_params"]["dt"]
 
 NSRC = data_src.shape[0]
 
-i_src = np.array([simul_roi.get_nearest_grid_idx(d[0:3]) for d in data_src])
+i_src = simul_roi.get_nearest_grid_idx_batch(data_src[:, 0:3])
 ix_src = i_src[:, 0].astype(np.int32)
 aux_src = ix_src[0]
 
@@ -98,7 +98,7 @@ source_term = factor * flt32(gausspulse((t - t0), fc=f0, bw=source_term_cfg[2]))
 # Define a localizacao dos receptores
 NREC = data_rec.shape[0]
 
-i_rec = np.array([simul_roi.get_nearest_grid_idx(p[0:3]) for p in data_rec])
+i_rec = simul_roi.get_nearest_grid_idx_batch(data_rec[:, 0:3])
 ix_rec = i_rec[:, 0].astype(np.int32)
 
 # Valor da potencia para calcular "d0"
@@ -138,11 +138,11 @@ def sim_1D_wgpu(device):
     params_i32 = np.array([nx, aux_src, NSTEP, NREC, 0, ord], dtype=np.int32)
     params_f32 = np.array([dx, dt, rho, lambda_, mu, lambdaplus2mu], dtype=flt32)
 
-    # Rodar shader
-    with open('shader_1D_elast.wgsl') as shader_file:
-        cshader_string = shader_file.read()
-        cshader_string = cshader_string.replace('wsx', f'{wsx}')
-        cshader = device.create_shader_module(code=cshader_string)
+    # Rodar shader (especializado para a ordem e o tamanho do grid, com o estencil desenrolado)
+    cshader_string = get_shader_code('shader_1D_elast.wgsl', tokens={'wsx': wsx},
+                                     consts={'sim_int.x_sz': nx, 'sim_int.ord': ord},
+                                     fd_tables={'coefs': coefs}, fd_bound='sim_int.ord')
+    cshader = device.create_shader_module(code=cshader_string)
 
 
     # Buffers
@@ -0,0 +1,130 @@
+"""
+Benchmark do mapeamento das threads na grade 2D dos shaders.
+Os campos sao armazenados com ``ij(i, j) = j + i * j_max'' (y contiguo). O kernel aplica um estencil de
+diferencas finitas de 4 pontos em y e em x, com o eixo mais rapido das threads (global_invocation_id.x)
+percorrendo x (``x_fast'', acessos com passo ny) ou y (``y_fast'', acessos coalescidos).
+"""
+from time import time
+
+import wgpu
+if wgpu.version_info[1] > 11:
+    import wgpu.backends.wgpu_native  # Select backend 0.13.X
+else:
+    import wgpu.backends.rs  # Select backend 0.9.5
+
+import numpy as np
+
+# Parametros do benchmark
+nx = 2048
+ny = 2048
+n_rep = 200
+ws = 16
+flt32 = np.float32
+
+# Campo de entrada
+field = np.random.rand(nx, ny).astype(flt32)
+
+# %% Shader
+shader_source = """
+@group(0) @binding(0)
+var<storage,read> fld_in: array<f32>;
+
+@group(0) @binding(1)
+var<storage,read_write> fld_out: array<f32>;
+
+const x_sz: i32 = nx_sz;
+const y_sz: i32 = ny_sz;
+const th_y_fast: bool = th_map_y_fast;
+
+// function to convert 2D [i,j] index into 1D [] index
+fn ij(i: i32, j: i32) -> i32 {
+    let index = j + i * y_sz;
+
+    return select(-1, index, i >= 0 && i < x_sz && j >= 0 && j < y_sz);
+}
+
+// getter for the input field
+fn get_fld(x: i32, y: i32) -> f32 {
+    let index: i32 = ij(x, y);
+
+    return select(0.0, fld_in[index], index != -1);
+}
+
+// function to convert the thread index into the 2D [x,y] grid index
+fn get_thread_xy(index: vec3<u32>) -> vec2<i32> {
+    return select(vec2<i32>(index.xy), vec2<i32>(index.yx), th_y_fast);
+}
+
+@compute
+@workgroup_size(ws_th, ws_th)
+fn stencil_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
+    let xy: vec2<i32> = get_thread_xy(index);
+    let x: i32 = xy.x;                  // x grid index
+    let y: i32 = xy.y;                  // y grid index
+
+    let d_x: f32 = 1.125 * (get_fld(x + 1, y) - get_fld(x, y)) - (get_fld(x + 2, y) - get_fld(x - 1, y)) / 24.0;
+    let d_y: f32 = 1.125 * (get_fld(x, y + 1) - get_fld(x, y)) - (get_fld(x, y + 2) - get_fld(x, y - 1)) / 24.0;
+    fld_out[ij(x, y)] = d_x + d_y;
+}
+"""
+
+device_gpu = wgpu.utils.get_default_device()
+
+# Buffers
+buffer_in = device_gpu.create_buffer_with_data(data=field, usage=wgpu.BufferUsage.STORAGE)
+buffer_out = device_gpu.create_buffer(size=field.nbytes, usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+
+binding_layout = [
+    {"binding": 0,
+     "visibility": wgpu.ShaderStage.COMPUTE,
+     "buffer": {"type": wgpu.BufferBindingType.read_only_storage}},
+    {"binding": 1,
+     "visibility": wgpu.ShaderStage.COMPUTE,
+     "buffer": {"type": wgpu.BufferBindingType.storage}},
+]
+bind_group_layout = device_gpu.create_bind_group_layout(entries=binding_layout)
+binding = [
+    {"binding": 0, "resource": {"buffer": buffer_in, "offset": 0, "size": buffer_in.size}},
+    {"binding": 1, "resource": {"buffer": buffer_out, "offset": 0, "size": buffer_out.size}},
+]
+binding_group = device_gpu.create_bind_group(layout=bind_group_layout, entries=binding)
+pipeline_layout = device_gpu.create_pipeline_layout(bind_group_layouts=[bind_group_layout])
+
+# Estencil de referencia (CPU)
+fld_pad = np.pad(field, 2)
+ref = (1.125 * (fld_pad[3:-1, 2:-2] - fld_pad[2:-2, 2:-2]) - (fld_pad[4:, 2:-2] - fld_pad[1:-3, 2:-2]) / 24.0 +
+       1.125 * (fld_pad[2:-2, 3:-1] - fld_pad[2:-2, 2:-2]) - (fld_pad[2:-2, 4:] - fld_pad[2:-2, 1:-3]) / 24.0)
+
+# Cada ponto le o campo de entrada e escreve o de saida uma vez (os vizinhos sao servidos pela cache)
+n_bytes = 2 * field.nbytes
+for thread_map in ["x_fast", "y_fast"]:
+    y_fast = thread_map == "y_fast"
+    cshader_string = shader_source.replace('nx_sz', f'{nx}').replace('ny_sz', f'{ny}')
+    cshader_string = cshader_string.replace('ws_th', f'{ws}')
+    cshader_string = cshader_string.replace('th_map_y_fast', f'{str(y_fast).lower()}')
+    cshader = device_gpu.create_shader_module(code=cshader_string)
+    compute_stencil = device_gpu.create_compute_pipeline(layout=pipeline_layout,
+                                                         compute={"module": cshader,
+                                                                  "entry_point": "stencil_kernel"})
+    wg = (ny // ws, nx // ws) if y_fast else (nx // ws, ny // ws)
+
+    def run(n):
+        command_encoder = device_gpu.create_command_encoder()
+        compute_pass = command_encoder.begin_compute_pass()
+        compute_pass.set_bind_group(0, binding_group, [], 0, 999999)
+        compute_pass.set_pipeline(compute_stencil)
+        for _ in range(n):
+            compute_pass.dispatch_workgroups(*wg)
+        compute_pass.end()
+        device_gpu.queue.submit([command_encoder.finish()])
+
+        # A leitura do buffer de saida sincroniza com a GPU
+        return np.asarray(device_gpu.queue.read_buffer(buffer_out).cast("f")).reshape((nx, ny))
+
+    # Aquecimento e verificacao
+    result = run(1)
+    t_gpu = time()
+    run(n_rep)
+    t_gpu = (time() - t_gpu) / n_rep
+    print(f'{thread_map}: {t_gpu * 1e3:.3f} ms/kernel, {n_bytes / t_gpu / 1e9:.1f} GB/s, '
+          f'ok = {np.allclose(result, ref, atol=1e-5)}')
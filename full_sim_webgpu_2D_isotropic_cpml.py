@@ -9,12 +9,17 @@ from datetime import datetime
 import numpy as np
 import argparse
 import ast
+from scipy.sparse import csr_matrix
 import matplotlib.pyplot as plt
 from time import time
-from PyQt6.QtWidgets import *
-import pyqtgraph as pg
-from pyqtgraph.widgets.RawImageWidget import RawImageWidget
-from simul_utils import SimulationROI, SimulationProbeLinearArray
+from simul_utils import SimulationROI, SimulationProbeLinearArray, get_decimation_filter, get_decimated_idx, \
+    get_staggered_coeffs_2d, get_staggered_coeffs_2d_table, get_material_table, get_material_maps, pack_material_grid
+from simul_utils import load_map, get_map_grid
+from simul_utils import get_host_ram, get_max_rec_decimation, get_memory_plan, print_memory_plan
+from simul_utils import get_fd_tables, get_shader_code, get_x_slabs, pack_pml_coeffs, StagingPool
+from simul_utils import get_bind_group, get_slab_entries, get_storage_bindings
+from simul_utils import CheckpointWriter, get_checkpoint_signature, load_checkpoint
+from simul_viewer import SimulationViewer
 import os.path
 import file_law
 
@@ -23,73 +28,23 @@ import file_law
 # ==========================================================
 flt32 = np.float32
 
+# Tamanho do workgroup do kernel de fontes (um thread por ponto da grade com fonte)
+WS_SRC = 64
 
-# -----------------------------------------------
-# Codigo para visualizacao da janela de simulacao
-# -----------------------------------------------
-# Image View class
-class ImageView(pg.ImageView):
-    # constructor which inherit original
-    # ImageView
-    def __init__(self, *args, **kwargs):
-        pg.ImageView.__init__(self, *args, **kwargs)
+# Grandezas que podem ser gravadas nos receptores
+REC_QUANTITIES = ["Vx", "Vy", "SigXX", "SigYY", "SigXY"]
 
-
-# Window class
-class Window(QMainWindow):
-    def __init__(self, title=None, geometry=None):
-        super().__init__()
-
-        # setting title
-        if title is None:
-            self.setWindowTitle(f"{nx}x{ny} Grid x {NSTEP} iterations - dx = {dx} m x dy = {dy} m x dt = {dt} s")
-        else:
-            self.setWindowTitle(title)
-
-        # setting geometry
-        if geometry is None:
-            self.setGeometry(200, 50, 300, 300)
-        else:
-            self.setGeometry(*geometry)
-
-        # setting animation
-        self.isAnimated()
-
-        # setting image
-        self.image = np.random.normal(size=(geometry[2], geometry[3]))
-
-        # showing all the widgets
-        self.show()
-
-        # creating a widget object
-        self.widget = QWidget()
-
-        # setting configuration options
-        pg.setConfigOptions(antialias=True)
-
-        # creating image view view object
-        self.imv = RawImageWidget()
-
-        # setting image to image view
-        self.imv.setImage(self.image, levels=[-0.1, 0.1])
-
-        # Creating a grid layout
-        self.layout = QGridLayout()
-
-        # setting this layout to the widget
-        self.widget.setLayout(self.layout)
-
-        # plot window goes on right side, spanning 3 rows
-        self.layout.addWidget(self.imv, 0, 0, 4, 1)
-
-        # setting this widget as central widget of the main window
-        self.setCentralWidget(self.widget)
+# Arrays do estado do simulador em CPU gravados nos checkpoints
+CPU_STATE = ["vx", "vy", "sigmaxx", "sigmayy", "sigmaxy",
+             "memory_dvx_dx", "memory_dvx_dy", "memory_dvy_dx", "memory_dvy_dy",
+             "memory_dsigmaxx_dx", "memory_dsigmayy_dy", "memory_dsigmaxy_dx", "memory_dsigmaxy_dy",
+             "sisvx", "sisvy"]
 
 
 # --------------------------
 # Funcao do simulador em CPU
 # --------------------------
-def sim_cpu():
+def sim_cpu(ckpt_tag):
     global simul_probes, coefs
     global a_x, a_x_half, b_x, b_x_half, k_x, k_x_half
     global a_y, a_y_half, b_y, b_y_half, k_y, k_y_half
@@ -102,10 +57,14 @@ def sim_cpu():
     global value_dsigmaxx_dx, value_dsigmaxy_dy
     global value_dsigmaxy_dx, value_dsigmayy_dy
     global sisvx, sisvy
-    global ix_src, iy_src, ix_rec, iy_rec
-    global windows_cpu
+    global src_nodes, rec_nodes, op_src, op_rec
+    global viewer_cpu
     global rho_grid_vx, cp_grid_vx, cs_grid_vx
 
+    # O simulador em CPU usa os mapas densos de propriedades
+    if mat_grid is not None:
+        cp_grid_vx, cs_grid_vx, rho_grid_vx = get_material_maps(mat_grid, mat_table)
+
     _ord = coefs.shape[0]
     idx_fd = np.array([[c + _ord,  # ini half grid
                         -c + _ord - 1,  # ini full grid
@@ -113,42 +72,24 @@ def sim_cpu():
                         -c - _ord]  # fin full grid
                        for c in range(_ord)], dtype=np.int32)
 
-    v_max = 100.0
-    v_min = - v_max
     ix_min = simul_roi.get_ix_min()
     ix_max = simul_roi.get_ix_max()
     iy_min = simul_roi.get_iz_min()
     iy_max = simul_roi.get_iz_max()
 
-    # Obtem fontes e receptores dos transdutores
+    # Obtem os termos de fonte dos transdutores (uma coluna por elemento de cada transdutor)
     source_term = list()
-    idx_src = list()
-    idx_rec = list()
-    idx_src_offset = 0
-    idx_rec_offset = 0
     for _pr in simul_probes:
         if source_env:
-            st, i_src = _pr.get_source_term(samples=NSTEP, dt=dt, out='e')
+            source_term.append(_pr.get_source_term(samples=NSTEP, dt=dt, out='e'))
         else:
-            st, i_src = _pr.get_source_term(samples=NSTEP, dt=dt)
-        if len(i_src) > 0:
-            source_term.append(st)
-            idx_src += [np.array(_s) + idx_src_offset for _s in i_src]
-            idx_src_offset += len(i_src)
-
-        i_rec = _pr.get_idx_rec(sim_roi=simul_roi, simul_type="2D")
-        if len(i_rec) > 0:
-            idx_rec += [np.array(_r) + idx_rec_offset for _r in i_rec]
-            idx_rec_offset += len(i_rec)
+            source_term.append(_pr.get_source_term(samples=NSTEP, dt=dt))
 
     # Source terms
     source_term = np.concatenate(source_term, axis=1)
     if save_sources:
         np.save(f'results/sources_2D_elast_CPML_{datetime.now().strftime("%Y%m%d-%H%M%S")}_CPU', source_term)
 
-    idx_src = np.array(idx_src).astype(np.int32).flatten()
-    idx_rec = np.array(idx_rec).astype(np.int32).flatten()
-
     # rho_grid_vy e a matriz de densidade calculada no ponto medio do grid de vx (grid de vy)
     rho_grid_vy = rho_grid_vx
     rho_grid_vy[:-1, :-1] = flt32(0.25) * (
@@ -163,8 +104,15 @@ def sim_cpu():
     lambdaplus2mu_grid_sig_norm = lambda_grid_sig_norm + flt32(2.0) * mu_grid_sig_norm
     mu_grid_sig_trans[:-1, :-1] = flt32(0.5) * (mu_grid_vx[:-1, 1:] + mu_grid_vx[:-1, :-1])
 
+    # Checkpoints: com --resume, o estado e restaurado do ultimo checkpoint gravado, e o estado e gravado a cada
+    # ckpt_interval passos de tempo
+    it_ini, state = load_checkpoint(ckpt_dir, ckpt_tag, ckpt_sig) if args.resume else (0, None)
+    if state is not None:
+        globals().update(state)
+    ckpt = CheckpointWriter(ckpt_dir, ckpt_tag, ckpt_sig) if ckpt_interval > 0 or state is not None else None
+
     # Inicio do laco de tempo
-    for it in range(1, NSTEP + 1):
+    for it in range(it_ini + 1, NSTEP + 1):
         # Calculo da tensao [stress] - {sigma} (equivalente a pressao nos gases-liquidos)
         # sigma_ii -> tensoes normais; sigma_ij -> tensoes cisalhantes
         # Primeiro "laco" i: 1,NX-1; j: 2,NY -> [1:-2, 2:-1]
@@ -329,9 +277,8 @@ def sim_cpu():
 
         vy = dt * (value_dsigmaxy_dx + value_dsigmayy_dy) / rho_grid_vy + vy
 
-        # add the source (force vector located at a given grid point)
-        for _isrc in range(NSRC):
-            vy[ix_src[_isrc], iy_src[_isrc]] += source_term[it - 1, idx_src[_isrc]] * dt / rho
+        # add the source (force vector injected at the grid points by the sparse operator)
+        vy.flat[src_nodes] += (op_src @ source_term[it - 1]) * dt / rho
 
         # implement Dirichlet boundary conditions on the six edges of the grid
         # which is the right condition to implement in order for C-PML to remain stable at long times
@@ -352,13 +299,18 @@ def sim_cpu():
         vy[:, -_ord:] = ZERO
 
         # Store seismograms
-        for _i in range(idx_rec.shape[0]):
-            _irec = idx_rec[_i]
+        # Os valores nos receptores sao interpolados pelo operador esparso. A amostra e filtrada (anti-aliasing)
+        # e acumulada nas amostras decimadas da janela de recepcao que recebem sua contribuicao
+        rec_vx = op_rec @ vx.flat[rec_nodes]
+        rec_vy = op_rec @ vy.flat[rec_nodes]
+        for _irec in range(NREC):
             if it >= delay_recv[_irec]:
-                _x = ix_rec[_i]
-                _y = iy_rec[_i]
-                sisvx[it - 1, _irec] += vx[_x, _y]
-                sisvy[it - 1, _irec] += vy[_x, _y]
+                _m, _j = get_decimated_idx(it - 1 - rec_ini[_irec], rec_decim, dec_filter.shape[0], rec_smp[_irec])
+                if _m.shape[0] == 0:
+                    continue
+                _h = dec_filter[_j]
+                sisvx[_m, _irec] += _h * rec_vx[_irec]
+                sisvy[_m, _irec] += _h * rec_vy[_irec]
 
         vsn2 = np.sqrt(np.max(vx[:, :] ** 2 + vy[:, :] ** 2))
         if (it % IT_DISPLAY) == 0 or it == 5:
@@ -369,20 +321,26 @@ def sim_cpu():
                 print(f'Max norm velocity vector V (m/s) = {vsn2}')
 
             if show_anim:
-                windows_cpu[0].imv.setImage(vx[ix_min:ix_max, iy_min:iy_max], levels=[v_min, v_max])
-                windows_cpu[1].imv.setImage(vy[ix_min:ix_max, iy_min:iy_max], levels=[v_min, v_max])
-                App.processEvents()
+                viewer_cpu.update([vx[ix_min:ix_max, iy_min:iy_max], vy[ix_min:ix_max, iy_min:iy_max]])
 
         # Verifica a estabilidade da simulacao
         if vsn2 > STABILITY_THRESHOLD:
             print("Simulacao tornando-se instavel")
             exit(2)
 
+        # Grava o checkpoint (copias do estado, gravadas em segundo plano)
+        if ckpt_interval > 0 and it % ckpt_interval == 0 and it < NSTEP:
+            ckpt.save(it, {_k: np.copy(globals()[_k]) for _k in CPU_STATE})
+
+    # Simulacao concluida, os checkpoints nao sao mais necessarios
+    if ckpt is not None:
+        ckpt.clear()
+
 
 # ----------------------------------------
 # Funcao do simulador em WebGPU
 # ----------------------------------------
-def sim_webgpu(device):
+def sim_webgpu(device, ckpt_tag):
     global simul_probes, coefs
     global a_x, a_x_half, b_x, b_x_half, k_x, k_x_half
     global a_y, a_y_half, b_y, b_y_half, k_y, k_y_half
@@ -394,70 +352,88 @@ def sim_webgpu(device):
     global value_dvx_dx, value_dvy_dy
     global value_dsigmaxx_dx, value_dsigmaxy_dy
     global value_dsigmaxy_dx, value_dsigmayy_dy
-    global ix_src, iy_src, ix_rec, iy_rec
+    global op_src_idx, op_src_col, op_src_w, op_rec_idx, op_rec_col, op_rec_w
     global simul_roi, rho_grid_vx, cp_grid_vx, cs_grid_vx
-    global windows_gpu
+    global viewer_gpu
 
-    # Obtem fontes e receptores dos transdutores
+    # Obtem os termos de fonte dos transdutores (uma coluna por elemento de cada transdutor)
     source_term = list()
-    idx_src = list()
-    idx_rec = list()
-    idx_src_offset = 0
-    idx_rec_offset = 0
     for _pr in simul_probes:
         if source_env:
-            st = _pr.get_source_term(samples=NSTEP, dt=dt, out='e')
-            _, i_src = _pr.get_points_roi(sim_roi=simul_roi, simul_type="2d")
+            source_term.append(_pr.get_source_term(samples=NSTEP, dt=dt, out='e'))
         else:
-            st = _pr.get_source_term(samples=NSTEP, dt=dt)
-            _, i_src = _pr.get_points_roi(sim_roi=simul_roi, simul_type="2d")
-        if len(i_src) > 0:
-            source_term.append(st)
-            idx_src += [np.array(_s) + idx_src_offset for _s in i_src]
-            idx_src_offset += _pr.num_elem
-
-        i_rec = _pr.get_idx_rec(sim_roi=simul_roi, simul_type="2D")
-        if len(i_rec) > 0:
-            idx_rec += [np.array(_r) + idx_rec_offset for _r in i_rec]
-            idx_rec_offset += _pr.num_elem
+            source_term.append(_pr.get_source_term(samples=NSTEP, dt=dt))
 
     # Source terms
     source_term = np.concatenate(source_term, axis=1)
     if save_sources:
         np.save(f'results/sources_2D_elast_CPML_{datetime.now().strftime("%Y%m%d-%H%M%S")}_GPU', source_term)
 
-    pos_sources = -np.ones((nx, ny), dtype=np.int32)
-    pos_sources[ix_src, iy_src] = np.array(idx_src).astype(np.int32).flatten()
+    # Tabela de pesos das fontes (ponto da grade, coluna do termo de fonte, peso), ordenada pelo ponto da grade.
+    # ptr_src_pt indica, para cada ponto da grade com fonte, a primeira entrada da tabela
+    order = np.lexsort((op_src_col, op_src_idx[:, 2], op_src_idx[:, 0]))
+    src_node = (op_src_idx[order, 0] * ny + op_src_idx[order, 2]).astype(np.int32)
+    info_src_pt = np.column_stack((src_node, op_src_col[order])).astype(np.int32)
+    weight_src_pt = op_src_w[order].astype(flt32)
+    ptr_src_pt = np.unique(src_node, return_index=True)[1].astype(np.int32)
+    n_pto_src = np.int32(src_node.shape[0])
+    n_nd_src = np.int32(ptr_src_pt.shape[0])
 
     # Receivers
-    info_rec_pt = np.column_stack((ix_rec, iy_rec, np.array(idx_rec).flatten())).astype(np.int32)
-    numbers = list(np.array(idx_rec, dtype=np.int32).flatten())
-    offset_sensors = [numbers[0]]
-    for i in range(1, len(numbers)):
-        if numbers[i] != numbers[i - 1]:
-            offset_sensors.append(np.int32(i))
-    offset_sensors = np.array(offset_sensors, dtype=np.int32)
-    n_pto_rec = np.int32(len(numbers))
+    # Tabela dos pontos receptores (x, y, sensor) e seus pesos de interpolacao, ordenada pelo sensor
+    order = np.argsort(op_rec_col, kind='stable')
+    info_rec_pt = np.column_stack((op_rec_idx[order, 0], op_rec_idx[order, 2], op_rec_col[order])).astype(np.int32)
+    weight_rec_pt = op_rec_w[order].astype(flt32)
+    offset_sensors = np.searchsorted(info_rec_pt[:, 2], np.arange(NREC)).astype(np.int32)
+    n_pto_rec = np.int32(info_rec_pt.shape[0])
+
+    # Checkpoints: com --resume, o estado e restaurado do ultimo checkpoint gravado (inclusive o passo de tempo
+    # da GPU), e o estado e gravado a cada ckpt_interval passos de tempo
+    it_ini, state = load_checkpoint(ckpt_dir, ckpt_tag, ckpt_sig) if args.resume else (0, None)
+    ckpt = CheckpointWriter(ckpt_dir, ckpt_tag, ckpt_sig) if ckpt_interval > 0 or state is not None else None
 
     # Arrays com parametros inteiros (i32) e ponto flutuante (f32) para rodar o simulador
     _ord = coefs.shape[0]
-    params_i32 = np.array([nx, ny, NSTEP, source_term.shape[1], sisvx.shape[1], n_pto_rec, _ord, 0],
+    params_i32 = np.array([nx, ny, NSTEP, source_term.shape[1], sisvx.shape[1], n_pto_rec, _ord,
+                           NSTEP_REC, rec_decim, dec_filter.shape[0], rec_qty, n_pto_src, n_nd_src, it_ini],
                           dtype=np.int32)
     params_f32 = np.array([dx, dy, dt], dtype=flt32)
 
-    # Cria o shader para calculo contido no arquivo ``shader_2D_elast_cpml.wgsl''
-    with open('shader_2D_elast_cpml.wgsl') as shader_file:
-        cshader_string = shader_file.read()
-        cshader_string = cshader_string.replace('wsx', f'{wsx}')
-        cshader_string = cshader_string.replace('wsy', f'{wsy}')
-        cshader_string = cshader_string.replace('idx_rec_offset', f'{idx_rec_offset}')
-        cshader = device.create_shader_module(code=cshader_string)
+    # Mapeamento das threads na grade: com thread_y_fast, o eixo mais rapido das threads percorre y,
+    # que e o eixo contiguo na memoria (acessos coalescidos)
+    ws_th = (wsy, wsx) if thread_y_fast else (wsx, wsy)
+
+    # Fatias (slabs) do grid ao longo de x: campos maiores que o limite de tamanho de um binding do dispositivo
+    # sao amarrados por fatia (com um halo do alcance do estencil) e os kernels rodam em passadas sequenciais
+    fld_plane = ny * np.dtype(flt32).itemsize
+    lbl_plane = ny * mat_bits // 8
+    slabs = get_x_slabs(nx, [fld_plane] + ([lbl_plane] if mat_grid is not None else []),
+                        device.limits["max-storage-buffer-binding-size"], _ord,
+                        align=device.limits["min-storage-buffer-offset-alignment"], x_mult=wsx,
+                        max_buffer=device.limits["max-buffer-size"])
+    if len(slabs) > 1:
+        print(f'Grid dividido em {len(slabs)} fatias ao longo de x (limite de binding do dispositivo)')
+
+    # Indices dos pontos do estencil das diferencas finitas (grids intercalados)
+    idx_fd = np.array([[c + 1, c, -c, -c - 1] for c in range(_ord)], dtype=np.int32)
+
+    # Cria o shader para calculo a partir do modelo ``shader_2D_elast_cpml.wgsl'', especializado para a ordem,
+    # os tamanhos do grid e as grandezas gravadas (estencil desenrolado, com os coeficientes como constantes)
+    cshader_string = get_shader_code('shader_2D_elast_cpml.wgsl',
+                                     tokens={'wsx': wsx, 'wsy': wsy, 'ws_th0': ws_th[0], 'ws_th1': ws_th[1],
+                                             'th_map_y_fast': thread_y_fast, 'idx_rec_offset': NREC,
+                                             'ws_src': WS_SRC, 'mat_ids_on': mat_grid is not None,
+                                             'mat_lbl_bits': mat_bits, 'mat_num': mat_num, 'fd_num': _ord},
+                                     consts={'sim_int_par.x_sz': nx, 'sim_int_par.y_sz': ny,
+                                             'sim_int_par.fd_coeff': _ord, 'sim_int_par.rec_qty': rec_qty},
+                                     fd_tables=get_fd_tables(coefs, idx_fd))
+    cshader = device.create_shader_module(code=cshader_string)
 
     # Definicao dos buffers que terao informacoes compartilhadas entre CPU e GPU
     # ------- Buffers para o binding de parametros -------------
     # Buffer de parametros com valores em ponto flutuante
-    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-    b_param_flt32 = device.create_buffer_with_data(data=params_f32, usage=wgpu.BufferUsage.STORAGE |
+    # [UNIFORM | COPY_SRC] pois sao valores pequenos, constantes e passados para a GPU
+    b_param_flt32 = device.create_buffer_with_data(data=params_f32, usage=wgpu.BufferUsage.UNIFORM |
                                                                           wgpu.BufferUsage.COPY_SRC)
 
     # Forcas da fonte
@@ -466,38 +442,22 @@ def sim_webgpu(device):
                                              usage=wgpu.BufferUsage.STORAGE |
                                                    wgpu.BufferUsage.COPY_SRC)
 
-    # Indices das fontes na ROI
-    b_idx_src = device.create_buffer_with_data(data=pos_sources, usage=wgpu.BufferUsage.STORAGE |
-                                                                       wgpu.BufferUsage.COPY_SRC)
+    # Indices dos pontos da grade com fonte na tabela de pesos das fontes (um elemento extra evita buffer vazio)
+    b_idx_src = device.create_buffer_with_data(data=np.append(ptr_src_pt, np.int32(0)),
+                                               usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
 
-    # Coeficientes de absorcao
-    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-    b_a_x = device.create_buffer_with_data(data=a_x.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_b_x = device.create_buffer_with_data(data=b_x.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_k_x = device.create_buffer_with_data(data=k_x.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_a_x_h = device.create_buffer_with_data(data=a_x_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
-    b_b_x_h = device.create_buffer_with_data(data=b_x_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
-    b_k_x_h = device.create_buffer_with_data(data=k_x_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
+    # Tabela de pesos das fontes
+    b_info_src_pt = device.create_buffer_with_data(data=info_src_pt, usage=wgpu.BufferUsage.STORAGE |
+                                                                           wgpu.BufferUsage.COPY_SRC)
+    b_weight_src_pt = device.create_buffer_with_data(data=weight_src_pt, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_SRC)
 
+    # Coeficientes de absorcao, empacotados por eixo ([a, b, k, -] nos grids cheio e intercalado de cada ponto)
     # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-    b_a_y = device.create_buffer_with_data(data=a_y.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_b_y = device.create_buffer_with_data(data=b_y.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_k_y = device.create_buffer_with_data(data=k_y.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_a_y_h = device.create_buffer_with_data(data=a_y_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
-    b_b_y_h = device.create_buffer_with_data(data=b_y_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
-    b_k_y_h = device.create_buffer_with_data(data=k_y_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
+    b_pml_x = device.create_buffer_with_data(data=pack_pml_coeffs(a_x, b_x, k_x, a_x_half, b_x_half, k_x_half),
+                                             usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+    b_pml_y = device.create_buffer_with_data(data=pack_pml_coeffs(a_y, b_y, k_y, a_y_half, b_y_half, k_y_half),
+                                             usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
 
     # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
     b_param_int32 = device.create_buffer_with_data(data=params_i32, usage=wgpu.BufferUsage.STORAGE |
@@ -505,23 +465,41 @@ def sim_webgpu(device):
                                                                           wgpu.BufferUsage.COPY_DST)
 
     # Buffers com os indices para o calculo das derivadas com acuracia maior
-    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-    idx_fd = np.array([[c + 1, c, -c, -c - 1] for c in range(_ord)], dtype=np.int32)
-    b_idx_fd = device.create_buffer_with_data(data=idx_fd, usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+    # [UNIFORM | COPY_SRC] pois sao valores pequenos, constantes e passados para a GPU
+    b_idx_fd = device.create_buffer_with_data(data=idx_fd, usage=wgpu.BufferUsage.UNIFORM | wgpu.BufferUsage.COPY_SRC)
 
-    # Buffer com os mapas de velocidade e densidade da ROI
+    # Buffers com os coeficientes do material ja calculados nos grids intercalados (staggered) da ROI
+    # Com mapa de materiais, os coeficientes sao tabelados por par de materiais e os mapas densos nao sao usados
     # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-    b_rho_map = device.create_buffer_with_data(data=rho_grid_vx, usage=wgpu.BufferUsage.STORAGE |
-                                                                       wgpu.BufferUsage.COPY_SRC)
-    b_cp_map = device.create_buffer_with_data(data=cp_grid_vx, usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_cs_map = device.create_buffer_with_data(data=cs_grid_vx, usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-
-    # Buffer com os coeficientes para ao calculo das derivadas
-    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-    b_fd_coeffs = device.create_buffer_with_data(data=coefs, usage=wgpu.BufferUsage.STORAGE |
-                                                                   wgpu.BufferUsage.COPY_SRC)
+    if mat_grid is not None:
+        mat_packed = pack_material_grid(mat_grid)[0]
+        mat_coef = get_staggered_coeffs_2d_table(mat_table)
+        lambda_sig = lambdaplus2mu_sig = mu_sigxy = inv_rho_vx = inv_rho_vy = np.zeros(1, dtype=flt32)
+    else:
+        mat_packed = np.zeros(1, dtype=np.uint32)
+        mat_coef = np.zeros(1, dtype=flt32)
+        lambda_sig, lambdaplus2mu_sig, mu_sigxy, inv_rho_vx, inv_rho_vy = get_staggered_coeffs_2d(rho_grid_vx,
+                                                                                                cp_grid_vx,
+                                                                                                cs_grid_vx)
+    b_mat_map = device.create_buffer_with_data(data=mat_packed, usage=wgpu.BufferUsage.STORAGE |
+                                                                      wgpu.BufferUsage.COPY_SRC)
+    b_mat_coef = device.create_buffer_with_data(data=mat_coef, usage=wgpu.BufferUsage.STORAGE |
+                                                                    wgpu.BufferUsage.COPY_SRC)
+    b_lambda_map = device.create_buffer_with_data(data=lambda_sig, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_SRC)
+    b_lambdaplus2mu_map = device.create_buffer_with_data(data=lambdaplus2mu_sig, usage=wgpu.BufferUsage.STORAGE |
+                                                                                       wgpu.BufferUsage.COPY_SRC)
+    b_mu_xy_map = device.create_buffer_with_data(data=mu_sigxy, usage=wgpu.BufferUsage.STORAGE |
+                                                                      wgpu.BufferUsage.COPY_SRC)
+    b_inv_rho_vx_map = device.create_buffer_with_data(data=inv_rho_vx, usage=wgpu.BufferUsage.STORAGE |
+                                                                             wgpu.BufferUsage.COPY_SRC)
+    b_inv_rho_vy_map = device.create_buffer_with_data(data=inv_rho_vy, usage=wgpu.BufferUsage.STORAGE |
+                                                                             wgpu.BufferUsage.COPY_SRC)
+
+    # Buffer com os coeficientes para ao calculo das derivadas (completados ate um multiplo de 4, array de vec4)
+    # [UNIFORM | COPY_SRC] pois sao valores pequenos, constantes e passados para a GPU
+    b_fd_coeffs = device.create_buffer_with_data(data=np.pad(coefs, (0, (-_ord) % 4)), usage=wgpu.BufferUsage.UNIFORM |
+                                                                                             wgpu.BufferUsage.COPY_SRC)
 
     # Buffers com os arrays de simulacao
     # Velocidades
@@ -532,6 +510,8 @@ def sim_webgpu(device):
     b_vy = device.create_buffer_with_data(data=vy, usage=wgpu.BufferUsage.STORAGE |
                                                          wgpu.BufferUsage.COPY_DST |
                                                          wgpu.BufferUsage.COPY_SRC)
+    # Maximo do quadrado da norma da velocidade, reduzido no shader com atomicMax sobre os bits do f32 (os valores
+    # nao negativos mantem a ordem como inteiros sem sinal)
     b_v_2 = device.create_buffer_with_data(data=v_2, usage=wgpu.BufferUsage.STORAGE |
                                                            wgpu.BufferUsage.COPY_DST |
                                                            wgpu.BufferUsage.COPY_SRC)
@@ -549,41 +529,53 @@ def sim_webgpu(device):
                                                                    wgpu.BufferUsage.COPY_SRC)
 
     # Arrays de memoria do simulador
-    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
+    # [STORAGE | COPY_DST | COPY_SRC] pois sao valores passados para a GPU e restaurados dos checkpoints [COPY_DST]
     b_memory_dvx_dx = device.create_buffer_with_data(data=memory_dvx_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
                                                                                wgpu.BufferUsage.COPY_SRC)
     b_memory_dvx_dy = device.create_buffer_with_data(data=memory_dvx_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
                                                                                wgpu.BufferUsage.COPY_SRC)
     b_memory_dvy_dx = device.create_buffer_with_data(data=memory_dvy_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
                                                                                wgpu.BufferUsage.COPY_SRC)
     b_memory_dvy_dy = device.create_buffer_with_data(data=memory_dvy_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
                                                                                wgpu.BufferUsage.COPY_SRC)
     b_memory_dsigmaxx_dx = device.create_buffer_with_data(data=memory_dsigmaxx_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                                         wgpu.BufferUsage.COPY_DST |
                                                                                          wgpu.BufferUsage.COPY_SRC)
     b_memory_dsigmayy_dy = device.create_buffer_with_data(data=memory_dsigmayy_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                                         wgpu.BufferUsage.COPY_DST |
                                                                                          wgpu.BufferUsage.COPY_SRC)
     b_memory_dsigmaxy_dx = device.create_buffer_with_data(data=memory_dsigmaxy_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                                         wgpu.BufferUsage.COPY_DST |
                                                                                          wgpu.BufferUsage.COPY_SRC)
     b_memory_dsigmaxy_dy = device.create_buffer_with_data(data=memory_dsigmaxy_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                                         wgpu.BufferUsage.COPY_DST |
                                                                                          wgpu.BufferUsage.COPY_SRC)
 
     # Sinal do sensor
     # [STORAGE | COPY_DST | COPY_SRC] pois sao valores passados para a GPU e tambem retornam a CPU [COPY_DST]
-    b_sens_x = device.create_buffer_with_data(data=sisvx, usage=wgpu.BufferUsage.STORAGE |
-                                                                wgpu.BufferUsage.COPY_DST |
-                                                                wgpu.BufferUsage.COPY_SRC)
-    b_sens_y = device.create_buffer_with_data(data=sisvy, usage=wgpu.BufferUsage.STORAGE |
-                                                                wgpu.BufferUsage.COPY_DST |
-                                                                wgpu.BufferUsage.COPY_SRC)
-    b_sens_sigxx = device.create_buffer_with_data(data=sisvy, usage=wgpu.BufferUsage.STORAGE |
-                                                                wgpu.BufferUsage.COPY_DST |
-                                                                wgpu.BufferUsage.COPY_SRC)
-    b_sens_sigyy = device.create_buffer_with_data(data=sisvy, usage=wgpu.BufferUsage.STORAGE |
-                                                                wgpu.BufferUsage.COPY_DST |
-                                                                wgpu.BufferUsage.COPY_SRC)
-    b_sens_sigxy = device.create_buffer_with_data(data=sisvy, usage=wgpu.BufferUsage.STORAGE |
-                                                                wgpu.BufferUsage.COPY_DST |
-                                                                wgpu.BufferUsage.COPY_SRC)
+    # As grandezas que nao sao gravadas recebem um buffer minimo, apenas para completar o binding
+    sens_empty = np.zeros(1, dtype=flt32)
+    sens_data = {q: (np.zeros((NSTEP_REC, NREC), dtype=flt32) if q in rec_quantities else sens_empty)
+                 for q in REC_QUANTITIES}
+    b_sens_x = device.create_buffer_with_data(data=sens_data["Vx"], usage=wgpu.BufferUsage.STORAGE |
+                                                                          wgpu.BufferUsage.COPY_DST |
+                                                                          wgpu.BufferUsage.COPY_SRC)
+    b_sens_y = device.create_buffer_with_data(data=sens_data["Vy"], usage=wgpu.BufferUsage.STORAGE |
+                                                                          wgpu.BufferUsage.COPY_DST |
+                                                                          wgpu.BufferUsage.COPY_SRC)
+    b_sens_sigxx = device.create_buffer_with_data(data=sens_data["SigXX"], usage=wgpu.BufferUsage.STORAGE |
+                                                                                 wgpu.BufferUsage.COPY_DST |
+                                                                                 wgpu.BufferUsage.COPY_SRC)
+    b_sens_sigyy = device.create_buffer_with_data(data=sens_data["SigYY"], usage=wgpu.BufferUsage.STORAGE |
+                                                                                 wgpu.BufferUsage.COPY_DST |
+                                                                                 wgpu.BufferUsage.COPY_SRC)
+    b_sens_sigxy = device.create_buffer_with_data(data=sens_data["SigXY"], usage=wgpu.BufferUsage.STORAGE |
+                                                                                 wgpu.BufferUsage.COPY_DST |
+                                                                                 wgpu.BufferUsage.COPY_SRC)
 
     # Tempo de espera para recepcao nos sensores
     b_delay_rec = device.create_buffer_with_data(data=delay_recv, usage=wgpu.BufferUsage.STORAGE |
@@ -594,237 +586,103 @@ def sim_webgpu(device):
                                                                            wgpu.BufferUsage.COPY_SRC)
     b_offset_sensors = device.create_buffer_with_data(data=offset_sensors, usage=wgpu.BufferUsage.STORAGE |
                                                                                  wgpu.BufferUsage.COPY_SRC)
+    b_weight_rec_pt = device.create_buffer_with_data(data=weight_rec_pt, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_SRC)
+
+    # Coeficientes do filtro de decimacao dos sinais dos sensores
+    b_dec_filter = device.create_buffer_with_data(data=dec_filter, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_SRC)
+
+    # Janela de recepcao dos sensores (amostra inicial, numero de amostras decimadas)
+    b_rec_gate = device.create_buffer_with_data(data=np.column_stack((rec_ini, rec_smp)).astype(np.int32),
+                                                usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+
+    # Regiao de pre-visualizacao (ROI decimada) extraida na GPU, para que a exibicao leia apenas essa regiao
+    ix_min = simul_roi.get_ix_min()
+    ix_max = simul_roi.get_ix_max()
+    iy_min = simul_roi.get_iz_min()
+    iy_max = simul_roi.get_iz_max()
+    pv_nx = -(-(ix_max - ix_min) // preview_dec)
+    pv_ny = -(-(iy_max - iy_min) // preview_dec)
+    b_preview = device.create_buffer(size=2 * pv_nx * pv_ny * np.dtype(flt32).itemsize,
+                                     usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+    b_pv_par = device.create_buffer_with_data(data=np.array([ix_min, iy_min, pv_nx, pv_ny, preview_dec],
+                                                            dtype=np.int32),
+                                              usage=wgpu.BufferUsage.UNIFORM | wgpu.BufferUsage.COPY_SRC)
+    wg_pv = (-(-pv_ny // wsy), -(-pv_nx // wsx)) if thread_y_fast else (-(-pv_nx // wsx), -(-pv_ny // wsy))
+
+    # Buffers do estado do simulador gravados nos checkpoints, restaurados ao retomar a simulacao
+    b_sens = {"Vx": b_sens_x, "Vy": b_sens_y, "SigXX": b_sens_sigxx, "SigYY": b_sens_sigyy, "SigXY": b_sens_sigxy}
+    gpu_state = {"vx": b_vx, "vy": b_vy, "v_2": b_v_2, "sigmaxx": b_sigmaxx, "sigmayy": b_sigmayy,
+                 "sigmaxy": b_sigmaxy, "memory_dvx_dx": b_memory_dvx_dx, "memory_dvx_dy": b_memory_dvx_dy,
+                 "memory_dvy_dx": b_memory_dvy_dx, "memory_dvy_dy": b_memory_dvy_dy,
+                 "memory_dsigmaxx_dx": b_memory_dsigmaxx_dx, "memory_dsigmayy_dy": b_memory_dsigmayy_dy,
+                 "memory_dsigmaxy_dx": b_memory_dsigmaxy_dx, "memory_dsigmaxy_dy": b_memory_dsigmaxy_dy}
+    gpu_state.update({f'sens_{q}': b_sens[q] for q in rec_quantities})
+    if state is not None:
+        for _k, _b in gpu_state.items():
+            device.queue.write_buffer(_b, 0, state[_k])
+
+    # Esquema de amarracao dos buffers (bindings, na ordem das listas) e grupos de amarracao
+    rw = wgpu.BufferBindingType.storage
+    ro = wgpu.BufferBindingType.read_only_storage
+    uni = wgpu.BufferBindingType.uniform
 
-    # Esquema de amarracao dos parametros (binding layouts [bl])
     # Parametros
-    bl_params = [
-        {"binding": 0,
-         "visibility": wgpu.ShaderStage.COMPUTE,
-         "buffer": {
-             "type": wgpu.BufferBindingType.storage}
-         }
-    ]
-    bl_params += [
-        {"binding": ii,
-         "visibility": wgpu.ShaderStage.COMPUTE,
-         "buffer": {
-             "type": wgpu.BufferBindingType.read_only_storage}
-         } for ii in range(1, 21)
-    ]
+    bl_params = [(b_param_int32, rw), (b_param_flt32, uni), (b_force, ro), (b_idx_src, ro),
+                 (b_pml_x, ro), (b_pml_y, ro), (b_idx_fd, uni), (b_fd_coeffs, uni),
+                 (b_lambda_map, ro), (b_lambdaplus2mu_map, ro), (b_mu_xy_map, ro),
+                 (b_info_src_pt, ro), (b_weight_src_pt, ro),
+                 (b_inv_rho_vx_map, ro), (b_inv_rho_vy_map, ro),
+                 (b_mat_map, ro), (b_mat_coef, ro)]
 
     # Arrays da simulacao
-    bl_sim_arrays = [
-        {"binding": ii,
-         "visibility": wgpu.ShaderStage.COMPUTE,
-         "buffer": {
-             "type": wgpu.BufferBindingType.storage}
-         } for ii in range(0, 14)
-    ]
+    bl_sim_arrays = [(b_vx, rw), (b_vy, rw), (b_v_2, rw),
+                     (b_sigmaxx, rw), (b_sigmayy, rw), (b_sigmaxy, rw),
+                     (b_memory_dvx_dx, rw), (b_memory_dvx_dy, rw),
+                     (b_memory_dvy_dx, rw), (b_memory_dvy_dy, rw),
+                     (b_memory_dsigmaxx_dx, rw), (b_memory_dsigmayy_dy, rw),
+                     (b_memory_dsigmaxy_dx, rw), (b_memory_dsigmaxy_dy, rw),
+                     (b_preview, rw), (b_pv_par, uni)]
 
     # Sensores
-    bl_sensors = [
-        {"binding": ii,
-         "visibility": wgpu.ShaderStage.COMPUTE,
-         "buffer": {
-             "type": wgpu.BufferBindingType.storage}
-         } for ii in [*range(0, 2), *range(5, 8)]
-    ]
-    bl_sensors += [
-        {"binding": ii,
-         "visibility": wgpu.ShaderStage.COMPUTE,
-         "buffer": {
-             "type": wgpu.BufferBindingType.read_only_storage}
-         } for ii in range(2, 5)
-    ]
-
-    # Configuracao das amarracoes (bindings)
-    b_params = [
-        {
-            "binding": 0,
-            "resource": {"buffer": b_param_int32, "offset": 0, "size": b_param_int32.size},
-        },
-        {
-            "binding": 1,
-            "resource": {"buffer": b_param_flt32, "offset": 0, "size": b_param_flt32.size},
-        },
-        {
-            "binding": 2,
-            "resource": {"buffer": b_force, "offset": 0, "size": b_force.size},
-        },
-        {
-            "binding": 3,
-            "resource": {"buffer": b_idx_src, "offset": 0, "size": b_idx_src.size},
-        },
-        {
-            "binding": 4,
-            "resource": {"buffer": b_a_x, "offset": 0, "size": b_a_x.size},
-        },
-        {
-            "binding": 5,
-            "resource": {"buffer": b_b_x, "offset": 0, "size": b_b_x.size},
-        },
-        {
-            "binding": 6,
-            "resource": {"buffer": b_k_x, "offset": 0, "size": b_k_x.size},
-        },
-        {
-            "binding": 7,
-            "resource": {"buffer": b_a_x_h, "offset": 0, "size": b_a_x_h.size},
-        },
-        {
-            "binding": 8,
-            "resource": {"buffer": b_b_x_h, "offset": 0, "size": b_b_x_h.size},
-        },
-        {
-            "binding": 9,
-            "resource": {"buffer": b_k_x_h, "offset": 0, "size": b_k_x_h.size},
-        },
-        {
-            "binding": 10,
-            "resource": {"buffer": b_a_y, "offset": 0, "size": b_a_y.size},
-        },
-        {
-            "binding": 11,
-            "resource": {"buffer": b_b_y, "offset": 0, "size": b_b_y.size},
-        },
-        {
-            "binding": 12,
-            "resource": {"buffer": b_k_y, "offset": 0, "size": b_k_y.size},
-        },
-        {
-            "binding": 13,
-            "resource": {"buffer": b_a_y_h, "offset": 0, "size": b_a_y_h.size},
-        },
-        {
-            "binding": 14,
-            "resource": {"buffer": b_b_y_h, "offset": 0, "size": b_b_y_h.size},
-        },
-        {
-            "binding": 15,
-            "resource": {"buffer": b_k_y_h, "offset": 0, "size": b_k_y_h.size},
-        },
-        {
-            "binding": 16,
-            "resource": {"buffer": b_idx_fd, "offset": 0, "size": b_idx_fd.size},
-        },
-        {
-            "binding": 17,
-            "resource": {"buffer": b_fd_coeffs, "offset": 0, "size": b_fd_coeffs.size},
-        },
-        {
-            "binding": 18,
-            "resource": {"buffer": b_rho_map, "offset": 0, "size": b_rho_map.size},
-        },
-        {
-            "binding": 19,
-            "resource": {"buffer": b_cp_map, "offset": 0, "size": b_cp_map.size},
-        },
-        {
-            "binding": 20,
-            "resource": {"buffer": b_cs_map, "offset": 0, "size": b_cs_map.size},
-        },
-    ]
-    b_sim_arrays = [
-        {
-            "binding": 0,
-            "resource": {"buffer": b_vx, "offset": 0, "size": b_vx.size},
-        },
-        {
-            "binding": 1,
-            "resource": {"buffer": b_vy, "offset": 0, "size": b_vy.size},
-        },
-        {
-            "binding": 2,
-            "resource": {"buffer": b_v_2, "offset": 0, "size": b_v_2.size},
-        },
-        {
-            "binding": 3,
-            "resource": {"buffer": b_sigmaxx, "offset": 0, "size": b_sigmaxx.size},
-        },
-        {
-            "binding": 4,
-            "resource": {"buffer": b_sigmayy, "offset": 0, "size": b_sigmayy.size},
-        },
-        {
-            "binding": 5,
-            "resource": {"buffer": b_sigmaxy, "offset": 0, "size": b_sigmaxy.size},
-        },
-        {
-            "binding": 6,
-            "resource": {"buffer": b_memory_dvx_dx, "offset": 0, "size": b_memory_dvx_dx.size},
-        },
-        {
-            "binding": 7,
-            "resource": {"buffer": b_memory_dvx_dy, "offset": 0, "size": b_memory_dvx_dy.size},
-        },
-        {
-            "binding": 8,
-            "resource": {"buffer": b_memory_dvy_dx, "offset": 0, "size": b_memory_dvy_dx.size},
-        },
-        {
-            "binding": 9,
-            "resource": {"buffer": b_memory_dvy_dy, "offset": 0, "size": b_memory_dvy_dy.size},
-        },
-        {
-            "binding": 10,
-            "resource": {"buffer": b_memory_dsigmaxx_dx, "offset": 0, "size": b_memory_dsigmaxx_dx.size},
-        },
-        {
-            "binding": 11,
-            "resource": {"buffer": b_memory_dsigmayy_dy, "offset": 0, "size": b_memory_dsigmayy_dy.size},
-        },
-        {
-            "binding": 12,
-            "resource": {"buffer": b_memory_dsigmaxy_dx, "offset": 0, "size": b_memory_dsigmaxy_dx.size},
-        },
-        {
-            "binding": 13,
-            "resource": {"buffer": b_memory_dsigmaxy_dy, "offset": 0, "size": b_memory_dsigmaxy_dy.size},
-        },
-    ]
-    b_sensors = [
-        {
-            "binding": 0,
-            "resource": {"buffer": b_sens_x, "offset": 0, "size": b_sens_x.size},
-        },
-        {
-            "binding": 1,
-            "resource": {"buffer": b_sens_y, "offset": 0, "size": b_sens_y.size},
-        },
-        {
-            "binding": 2,
-            "resource": {"buffer": b_delay_rec, "offset": 0, "size": b_delay_rec.size},
-        },
-        {
-            "binding": 3,
-            "resource": {"buffer": b_info_rec_pt, "offset": 0, "size": b_info_rec_pt.size},
-        },
-        {
-            "binding": 4,
-            "resource": {"buffer": b_offset_sensors, "offset": 0, "size": b_offset_sensors.size},
-        },
-        {
-            "binding": 5,
-            "resource": {"buffer": b_sens_sigxx, "offset": 0, "size": b_sens_sigxx.size},
-        },
-        {
-            "binding": 6,
-            "resource": {"buffer": b_sens_sigyy, "offset": 0, "size": b_sens_sigyy.size},
-        },
-        {
-            "binding": 7,
-            "resource": {"buffer": b_sens_sigxy, "offset": 0, "size": b_sens_sigxy.size},
-        },
-    ]
-
-    # Coloca tudo junto
-    bgl_0 = device.create_bind_group_layout(entries=bl_params)
-    bgl_1 = device.create_bind_group_layout(entries=bl_sim_arrays)
-    bgl_2 = device.create_bind_group_layout(entries=bl_sensors)
+    bl_sensors = [(b_sens_x, rw), (b_sens_y, rw), (b_delay_rec, ro), (b_info_rec_pt, ro),
+                  (b_offset_sensors, ro), (b_sens_sigxx, rw), (b_sens_sigyy, rw),
+                  (b_sens_sigxy, rw), (b_dec_filter, ro), (b_rec_gate, ro),
+                  (b_weight_rec_pt, ro)]
+
+    # Os campos do grid sao amarrados um por binding, acima do limite default do WebGPU (8 storage buffers
+    # por estagio): o dispositivo e criado com o limite ``max-storage-buffers-per-shader-stage'' do adaptador
+    n_storage = get_storage_bindings([bl_params, bl_sim_arrays, bl_sensors])
+    if n_storage > device.limits["max-storage-buffers-per-shader-stage"]:
+        raise ValueError(f'Simulador requer {n_storage} storage buffers por estagio, dispositivo suporta '
+                         f'{device.limits["max-storage-buffers-per-shader-stage"]}')
+
+    bgl_2, bg_2 = get_bind_group(device, bl_sensors)
+
+    # Grupos de amarracao de cada fatia: os campos do grid sao amarrados a partir do plano x_ofs da fatia
+    # e os demais buffers sao amarrados inteiros
+    slab_bufs = [(b, fld_plane) for b in [b_vx, b_vy, b_sigmaxx, b_sigmayy, b_sigmaxy, b_memory_dvx_dx,
+                                          b_memory_dvx_dy, b_memory_dvy_dx, b_memory_dvy_dy, b_memory_dsigmaxx_dx,
+                                          b_memory_dsigmayy_dy, b_memory_dsigmaxy_dx, b_memory_dsigmaxy_dy]]
+    if mat_grid is not None:
+        slab_bufs += [(b_mat_map, lbl_plane)]
+    else:
+        slab_bufs += [(b, fld_plane) for b in [b_lambda_map, b_lambdaplus2mu_map, b_mu_xy_map, b_inv_rho_vx_map,
+                                               b_inv_rho_vy_map]]
+
+    bgl_0 = bgl_1 = None
+    bg_slabs = list()
+    for x_ofs, x_ini, x_end, x_lim in slabs:
+        b_slab_par = device.create_buffer_with_data(data=np.array([x_ofs, x_ini, x_end, 0], dtype=np.int32),
+                                                    usage=wgpu.BufferUsage.UNIFORM | wgpu.BufferUsage.COPY_SRC)
+        bgl_0, bg_0 = get_bind_group(device, get_slab_entries(bl_params, slab_bufs, x_ofs, x_lim), bgl_0)
+        bgl_1, bg_1 = get_bind_group(device, get_slab_entries(bl_sim_arrays, slab_bufs, x_ofs, x_lim) +
+                                     [(b_slab_par, uni)], bgl_1)
+
+        n_wg_x = (x_end - x_ini) // wsx
+        bg_slabs.append((bg_0, bg_1, (ny // wsy, n_wg_x) if thread_y_fast else (n_wg_x, ny // wsy)))
     pipeline_layout = device.create_pipeline_layout(bind_group_layouts=[bgl_0, bgl_1, bgl_2])
-    bg_0 = device.create_bind_group(layout=bgl_0, entries=b_params)
-    bg_1 = device.create_bind_group(layout=bgl_1, entries=b_sim_arrays)
-    bg_2 = device.create_bind_group(layout=bgl_2, entries=b_sensors)
 
     # Cria os pipelines de execucao
     compute_teste_kernel = device.create_compute_pipeline(layout=pipeline_layout,
@@ -839,25 +697,46 @@ def sim_webgpu(device):
     compute_sources_kernel = device.create_compute_pipeline(layout=pipeline_layout,
                                                             compute={"module": cshader,
                                                                      "entry_point": "sources_kernel"})
-    compute_finish_it_kernel = device.create_compute_pipeline(layout=pipeline_layout,
-                                                              compute={"module": cshader,
-                                                                       "entry_point": "finish_it_kernel"})
     compute_store_sensors_kernel = device.create_compute_pipeline(layout=pipeline_layout,
                                                                   compute={"module": cshader,
                                                                            "entry_point": "store_sensors_kernel"})
     compute_incr_it_kernel = device.create_compute_pipeline(layout=pipeline_layout,
                                                             compute={"module": cshader,
                                                                      "entry_point": "incr_it_kernel"})
+    compute_preview_kernel = device.create_compute_pipeline(layout=pipeline_layout,
+                                                            compute={"module": cshader,
+                                                                     "entry_point": "preview_kernel"})
 
-    v_max = 100.0
-    v_min = - v_max
-    ix_min = simul_roi.get_ix_min()
-    ix_max = simul_roi.get_ix_max()
-    iy_min = simul_roi.get_iz_min()
-    iy_max = simul_roi.get_iz_max()
+    # Buffers de staging persistentes para as leituras da GPU
+    stg_pool = StagingPool(device)
+
+    # Leitura dos resultados de um passo (norma da velocidade e pre-visualizacao) copiados para o staging
+    def check_step(it_rd, stg_v_2, stg_pv):
+        vsn2 = np.sqrt(stg_pool.read(stg_v_2)[0])
+        stg_pool.release(stg_v_2)
+        if (it_rd % IT_DISPLAY) == 0 or it_rd == 5:
+            if show_debug:
+                print(f'Time step # {it_rd} out of {NSTEP}')
+                print(f'Max norm velocity vector V (m/s) = {vsn2}')
+
+            if stg_pv is not None:
+                pv = stg_pool.read(stg_pv, shape=(2, pv_nx, pv_ny))
+
+                viewer_gpu.update([pv[0], pv[1]])
+
+                if show_debug:
+                    print(f'Max Vx = {np.max(pv[0])}, Vy = {np.max(pv[1])}')
+                    print(f'Min Vx = {np.min(pv[0])}, Vy = {np.min(pv[1])}')
+                stg_pool.release(stg_pv)
+
+        # Verifica a estabilidade da simulacao
+        if vsn2 > STABILITY_THRESHOLD:
+            print("Simulacao tornando-se instavel")
+            exit(2)
 
     # Laco de tempo para execucao da simulacao
-    for it in range(1, NSTEP + 1):
+    stg_prev = None
+    for it in range(it_ini + 1, NSTEP + 1):
         # Cria o codificador de comandos
         command_encoder = device.create_command_encoder()
 
@@ -865,33 +744,50 @@ def sim_webgpu(device):
         compute_pass = command_encoder.begin_compute_pass()
 
         # Ajusta os grupos de amarracao
-        compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
-        compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
         compute_pass.set_bind_group(2, bg_2, [], 0, 999999)  # last 2 elements not used
 
+        # Cada etapa percorre as fatias do grid em sequencia (uma unica fatia se os campos cabem em um binding),
+        # para que a etapa seguinte leia os halos ja atualizados das fatias vizinhas
         # Ativa o pipeline de teste
         # compute_pass.set_pipeline(compute_teste_kernel)
-        # compute_pass.dispatch_workgroups(nx // wsx, ny // wsy)
+        # compute_pass.dispatch_workgroups(*wg_fd)
 
         # # Ativa o pipeline de execucao do calculo dos estresses
         compute_pass.set_pipeline(compute_sigma_kernel)
-        compute_pass.dispatch_workgroups(nx // wsx, ny // wsy)
+        for bg_0, bg_1, wg_fd in bg_slabs:
+            compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+            compute_pass.dispatch_workgroups(*wg_fd)
 
         # Ativa o pipeline de execucao do calculo das velocidades
         compute_pass.set_pipeline(compute_velocity_kernel)
-        compute_pass.dispatch_workgroups(nx // wsx, ny // wsy)
+        for bg_0, bg_1, wg_fd in bg_slabs:
+            compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+            compute_pass.dispatch_workgroups(*wg_fd)
 
-        # Ativa o pipeline de adicao dos termos de fonte
+        # Ativa o pipeline de adicao dos termos de fonte (somente sobre os pontos da grade com fonte)
         compute_pass.set_pipeline(compute_sources_kernel)
-        compute_pass.dispatch_workgroups(nx // wsx, ny // wsy)
-
-        # Ativa o pipeline de execucao dos procedimentos finais da iteracao
-        compute_pass.set_pipeline(compute_finish_it_kernel)
-        compute_pass.dispatch_workgroups(nx // wsx, ny // wsy)
-
-        # Ativa o pipeline de execucao do armazenamento dos sensores
-        compute_pass.set_pipeline(compute_store_sensors_kernel)
-        compute_pass.dispatch_workgroups(1)
+        for bg_0, bg_1, wg_fd in bg_slabs:
+            compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+            compute_pass.dispatch_workgroups(-(-n_nd_src // WS_SRC))
+
+        # Ativa o pipeline de execucao do armazenamento dos sensores (somente dentro das janelas de recepcao)
+        if it_rec_min <= it - 1 <= it_rec_max:
+            compute_pass.set_pipeline(compute_store_sensors_kernel)
+            for bg_0, bg_1, wg_fd in bg_slabs:
+                compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+                compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+                compute_pass.dispatch_workgroups(1)
+
+        # Ativa o pipeline de extracao da regiao de pre-visualizacao (somente nos passos de exibicao)
+        if show_anim and ((it % IT_DISPLAY) == 0 or it == 5):
+            compute_pass.set_pipeline(compute_preview_kernel)
+            for bg_0, bg_1, wg_fd in bg_slabs:
+                compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+                compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+                compute_pass.dispatch_workgroups(*wg_pv)
 
         # Ativa o pipeline de atualizacao da amostra de tempo
         compute_pass.set_pipeline(compute_incr_it_kernel)
@@ -900,46 +796,39 @@ def sim_webgpu(device):
         # Termina o passo de execucao
         compute_pass.end()
 
+        # Copia a norma da velocidade (e a pre-visualizacao, nos passos de exibicao) para buffers de staging no
+        # mesmo envio dos kernels
+        stg_step = (it, stg_pool.copy(command_encoder, b_v_2, 0, np.dtype(flt32).itemsize),
+                    stg_pool.copy(command_encoder, b_preview) if show_anim and ((it % IT_DISPLAY) == 0 or it == 5)
+                    else None)
+
         # Efetua a execucao dos comandos na GPU
         device.queue.submit([command_encoder.finish()])
 
-        # Leitura da GPU para sincronismo
-        vsn2 = np.sqrt(device.queue.read_buffer(b_v_2, buffer_offset=0, size=b_v_2.size).cast("f")[0])
-        if (it % IT_DISPLAY) == 0 or it == 5:
-            if show_debug:
-                print(f'Time step # {it} out of {NSTEP}')
-                print(f'Max norm velocity vector V (m/s) = {vsn2}')
-
-            if show_anim:
-                vxgpu = np.asarray(device.queue.read_buffer(b_vx, buffer_offset=0).cast("f")).reshape((nx, ny))
-                vygpu = np.asarray(device.queue.read_buffer(b_vy, buffer_offset=0).cast("f")).reshape((nx, ny))
-
-                windows_gpu[0].imv.setImage(vxgpu[ix_min:ix_max, iy_min:iy_max], levels=[v_min, v_max])
-                windows_gpu[1].imv.setImage(vygpu[ix_min:ix_max, iy_min:iy_max], levels=[v_min, v_max])
-                App.processEvents()
+        # Le os resultados do passo anterior enquanto a GPU executa o passo atual (o ultimo passo e lido em seguida)
+        if stg_prev is not None:
+            check_step(*stg_prev)
+        stg_prev = stg_step
 
-                if show_debug:
-                    print(f'Max Vx = {np.max(vxgpu)}, Vy = {np.max(vygpu)}')
-                    print(f'Min Vx = {np.min(vxgpu)}, Vy = {np.min(vygpu)}')
+        # Grava o checkpoint em segundo plano. O estado do simulador e lido um buffer por vez, reaproveitando um
+        # unico buffer de staging
+        if ckpt_interval > 0 and it % ckpt_interval == 0 and it < NSTEP:
+            ckpt.save(it, stg_pool.fetch_each(gpu_state))
+    if stg_prev is not None:
+        check_step(*stg_prev)
 
-        # Verifica a estabilidade da simulacao
-        if vsn2 > STABILITY_THRESHOLD:
-            print("Simulacao tornando-se instavel")
-            exit(2)
+    # Simulacao concluida, os checkpoints nao sao mais necessarios
+    if ckpt is not None:
+        ckpt.clear()
 
-    # Pega os resultados da simulacao
-    vxgpu = np.asarray(device.queue.read_buffer(b_vx, buffer_offset=0).cast("f")).reshape((nx, ny))
-    vygpu = np.asarray(device.queue.read_buffer(b_vy, buffer_offset=0).cast("f")).reshape((nx, ny))
-    sigxx_gpu = np.asarray(device.queue.read_buffer(b_sigmaxx, buffer_offset=0).cast("f")).reshape((nx, ny))
-    sigyy_gpu = np.asarray(device.queue.read_buffer(b_sigmayy, buffer_offset=0).cast("f")).reshape((nx, ny))
-    sigxy_gpu = np.asarray(device.queue.read_buffer(b_sigmaxy, buffer_offset=0).cast("f")).reshape((nx, ny))
-    sens_vx = np.array(device.queue.read_buffer(b_sens_x).cast("f")).reshape((NSTEP, NREC))
-    sens_vy = np.array(device.queue.read_buffer(b_sens_y).cast("f")).reshape((NSTEP, NREC))
-    sens_sigxx = np.array(device.queue.read_buffer(b_sens_sigxx).cast("f")).reshape((NSTEP, NREC))
-    sens_sigyy = np.array(device.queue.read_buffer(b_sens_sigyy).cast("f")).reshape((NSTEP, NREC))
-    sens_sigxy = np.array(device.queue.read_buffer(b_sens_sigxy).cast("f")).reshape((NSTEP, NREC))
-    return (vxgpu, vygpu, sigxx_gpu, sigyy_gpu, sigxy_gpu, sens_vx, sens_vy, sens_sigxx, sens_sigyy, sens_sigxy,
-            device.adapter.info["device"])
+    # Pega os resultados da simulacao (copias codificadas em um unico envio)
+    command_encoder = device.create_command_encoder()
+    stg_fld = [stg_pool.copy(command_encoder, _b) for _b in [b_vx, b_vy, b_sigmaxx, b_sigmayy, b_sigmaxy]]
+    stg_sens = {q: stg_pool.copy(command_encoder, b_sens[q]) for q in rec_quantities}
+    device.queue.submit([command_encoder.finish()])
+    vxgpu, vygpu, sigxx_gpu, sigyy_gpu, sigxy_gpu = [stg_pool.fetch(_s, shape=(nx, ny)) for _s in stg_fld]
+    sens = {q: stg_pool.fetch(stg_sens[q], shape=(NSTEP_REC, NREC)) for q in rec_quantities}
+    return vxgpu, vygpu, sigxx_gpu, sigyy_gpu, sigxy_gpu, sens, device.adapter.info["device"]
 
 
 # ----------------------------------------------------------
@@ -969,6 +858,10 @@ coefs_Lui = [
 # ----------------------------------------------------------
 parser = argparse.ArgumentParser()
 parser.add_argument('-c', '--config', help='Configuration file', default='config.json')
+parser.add_argument('-p', '--plan', help='Print the memory plan and exit, without running the simulation',
+                    action='store_true')
+parser.add_argument('-r', '--resume', help='Resume the simulations from their latest checkpoints',
+                    action='store_true')
 args = parser.parse_args()
 
 # -----------------------
@@ -985,13 +878,18 @@ except IndexError:
     coefs = np.array(coefs_Lui[-1], dtype=flt32)
 
 # Configuracao do corpo de prova
+# Recorte dos mapas (indices [inicio, fim] em cada dimensao) e posicao do seu primeiro ponto no grid
+map_crop = configs["specimen_params"]["map_crop"] if "map_crop" in configs["specimen_params"] else None
+map_offset = configs["specimen_params"]["map_offset"] if "map_offset" in configs["specimen_params"] \
+    else None
+
 cp = flt32(5.9)
 if "cp" in configs["specimen_params"]:
     cp = flt32(configs["specimen_params"]["cp"])  # [mm/us]
 
 cp_map = None
 if "cp_map" in configs["specimen_params"]:
-    cp_map = np.load(configs["specimen_params"]["cp_map"]).astype(np.float32)
+    cp_map = load_map(configs["specimen_params"]["cp_map"], crop=map_crop)
 
 cs = flt32(3.23)
 if "cs" in configs["specimen_params"]:
@@ -999,7 +897,7 @@ if "cs" in configs["specimen_params"]:
 
 cs_map = None
 if "cs_map" in configs["specimen_params"]:
-    cs_map = np.load(configs["specimen_params"]["cs_map"]).astype(np.float32)
+    cs_map = load_map(configs["specimen_params"]["cs_map"], crop=map_crop)
 
 rho = flt32(7800.0)
 if "rho" in configs["specimen_params"]:
@@ -1007,10 +905,22 @@ if "rho" in configs["specimen_params"]:
 
 rho_map = None
 if "rho_map" in configs["specimen_params"]:
-    rho_map = np.load(configs["specimen_params"]["rho_map"]).astype(np.float32)
+    rho_map = load_map(configs["specimen_params"]["rho_map"], crop=map_crop)
+
+# Mapa de materiais (rotulos uint8/uint16) com a tabela de propriedades de cada material.
+# Se definido, substitui os mapas de cp, cs e rho
+mat_map = None
+mat_table = None
+if "material_map" in configs["specimen_params"]:
+    mat_map = load_map(configs["specimen_params"]["material_map"], crop=map_crop)
+    if mat_map.dtype not in (np.uint8, np.uint16):
+        raise ValueError(f'material_map deve ser uint8 ou uint16 (e {mat_map.dtype})')
+    mat_table = get_material_table(configs["specimen_params"]["materials"])
+    if mat_map.size > 0 and mat_map.max() >= mat_table.shape[0]:
+        raise ValueError('material_map tem rotulos sem material correspondente em materials')
 
 # Configuracao da ROI
-simul_roi = SimulationROI(**configs["roi"], pad=coefs.shape[0] - 1, rho_map=rho_map)
+simul_roi = SimulationROI(**configs["roi"], pad=coefs.shape[0] - 1, rho_map=rho_map if mat_map is None else mat_map)
 
 # Configuracao dos transdutores
 simul_probes = list()
@@ -1035,7 +945,27 @@ save_sources = bool(configs["simul_configs"]["save_sources"]) if "save_sources"
 show_results = bool(configs["simul_configs"]["show_results"]) if "show_results" in configs["simul_configs"] else False
 save_results = bool(configs["simul_configs"]["save_results"]) if "save_results" in configs["simul_configs"] else False
 gpu_type = configs["simul_configs"]["gpu_type"] if "gpu_type" in configs["simul_configs"] else "high-perf"
+thread_map = configs["simul_configs"]["thread_map"] if "thread_map" in configs["simul_configs"] else "y_fast"
+if thread_map not in ("x_fast", "y_fast"):
+    raise ValueError(f'thread_map: {thread_map} nao e um mapeamento valido (x_fast, y_fast)')
+thread_y_fast = thread_map == "y_fast"
 source_env = bool(configs["simul_configs"]["source_env"]) if "source_env" in configs["simul_configs"] else False
+src_rec_interp = configs["simul_configs"]["src_rec_interp"] if "src_rec_interp" in configs["simul_configs"] \
+    else "nearest"
+preview_dec = max(int(configs["simul_configs"]["preview_decimation"]), 1) \
+    if "preview_decimation" in configs["simul_configs"] else 1
+rec_quantities = configs["simul_configs"]["rec_quantities"] if "rec_quantities" in configs["simul_configs"] \
+    else REC_QUANTITIES
+for q in rec_quantities:
+    if q not in REC_QUANTITIES:
+        raise ValueError(f'rec_quantities: {q} nao e uma grandeza valida {REC_QUANTITIES}')
+rec_quantities = [q for q in REC_QUANTITIES if q in rec_quantities]
+rec_qty = np.int32(sum(1 << REC_QUANTITIES.index(q) for q in rec_quantities))
+ckpt_interval = int(configs["simul_configs"]["checkpoint_interval"]) \
+    if "checkpoint_interval" in configs["simul_configs"] else 0
+ckpt_dir = configs["simul_configs"]["checkpoint_dir"] if "checkpoint_dir" in configs["simul_configs"] \
+    else "checkpoints"
+ckpt_sig = get_checkpoint_signature(configs)
 if "emission_laws" in configs["simul_configs"] and os.path.isfile(configs["simul_configs"]["emission_laws"]):
     emission_laws, _ = file_law.read(configs["simul_configs"]["emission_laws"])
 else:
@@ -1044,19 +974,24 @@ else:
 # -----------------------
 # Inicializacao do WebGPU
 # -----------------------
+adapter = None
 device_gpu = None
-if do_sim_gpu:
+if do_sim_gpu or args.plan:
     # =====================
     # webgpu configurations
-    if gpu_type == "high-perf":
-        device_gpu = wgpu.utils.get_default_device()
+    # Os limites de tamanho de buffer e de storage buffers por estagio sao os do adaptador, em vez dos limites
+    # default do WebGPU
+    power_pref = "high-performance" if gpu_type == "high-perf" else "low-power"
+    if wgpu.version_info[1] > 11:
+        adapter = wgpu.gpu.request_adapter(power_preference=power_pref)  # 0.13.X
     else:
-        if wgpu.version_info[1] > 11:
-            adapter = wgpu.gpu.request_adapter(power_preference="low-power")  # 0.13.X
-        else:
-            adapter = wgpu.request_adapter(canvas=None, power_preference="low-power")  # 0.9.5
+        adapter = wgpu.request_adapter(canvas=None, power_preference=power_pref)  # 0.9.5
 
-        device_gpu = adapter.request_device()
+    # No planejamento de memoria apenas os limites do adaptador sao consultados
+    if not args.plan:
+        device_gpu = adapter.request_device(required_limits={_l: adapter.limits[_l] for _l in
+                                                             ["max-buffer-size", "max-storage-buffer-binding-size",
+                                                              "max-storage-buffers-per-shader-stage"]})
 
     # Escolha dos valores de wsx, wsy e wsz (GPU)
     wsx = np.gcd(simul_roi.get_nx(), 16)
@@ -1072,45 +1007,31 @@ dy = flt32(simul_roi.h_step)
 one_dx = flt32(1.0 / dx)
 one_dy = flt32(1.0 / dy)
 
-# Inicializa os mapas de densidade do meio
-# rho_grid_vx e a matriz das densidades no mesmo grid de vx
-rho_grid_vx = np.ones((nx, ny), dtype=flt32) * rho
-if rho_map is not None:
-    if rho_map.shape[0] < nx and rho_map.shape[1] < ny:
-        rho_grid_vx[simul_roi.get_ix_min(): simul_roi.get_ix_max(),
-        simul_roi.get_iz_min(): simul_roi.get_iz_max()] = rho_map
-    elif rho_map.shape[0] > nx and rho_map.shape[1] > ny:
-        rho_grid_vx = rho_map[:nx, :ny]
-    elif rho_map.shape[0] == nx and rho_map.shape[1] == ny:
-        rho_grid_vx = rho_map
-    else:
-        raise ValueError(f'rho_map shape {rho_map.shape} e incompativel com a ROI')
-
-# cp_grid_vx e a matriz das velocidades longitudinais no mesmo grid de vx
-cp_grid_vx = np.ones((nx, ny), dtype=flt32) * cp
-if cp_map is not None:
-    if cp_map.shape[0] < nx and cp_map.shape[1] < ny:
-        cp_grid_vx[simul_roi.get_ix_min(): simul_roi.get_ix_max(),
-        simul_roi.get_iz_min(): simul_roi.get_iz_max()] = cp_map
-    elif cp_map.shape[0] > nx and cp_map.shape[1] > ny:
-        cp_grid_vx = cp_map[:nx, :ny]
-    elif cp_map.shape[0] == nx and cp_map.shape[1] == ny:
-        cp_grid_vx = cp_map
-    else:
-        raise ValueError(f'cp_map shape {cp_map.shape} e incompativel com a ROI')
-
-# cs_grid_vx e a matriz das velocidades transversais no mesmo grid de vx
-cs_grid_vx = np.ones((nx, ny), dtype=flt32) * cs
-if cs_map is not None:
-    if cs_map.shape[0] < nx and cs_map.shape[1] < ny:
-        cs_grid_vx[simul_roi.get_ix_min(): simul_roi.get_ix_max(),
-        simul_roi.get_iz_min(): simul_roi.get_iz_max()] = cs_map
-    elif cs_map.shape[0] > nx and cs_map.shape[1] > ny:
-        cs_grid_vx = cs_map[:nx, :ny]
-    elif cs_map.shape[0] == nx and cs_map.shape[1] == ny:
-        cs_grid_vx = cs_map
-    else:
-        raise ValueError(f'cs_map shape {cs_map.shape} e incompativel com a ROI')
+# Indices do primeiro ponto da ROI no grid
+roi_ini = [simul_roi.get_ix_min(), simul_roi.get_iz_min()]
+
+# Inicializa o mapa de materiais do meio
+# mat_grid e a matriz dos rotulos dos materiais no mesmo grid de vx. Os pontos fora do mapa recebem o material
+# homogeneo do corpo de prova (cp, cs, rho), acrescentado ao fim da tabela
+mat_grid = None
+mat_bits = 8
+mat_num = 1
+if mat_map is not None:
+    mat_table = np.vstack((mat_table, [[cp, cs, rho]])).astype(flt32)
+    if mat_table.shape[0] > 65536:
+        raise ValueError(f'Numero de materiais ({mat_table.shape[0]}) maior que o suportado (65536)')
+    mat_grid = get_map_grid(mat_map, (nx, ny), mat_table.shape[0] - 1, offset=map_offset, roi_ini=roi_ini,
+                            dtype=np.uint8 if mat_table.shape[0] <= 256 else np.uint16)
+
+    mat_bits = 8 * mat_grid.dtype.itemsize
+    mat_num = mat_table.shape[0] + 1
+    rho_grid_vx = cp_grid_vx = cs_grid_vx = None
+    print(f'Mapa de materiais com {mat_table.shape[0]} materiais ({mat_bits} bits por ponto)')
+else:
+    # Inicializa os mapas de densidade e velocidades do meio no mesmo grid de vx
+    rho_grid_vx = get_map_grid(rho_map, (nx, ny), rho, offset=map_offset, roi_ini=roi_ini)
+    cp_grid_vx = get_map_grid(cp_map, (nx, ny), cp, offset=map_offset, roi_ini=roi_ini)
+    cs_grid_vx = get_map_grid(cs_map, (nx, ny), cs, offset=map_offset, roi_ini=roi_ini)
 
 # Numero total de passos de tempo
 NSTEP = configs["simul_params"]["time_steps"]
@@ -1121,34 +1042,120 @@ dt = flt32(configs["simul_params"]["dt"])
 # Numero de iteracoes de tempo para apresentar e armazenar informacoes
 IT_DISPLAY = configs["simul_params"]["it_display"]
 
-# Pega as listas de todos os pontos transmissores e receptores de todos os transdutores configurados
-i_probe_tx_ptos = list()
-i_probe_rx_ptos = list()
+# Fator de decimacao dos sinais dos receptores (armazena uma amostra a cada ``rec_decim`` passos de tempo)
+rec_decim = max(int(configs["simul_params"]["record_decimation"]), 1) \
+    if "record_decimation" in configs["simul_params"] else 1
+dec_filter = get_decimation_filter(rec_decim)
+
+# Pega os operadores de injecao das fontes e de interpolacao dos receptores de todos os transdutores configurados.
+# Cada entrada relaciona um ponto da grade a uma coluna (termo de fonte ou receptor) com um peso.
+op_src_idx = list()
+op_src_col = list()
+op_src_w = list()
+op_rec_idx = list()
+op_rec_col = list()
+op_rec_w = list()
 delay_recv = list()
+rec_gate = list()
 NREC = 0
+n_src_col = 0
 for pr in simul_probes:
-    i_probe_tx_ptos += pr.get_points_roi(simul_roi, simul_type="2d", dir="e")[0]
-    i_probe_rx_ptos += pr.get_points_roi(simul_roi, simul_type="2d", dir="r")[0]
+    _idx, _col, _w = pr.get_interp_operator(simul_roi, simul_type="2d", dir="e", interp=src_rec_interp)
+    op_src_idx.append(_idx)
+    op_src_col.append(_col + n_src_col)
+    op_src_w.append(_w)
+    _idx, _col, _w = pr.get_interp_operator(simul_roi, simul_type="2d", dir="r", interp=src_rec_interp)
+    op_rec_idx.append(_idx)
+    op_rec_col.append(_col + NREC)
+    op_rec_w.append(_w)
     delay_recv += pr.get_delay_rx()
+    rec_gate += [pr.get_rec_window()] * pr.receivers.count(True)
     NREC += pr.receivers.count(True)
-
-# Define a posicao das fontes
-i_probe_tx_ptos = np.array(i_probe_tx_ptos, dtype=np.int32).reshape(-1, 3)
-ix_src = i_probe_tx_ptos[:, 0].astype(np.int32)
-iy_src = i_probe_tx_ptos[:, 2].astype(np.int32)
-NSRC = i_probe_tx_ptos.shape[0]
-
-# Define a localizacao dos receptores
-i_probe_rx_ptos = np.array(i_probe_rx_ptos, dtype=np.int32).reshape(-1, 3)
-ix_rec = i_probe_rx_ptos[:, 0].astype(np.int32)
-iy_rec = i_probe_rx_ptos[:, 2].astype(np.int32)
+    n_src_col += pr.num_elem
+
+op_src_idx = np.concatenate(op_src_idx)
+op_src_col = np.concatenate(op_src_col)
+op_src_w = np.concatenate(op_src_w)
+op_rec_idx = np.concatenate(op_rec_idx)
+op_rec_col = np.concatenate(op_rec_col)
+op_rec_w = np.concatenate(op_rec_w)
+
+# Operadores esparsos para a CPU, sobre os pontos da grade (indices lineares) que sao fontes ou receptores.
+# A grade 2D usa os eixos 'x' e 'z' da ROI.
+src_nodes, inv = np.unique(op_src_idx[:, 0] * ny + op_src_idx[:, 2], return_inverse=True)
+op_src = csr_matrix((op_src_w, (inv.flatten(), op_src_col)), shape=(src_nodes.shape[0], n_src_col), dtype=flt32)
+rec_nodes, inv = np.unique(op_rec_idx[:, 0] * ny + op_rec_idx[:, 2], return_inverse=True)
+op_rec = csr_matrix((op_rec_w, (op_rec_col, inv.flatten())), shape=(NREC, rec_nodes.shape[0]), dtype=flt32)
+NSRC = src_nodes.shape[0]
 
 # Calcula o delay de recepcao dos receptores
 delay_recv = (np.array(delay_recv) / dt + 1.0).astype(np.int32)
 
+# Calcula a janela de recepcao de cada receptor: amostra inicial e numero de amostras decimadas.
+# Os buffers dos sensores tem o tamanho da maior janela.
+rec_ini = np.array([np.clip(np.round(_t0 / dt), 0, NSTEP - 1) for _t0, _ in rec_gate], dtype=np.int32)
+rec_fin = np.array([NSTEP if _t1 is None else np.clip(np.round(_t1 / dt), 1, NSTEP) for _, _t1 in rec_gate],
+                   dtype=np.int32)
+rec_smp = np.maximum((rec_fin - rec_ini + rec_decim - 1) // rec_decim, 1).astype(np.int32)
+NSTEP_REC = int(rec_smp.max())
+
+# Intervalo de passos de tempo em que algum receptor contribui com amostras (inclui o atraso do filtro)
+it_rec_min = int(rec_ini.min()) - (dec_filter.shape[0] - 1) // 2
+it_rec_max = int((rec_ini + (rec_smp - 1) * rec_decim).max()) + (dec_filter.shape[0] - 1) // 2
+
 # for evolution of total energy in the medium
 v_2 = np.float32(0.0)
 
+print(f'2D elastic finite-difference code in velocity and stress formulation with C-PML')
+print(f'NX = {nx}')
+print(f'NY = {ny}')
+print(f'Total de pontos no grid = {nx * ny}\n')
+
+# Plano de memoria do host e da GPU (quantidade e tamanho em bytes dos arrays), verificado com os limites do
+# adaptador e com a RAM do host antes das alocacoes
+fld_sz = nx * ny * np.dtype(flt32).itemsize
+sens_sz = NSTEP_REC * NREC * np.dtype(flt32).itemsize
+src_sz = NSTEP * n_src_col * np.dtype(flt32).itemsize
+host_arrays = {"campos": (5, fld_sz), "memorias da CPML": (8, fld_sz), "derivadas (CPU)": (8, fld_sz),
+               "mapas do meio": (1, mat_grid.nbytes) if mat_grid is not None else (3, fld_sz),
+               "sinais dos receptores": (2, sens_sz)}
+gpu_buffers = dict()
+slab_args = None
+if do_sim_gpu or args.plan:
+    pv_pts = -(-(simul_roi.get_ix_max() - simul_roi.get_ix_min()) // preview_dec) * \
+        -(-(simul_roi.get_iz_max() - simul_roi.get_iz_min()) // preview_dec)
+    host_arrays.update({"termos de fonte": (1, src_sz), "resultados da GPU": (5, fld_sz),
+                        "coeficientes do material": (5, fld_sz) if mat_grid is None else (0, 0)})
+    gpu_buffers = {"campos": (5, fld_sz), "memorias da CPML": (8, fld_sz),
+                   "coeficientes do material": (5, fld_sz) if mat_grid is None else
+                   (1, -(-mat_grid.size * mat_bits // 32) * 4),
+                   "termos de fonte": (1, src_sz), "pesos das fontes": (1, op_src_w.shape[0] * 12 + (NSRC + 1) * 4),
+                   "sinais dos receptores": (len(rec_quantities), sens_sz),
+                   "pesos dos receptores": (1, op_rec_w.shape[0] * 16), "perfis da CPML": (1, (nx + ny) * 32),
+                   "pre-visualizacao": (1, 2 * pv_pts * np.dtype(flt32).itemsize)}
+    slab_args = dict(nx=nx, plane_bytes=[ny * np.dtype(flt32).itemsize] +
+                                        ([ny * mat_bits // 8] if mat_grid is not None else []),
+                     halo=coefs.shape[0], x_mult=wsx)
+
+# Checkpoints: uma copia do estado do simulador no host e um buffer de staging reaproveitado na GPU
+if ckpt_interval > 0:
+    host_arrays["estado do checkpoint"] = (1, 13 * fld_sz + max(len(rec_quantities), 2) * sens_sz)
+    if gpu_buffers:
+        gpu_buffers["staging do checkpoint"] = (1, max(fld_sz, sens_sz))
+adapter_limits = None if adapter is None else \
+    {_l: adapter.limits[_l] for _l in ["max-buffer-size", "max-storage-buffer-binding-size",
+                                       "min-storage-buffer-offset-alignment"]}
+mem_plan = get_memory_plan(host_arrays, gpu_buffers, limits=adapter_limits, host_ram=get_host_ram(),
+                           cpu_fallback=True, slabs=slab_args,
+                           slab_keys=["campos", "memorias da CPML", "coeficientes do material",
+                                      "staging do checkpoint"],
+                           rec_keys=["sinais dos receptores"], rec_decim=rec_decim,
+                           rec_decim_max=get_max_rec_decimation(simul_probes, dt),
+                           f16=adapter is not None and "shader-f16" in adapter.features)
+print_memory_plan(mem_plan)
+if args.plan:
+    exit(0)
+
 # Arrays para as variaveis de memoria do calculo
 memory_dvx_dx = np.zeros((nx, ny), dtype=flt32)
 memory_dvx_dy = np.zeros((nx, ny), dtype=flt32)
@@ -1175,16 +1182,6 @@ sigmaxx = np.zeros((nx, ny), dtype=flt32)
 sigmayy = np.zeros((nx, ny), dtype=flt32)
 sigmaxy = np.zeros((nx, ny), dtype=flt32)
 
-# Total de arrays
-N_ARRAYS = 5 + 2 * 4
-
-print(f'2D elastic finite-difference code in velocity and stress formulation with C-PML')
-print(f'NX = {nx}')
-print(f'NY = {ny}')
-print(f'Total de pontos no grid = {nx * ny}')
-print(f'Number of points of all the arrays = {nx * ny * N_ARRAYS}')
-print(f'Size in GB of all the arrays = {nx * ny * N_ARRAYS * 4 / (1024 * 1024 * 1024)}\n')
-
 # Valor da potencia para calcular "d0"
 NPOWER = flt32(configs["simul_params"]["npower"])
 if NPOWER < 1:
@@ -1244,12 +1241,13 @@ print(f'Existem {NSRC} fontes')
 print(f'Existem {NREC} receptores')
 
 # Arrays para armazenamento dos sinais dos sensores
-sisvx = np.zeros((NSTEP, NREC), dtype=flt32)
-sisvy = np.zeros((NSTEP, NREC), dtype=flt32)
+print(f'Sinais dos receptores com {NSTEP_REC} amostras (decimacao {rec_decim}, dt = {dt * rec_decim})')
+sisvx = np.zeros((NSTEP_REC, NREC), dtype=flt32)
+sisvy = np.zeros((NSTEP_REC, NREC), dtype=flt32)
 
 # Verifica a condicao de estabilidade de Courant
 # R. Courant et K. O. Friedrichs et H. Lewy (1928)
-cp_max = max(cp_grid_vx.max(), cp)
+cp_max = max(cp_grid_vx.max() if mat_grid is None else mat_table[:, 0].max(), cp)
 courant_number = flt32(cp_max * dt * np.sqrt(1.0 / dx ** 2 + 1.0 / dy ** 2))
 print(f'\nNumero de Courant e {courant_number}')
 if courant_number > 1:
@@ -1262,39 +1260,36 @@ times_cpu = list()
 sensor_gpu_result = list()
 sensor_cpu_result = list()
 
-# Configuracao e inicializacao da janela de exibicao
+# Configuracao e inicializacao da janela de exibicao (em um processo separado)
+viewer_cpu = None
+viewer_gpu = None
 if show_anim:
-    App = pg.QtWidgets.QApplication([])
     if do_sim_cpu:
         x_pos = 200 + np.arange(3) * (nx + 50)
         y_pos = 500 + np.arange(3) * (ny + 50)
-        windows_cpu_data = [
-            {"title": "Vx [CPU]", "geometry": (x_pos[0], y_pos[0],
-                                               simul_roi.get_nx(), simul_roi.get_nz())},
-            {"title": "Vy [CPU]", "geometry": (x_pos[1], y_pos[0],
-                                               simul_roi.get_nx(), simul_roi.get_nz())},
-        ]
-        windows_cpu = [Window(title=data["title"], geometry=data["geometry"]) for data in windows_cpu_data]
+        roi_size = (simul_roi.get_len_x(), simul_roi.get_len_z())
+        viewer_cpu = SimulationViewer([
+            {"title": "Vx [CPU]", "geometry": (x_pos[0], y_pos[0], simul_roi.get_nx(), simul_roi.get_nz()),
+             "shape": roi_size},
+            {"title": "Vy [CPU]", "geometry": (x_pos[1], y_pos[0], simul_roi.get_nx(), simul_roi.get_nz()),
+             "shape": roi_size},
+        ])
 
     if do_sim_gpu:
         x_pos = 200 + np.arange(3) * (nx + 50)
         y_pos = 100 + np.arange(3) * (ny + 50)
-        windows_gpu_data = [
-            {"title": "Vx [GPU]", "geometry": (x_pos[0], y_pos[0],
-                                               simul_roi.get_nx(), simul_roi.get_nz())},
-            {"title": "Vy [GPU]", "geometry": (x_pos[1], y_pos[0],
-                                               simul_roi.get_nx(), simul_roi.get_nz())},
-        ]
-        windows_gpu = [Window(title=data["title"], geometry=data["geometry"]) for data in windows_gpu_data]
-else:
-    App = None
+        pv_size = (-(-simul_roi.get_len_x() // preview_dec), -(-simul_roi.get_len_z() // preview_dec))
+        viewer_gpu = SimulationViewer([
+            {"title": "Vx [GPU]", "geometry": (x_pos[0], y_pos[0], *pv_size), "shape": pv_size},
+            {"title": "Vy [GPU]", "geometry": (x_pos[1], y_pos[0], *pv_size), "shape": pv_size},
+        ])
 
 # WebGPU
 now = datetime.now()
 if do_sim_gpu:
     for n in range(n_iter_gpu):
         print(f'Simulacao WEBGPU')
-        print(f'wsx = {wsx}, wsy = {wsy}')
+        print(f'wsx = {wsx}, wsy = {wsy}, thread_map = {thread_map}')
         print(f'Iteracao {n}')
 
         n_laws = emission_laws.shape[0] if emission_laws is not None else 1
@@ -1306,9 +1301,8 @@ if do_sim_gpu:
                     p.set_t0(emission_laws[law])
 
             t_gpu = time()
-            (vx_gpu, vy_gpu, sigxx_gpu, sigyy_gpu, sigxy_gpu,
-             sensor_vx_gpu, sensor_vy_gpu, sensor_sigxx_gpu, sensor_sigyy_gpu, sensor_sigxy_gpu,
-             gpu_str) = sim_webgpu(device_gpu)
+            vx_gpu, vy_gpu, sigxx_gpu, sigyy_gpu, sigxy_gpu, sensor_gpu, gpu_str = \
+                sim_webgpu(device_gpu, f'2D_elast_CPML_GPU_iter_{n}_law_{law}')
             times_gpu.append(time() - t_gpu)
             print(gpu_str)
             print(f'{times_gpu[-1]:.3}s')
@@ -1378,17 +1372,14 @@ if do_sim_gpu:
                     sigyy_gpu_sim_result.savefig(name + '_SigYY_gpu_' + gpu_type + '.png')
                     sigxy_gpu_sim_result.savefig(name + '_SigXY_gpu_' + gpu_type + '.png')
 
-            # Plota as velocidades tomadas no sensores
+            # Plota as grandezas tomadas no sensores
             if plot_results and plot_sensors:
                 for r in range(NREC):
-                    fig, ax = plt.subplots(3, sharex=True, sharey=True)
+                    fig, ax = plt.subplots(len(sensor_gpu), sharex=True, squeeze=False)
                     fig.suptitle(f'Receptor {r + 1} [GPU] - law ({law})')
-                    ax[0].plot(sensor_vx_gpu[:, r])
-                    ax[0].set_title(r'$V_x$')
-                    ax[1].plot(sensor_vy_gpu[:, r])
-                    ax[1].set_title(r'$V_y$')
-                    ax[2].plot(sensor_vx_gpu[:, r] + sensor_vy_gpu[:, r], 'tab:orange')
-                    ax[2].set_title(r'$V_x + V_y$')
+                    for i_q, q in enumerate(sensor_gpu):
+                        ax[i_q, 0].plot(sensor_gpu[q][:, r])
+                        ax[i_q, 0].set_title(q)
                     sensor_gpu_result.append(fig)
 
                 if show_results:
@@ -1402,46 +1393,20 @@ if do_sim_gpu:
                             pass
 
             if plot_results and plot_bscan:
-                gpu_bscan_vx_sim_result = plt.figure()
-                plt.title(f'GPU simulation B-scan Vx - law({law})\n'
-                          f'[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
-                plt.imshow(sensor_vx_gpu, aspect='auto', cmap='viridis')
-                plt.colorbar()
-
-                gpu_bscan_vy_sim_result = plt.figure()
-                plt.title(f'GPU simulation B-scan Vy - law({law})\n'
-                          f'[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
-                plt.imshow(sensor_vy_gpu, aspect='auto', cmap='viridis')
-                plt.colorbar()
-
-                gpu_bscan_sigxx_sim_result = plt.figure()
-                plt.title(f'GPU simulation B-scan SigXX - law({law})\n'
-                          f'[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
-                plt.imshow(sensor_sigxx_gpu, aspect='auto', cmap='viridis')
-                plt.colorbar()
-
-                gpu_bscan_sigyy_sim_result = plt.figure()
-                plt.title(f'GPU simulation B-scan SigYY - law({law})\n'
-                          f'[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
-                plt.imshow(sensor_sigyy_gpu, aspect='auto', cmap='viridis')
-                plt.colorbar()
-
-                gpu_bscan_sigxy_sim_result = plt.figure()
-                plt.title(f'GPU simulation B-scan SigXY - law({law})\n'
-                          f'[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
-                plt.imshow(sensor_sigxy_gpu, aspect='auto', cmap='viridis')
-                plt.colorbar()
+                for q in sensor_gpu:
+                    plt.figure()
+                    plt.title(f'GPU simulation B-scan {q} - law({law})\n'
+                              f'[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
+                    plt.imshow(sensor_gpu[q], aspect='auto', cmap='viridis')
+                    plt.colorbar()
 
                 if show_results:
                     plt.show(block=False)
 
             if save_bscan:
                 name = f'results/bscan_2D_elast_CPML_{datetime.now().strftime("%Y%m%d-%H%M%S")}_law_{law}'
-                np.save(name + '_Vx_GPU', sensor_vx_gpu)
-                np.save(name + '_Vy_GPU', sensor_vy_gpu)
-                np.save(name + '_SigXX_GPU', sensor_sigxx_gpu)
-                np.save(name + '_SigYY_GPU', sensor_sigyy_gpu)
-                np.save(name + '_SigXY_GPU', sensor_sigxy_gpu)
+                for q in sensor_gpu:
+                    np.save(name + f'_{q}_GPU', sensor_gpu[q])
 
 # CPU
 if do_sim_cpu:
@@ -1456,7 +1421,7 @@ if do_sim_cpu:
                 p.set_t0(emission_laws[law])
 
             t_cpu = time()
-            sim_cpu()
+            sim_cpu(f'2D_elast_CPML_CPU_iter_{n}_law_{law}')
             times_cpu.append(time() - t_cpu)
             print(f'{times_cpu[-1]:.3}s')
             name = (f'results/result_2D_elast_CPML_{now.strftime("%Y%m%d-%H%M%S")}_'
@@ -1526,11 +1491,14 @@ if do_sim_cpu:
 
             if save_bscan:
                 name = f'results/bscan_2D_elast_CPML_{datetime.now().strftime("%Y%m%d-%H%M%S")}_law{law}'
-                np.save(name + '_Vx_CPU', sisvx)
-                np.save(name + '_Vy_CPU', sisvy)
+                if "Vx" in rec_quantities:
+                    np.save(name + '_Vx_CPU', sisvx)
+                if "Vy" in rec_quantities:
+                    np.save(name + '_Vy_CPU', sisvy)
 
-if show_anim and App:
-    App.exit()
+for viewer in [viewer_cpu, viewer_gpu]:
+    if viewer is not None:
+        viewer.close()
 
 times_gpu = np.array(times_gpu)
 times_cpu = np.array(times_cpu)
@@ -1563,6 +1531,7 @@ if save_results:
         f.write('--------------------\n')
         f.write('\n')
         f.write(f'Quantidade de iteracoes no tempo: {NSTEP}\n')
+        f.write(f'Decimacao dos sinais dos receptores: {rec_decim} ({NSTEP_REC} amostras)\n')
         f.write(f'Tamanho da ROI: {simul_roi.get_len_x()}x{simul_roi.get_len_z()}\n')
         f.write(f'Simulacao GPU: {"Sim" if do_sim_gpu else "Nao"}\n')
         if do_sim_gpu:
@@ -9,85 +9,42 @@ from datetime import datetime
 import numpy as np
 import argparse
 import ast
+from scipy.sparse import csr_matrix
 import matplotlib.pyplot as plt
 from time import time
-from PyQt6.QtWidgets import *
-import pyqtgraph as pg
-from pyqtgraph.widgets.RawImageWidget import RawImageWidget
-from simul_utils import SimulationROI, SimulationProbeLinearArray
+from simul_utils import SimulationROI, SimulationProbeLinearArray, get_decimation_filter, get_decimated_idx
+from simul_utils import get_material_table, pack_material_grid
+from simul_utils import load_map, get_map_grid
+from simul_utils import get_host_ram, get_max_rec_decimation, get_memory_plan, print_memory_plan
+from simul_utils import get_fd_tables, get_shader_code, get_x_slabs, pack_pml_coeffs, StagingPool
+from simul_utils import get_bind_group, get_slab_entries, get_storage_bindings
+from simul_utils import CheckpointWriter, get_checkpoint_signature, load_checkpoint
+from simul_viewer import SimulationViewer
 
 # ==========================================================
 # Esse arquivo contem as simulacoes realizadas dentro da GPU.
 # ==========================================================
 flt32 = np.float32
 
+# Tamanho do workgroup do kernel de fontes (um thread por ponto da grade com fonte)
+WS_SRC = 64
 
-# -----------------------------------------------
-# Codigo para visualizacao da janela de simulacao
-# -----------------------------------------------
-# Image View class
-class ImageView(pg.ImageView):
-    # constructor which inherit original
-    # ImageView
-    def __init__(self, *args, **kwargs):
-        pg.ImageView.__init__(self, *args, **kwargs)
-
-
-# Window class
-class Window(QMainWindow):
-    def __init__(self, title=None, geometry=None):
-        super().__init__()
-
-        # setting title
-        if title is None:
-            self.setWindowTitle(f"{nx}x{ny} Grid x {NSTEP} iterations - dx = {dx} m x dy = {dy} m x dt = {dt} s")
-        else:
-            self.setWindowTitle(title)
-
-        # setting geometry
-        if geometry is None:
-            self.setGeometry(200, 50, 300, 300)
-        else:
-            self.setGeometry(*geometry)
-
-        # setting animation
-        self.isAnimated()
-
-        # setting image
-        self.image = np.random.normal(size=(geometry[2], geometry[3]))
-
-        # showing all the widgets
-        self.show()
-
-        # creating a widget object
-        self.widget = QWidget()
-
-        # setting configuration options
-        pg.setConfigOptions(antialias=True)
-
-        # creating image view view object
-        self.imv = RawImageWidget()
-
-        # setting image to image view
-        self.imv.setImage(self.image, levels=[-0.1, 0.1])
-
-        # Creating a grid layout
-        self.layout = QGridLayout()
-
-        # setting this layout to the widget
-        self.widget.setLayout(self.layout)
-
-        # plot window goes on right side, spanning 3 rows
-        self.layout.addWidget(self.imv, 0, 0, 4, 1)
-
-        # setting this widget as central widget of the main window
-        self.setCentralWidget(self.widget)
+# Arrays do estado do simulador em CPU gravados nos checkpoints
+CPU_STATE = ["vx", "vy", "vz", "sigmaxx", "sigmayy", "sigmazz", "sigmaxy", "sigmaxz", "sigmayz",
+             "memory_dvx_dx", "memory_dvx_dy", "memory_dvx_dz",
+             "memory_dvy_dx", "memory_dvy_dy", "memory_dvy_dz",
+             "memory_dvz_dx", "memory_dvz_dy", "memory_dvz_dz",
+             "memory_dsigmaxx_dx", "memory_dsigmayy_dy", "memory_dsigmazz_dz",
+             "memory_dsigmaxy_dx", "memory_dsigmaxy_dy",
+             "memory_dsigmaxz_dx", "memory_dsigmaxz_dz",
+             "memory_dsigmayz_dy", "memory_dsigmayz_dz",
+             "sisvx", "sisvy", "sisvz", "v_solid_norm"]
 
 
 # --------------------------
 # Funcao do simulador em CPU
 # --------------------------
-def sim_cpu():
+def sim_cpu(ckpt_tag):
     global simul_probes, coefs
     global a_x, a_x_half, b_x, b_x_half, k_x, k_x_half
     global a_y, a_y_half, b_y, b_y_half, k_y, k_y_half
@@ -104,8 +61,9 @@ def sim_cpu():
     global value_dsigmaxx_dx, value_dsigmaxy_dy, value_dsigmaxz_dz
     global value_dsigmaxy_dx, value_dsigmayy_dy, value_dsigmayz_dz
     global sisvx, sisvy, sisvz
+    global src_nodes, rec_nodes, op_src, op_rec
     global v_solid_norm, v_2
-    global windows_cpu
+    global viewer_cpu
 
     DELTAT_over_rho = flt32(dt / rho)
     _ord = coefs.shape[0]
@@ -115,8 +73,6 @@ def sim_cpu():
                         -c - _ord]  # fin full grid
                        for c in range(_ord)], dtype=np.int32)
 
-    v_max = 100.0
-    v_min = - v_max
     ix_min = simul_roi.get_ix_min()
     ix_max = simul_roi.get_ix_max()
     iy_min = simul_roi.get_iy_min()
@@ -124,11 +80,28 @@ def sim_cpu():
     iz_min = simul_roi.get_iz_min()
     iz_max = simul_roi.get_iz_max()
 
+    # Obtem os termos de fonte dos transdutores (uma coluna por elemento de cada transdutor)
+    source_term = list()
+    for _pr in simul_probes:
+        if source_env:
+            source_term.append(_pr.get_source_term(samples=NSTEP, dt=dt, out='e'))
+        else:
+            source_term.append(_pr.get_source_term(samples=NSTEP, dt=dt))
+
     # Source terms
-    source_term, idx_src = simul_probes[0].get_source_term(samples=NSTEP, dt=dt)
+    source_term = np.concatenate(source_term, axis=1)
+    if save_sources:
+        np.save(f'results/sources_3D_elast_CPML_{datetime.now().strftime("%Y%m%d-%H%M%S")}_CPU', source_term)
+
+    # Checkpoints: com --resume, o estado e restaurado do ultimo checkpoint gravado, e o estado e gravado a cada
+    # ckpt_interval passos de tempo
+    it_ini, state = load_checkpoint(ckpt_dir, ckpt_tag, ckpt_sig) if args.resume else (0, None)
+    if state is not None:
+        globals().update(state)
+    ckpt = CheckpointWriter(ckpt_dir, ckpt_tag, ckpt_sig) if ckpt_interval > 0 or state is not None else None
 
     # Inicio do laco de tempo
-    for it in range(1, NSTEP + 1):
+    for it in range(it_ini + 1, NSTEP + 1):
         # Calculo da tensao [stress] - {sigma} (equivalente a pressao nos gases-liquidos)
         # sigma_ii -> tensoes normais; sigma_ij -> tensoes cisalhantes
         # Primeiro "laco" i: 1,NX-1; j: 2,NY; k: 2,NZ -> [1:-2, 2:-1, 2:-1]
@@ -567,9 +540,8 @@ def sim_cpu():
         # TODO: ajustar array rho
         vz = DELTAT_over_rho * (value_dsigmaxz_dx + value_dsigmayz_dy + value_dsigmazz_dz) + vz
 
-        # add the source (force vector located at a given grid point)
-        for _isrc in range(NSRC):
-            vz[ix_src[_isrc], iy_src[_isrc], iz_src[_isrc]] += source_term[it - 1, idx_src[_isrc]] * dt / rho
+        # add the source (force vector injected at the grid points by the sparse operator)
+        vz.flat[src_nodes] += (op_src @ source_term[it - 1]) * dt / rho
 
         # implement Dirichlet boundary conditions on the six edges of the grid
         # which is the right condition to implement in order for C-PML to remain stable at long times
@@ -604,10 +576,17 @@ def sim_cpu():
         vz[:, :, -_ord:] = ZERO
 
         # Store seismograms
+        # Os valores nos receptores sao interpolados pelo operador esparso. A amostra e filtrada (anti-aliasing)
+        # e acumulada nas amostras decimadas que recebem sua contribuicao
+        _m, _j = get_decimated_idx(it - 1, rec_decim, dec_filter.shape[0], NSTEP_REC)
+        _h = dec_filter[_j]
+        rec_vx = op_rec @ vx.flat[rec_nodes]
+        rec_vy = op_rec @ vy.flat[rec_nodes]
+        rec_vz = op_rec @ vz.flat[rec_nodes]
         for _irec in range(NREC):
-            sisvx[it - 1, _irec] = vx[ix_rec[_irec], iy_rec[_irec], iz_rec[_irec]]
-            sisvy[it - 1, _irec] = vy[ix_rec[_irec], iy_rec[_irec], iz_rec[_irec]]
-            sisvz[it - 1, _irec] = vz[ix_rec[_irec], iy_rec[_irec], iz_rec[_irec]]
+            sisvx[_m, _irec] += _h * rec_vx[_irec]
+            sisvy[_m, _irec] += _h * rec_vy[_irec]
+            sisvz[_m, _irec] += _h * rec_vz[_irec]
 
         v_2 = vx[:, :, :] ** 2 + vy[:, :, :] ** 2 + vz[:, :, :] ** 2
         v_solid_norm[it - 1] = np.sqrt(np.max(v_2))
@@ -619,54 +598,33 @@ def sim_cpu():
                 print(f'Max norm velocity vector V (m/s) = {v_solid_norm[it - 1]}')
 
             if show_anim:
+                frames = list()
                 if show_xy:
-                    idx = 0
-                    windows_cpu[idx].imv.setImage(vx[ix_min:ix_max, iy_min:iy_max, z_plane_idx],
-                                                  levels=[v_min, v_max])
-                    windows_cpu[idx + 1].imv.setImage(vy[ix_min:ix_max, iy_min:iy_max, z_plane_idx],
-                                                      levels=[v_min, v_max])
-                    windows_cpu[idx + 2].imv.setImage(vz[ix_min:ix_max, iy_min:iy_max, z_plane_idx],
-                                                      levels=[v_min, v_max])
-
+                    frames += [v[ix_min:ix_max, iy_min:iy_max, z_plane_idx] for v in [vx, vy, vz]]
                 if show_xz:
-                    if not show_xy:
-                        idx = 0
-                    else:
-                        idx = 3
-
-                    windows_cpu[idx].imv.setImage(vx[ix_min:ix_max, y_plane_idx, iz_min:iz_max],
-                                                  levels=[v_min, v_max])
-                    windows_cpu[idx + 1].imv.setImage(vy[ix_min:ix_max, y_plane_idx, iz_min:iz_max],
-                                                      levels=[v_min, v_max])
-                    windows_cpu[idx + 2].imv.setImage(vz[ix_min:ix_max, y_plane_idx, iz_min:iz_max],
-                                                      levels=[v_min, v_max])
-
+                    frames += [v[ix_min:ix_max, y_plane_idx, iz_min:iz_max] for v in [vx, vy, vz]]
                 if show_yz:
-                    if not show_xy and not show_xz:
-                        idx = 0
-                    elif (show_xy and not show_xz) or (not show_xy and show_xz):
-                        idx = 3
-                    else:
-                        idx = 6
-
-                    windows_cpu[idx].imv.setImage(vx[x_plane_idx, iy_min:iy_max, iz_min:iz_max],
-                                                  levels=[v_min, v_max])
-                    windows_cpu[idx + 1].imv.setImage(vy[x_plane_idx, iy_min:iy_max, iz_min:iz_max],
-                                                      levels=[v_min, v_max])
-                    windows_cpu[idx + 2].imv.setImage(vz[x_plane_idx, iy_min:iy_max, iz_min:iz_max],
-                                                      levels=[v_min, v_max])
-                App.processEvents()
+                    frames += [v[x_plane_idx, iy_min:iy_max, iz_min:iz_max] for v in [vx, vy, vz]]
+                viewer_cpu.update(frames)
 
         # Verifica a estabilidade da simulacao
         if v_solid_norm[it - 1] > STABILITY_THRESHOLD:
             print("Simulacao tornando-se instavel")
             exit(2)
 
+        # Grava o checkpoint (copias do estado, gravadas em segundo plano)
+        if ckpt_interval > 0 and it % ckpt_interval == 0 and it < NSTEP:
+            ckpt.save(it, {_k: np.copy(globals()[_k]) for _k in CPU_STATE})
+
+    # Simulacao concluida, os checkpoints nao sao mais necessarios
+    if ckpt is not None:
+        ckpt.clear()
+
 
 # -----------------------------
 # Funcao do simulador em WebGPU
 # -----------------------------
-def sim_webgpu(device):
+def sim_webgpu(device, ckpt_tag, kernel="cell"):
     global simul_probes, coefs
     global a_x, a_x_half, b_x, b_x_half, k_x, k_x_half
     global a_y, a_y_half, b_y, b_y_half, k_y, k_y_half
@@ -680,72 +638,90 @@ def sim_webgpu(device):
     global memory_dsigmaxz_dx, memory_dsigmaxz_dz
     global memory_dsigmayz_dy, memory_dsigmayz_dz
     global sisvx, sisvy, sisvz
-    global ix_src, iy_src, iz_src, ix_rec, iy_rec, iz_rec
-    global v_2, v_solid_norm
+    global op_src_idx, op_src_col, op_src_w, op_rec_idx, op_rec_col, op_rec_w
+    global v_solid_norm
     global simul_roi, rho_grid_vx, cp_grid_vx, cs_grid_vx
-    global windows_gpu
+    global viewer_gpu
 
-    # Obtem fontes e receptores dos transdutores
+    # Obtem os termos de fonte dos transdutores (uma coluna por elemento de cada transdutor)
     source_term = list()
-    idx_src = list()
-    idx_rec = list()
-    idx_src_offset = 0
-    idx_rec_offset = 0
     for _pr in simul_probes:
         if source_env:
-            st = _pr.get_source_term(samples=NSTEP, dt=dt, out='e')
-            _, i_src = _pr.get_points_roi(sim_roi=simul_roi, simul_type="3D")
+            source_term.append(_pr.get_source_term(samples=NSTEP, dt=dt, out='e'))
         else:
-            st = _pr.get_source_term(samples=NSTEP, dt=dt)
-            _, i_src = _pr.get_points_roi(sim_roi=simul_roi, simul_type="3D")
-        if len(i_src) > 0:
-            source_term.append(st)
-            idx_src += [np.array(_s) + idx_src_offset for _s in i_src]
-            idx_src_offset += _pr.num_elem
-
-        i_rec = _pr.get_idx_rec(sim_roi=simul_roi, simul_type="3D")
-        if len(i_rec) > 0:
-            idx_rec += [np.array(_r) + idx_rec_offset for _r in i_rec]
-            idx_rec_offset += _pr.num_elem
+            source_term.append(_pr.get_source_term(samples=NSTEP, dt=dt))
 
     # Source terms
     source_term = np.concatenate(source_term, axis=1)
     if save_sources:
         np.save(f'results/sources_3D_elast_CPML_{datetime.now().strftime("%Y%m%d-%H%M%S")}_GPU', source_term)
 
-    pos_sources = -np.ones((nx, ny, nz), dtype=np.int32)
-    pos_sources[ix_src, iy_src, iz_src] = np.array(idx_src).astype(np.int32).flatten()
+    # Tabela de pesos das fontes (ponto da grade, coluna do termo de fonte, peso), ordenada pelo ponto da grade.
+    # ptr_src_pt indica, para cada ponto da grade com fonte, a primeira entrada da tabela
+    src_node = np.ravel_multi_index(op_src_idx.T, (nx, ny, nz))
+    order = np.lexsort((op_src_col, src_node))
+    src_node = src_node[order].astype(np.int32)
+    info_src_pt = np.column_stack((src_node, op_src_col[order])).astype(np.int32)
+    weight_src_pt = op_src_w[order].astype(flt32)
+    ptr_src_pt = np.unique(src_node, return_index=True)[1].astype(np.int32)
+    n_pto_src = np.int32(src_node.shape[0])
+    n_nd_src = np.int32(ptr_src_pt.shape[0])
 
     # Receivers
-    info_rec_pt = np.column_stack((ix_rec, iy_rec, iz_rec, np.array(idx_rec).flatten())).astype(np.int32)
-    numbers = list(np.array(idx_rec, dtype=np.int32).flatten())
-    offset_sensors = [numbers[0]]
-    for i in range(1, len(numbers)):
-        if numbers[i] != numbers[i - 1]:
-            offset_sensors.append(np.int32(i))
-    offset_sensors = np.array(offset_sensors, dtype=np.int32)
-    n_pto_rec = np.int32(len(numbers))
+    # Tabela dos pontos receptores (x, y, z, sensor) e seus pesos de interpolacao, ordenada pelo sensor
+    order = np.argsort(op_rec_col, kind='stable')
+    info_rec_pt = np.column_stack((op_rec_idx[order], op_rec_col[order])).astype(np.int32)
+    weight_rec_pt = op_rec_w[order].astype(flt32)
+    offset_sensors = np.searchsorted(info_rec_pt[:, 3], np.arange(NREC)).astype(np.int32)
+    n_pto_rec = np.int32(info_rec_pt.shape[0])
+
+    # Checkpoints: com --resume, o estado e restaurado do ultimo checkpoint gravado (inclusive o passo de tempo
+    # da GPU), e o estado e gravado a cada ckpt_interval passos de tempo
+    it_ini, state = load_checkpoint(ckpt_dir, ckpt_tag, ckpt_sig) if args.resume else (0, None)
+    ckpt = CheckpointWriter(ckpt_dir, ckpt_tag, ckpt_sig) if ckpt_interval > 0 or state is not None else None
 
     # Arrays com parametros inteiros (i32) e ponto flutuante (f32) para rodar o simulador
     _ord = coefs.shape[0]
-    params_i32 = np.array([nx, ny, nz, NSTEP, source_term.shape[1], sisvx.shape[1], n_pto_rec, _ord, 0],
-                          dtype=np.int32)
+    params_i32 = np.array([nx, ny, nz, NSTEP, source_term.shape[1], sisvx.shape[1], n_pto_rec, _ord,
+                           NSTEP_REC, rec_decim, dec_filter.shape[0], n_pto_src, n_nd_src, it_ini], dtype=np.int32)
     params_f32 = np.array([dx, dy, dz, dt], dtype=flt32)
 
-    # Cria o shader para calculo contido no arquivo ``shader_3D_elast_cpml.wgsl''
-    with open('shader_3D_elast_cpml.wgsl') as shader_file:
-        cshader_string = shader_file.read()
-        cshader_string = cshader_string.replace('wsx', f'{wsx}')
-        cshader_string = cshader_string.replace('wsy', f'{wsy}')
-        cshader_string = cshader_string.replace('wsz', f'{wsz}')
-        cshader_string = cshader_string.replace('idx_rec_offset', f'{idx_rec_offset}')
-        cshader = device.create_shader_module(code=cshader_string)
+    # Mapeamento das threads dos kernels ``cell'': com thread_z_fast, o eixo mais rapido das threads percorre z,
+    # que e o eixo contiguo na memoria (acessos coalescidos)
+    ws_th = (wsz, wsy, wsx) if thread_z_fast else (wsx, wsy, wsz)
+
+    # Fatias (slabs) do grid ao longo de x: campos maiores que o limite de tamanho de um binding do dispositivo
+    # sao amarrados por fatia (com um halo do alcance do estencil) e os kernels rodam em passadas sequenciais
+    fld_plane = ny * nz * np.dtype(flt32).itemsize
+    lbl_plane = ny * nz * mat_bits // 8
+    slabs = get_x_slabs(nx, [fld_plane] + ([lbl_plane] if mat_grid is not None else []),
+                        device.limits["max-storage-buffer-binding-size"], _ord,
+                        align=device.limits["min-storage-buffer-offset-alignment"], x_mult=wsx,
+                        max_buffer=device.limits["max-buffer-size"])
+    if len(slabs) > 1:
+        print(f'Grid dividido em {len(slabs)} fatias ao longo de x (limite de binding do dispositivo)')
+
+    # Indices dos pontos do estencil das diferencas finitas (grids intercalados)
+    idx_fd = np.array([[c + 1, c, -c, -c - 1] for c in range(_ord)], dtype=np.int32)
+
+    # Cria o shader para calculo a partir do modelo ``shader_3D_elast_cpml.wgsl'', especializado para a ordem
+    # e os tamanhos do grid (estencil desenrolado, com os coeficientes como constantes)
+    cshader_string = get_shader_code('shader_3D_elast_cpml.wgsl',
+                                     tokens={'wsx': wsx, 'wsy': wsy, 'wsz': wsz, 'ws_th0': ws_th[0], 'ws_th1': ws_th[1],
+                                             'ws_th2': ws_th[2], 'th_map_z_fast': thread_z_fast,
+                                             'idx_rec_offset': NREC, 'mz_fd_coeff': _ord, 'mz_z_len': nz,
+                                             'mat_ids_on': mat_grid is not None, 'mat_lbl_bits': mat_bits,
+                                             'mat_num': mat_num, 'ws_src': WS_SRC, 'fd_num': _ord},
+                                     consts={'sim_int_par.x_sz': nx, 'sim_int_par.y_sz': ny, 'sim_int_par.z_sz': nz,
+                                             'sim_int_par.fd_coeff': _ord},
+                                     fd_tables=get_fd_tables(coefs, idx_fd))
+    cshader = device.create_shader_module(code=cshader_string)
 
     # Definicao dos buffers que terao informacoes compartilhadas entre CPU e GPU
     # ------- Buffers para o binding de parametros -------------
     # Buffer de parametros com valores em ponto flutuante
-    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-    b_param_flt32 = device.create_buffer_with_data(data=params_f32, usage=wgpu.BufferUsage.STORAGE |
+    # [UNIFORM | COPY_SRC] pois sao valores pequenos, constantes e passados para a GPU
+    b_param_flt32 = device.create_buffer_with_data(data=params_f32, usage=wgpu.BufferUsage.UNIFORM |
                                                                           wgpu.BufferUsage.COPY_SRC)
 
     # Forcas da fonte
@@ -754,52 +730,24 @@ def sim_webgpu(device):
                                              usage=wgpu.BufferUsage.STORAGE |
                                                    wgpu.BufferUsage.COPY_SRC)
 
-    # Indices das fontes na ROI
-    b_idx_src = device.create_buffer_with_data(data=pos_sources, usage=wgpu.BufferUsage.STORAGE |
-                                                                       wgpu.BufferUsage.COPY_SRC)
-
-    # Coeficientes de absorcao
-    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-    b_a_x = device.create_buffer_with_data(data=a_x.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_b_x = device.create_buffer_with_data(data=b_x.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_k_x = device.create_buffer_with_data(data=k_x.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_a_x_h = device.create_buffer_with_data(data=a_x_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
-    b_b_x_h = device.create_buffer_with_data(data=b_x_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
-    b_k_x_h = device.create_buffer_with_data(data=k_x_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
+    # Indices dos pontos da grade com fonte na tabela de pesos das fontes (um elemento extra evita buffer vazio)
+    b_idx_src = device.create_buffer_with_data(data=np.append(ptr_src_pt, np.int32(0)),
+                                               usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
 
-    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-    b_a_y = device.create_buffer_with_data(data=a_y.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_b_y = device.create_buffer_with_data(data=b_y.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_k_y = device.create_buffer_with_data(data=k_y.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_a_y_h = device.create_buffer_with_data(data=a_y_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
-    b_b_y_h = device.create_buffer_with_data(data=b_y_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
-    b_k_y_h = device.create_buffer_with_data(data=k_y_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
+    # Tabela de pesos das fontes
+    b_info_src_pt = device.create_buffer_with_data(data=info_src_pt, usage=wgpu.BufferUsage.STORAGE |
+                                                                           wgpu.BufferUsage.COPY_SRC)
+    b_weight_src_pt = device.create_buffer_with_data(data=weight_src_pt, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_SRC)
 
+    # Coeficientes de absorcao, empacotados por eixo ([a, b, k, -] nos grids cheio e intercalado de cada ponto)
     # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-    b_a_z = device.create_buffer_with_data(data=a_z.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_b_z = device.create_buffer_with_data(data=b_z.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_k_z = device.create_buffer_with_data(data=k_z.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_a_z_h = device.create_buffer_with_data(data=a_z_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
-    b_b_z_h = device.create_buffer_with_data(data=b_z_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
-    b_k_z_h = device.create_buffer_with_data(data=k_z_half.flatten(), usage=wgpu.BufferUsage.STORAGE |
-                                                                            wgpu.BufferUsage.COPY_SRC)
+    b_pml_x = device.create_buffer_with_data(data=pack_pml_coeffs(a_x, b_x, k_x, a_x_half, b_x_half, k_x_half),
+                                             usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+    b_pml_y = device.create_buffer_with_data(data=pack_pml_coeffs(a_y, b_y, k_y, a_y_half, b_y_half, k_y_half),
+                                             usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+    b_pml_z = device.create_buffer_with_data(data=pack_pml_coeffs(a_z, b_z, k_z, a_z_half, b_z_half, k_z_half),
+                                             usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
 
     # Buffer de parametros com valores inteiros
     # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
@@ -807,23 +755,36 @@ def sim_webgpu(device):
                                                                           wgpu.BufferUsage.COPY_SRC)
 
     # Buffers com os indices para o calculo das derivadas com acuracia maior
-    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-    idx_fd = np.array([[c + 1, c, -c, -c - 1] for c in range(_ord)], dtype=np.int32)
-    b_idx_fd = device.create_buffer_with_data(data=idx_fd, usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+    # [UNIFORM | COPY_SRC] pois sao valores pequenos, constantes e passados para a GPU
+    b_idx_fd = device.create_buffer_with_data(data=idx_fd, usage=wgpu.BufferUsage.UNIFORM | wgpu.BufferUsage.COPY_SRC)
 
     # Buffer com os mapas de velocidade e densidade da ROI
+    # Com mapa de materiais, as propriedades sao lidas da tabela (com um material nulo fora do dominio)
+    # e os mapas densos nao sao usados
     # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-    b_rho_map = device.create_buffer_with_data(data=rho_grid_vx, usage=wgpu.BufferUsage.STORAGE |
-                                                                       wgpu.BufferUsage.COPY_SRC)
-    b_cp_map = device.create_buffer_with_data(data=cp_grid_vx, usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-    b_cs_map = device.create_buffer_with_data(data=cs_grid_vx, usage=wgpu.BufferUsage.STORAGE |
-                                                                     wgpu.BufferUsage.COPY_SRC)
-
-    # Buffer com os coeficientes para ao calculo das derivadas
-    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-    b_fd_coeffs = device.create_buffer_with_data(data=coefs, usage=wgpu.BufferUsage.STORAGE |
+    if mat_grid is not None:
+        mat_packed = pack_material_grid(mat_grid)[0]
+        mat_coef = np.vstack((mat_table, np.zeros((1, mat_table.shape[1])))).astype(flt32)
+        rho_gpu = cp_gpu = cs_gpu = np.zeros(1, dtype=flt32)
+    else:
+        mat_packed = np.zeros(1, dtype=np.uint32)
+        mat_coef = np.zeros(1, dtype=flt32)
+        rho_gpu, cp_gpu, cs_gpu = rho_grid_vx, cp_grid_vx, cs_grid_vx
+    b_rho_map = device.create_buffer_with_data(data=rho_gpu, usage=wgpu.BufferUsage.STORAGE |
                                                                    wgpu.BufferUsage.COPY_SRC)
+    b_cp_map = device.create_buffer_with_data(data=cp_gpu, usage=wgpu.BufferUsage.STORAGE |
+                                                                 wgpu.BufferUsage.COPY_SRC)
+    b_cs_map = device.create_buffer_with_data(data=cs_gpu, usage=wgpu.BufferUsage.STORAGE |
+                                                                 wgpu.BufferUsage.COPY_SRC)
+    b_mat_map = device.create_buffer_with_data(data=mat_packed, usage=wgpu.BufferUsage.STORAGE |
+                                                                      wgpu.BufferUsage.COPY_SRC)
+    b_mat_coef = device.create_buffer_with_data(data=mat_coef, usage=wgpu.BufferUsage.STORAGE |
+                                                                    wgpu.BufferUsage.COPY_SRC)
+
+    # Buffer com os coeficientes para ao calculo das derivadas (completados ate um multiplo de 4, array de vec4)
+    # [UNIFORM | COPY_SRC] pois sao valores pequenos, constantes e passados para a GPU
+    b_fd_coeffs = device.create_buffer_with_data(data=np.pad(coefs, (0, (-_ord) % 4)), usage=wgpu.BufferUsage.UNIFORM |
+                                                                                             wgpu.BufferUsage.COPY_SRC)
 
     # Buffers com os arrays de simulacao
     # Velocidades
@@ -837,9 +798,11 @@ def sim_webgpu(device):
     b_vz = device.create_buffer_with_data(data=vz, usage=wgpu.BufferUsage.STORAGE |
                                                          wgpu.BufferUsage.COPY_DST |
                                                          wgpu.BufferUsage.COPY_SRC)
-    b_v_2 = device.create_buffer_with_data(data=v_2, usage=wgpu.BufferUsage.STORAGE |
-                                                           wgpu.BufferUsage.COPY_DST |
-                                                           wgpu.BufferUsage.COPY_SRC)
+    # Historico do maximo do quadrado da norma da velocidade (um valor por passo de tempo, reduzido na GPU)
+    b_v_max_hist = device.create_buffer_with_data(data=np.zeros(NSTEP, dtype=np.uint32),
+                                                  usage=wgpu.BufferUsage.STORAGE |
+                                                        wgpu.BufferUsage.COPY_DST |
+                                                        wgpu.BufferUsage.COPY_SRC)
 
     # Estresses
     # [STORAGE | COPY_DST | COPY_SRC] pois sao valores passados para a GPU e tambem retornam a CPU [COPY_DST]
@@ -863,43 +826,61 @@ def sim_webgpu(device):
                                                                    wgpu.BufferUsage.COPY_SRC)
 
     # Arrays de memoria do simulador
-    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
+    # [STORAGE | COPY_DST | COPY_SRC] pois sao valores passados para a GPU e restaurados dos checkpoints [COPY_DST]
     b_mdvx_dx = device.create_buffer_with_data(data=memory_dvx_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
                                                                          wgpu.BufferUsage.COPY_SRC)
     b_mdvy_dx = device.create_buffer_with_data(data=memory_dvy_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
                                                                          wgpu.BufferUsage.COPY_SRC)
     b_mdvz_dx = device.create_buffer_with_data(data=memory_dvz_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
                                                                          wgpu.BufferUsage.COPY_SRC)
     b_mdvx_dy = device.create_buffer_with_data(data=memory_dvx_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
                                                                          wgpu.BufferUsage.COPY_SRC)
     b_mdvy_dy = device.create_buffer_with_data(data=memory_dvy_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
                                                                          wgpu.BufferUsage.COPY_SRC)
     b_mdvz_dy = device.create_buffer_with_data(data=memory_dvz_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
                                                                          wgpu.BufferUsage.COPY_SRC)
     b_mdvx_dz = device.create_buffer_with_data(data=memory_dvx_dz, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
                                                                          wgpu.BufferUsage.COPY_SRC)
     b_mdvy_dz = device.create_buffer_with_data(data=memory_dvy_dz, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
                                                                          wgpu.BufferUsage.COPY_SRC)
     b_mdvz_dz = device.create_buffer_with_data(data=memory_dvz_dz, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
                                                                          wgpu.BufferUsage.COPY_SRC)
 
     b_mdsxx_dx = device.create_buffer_with_data(data=memory_dsigmaxx_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
                                                                                wgpu.BufferUsage.COPY_SRC)
     b_mdsxy_dy = device.create_buffer_with_data(data=memory_dsigmaxy_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
                                                                                wgpu.BufferUsage.COPY_SRC)
     b_mdsxz_dz = device.create_buffer_with_data(data=memory_dsigmaxz_dz, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
                                                                                wgpu.BufferUsage.COPY_SRC)
     b_mdsxy_dx = device.create_buffer_with_data(data=memory_dsigmaxy_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
                                                                                wgpu.BufferUsage.COPY_SRC)
     b_mdsyy_dy = device.create_buffer_with_data(data=memory_dsigmayy_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
                                                                                wgpu.BufferUsage.COPY_SRC)
     b_mdsyz_dz = device.create_buffer_with_data(data=memory_dsigmayz_dz, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
                                                                                wgpu.BufferUsage.COPY_SRC)
     b_mdsxz_dx = device.create_buffer_with_data(data=memory_dsigmaxz_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
                                                                                wgpu.BufferUsage.COPY_SRC)
     b_mdsyz_dy = device.create_buffer_with_data(data=memory_dsigmayz_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
                                                                                wgpu.BufferUsage.COPY_SRC)
     b_mdszz_dz = device.create_buffer_with_data(data=memory_dsigmazz_dz, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
                                                                                wgpu.BufferUsage.COPY_SRC)
 
     # Sinal do sensor
@@ -923,344 +904,172 @@ def sim_webgpu(device):
                                                                            wgpu.BufferUsage.COPY_SRC)
     b_offset_sensors = device.create_buffer_with_data(data=offset_sensors, usage=wgpu.BufferUsage.STORAGE |
                                                                                  wgpu.BufferUsage.COPY_SRC)
+    b_weight_rec_pt = device.create_buffer_with_data(data=weight_rec_pt, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_SRC)
+
+    # Coeficientes do filtro de decimacao dos sinais dos sensores
+    b_dec_filter = device.create_buffer_with_data(data=dec_filter, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_SRC)
+
+    # Planos de pre-visualizacao (ROI decimada) extraidos na GPU, para que a exibicao leia apenas esses planos
+    ix_min = simul_roi.get_ix_min()
+    ix_max = simul_roi.get_ix_max()
+    iy_min = simul_roi.get_iy_min()
+    iy_max = simul_roi.get_iy_max()
+    iz_min = simul_roi.get_iz_min()
+    iz_max = simul_roi.get_iz_max()
+    pv_nx = -(-(ix_max - ix_min) // preview_dec)
+    pv_ny = -(-(iy_max - iy_min) // preview_dec)
+    pv_nz = -(-(iz_max - iz_min) // preview_dec)
+    pv_sz = [pv_nx * pv_ny, pv_nx * pv_nz, pv_ny * pv_nz]
+    b_preview = device.create_buffer(size=3 * sum(pv_sz) * np.dtype(flt32).itemsize,
+                                     usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+    b_pv_par = device.create_buffer_with_data(data=np.array([ix_min, iy_min, iz_min, pv_nx, pv_ny, pv_nz,
+                                                             x_plane_idx, y_plane_idx, z_plane_idx, preview_dec],
+                                                            dtype=np.int32),
+                                              usage=wgpu.BufferUsage.UNIFORM | wgpu.BufferUsage.COPY_SRC)
+
+    # Buffers do estado do simulador gravados nos checkpoints, restaurados ao retomar a simulacao
+    gpu_state = {"vx": b_vx, "vy": b_vy, "vz": b_vz, "sigmaxx": b_sigmaxx, "sigmayy": b_sigmayy, "sigmazz": b_sigmazz,
+                 "sigmaxy": b_sigmaxy, "sigmaxz": b_sigmaxz, "sigmayz": b_sigmayz, "memory_dvx_dx": b_mdvx_dx,
+                 "memory_dvx_dy": b_mdvx_dy, "memory_dvx_dz": b_mdvx_dz, "memory_dvy_dx": b_mdvy_dx,
+                 "memory_dvy_dy": b_mdvy_dy, "memory_dvy_dz": b_mdvy_dz, "memory_dvz_dx": b_mdvz_dx,
+                 "memory_dvz_dy": b_mdvz_dy, "memory_dvz_dz": b_mdvz_dz, "memory_dsigmaxx_dx": b_mdsxx_dx,
+                 "memory_dsigmaxy_dy": b_mdsxy_dy, "memory_dsigmaxz_dz": b_mdsxz_dz, "memory_dsigmaxy_dx": b_mdsxy_dx,
+                 "memory_dsigmayy_dy": b_mdsyy_dy, "memory_dsigmayz_dz": b_mdsyz_dz, "memory_dsigmaxz_dx": b_mdsxz_dx,
+                 "memory_dsigmayz_dy": b_mdsyz_dy, "memory_dsigmazz_dz": b_mdszz_dz, "v_max_hist": b_v_max_hist,
+                 "sisvx": b_sens_x, "sisvy": b_sens_y, "sisvz": b_sens_z}
+    if state is not None:
+        for _k, _b in gpu_state.items():
+            device.queue.write_buffer(_b, 0, state[_k])
+
+    # Esquema de amarracao dos buffers (bindings, na ordem das listas)
+    rw = wgpu.BufferBindingType.storage
+    ro = wgpu.BufferBindingType.read_only_storage
+    uni = wgpu.BufferBindingType.uniform
 
-    # Esquema de amarracao dos parametros (binding layouts [bl])
     # Parametros
-    bl_params = [
-        {"binding": 0,
-         "visibility": wgpu.ShaderStage.COMPUTE,
-         "buffer": {
-             "type": wgpu.BufferBindingType.storage}
-         }
-    ]
-    bl_params += [
-        {"binding": ii,
-         "visibility": wgpu.ShaderStage.COMPUTE,
-         "buffer": {
-             "type": wgpu.BufferBindingType.read_only_storage}
-         } for ii in range(1, 27)
-    ]
-
-    # Arrays da simulacao
-    bl_sim_arrays = [
-        {"binding": ii,
-         "visibility": wgpu.ShaderStage.COMPUTE,
-         "buffer": {
-             "type": wgpu.BufferBindingType.storage}
-         } for ii in range(0, 28)
-    ]
+    bl_params = [(b_param_int32, rw), (b_param_flt32, uni), (b_force, ro), (b_idx_src, ro),
+                 (b_pml_x, ro), (b_pml_y, ro), (b_pml_z, ro), (b_idx_fd, uni), (b_fd_coeffs, uni),
+                 (b_rho_map, ro), (b_cp_map, ro), (b_cs_map, ro), (b_mat_map, ro), (b_mat_coef, ro),
+                 (b_info_src_pt, ro), (b_weight_src_pt, ro)]
+
+    # Arrays da simulacao (o binding 30, com os parametros da fatia, e incluido em cada fatia)
+    bl_sim_arrays = [(b_vx, rw), (b_vy, rw), (b_vz, rw), (b_v_max_hist, rw),
+                     (b_sigmaxx, rw), (b_sigmayy, rw), (b_sigmazz, rw), (b_sigmaxy, rw), (b_sigmaxz, rw),
+                     (b_sigmayz, rw), (b_mdvx_dx, rw), (b_mdvy_dx, rw), (b_mdvz_dx, rw), (b_mdvx_dy, rw),
+                     (b_mdvy_dy, rw), (b_mdvz_dy, rw), (b_mdvx_dz, rw), (b_mdvy_dz, rw), (b_mdvz_dz, rw),
+                     (b_mdsxx_dx, rw), (b_mdsxy_dy, rw), (b_mdsxz_dz, rw), (b_mdsxy_dx, rw), (b_mdsyy_dy, rw),
+                     (b_mdsyz_dz, rw), (b_mdsxz_dx, rw), (b_mdsyz_dy, rw), (b_mdszz_dz, rw),
+                     (b_preview, rw), (b_pv_par, uni)]
 
     # Sensores
-    bl_sensors = [
-        {"binding": ii,
-         "visibility": wgpu.ShaderStage.COMPUTE,
-         "buffer": {
-             "type": wgpu.BufferBindingType.storage}
-         } for ii in range(0, 3)
-    ]
-    bl_sensors += [
-        {"binding": ii,
-         "visibility": wgpu.ShaderStage.COMPUTE,
-         "buffer": {
-             "type": wgpu.BufferBindingType.read_only_storage}
-         } for ii in range(3, 6)
-    ]
-
-    # Configuracao das amarracoes (bindings)
-    b_params = [
-        {
-            "binding": 0,
-            "resource": {"buffer": b_param_int32, "offset": 0, "size": b_param_int32.size},
-        },
-        {
-            "binding": 1,
-            "resource": {"buffer": b_param_flt32, "offset": 0, "size": b_param_flt32.size},
-        },
-        {
-            "binding": 2,
-            "resource": {"buffer": b_force, "offset": 0, "size": b_force.size},
-        },
-        {
-            "binding": 3,
-            "resource": {"buffer": b_idx_src, "offset": 0, "size": b_idx_src.size},
-        },
-        {
-            "binding": 4,
-            "resource": {"buffer": b_a_x, "offset": 0, "size": b_a_x.size},
-        },
-        {
-            "binding": 5,
-            "resource": {"buffer": b_b_x, "offset": 0, "size": b_b_x.size},
-        },
-        {
-            "binding": 6,
-            "resource": {"buffer": b_k_x, "offset": 0, "size": b_k_x.size},
-        },
-        {
-            "binding": 7,
-            "resource": {"buffer": b_a_x_h, "offset": 0, "size": b_a_x_h.size},
-        },
-        {
-            "binding": 8,
-            "resource": {"buffer": b_b_x_h, "offset": 0, "size": b_b_x_h.size},
-        },
-        {
-            "binding": 9,
-            "resource": {"buffer": b_k_x_h, "offset": 0, "size": b_k_x_h.size},
-        },
-        {
-            "binding": 10,
-            "resource": {"buffer": b_a_y, "offset": 0, "size": b_a_y.size},
-        },
-        {
-            "binding": 11,
-            "resource": {"buffer": b_b_y, "offset": 0, "size": b_b_y.size},
-        },
-        {
-            "binding": 12,
-            "resource": {"buffer": b_k_y, "offset": 0, "size": b_k_y.size},
-        },
-        {
-            "binding": 13,
-            "resource": {"buffer": b_a_y_h, "offset": 0, "size": b_a_y_h.size},
-        },
-        {
-            "binding": 14,
-            "resource": {"buffer": b_b_y_h, "offset": 0, "size": b_b_y_h.size},
-        },
-        {
-            "binding": 15,
-            "resource": {"buffer": b_k_y_h, "offset": 0, "size": b_k_y_h.size},
-        },
-        {
-            "binding": 16,
-            "resource": {"buffer": b_a_z, "offset": 0, "size": b_a_z.size},
-        },
-        {
-            "binding": 17,
-            "resource": {"buffer": b_b_z, "offset": 0, "size": b_b_z.size},
-        },
-        {
-            "binding": 18,
-            "resource": {"buffer": b_k_z, "offset": 0, "size": b_k_z.size},
-        },
-        {
-            "binding": 19,
-            "resource": {"buffer": b_a_z_h, "offset": 0, "size": b_a_z_h.size},
-        },
-        {
-            "binding": 20,
-            "resource": {"buffer": b_b_z_h, "offset": 0, "size": b_b_z_h.size},
-        },
-        {
-            "binding": 21,
-            "resource": {"buffer": b_k_z_h, "offset": 0, "size": b_k_z_h.size},
-        },
-        {
-            "binding": 22,
-            "resource": {"buffer": b_idx_fd, "offset": 0, "size": b_idx_fd.size},
-        },
-        {
-            "binding": 23,
-            "resource": {"buffer": b_fd_coeffs, "offset": 0, "size": b_fd_coeffs.size},
-        },
-        {
-            "binding": 24,
-            "resource": {"buffer": b_rho_map, "offset": 0, "size": b_rho_map.size},
-        },
-        {
-            "binding": 25,
-            "resource": {"buffer": b_cp_map, "offset": 0, "size": b_cp_map.size},
-        },
-        {
-            "binding": 26,
-            "resource": {"buffer": b_cs_map, "offset": 0, "size": b_cs_map.size},
-        },
-    ]
-    b_sim_arrays = [
-        {
-            "binding": 0,
-            "resource": {"buffer": b_vx, "offset": 0, "size": b_vx.size},
-        },
-        {
-            "binding": 1,
-            "resource": {"buffer": b_vy, "offset": 0, "size": b_vy.size},
-        },
-        {
-            "binding": 2,
-            "resource": {"buffer": b_vz, "offset": 0, "size": b_vz.size},
-        },
-        {
-            "binding": 3,
-            "resource": {"buffer": b_v_2, "offset": 0, "size": b_v_2.size},
-        },
-        {
-            "binding": 4,
-            "resource": {"buffer": b_sigmaxx, "offset": 0, "size": b_sigmaxx.size},
-        },
-        {
-            "binding": 5,
-            "resource": {"buffer": b_sigmayy, "offset": 0, "size": b_sigmayy.size},
-        },
-        {
-            "binding": 6,
-            "resource": {"buffer": b_sigmazz, "offset": 0, "size": b_sigmazz.size},
-        },
-        {
-            "binding": 7,
-            "resource": {"buffer": b_sigmaxy, "offset": 0, "size": b_sigmaxy.size},
-        },
-        {
-            "binding": 8,
-            "resource": {"buffer": b_sigmaxz, "offset": 0, "size": b_sigmaxz.size},
-        },
-        {
-            "binding": 9,
-            "resource": {"buffer": b_sigmayz, "offset": 0, "size": b_sigmayz.size},
-        },
-        {
-            "binding": 10,
-            "resource": {"buffer": b_mdvx_dx, "offset": 0, "size": b_mdvx_dx.size},
-        },
-        {
-            "binding": 11,
-            "resource": {"buffer": b_mdvy_dx, "offset": 0, "size": b_mdvy_dx.size},
-        },
-        {
-            "binding": 12,
-            "resource": {"buffer": b_mdvz_dx, "offset": 0, "size": b_mdvz_dx.size},
-        },
-        {
-            "binding": 13,
-            "resource": {"buffer": b_mdvx_dy, "offset": 0, "size": b_mdvx_dy.size},
-        },
-        {
-            "binding": 14,
-            "resource": {"buffer": b_mdvy_dy, "offset": 0, "size": b_mdvy_dy.size},
-        },
-        {
-            "binding": 15,
-            "resource": {"buffer": b_mdvz_dy, "offset": 0, "size": b_mdvz_dy.size},
-        },
-        {
-            "binding": 16,
-            "resource": {"buffer": b_mdvx_dz, "offset": 0, "size": b_mdvx_dz.size},
-        },
-        {
-            "binding": 17,
-            "resource": {"buffer": b_mdvy_dz, "offset": 0, "size": b_mdvy_dz.size},
-        },
-        {
-            "binding": 18,
-            "resource": {"buffer": b_mdvz_dz, "offset": 0, "size": b_mdvz_dz.size},
-        },
-        {
-            "binding": 19,
-            "resource": {"buffer": b_mdsxx_dx, "offset": 0, "size": b_mdsxx_dx.size},
-        },
-        {
-            "binding": 20,
-            "resource": {"buffer": b_mdsxy_dy, "offset": 0, "size": b_mdsxy_dy.size},
-        },
-        {
-            "binding": 21,
-            "resource": {"buffer": b_mdsxz_dz, "offset": 0, "size": b_mdsxz_dz.size},
-        },
-        {
-            "binding": 22,
-            "resource": {"buffer": b_mdsxy_dx, "offset": 0, "size": b_mdsxy_dx.size},
-        },
-        {
-            "binding": 23,
-            "resource": {"buffer": b_mdsyy_dy, "offset": 0, "size": b_mdsyy_dy.size},
-        },
-        {
-            "binding": 24,
-            "resource": {"buffer": b_mdsyz_dz, "offset": 0, "size": b_mdsyz_dz.size},
-        },
-        {
-            "binding": 25,
-            "resource": {"buffer": b_mdsxz_dx, "offset": 0, "size": b_mdsxz_dz.size},
-        },
-        {
-            "binding": 26,
-            "resource": {"buffer": b_mdsyz_dy, "offset": 0, "size": b_mdsyz_dy.size},
-        },
-        {
-            "binding": 27,
-            "resource": {"buffer": b_mdszz_dz, "offset": 0, "size": b_mdszz_dz.size},
-        },
-    ]
-    b_sensors = [
-        {
-            "binding": 0,
-            "resource": {"buffer": b_sens_x, "offset": 0, "size": b_sens_x.size},
-        },
-        {
-            "binding": 1,
-            "resource": {"buffer": b_sens_y, "offset": 0, "size": b_sens_y.size},
-        },
-        {
-            "binding": 2,
-            "resource": {"buffer": b_sens_z, "offset": 0, "size": b_sens_z.size},
-        },
-        {
-            "binding": 3,
-            "resource": {"buffer": b_delay_rec, "offset": 0, "size": b_delay_rec.size},
-        },
-        {
-            "binding": 4,
-            "resource": {"buffer": b_info_rec_pt, "offset": 0, "size": b_info_rec_pt.size},
-        },
-        {
-            "binding": 5,
-            "resource": {"buffer": b_offset_sensors, "offset": 0, "size": b_offset_sensors.size},
-        },
-    ]
-
-    # Coloca tudo junto
-    bgl_0 = device.create_bind_group_layout(entries=bl_params)
-    bgl_1 = device.create_bind_group_layout(entries=bl_sim_arrays)
-    bgl_2 = device.create_bind_group_layout(entries=bl_sensors)
+    bl_sensors = [(b_sens_x, rw), (b_sens_y, rw), (b_sens_z, rw), (b_delay_rec, ro), (b_info_rec_pt, ro),
+                  (b_offset_sensors, ro), (b_dec_filter, ro), (b_weight_rec_pt, ro)]
+
+    # Os campos do grid e os mapas do meio sao amarrados um por binding (para as fatias ao longo de x), acima
+    # do limite default do WebGPU (8 storage buffers por estagio): o dispositivo e criado com o limite
+    # ``max-storage-buffers-per-shader-stage'' do adaptador
+    n_storage = get_storage_bindings([bl_params, bl_sim_arrays, bl_sensors])
+    if n_storage > device.limits["max-storage-buffers-per-shader-stage"]:
+        raise ValueError(f'Simulador requer {n_storage} storage buffers por estagio, dispositivo suporta '
+                         f'{device.limits["max-storage-buffers-per-shader-stage"]}')
+
+    bgl_2, bg_2 = get_bind_group(device, bl_sensors)
+
+    # Grupos de amarracao de cada fatia: os campos do grid sao amarrados a partir do plano x_ofs da fatia
+    # e os demais buffers sao amarrados inteiros
+    slab_bufs = [(b, fld_plane) for b in [b_vx, b_vy, b_vz, b_sigmaxx, b_sigmayy, b_sigmazz, b_sigmaxy,
+                                          b_sigmaxz, b_sigmayz, b_mdvx_dx, b_mdvy_dx, b_mdvz_dx, b_mdvx_dy, b_mdvy_dy,
+                                          b_mdvz_dy, b_mdvx_dz, b_mdvy_dz, b_mdvz_dz, b_mdsxx_dx, b_mdsxy_dy,
+                                          b_mdsxz_dz, b_mdsxy_dx, b_mdsyy_dy, b_mdsyz_dz, b_mdsxz_dx, b_mdsyz_dy,
+                                          b_mdszz_dz]]
+    if mat_grid is not None:
+        slab_bufs += [(b_mat_map, lbl_plane)]
+    else:
+        slab_bufs += [(b, fld_plane) for b in [b_rho_map, b_cp_map, b_cs_map]]
+
+    bgl_0 = bgl_1 = None
+    bg_slabs = list()
+    for x_ofs, x_ini, x_end, x_lim in slabs:
+        b_slab_par = device.create_buffer_with_data(data=np.array([x_ofs, x_ini, x_end, 0], dtype=np.int32),
+                                                    usage=wgpu.BufferUsage.UNIFORM | wgpu.BufferUsage.COPY_SRC)
+        bgl_0, bg_0 = get_bind_group(device, get_slab_entries(bl_params, slab_bufs, x_ofs, x_lim), bgl_0)
+        bgl_1, bg_1 = get_bind_group(device, get_slab_entries(bl_sim_arrays, slab_bufs, x_ofs, x_lim) +
+                                     [(b_slab_par, uni)], bgl_1)
+
+        n_wg_x = (x_end - x_ini) // wsx
+        wg_cell = (nz // wsz, ny // wsy, n_wg_x) if thread_z_fast else (n_wg_x, ny // wsy, nz // wsz)
+        bg_slabs.append((bg_0, bg_1, wg_cell, (n_wg_x, ny // wsy, 1) if kernel == "march" else wg_cell))
     pipeline_layout = device.create_pipeline_layout(bind_group_layouts=[bgl_0, bgl_1, bgl_2])
-    bg_0 = device.create_bind_group(layout=bgl_0, entries=b_params)
-    bg_1 = device.create_bind_group(layout=bgl_1, entries=b_sim_arrays)
-    bg_2 = device.create_bind_group(layout=bgl_2, entries=b_sensors)
 
     # Cria os pipelines de execucao
     compute_teste_kernel = device.create_compute_pipeline(layout=pipeline_layout,
                                                           compute={"module": cshader,
                                                                    "entry_point": "teste_kernel"})
+    # Os kernels ``march'' percorrem o eixo z dentro de cada thread (blocagem 2.5D)
+    kernel_suffix = "_march_kernel" if kernel == "march" else "_kernel"
     compute_sigma_kernel = device.create_compute_pipeline(layout=pipeline_layout,
                                                           compute={"module": cshader,
-                                                                   "entry_point": "sigma_kernel"})
+                                                                   "entry_point": "sigma" + kernel_suffix})
     compute_velocity_kernel = device.create_compute_pipeline(layout=pipeline_layout,
                                                              compute={"module": cshader,
-                                                                      "entry_point": "velocity_kernel"})
+                                                                      "entry_point": "velocity" + kernel_suffix})
     compute_sources_kernel = device.create_compute_pipeline(layout=pipeline_layout,
                                                             compute={"module": cshader,
                                                                      "entry_point": "sources_kernel"})
-    compute_finish_it_kernel = device.create_compute_pipeline(layout=pipeline_layout,
-                                                              compute={"module": cshader,
-                                                                       "entry_point": "finish_it_kernel"})
     compute_store_sensors_kernel = device.create_compute_pipeline(layout=pipeline_layout,
                                                                   compute={"module": cshader,
                                                                            "entry_point": "store_sensors_kernel"})
     compute_incr_it_kernel = device.create_compute_pipeline(layout=pipeline_layout,
                                                             compute={"module": cshader,
                                                                      "entry_point": "incr_it_kernel"})
+    compute_preview_kernel = device.create_compute_pipeline(layout=pipeline_layout,
+                                                            compute={"module": cshader,
+                                                                     "entry_point": "preview_kernel"})
+
+    # Buffers de staging persistentes para as leituras da GPU
+    stg_pool = StagingPool(device)
+
+    # Leitura dos resultados de um passo de apresentacao (historico da norma da velocidade desde o passo
+    # ``it_ini`` e planos de pre-visualizacao) copiados para o staging
+    def check_step(it_rd, it_ini, stg_hist, stg_pv):
+        v_sol_n[it_ini:it_rd] = np.sqrt(stg_pool.read(stg_hist))
+        stg_pool.release(stg_hist)
+
+        # Verifica a estabilidade da simulacao
+        if np.any(v_sol_n[:it_rd] > STABILITY_THRESHOLD):
+            print("Simulacao tornando-se instavel")
+            exit(2)
+
+        # Pega resultados intermediarios
+        if (it_rd % IT_DISPLAY) == 0 or it_rd == 5:
+            if show_debug:
+                print(f'Time step # {it_rd} out of {NSTEP}')
+                print(f'Max norm velocity vector V (m/s) = {v_sol_n[it_rd - 1]}')
+
+            if stg_pv is not None:
+                pv = stg_pool.read(stg_pv)
+                pv_xy = pv[:3 * pv_sz[0]].reshape((3, pv_nx, pv_ny))
+                pv_xz = pv[3 * pv_sz[0]:3 * (pv_sz[0] + pv_sz[1])].reshape((3, pv_nx, pv_nz))
+                pv_yz = pv[3 * (pv_sz[0] + pv_sz[1]):].reshape((3, pv_ny, pv_nz))
+
+                frames = list()
+                for show_pl, pv_pl in [(show_xy, pv_xy), (show_xz, pv_xz), (show_yz, pv_yz)]:
+                    if show_pl:
+                        frames += [pv_pl[_f] for _f in range(3)]
+
+                        if show_debug:
+                            print(f'Max Vx = {np.max(pv_pl[0])}, Vy = {np.max(pv_pl[1])}, Vz = {np.max(pv_pl[2])}')
+                            print(f'Min Vx = {np.min(pv_pl[0])}, Vy = {np.min(pv_pl[1])}, Vz = {np.min(pv_pl[2])}')
+                viewer_gpu.update(frames)
+                stg_pool.release(stg_pv)
 
-    v_max = 100.0
-    v_min = - v_max
     v_sol_n = np.zeros(NSTEP, dtype=flt32)
-    ix_min = simul_roi.get_ix_min()
-    ix_max = simul_roi.get_ix_max()
-    iy_min = simul_roi.get_iy_min()
-    iy_max = simul_roi.get_iy_max()
-    iz_min = simul_roi.get_iz_min()
-    iz_max = simul_roi.get_iz_max()
+    it_hist = 0
+    stg_prev = None
     # Laco de tempo para execucao da simulacao
-    for it in range(1, NSTEP + 1):
+    for it in range(it_ini + 1, NSTEP + 1):
         # Cria o codificador de comandos
         command_encoder = device.create_command_encoder()
 
@@ -1268,33 +1077,49 @@ def sim_webgpu(device):
         compute_pass = command_encoder.begin_compute_pass()
 
         # Ajusta os grupos de amarracao
-        compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
-        compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
         compute_pass.set_bind_group(2, bg_2, [], 0, 999999)  # last 2 elements not used
 
+        # Cada etapa percorre as fatias do grid em sequencia (uma unica fatia se os campos cabem em um binding),
+        # para que a etapa seguinte leia os halos ja atualizados das fatias vizinhas
         # Ativa o pipeline de teste
         # compute_pass.set_pipeline(compute_teste_kernel)
-        # compute_pass.dispatch_workgroups(nx // wsx, ny // wsy, nz // wsz)
+        # compute_pass.dispatch_workgroups(*wg_cell)
 
         # Ativa o pipeline de execucao do calculo dos estresses
         compute_pass.set_pipeline(compute_sigma_kernel)
-        compute_pass.dispatch_workgroups(nx // wsx, ny // wsy, nz // wsz)
+        for bg_0, bg_1, wg_cell, wg_fd in bg_slabs:
+            compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+            compute_pass.dispatch_workgroups(*wg_fd)
 
         # Ativa o pipeline de execucao do calculo das velocidades
         compute_pass.set_pipeline(compute_velocity_kernel)
-        compute_pass.dispatch_workgroups(nx // wsx, ny // wsy, nz // wsz)
+        for bg_0, bg_1, wg_cell, wg_fd in bg_slabs:
+            compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+            compute_pass.dispatch_workgroups(*wg_fd)
 
-        # Ativa o pipeline de adicao dos termos de fonte
+        # Ativa o pipeline de adicao dos termos de fonte (somente sobre os pontos da grade com fonte)
         compute_pass.set_pipeline(compute_sources_kernel)
-        compute_pass.dispatch_workgroups(nx // wsx, ny // wsy, nz // wsz)
-
-        # Ativa o pipeline de execucao dos procedimentos finais da iteracao
-        compute_pass.set_pipeline(compute_finish_it_kernel)
-        compute_pass.dispatch_workgroups(nx // wsx, ny // wsy, nz // wsz)
+        for bg_0, bg_1, wg_cell, wg_fd in bg_slabs:
+            compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+            compute_pass.dispatch_workgroups(-(-n_nd_src // WS_SRC))
 
         # Ativa o pipeline de execucao do armazenamento dos sensores
         compute_pass.set_pipeline(compute_store_sensors_kernel)
-        compute_pass.dispatch_workgroups(idx_rec_offset)
+        for bg_0, bg_1, wg_cell, wg_fd in bg_slabs:
+            compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+            compute_pass.dispatch_workgroups(1)
+
+        # Ativa o pipeline de extracao dos planos de pre-visualizacao (somente nos passos de exibicao)
+        if show_anim and ((it % IT_DISPLAY) == 0 or it == 5):
+            compute_pass.set_pipeline(compute_preview_kernel)
+            for bg_0, bg_1, wg_cell, wg_fd in bg_slabs:
+                compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+                compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+                compute_pass.dispatch_workgroups(-(-max(pv_nx, pv_ny) // wsx), -(-max(pv_ny, pv_nz) // wsy), 3)
 
         # Ativa o pipeline de atualizacao da amostra de tempo
         compute_pass.set_pipeline(compute_incr_it_kernel)
@@ -1303,76 +1128,41 @@ def sim_webgpu(device):
         # Termina o passo de execucao
         compute_pass.end()
 
+        # Nos intervalos de apresentacao, copia o historico do maximo da norma da velocidade em bloco (e os planos
+        # de pre-visualizacao) para buffers de staging no mesmo envio dos kernels
+        stg_step = None
+        if (it % IT_DISPLAY) == 0 or it == 5 or it == NSTEP:
+            stg_step = (it, it_hist, stg_pool.copy(command_encoder, b_v_max_hist, it_hist * 4, (it - it_hist) * 4),
+                        stg_pool.copy(command_encoder, b_preview) if show_anim and ((it % IT_DISPLAY) == 0 or it == 5)
+                        else None)
+            it_hist = it
+
         # Efetua a execucao dos comandos na GPU
         device.queue.submit([command_encoder.finish()])
 
-        # Pega resultados intermediarios
-        vsn2 = np.asarray(device.queue.read_buffer(b_v_2, buffer_offset=0).cast("f")).reshape((nx, ny, nz))
-        v_sol_n[it - 1] = np.sqrt(np.max(vsn2))
-        if (it % IT_DISPLAY) == 0 or it == 5:
-            if show_debug or show_anim:
-                vxgpu = np.asarray(device.queue.read_buffer(b_vx, buffer_offset=0).cast("f")).reshape((nx, ny, nz))
-                vygpu = np.asarray(device.queue.read_buffer(b_vy, buffer_offset=0).cast("f")).reshape((nx, ny, nz))
-                vzgpu = np.asarray(device.queue.read_buffer(b_vz, buffer_offset=0).cast("f")).reshape((nx, ny, nz))
-
-                if show_debug:
-                    print(f'Time step # {it} out of {NSTEP}')
-                    print(f'Max Vx = {np.max(vxgpu)}, Vy = {np.max(vygpu)}, Vz = {np.max(vzgpu)}')
-                    print(f'Min Vx = {np.min(vxgpu)}, Vy = {np.min(vygpu)}, Vz = {np.min(vzgpu)}')
-                    print(f'Max norm velocity vector V (m/s) = {v_sol_n[it - 1]}')
-
-                if show_anim:
-                    if show_xy:
-                        idx = 0
-                        windows_gpu[idx].imv.setImage(vxgpu[ix_min:ix_max, iy_min:iy_max, z_plane_idx],
-                                                      levels=[v_min, v_max])
-                        windows_gpu[idx + 1].imv.setImage(vygpu[ix_min:ix_max, iy_min:iy_max, z_plane_idx],
-                                                          levels=[v_min, v_max])
-                        windows_gpu[idx + 2].imv.setImage(vzgpu[ix_min:ix_max, iy_min:iy_max, z_plane_idx],
-                                                          levels=[v_min, v_max])
-
-                    if show_xz:
-                        if not show_xy:
-                            idx = 0
-                        else:
-                            idx = 3
-
-                        windows_gpu[idx].imv.setImage(vxgpu[ix_min:ix_max, y_plane_idx, iz_min:iz_max],
-                                                      levels=[v_min, v_max])
-                        windows_gpu[idx + 1].imv.setImage(vygpu[ix_min:ix_max, y_plane_idx, iz_min:iz_max],
-                                                          levels=[v_min, v_max])
-                        windows_gpu[idx + 2].imv.setImage(vzgpu[ix_min:ix_max, y_plane_idx, iz_min:iz_max],
-                                                          levels=[v_min, v_max])
-
-                    if show_yz:
-                        if not show_xy and not show_xz:
-                            idx = 0
-                        elif (show_xy and not show_xz) or (not show_xy and show_xz):
-                            idx = 3
-                        else:
-                            idx = 6
-
-                        windows_gpu[idx].imv.setImage(vxgpu[x_plane_idx, iy_min:iy_max, iz_min:iz_max],
-                                                      levels=[v_min, v_max])
-                        windows_gpu[idx + 1].imv.setImage(vygpu[x_plane_idx, iy_min:iy_max, iz_min:iz_max],
-                                                          levels=[v_min, v_max])
-                        windows_gpu[idx + 2].imv.setImage(vzgpu[x_plane_idx, iy_min:iy_max, iz_min:iz_max],
-                                                          levels=[v_min, v_max])
-
-                    App.processEvents()
-
-        # Verifica a estabilidade da simulacao
-        if v_sol_n[it - 1] > STABILITY_THRESHOLD:
-            print("Simulacao tornando-se instavel")
-            exit(2)
-
-    # Pega os resultados da simulacao
-    vxgpu = np.asarray(device.queue.read_buffer(b_vx, buffer_offset=0).cast("f")).reshape((nx, ny, nz))
-    vygpu = np.asarray(device.queue.read_buffer(b_vy, buffer_offset=0).cast("f")).reshape((nx, ny, nz))
-    vzgpu = np.asarray(device.queue.read_buffer(b_vz, buffer_offset=0).cast("f")).reshape((nx, ny, nz))
-    sens_vx = np.array(device.queue.read_buffer(b_sens_x).cast("f")).reshape((NSTEP, NREC))
-    sens_vy = np.array(device.queue.read_buffer(b_sens_y).cast("f")).reshape((NSTEP, NREC))
-    sens_vz = np.array(device.queue.read_buffer(b_sens_z).cast("f")).reshape((NSTEP, NREC))
+        # Le os resultados da apresentacao anterior enquanto a GPU executa o passo atual (o ultimo passo e lido
+        # em seguida)
+        if stg_prev is not None:
+            check_step(*stg_prev)
+        stg_prev = stg_step
+
+        # Grava o checkpoint em segundo plano. O estado do simulador e lido um buffer por vez, reaproveitando um
+        # unico buffer de staging
+        if ckpt_interval > 0 and it % ckpt_interval == 0 and it < NSTEP:
+            ckpt.save(it, stg_pool.fetch_each(gpu_state))
+    if stg_prev is not None:
+        check_step(*stg_prev)
+
+    # Simulacao concluida, os checkpoints nao sao mais necessarios
+    if ckpt is not None:
+        ckpt.clear()
+
+    # Pega os resultados da simulacao (copias codificadas em um unico envio)
+    command_encoder = device.create_command_encoder()
+    stg_res = [stg_pool.copy(command_encoder, _b) for _b in [b_vx, b_vy, b_vz, b_sens_x, b_sens_y, b_sens_z]]
+    device.queue.submit([command_encoder.finish()])
+    vxgpu, vygpu, vzgpu = [stg_pool.fetch(_s, shape=(nx, ny, nz)) for _s in stg_res[:3]]
+    sens_vx, sens_vy, sens_vz = [stg_pool.fetch(_s, shape=(NSTEP_REC, NREC)) for _s in stg_res[3:]]
     return vxgpu, vygpu, vzgpu, sens_vx, sens_vy, sens_vz, v_sol_n, device.adapter.info["device"]
 
 
@@ -1400,6 +1190,10 @@ coefs_Lui = [
 # ----------------------------------------------------------
 parser = argparse.ArgumentParser()
 parser.add_argument('-c', '--config', help='Configuration file', default='config.json')
+parser.add_argument('-p', '--plan', help='Print the memory plan and exit, without running the simulation',
+                    action='store_true')
+parser.add_argument('-r', '--resume', help='Resume the simulations from their latest checkpoints',
+                    action='store_true')
 args = parser.parse_args()
 
 # -----------------------
@@ -1410,13 +1204,18 @@ with open(args.config, 'r') as f:
     coefs = np.array(coefs_Lui[configs["simul_params"]["ord"] - 2], dtype=flt32)
 
     # Configuracao do corpo de prova
+    # Recorte dos mapas (indices [inicio, fim] em cada dimensao) e posicao do seu primeiro ponto no grid
+    map_crop = configs["specimen_params"]["map_crop"] if "map_crop" in configs["specimen_params"] else None
+    map_offset = configs["specimen_params"]["map_offset"] if "map_offset" in configs["specimen_params"] \
+        else None
+
     cp = flt32(5.9)
     if "cp" in configs["specimen_params"]:
         cp = flt32(configs["specimen_params"]["cp"])  # [mm/us]
 
     cp_map = None
     if "cp_map" in configs["specimen_params"]:
-        cp_map = np.load(configs["specimen_params"]["cp_map"]).astype(np.float32)
+        cp_map = load_map(configs["specimen_params"]["cp_map"], crop=map_crop)
 
     cs = flt32(3.23)
     if "cs" in configs["specimen_params"]:
@@ -1424,7 +1223,7 @@ with open(args.config, 'r') as f:
 
     cs_map = None
     if "cs_map" in configs["specimen_params"]:
-        cs_map = np.load(configs["specimen_params"]["cs_map"]).astype(np.float32)
+        cs_map = load_map(configs["specimen_params"]["cs_map"], crop=map_crop)
 
     rho = flt32(7800.0)
     if "rho" in configs["specimen_params"]:
@@ -1432,10 +1231,23 @@ with open(args.config, 'r') as f:
 
     rho_map = None
     if "rho_map" in configs["specimen_params"]:
-        rho_map = np.load(configs["specimen_params"]["rho_map"]).astype(np.float32)
+        rho_map = load_map(configs["specimen_params"]["rho_map"], crop=map_crop)
+
+    # Mapa de materiais (rotulos uint8/uint16) com a tabela de propriedades de cada material.
+    # Se definido, substitui os mapas de cp, cs e rho
+    mat_map = None
+    mat_table = None
+    if "material_map" in configs["specimen_params"]:
+        mat_map = load_map(configs["specimen_params"]["material_map"], crop=map_crop)
+        if mat_map.dtype not in (np.uint8, np.uint16):
+            raise ValueError(f'material_map deve ser uint8 ou uint16 (e {mat_map.dtype})')
+        mat_table = get_material_table(configs["specimen_params"]["materials"])
+        if mat_map.size > 0 and mat_map.max() >= mat_table.shape[0]:
+            raise ValueError('material_map tem rotulos sem material correspondente em materials')
 
     # Configuracao da ROI
-    simul_roi = SimulationROI(**configs["roi"], pad=coefs.shape[0] - 1, rho_map=rho_map)
+    simul_roi = SimulationROI(**configs["roi"], pad=coefs.shape[0] - 1,
+                              rho_map=rho_map if mat_map is None else mat_map)
 
     # Configuracao dos transdutores
     simul_probes = list()
@@ -1467,23 +1279,44 @@ with open(args.config, 'r') as f:
     gpu_type = configs["simul_configs"]["gpu_type"]
     sim_interactive = bool(configs["simul_configs"]["sim_interactive"])
     source_env = bool(configs["simul_configs"]["source_env"])
+    src_rec_interp = configs["simul_configs"]["src_rec_interp"] if "src_rec_interp" in configs["simul_configs"] \
+        else "nearest"
+    gpu_kernels = list(configs["simul_configs"]["gpu_kernels"]) \
+        if "gpu_kernels" in configs["simul_configs"] else ["cell"]
+    for k in gpu_kernels:
+        if k not in ["cell", "march"]:
+            raise ValueError(f'gpu_kernels: tipo de kernel invalido ({k}). Use "cell" ou "march"')
+    thread_map = configs["simul_configs"]["thread_map"] if "thread_map" in configs["simul_configs"] else "z_fast"
+    if thread_map not in ("x_fast", "z_fast"):
+        raise ValueError(f'thread_map: {thread_map} nao e um mapeamento valido (x_fast, z_fast)')
+    thread_z_fast = thread_map == "z_fast"
+    ckpt_interval = int(configs["simul_configs"]["checkpoint_interval"]) \
+        if "checkpoint_interval" in configs["simul_configs"] else 0
+    ckpt_dir = configs["simul_configs"]["checkpoint_dir"] if "checkpoint_dir" in configs["simul_configs"] \
+        else "checkpoints"
+    ckpt_sig = get_checkpoint_signature(configs)
 
 # -----------------------
 # Inicializacao do WebGPU
 # -----------------------
+adapter = None
 device_gpu = None
-if do_sim_gpu:
+if do_sim_gpu or args.plan:
     # =====================
     # webgpu configurations
-    if gpu_type == "high-perf":
-        device_gpu = wgpu.utils.get_default_device()
+    # Os limites de tamanho de buffer e de storage buffers por estagio sao os do adaptador, em vez dos limites
+    # default do WebGPU
+    power_pref = "high-performance" if gpu_type == "high-perf" else "low-power"
+    if wgpu.version_info[1] > 11:
+        adapter = wgpu.gpu.request_adapter(power_preference=power_pref)  # 0.13.X
     else:
-        if wgpu.version_info[1] > 11:
-            adapter = wgpu.gpu.request_adapter(power_preference="low-power")  # 0.13.X
-        else:
-            adapter = wgpu.request_adapter(canvas=None, power_preference="low-power")  # 0.9.5
+        adapter = wgpu.request_adapter(canvas=None, power_preference=power_pref)  # 0.9.5
 
-        device_gpu = adapter.request_device()
+    # No planejamento de memoria apenas os limites do adaptador sao consultados
+    if not args.plan:
+        device_gpu = adapter.request_device(required_limits={_l: adapter.limits[_l] for _l in
+                                                             ["max-buffer-size", "max-storage-buffer-binding-size",
+                                                              "max-storage-buffers-per-shader-stage"]})
 
     # Escolha dos valores de wsx, wsy e wsz (GPU)
     wsx = np.gcd(simul_roi.get_nx(), 8)
@@ -1503,48 +1336,23 @@ one_dx = flt32(1.0 / dx)
 one_dy = flt32(1.0 / dy)
 one_dz = flt32(1.0 / dz)
 
-# Inicializa os mapas de densidade do meio
-# rho_grid_vx e a matriz das densidades no mesmo grid de vx
-rho_grid_vx = np.ones((nx, ny, nz), dtype=flt32) * rho
-if rho_map is not None:
-    if rho_map.shape[0] < nx and rho_map.shape[1] < ny and rho_map.shape[2] < nz:
-        rho_grid_vx[simul_roi.get_ix_min(): simul_roi.get_ix_max(),
-                    simul_roi.get_iy_min(): simul_roi.get_iy_max(),
-                    simul_roi.get_iz_min(): simul_roi.get_iz_max()] = rho_map
-    elif rho_map.shape[0] > nx and rho_map.shape[1] > ny and rho_map.shape[2] > nz:
-        rho_grid_vx = rho_map[:nx, :ny, :nz]
-    elif rho_map.shape[0] == nx and rho_map.shape[1] == ny and rho_map.shape[2] == nz:
-        rho_grid_vx = rho_map
-    else:
-        raise ValueError(f'rho_map shape {rho_map.shape} e incompativel com a ROI')
-
-# cp_grid_vx e a matriz das velocidades longitudinais no mesmo grid de vx
-cp_grid_vx = np.ones((nx, ny, nz), dtype=flt32) * cp
-if cp_map is not None:
-    if cp_map.shape[0] < nx and cp_map.shape[1] < ny and cp_map.shape[2] < nz:
-        cp_grid_vx[simul_roi.get_ix_min(): simul_roi.get_ix_max(),
-                   simul_roi.get_iy_min(): simul_roi.get_iy_max(),
-                   simul_roi.get_iz_min(): simul_roi.get_iz_max()] = cp_map
-    elif cp_map.shape[0] > nx and cp_map.shape[1] > ny and cp_map.shape[2] > nz:
-        cp_grid_vx = cp_map[:nx, :ny, :nz]
-    elif cp_map.shape[0] == nx and cp_map.shape[1] == ny and cp_map.shape[2] == nz:
-        cp_grid_vx = cp_map
-    else:
-        raise ValueError(f'cp_map shape {cp_map.shape} e incompativel com a ROI')
-
-# cs_grid_vx e a matriz das velocidades transversais no mesmo grid de vx
-cs_grid_vx = np.ones((nx, ny, nz), dtype=flt32) * cs
-if cs_map is not None:
-    if cs_map.shape[0] < nx and cs_map.shape[1] < ny and cs_map.shape[2] < nz:
-        cs_grid_vx[simul_roi.get_ix_min(): simul_roi.get_ix_max(),
-                   simul_roi.get_iy_min(): simul_roi.get_iy_max(),
-                   simul_roi.get_iz_min(): simul_roi.get_iz_max()] = cs_map
-    elif cs_map.shape[0] > nx and cs_map.shape[1] > ny and cs_map.shape[2] > nz:
-        cs_grid_vx = cs_map[:nx, :ny, :nz]
-    elif cs_map.shape[0] == nx and cs_map.shape[1] == ny and cs_map.shape[2] == nz:
-        cs_grid_vx = cs_map
-    else:
-        raise ValueError(f'cs_map shape {cs_map.shape} e incompativel com a ROI')
+# Indices do primeiro ponto da ROI no grid
+roi_ini = [simul_roi.get_ix_min(), simul_roi.get_iy_min(), simul_roi.get_iz_min()]
+
+# Inicializa a tabela do mapa de materiais do meio
+# Os pontos fora do mapa recebem o material homogeneo do corpo de prova (cp, cs, rho), acrescentado ao fim da
+# tabela. Os grids do meio sao montados somente depois da verificacao do plano de memoria
+mat_grid = None
+mat_bits = 8
+mat_num = 1
+if mat_map is not None:
+    mat_table = np.vstack((mat_table, [[cp, cs, rho]])).astype(flt32)
+    if mat_table.shape[0] > 65536:
+        raise ValueError(f'Numero de materiais ({mat_table.shape[0]}) maior que o suportado (65536)')
+
+    mat_bits = 8 if mat_table.shape[0] <= 256 else 16
+    mat_num = mat_table.shape[0] + 1
+    print(f'Mapa de materiais com {mat_table.shape[0]} materiais ({mat_bits} bits por ponto)')
 
 # Numero total de passos de tempo
 NSTEP = configs["simul_params"]["time_steps"]
@@ -1555,37 +1363,126 @@ dt = flt32(configs["simul_params"]["dt"])
 # Numero de iteracoes de tempo para apresentar e armazenar informacoes
 IT_DISPLAY = configs["simul_params"]["it_display"]
 
-# Pega as listas de todos os pontos transmissores e receptores de todos os transdutores configurados
-i_probe_tx_ptos = list()
-i_probe_rx_ptos = list()
+# Fator de decimacao dos planos de pre-visualizacao
+preview_dec = max(int(configs["simul_configs"]["preview_decimation"]), 1) \
+    if "preview_decimation" in configs["simul_configs"] else 1
+
+# Fator de decimacao dos sinais dos receptores (armazena uma amostra a cada ``rec_decim`` passos de tempo)
+rec_decim = max(int(configs["simul_params"]["record_decimation"]), 1) \
+    if "record_decimation" in configs["simul_params"] else 1
+NSTEP_REC = (NSTEP + rec_decim - 1) // rec_decim
+dec_filter = get_decimation_filter(rec_decim)
+
+# Pega os operadores de injecao das fontes e de interpolacao dos receptores de todos os transdutores configurados.
+# Cada entrada relaciona um ponto da grade a uma coluna (termo de fonte ou receptor) com um peso.
+op_src_idx = list()
+op_src_col = list()
+op_src_w = list()
+op_rec_idx = list()
+op_rec_col = list()
+op_rec_w = list()
 delay_recv = list()
 NREC = 0
+n_src_col = 0
 for pr in simul_probes:
-    i_probe_tx_ptos += pr.get_points_roi(simul_roi, simul_type="3d", dir="e")[0]
-    i_probe_rx_ptos += pr.get_points_roi(simul_roi, simul_type="3d", dir="r")[0]
+    _idx, _col, _w = pr.get_interp_operator(simul_roi, simul_type="3d", dir="e", interp=src_rec_interp)
+    op_src_idx.append(_idx)
+    op_src_col.append(_col + n_src_col)
+    op_src_w.append(_w)
+    _idx, _col, _w = pr.get_interp_operator(simul_roi, simul_type="3d", dir="r", interp=src_rec_interp)
+    op_rec_idx.append(_idx)
+    op_rec_col.append(_col + NREC)
+    op_rec_w.append(_w)
     delay_recv += pr.get_delay_rx()
     NREC += pr.receivers.count(True)
-
-# Define a posicao das fontes
-i_probe_tx_ptos = np.array(i_probe_tx_ptos, dtype=np.int32).reshape(-1, 3)
-ix_src = i_probe_tx_ptos[:, 0].astype(np.int32)
-iy_src = i_probe_tx_ptos[:, 1].astype(np.int32)
-iz_src = i_probe_tx_ptos[:, 2].astype(np.int32)
-NSRC = i_probe_tx_ptos.shape[0]
-
-# Define a localizacao dos receptores
-i_probe_rx_ptos = np.array(i_probe_rx_ptos, dtype=np.int32).reshape(-1, 3)
-ix_rec = i_probe_rx_ptos[:, 0].astype(np.int32)
-iy_rec = i_probe_rx_ptos[:, 1].astype(np.int32)
-iz_rec = i_probe_rx_ptos[:, 2].astype(np.int32)
+    n_src_col += pr.num_elem
+
+op_src_idx = np.concatenate(op_src_idx)
+op_src_col = np.concatenate(op_src_col)
+op_src_w = np.concatenate(op_src_w)
+op_rec_idx = np.concatenate(op_rec_idx)
+op_rec_col = np.concatenate(op_rec_col)
+op_rec_w = np.concatenate(op_rec_w)
+
+# Operadores esparsos para a CPU, sobre os pontos da grade (indices lineares) que sao fontes ou receptores
+src_nodes, inv = np.unique(np.ravel_multi_index(op_src_idx.T, (nx, ny, nz)), return_inverse=True)
+op_src = csr_matrix((op_src_w, (inv.flatten(), op_src_col)), shape=(src_nodes.shape[0], n_src_col), dtype=flt32)
+rec_nodes, inv = np.unique(np.ravel_multi_index(op_rec_idx.T, (nx, ny, nz)), return_inverse=True)
+op_rec = csr_matrix((op_rec_w, (op_rec_col, inv.flatten())), shape=(NREC, rec_nodes.shape[0]), dtype=flt32)
+NSRC = src_nodes.shape[0]
 
 # Calcula o delay de recepcao dos receptores
 delay_recv = (np.array(delay_recv) / dt + 1.0).astype(np.int32)
 
 # for evolution of total energy in the medium
-v_2 = np.zeros((nx, ny, nz), dtype=flt32)
 v_solid_norm = np.zeros(NSTEP, dtype=flt32)
 
+print(f'3D elastic finite-difference code in velocity and stress formulation with C-PML')
+print(f'NX = {nx}')
+print(f'NY = {ny}')
+print(f'NZ = {nz}')
+print(f'Total de pontos no grid = {nx * ny * nz}\n')
+
+# Plano de memoria do host e da GPU (quantidade e tamanho em bytes dos arrays), verificado com os limites do
+# adaptador e com a RAM do host antes das alocacoes
+fld_sz = nx * ny * nz * np.dtype(flt32).itemsize
+sens_sz = NSTEP_REC * NREC * np.dtype(flt32).itemsize
+src_sz = NSTEP * n_src_col * np.dtype(flt32).itemsize
+lbl_sz = nx * ny * nz * mat_bits // 8
+map_key = "mapa de materiais" if mat_map is not None else "mapas do meio"
+host_arrays = {"campos": (9, fld_sz), "memorias da CPML": (18, fld_sz), "derivadas (CPU)": (18, fld_sz),
+               map_key: (1, lbl_sz) if mat_map is not None else (3, fld_sz),
+               "sinais dos receptores": (3, sens_sz)}
+gpu_buffers = dict()
+slab_args = None
+if do_sim_gpu or args.plan:
+    pv_pts = [-(-(simul_roi.get_ix_max() - simul_roi.get_ix_min()) // preview_dec),
+              -(-(simul_roi.get_iy_max() - simul_roi.get_iy_min()) // preview_dec),
+              -(-(simul_roi.get_iz_max() - simul_roi.get_iz_min()) // preview_dec)]
+    host_arrays.update({"termos de fonte": (1, src_sz),
+                        "resultados da GPU": (3, fld_sz)})
+    gpu_buffers = {"campos": (9, fld_sz), "memorias da CPML": (18, fld_sz),
+                   map_key: (1, -(-lbl_sz // 4) * 4) if mat_map is not None else (3, fld_sz),
+                   "termos de fonte": (1, src_sz), "pesos das fontes": (1, op_src_w.shape[0] * 12 + (NSRC + 1) * 4),
+                   "sinais dos receptores": (3, sens_sz), "pesos dos receptores": (1, op_rec_w.shape[0] * 20),
+                   "historico da norma": (1, NSTEP * np.dtype(np.uint32).itemsize),
+                   "pre-visualizacao": (1, 3 * (pv_pts[0] * pv_pts[1] + pv_pts[0] * pv_pts[2] + pv_pts[1] * pv_pts[2]) *
+                                        np.dtype(flt32).itemsize),
+                   "perfis da CPML": (1, (nx + ny + nz) * 32)}
+    slab_args = dict(nx=nx, plane_bytes=[ny * nz * np.dtype(flt32).itemsize] +
+                                        ([ny * nz * mat_bits // 8] if mat_map is not None else []),
+                     halo=coefs.shape[0], x_mult=wsx)
+
+# Checkpoints: uma copia do estado do simulador no host e um buffer de staging reaproveitado na GPU
+if ckpt_interval > 0:
+    host_arrays["estado do checkpoint"] = (1, 27 * fld_sz + 3 * sens_sz + NSTEP * 4)
+    if gpu_buffers:
+        gpu_buffers["staging do checkpoint"] = (1, max(fld_sz, sens_sz, NSTEP * 4))
+adapter_limits = None if adapter is None else \
+    {_l: adapter.limits[_l] for _l in ["max-buffer-size", "max-storage-buffer-binding-size",
+                                       "min-storage-buffer-offset-alignment"]}
+mem_plan = get_memory_plan(host_arrays, gpu_buffers, limits=adapter_limits, host_ram=get_host_ram(),
+                           cpu_fallback=True, slabs=slab_args,
+                           slab_keys=["campos", "memorias da CPML", map_key, "staging do checkpoint"],
+                           rec_keys=["sinais dos receptores"], rec_decim=rec_decim,
+                           rec_decim_max=get_max_rec_decimation(simul_probes, dt),
+                           f16=adapter is not None and "shader-f16" in adapter.features)
+print_memory_plan(mem_plan)
+if args.plan:
+    exit(0)
+
+# Inicializa os grids do meio no mesmo grid de vx
+# mat_grid e a matriz dos rotulos dos materiais. Sem o mapa de materiais, sao usados os mapas de densidade e
+# velocidades do meio
+if mat_map is not None:
+    mat_grid = get_map_grid(mat_map, (nx, ny, nz), mat_table.shape[0] - 1, offset=map_offset, roi_ini=roi_ini,
+                            dtype=np.uint8 if mat_bits == 8 else np.uint16)
+    rho_grid_vx = cp_grid_vx = cs_grid_vx = None
+else:
+    rho_grid_vx = get_map_grid(rho_map, (nx, ny, nz), rho, offset=map_offset, roi_ini=roi_ini)
+    cp_grid_vx = get_map_grid(cp_map, (nx, ny, nz), cp, offset=map_offset, roi_ini=roi_ini)
+    cs_grid_vx = get_map_grid(cs_map, (nx, ny, nz), cs, offset=map_offset, roi_ini=roi_ini)
+
 # Arrays para as variaveis de memoria do calculo
 memory_dvx_dx = np.zeros((nx, ny, nz), dtype=flt32)
 memory_dvx_dy = np.zeros((nx, ny, nz), dtype=flt32)
@@ -1635,17 +1532,6 @@ sigmaxy = np.zeros((nx, ny, nz), dtype=flt32)
 sigmaxz = np.zeros((nx, ny, nz), dtype=flt32)
 sigmayz = np.zeros((nx, ny, nz), dtype=flt32)
 
-# Total de arrays para o campo de simulacao (ROI) na GPU
-N_ARRAYS = 3 + 6 + 2 * 9
-
-print(f'3D elastic finite-difference code in velocity and stress formulation with C-PML')
-print(f'NX = {nx}')
-print(f'NY = {ny}')
-print(f'NZ = {nz}')
-print(f'Total de pontos no grid = {nx * ny * nz}')
-print(f'Number of points of all the arrays = {nx * ny * nz * N_ARRAYS}')
-print(f'Size in GB of all the arrays = {nx * ny * nz * N_ARRAYS * 4 / (1024 * 1024 * 1024)}\n')
-
 # Valor da potencia para calcular "d0"
 NPOWER = flt32(configs["simul_params"]["npower"])
 if NPOWER < 1:
@@ -1714,9 +1600,10 @@ print(f'Existem {NSRC} fontes')
 print(f'Existem {NREC} receptores')
 
 # Arrays para armazenamento dos sinais dos sensores
-sisvx = np.zeros((NSTEP, NREC), dtype=flt32)
-sisvy = np.zeros((NSTEP, NREC), dtype=flt32)
-sisvz = np.zeros((NSTEP, NREC), dtype=flt32)
+print(f'Sinais dos receptores com {NSTEP_REC} amostras (decimacao {rec_decim}, dt = {dt * rec_decim})')
+sisvx = np.zeros((NSTEP_REC, NREC), dtype=flt32)
+sisvy = np.zeros((NSTEP_REC, NREC), dtype=flt32)
+sisvz = np.zeros((NSTEP_REC, NREC), dtype=flt32)
 
 # Define os indices dos planos de visualizacao
 # x_plane_idx = int(nx / 2) if show_yz else 0
@@ -1737,128 +1624,85 @@ if courant_number > 1:
 
 # Listas para armazenamento de resultados (tempos de execucao e sinais nos sensores)
 times_gpu = list()
+times_gpu_kernels = dict()
 times_cpu = list()
 sensor_gpu_result = list()
 sensor_cpu_result = list()
 
-# Configuracao e inicializacao da janela de exibicao
+# Configuracao e inicializacao da janela de exibicao (em um processo separado)
+viewer_cpu = None
+viewer_gpu = None
 if show_anim and sim_interactive:
-    App = pg.QtWidgets.QApplication([])
+    planes = [("XY", show_xy, (simul_roi.get_nx(), simul_roi.get_ny()), (simul_roi.get_len_x(), simul_roi.get_len_y())),
+              ("XZ", show_xz, (simul_roi.get_nx(), simul_roi.get_nz()), (simul_roi.get_len_x(), simul_roi.get_len_z())),
+              ("YZ", show_yz, (simul_roi.get_ny(), simul_roi.get_nz()), (simul_roi.get_len_y(), simul_roi.get_len_z()))]
     if do_sim_cpu:
         x_pos = 200 + np.arange(3) * (nx + 50)
         y_pos = 500 + np.arange(3) * (ny + 50)
-        windows_cpu_data = [
-            {"title": "Vx - Plano XY [CPU]",
-             "geometry": (x_pos[0], y_pos[0], simul_roi.get_nx(), simul_roi.get_ny()),
-             "show": show_xy},
-            {"title": "Vy - Plano XY [CPU]",
-             "geometry": (x_pos[1], y_pos[0], simul_roi.get_nx(), simul_roi.get_ny()),
-             "show": show_xy},
-            {"title": "Vz - Plano XY [CPU]",
-             "geometry": (x_pos[2], y_pos[0], simul_roi.get_nx(), simul_roi.get_ny()),
-             "show": show_xy},
-            {"title": "Vx - Plano XZ [CPU]",
-             "geometry": (x_pos[0], y_pos[1], simul_roi.get_nx(), simul_roi.get_nz()),
-             "show": show_xz},
-            {"title": "Vy - Plano XZ [CPU]",
-             "geometry": (x_pos[1], y_pos[1], simul_roi.get_nx(), simul_roi.get_nz()),
-             "show": show_xz},
-            {"title": "Vz - Plano XZ [CPU]",
-             "geometry": (x_pos[2], y_pos[1], simul_roi.get_nx(), simul_roi.get_nz()),
-             "show": show_xz},
-            {"title": "Vx - Plano YZ [CPU]",
-             "geometry": (x_pos[0], y_pos[2], simul_roi.get_ny(), simul_roi.get_nz()),
-             "show": show_yz},
-            {"title": "Vy - Plano YZ [CPU]",
-             "geometry": (x_pos[1], y_pos[2], simul_roi.get_ny(), simul_roi.get_nz()),
-             "show": show_yz},
-            {"title": "Vz - Plano YZ [CPU]",
-             "geometry": (x_pos[2], y_pos[2], simul_roi.get_ny(), simul_roi.get_nz()),
-             "show": show_yz},
-        ]
-        windows_cpu = [Window(title=data["title"], geometry=data["geometry"]) for data in windows_cpu_data
-                       if data["show"]]
+        viewer_cpu = SimulationViewer([
+            {"title": f"{f} - Plano {pl} [CPU]", "geometry": (x_pos[i_f], y_pos[i_pl], *win_size), "shape": roi_size}
+            for i_pl, (pl, show_pl, win_size, roi_size) in enumerate(planes) if show_pl
+            for i_f, f in enumerate(["Vx", "Vy", "Vz"])
+        ])
 
     if do_sim_gpu:
         x_pos = 200 + np.arange(3) * (nx + 50)
         y_pos = 100 + np.arange(3) * (ny + 50)
-        windows_gpu_data = [
-            {"title": "Vx - Plano XY [GPU]",
-             "geometry": (x_pos[0], y_pos[0], simul_roi.get_nx(), simul_roi.get_ny()),
-             "show": show_xy},
-            {"title": "Vy - Plano XY [GPU]",
-             "geometry": (x_pos[1], y_pos[0], simul_roi.get_nx(), simul_roi.get_ny()),
-             "show": show_xy},
-            {"title": "Vz - Plano XY [GPU]",
-             "geometry": (x_pos[2], y_pos[0], simul_roi.get_nx(), simul_roi.get_ny()),
-             "show": show_xy},
-            {"title": "Vx - Plano XZ [GPU]",
-             "geometry": (x_pos[0], y_pos[1], simul_roi.get_nx(), simul_roi.get_nz()),
-             "show": show_xz},
-            {"title": "Vy - Plano XZ [GPU]",
-             "geometry": (x_pos[1], y_pos[1], simul_roi.get_nx(), simul_roi.get_nz()),
-             "show": show_xz},
-            {"title": "Vz - Plano XZ [GPU]",
-             "geometry": (x_pos[2], y_pos[1], simul_roi.get_nx(), simul_roi.get_nz()),
-             "show": show_xz},
-            {"title": "Vx - Plano YZ [GPU]",
-             "geometry": (x_pos[0], y_pos[2], simul_roi.get_ny(), simul_roi.get_nz()),
-             "show": show_yz},
-            {"title": "Vy - Plano YZ [GPU]",
-             "geometry": (x_pos[1], y_pos[2], simul_roi.get_ny(), simul_roi.get_nz()),
-             "show": show_yz},
-            {"title": "Vz - Plano YZ [GPU]",
-             "geometry": (x_pos[2], y_pos[2], simul_roi.get_ny(), simul_roi.get_nz()),
-             "show": show_yz},
-        ]
-        windows_gpu = [Window(title=data["title"], geometry=data["geometry"]) for data in windows_gpu_data
-                       if data["show"]]
-else:
-    App = None
+        viewer_gpu = SimulationViewer([
+            {"title": f"{f} - Plano {pl} [GPU]", "geometry": (x_pos[i_f], y_pos[i_pl], *win_size),
+             "shape": tuple(-(-d // preview_dec) for d in roi_size)}
+            for i_pl, (pl, show_pl, win_size, roi_size) in enumerate(planes) if show_pl
+            for i_f, f in enumerate(["Vx", "Vy", "Vz"])
+        ])
 
 # WebGPU
 if do_sim_gpu:
-    for n in range(n_iter_gpu):
-        print(f'Simulacao WEBGPU')
-        print(f'wsx = {wsx}, wsy = {wsy}, wsz = {wsz}')
-        print(f'Iteracao {n}')
-        t_gpu = time()
-        (vx_gpu, vy_gpu, vz_gpu, sensor_vx_gpu, sensor_vy_gpu, sensor_vz_gpu,
-         v_solid_norm_gpu, gpu_str) = sim_webgpu(device_gpu)
-        times_gpu.append(time() - t_gpu)
-        print(gpu_str)
-        print(f'{times_gpu[-1]:.3}s')
-
-        # Plota as velocidades tomadas no sensores
-        if plot_results and plot_sensors:
-            for r in range(NREC):
-                fig, ax = plt.subplots(4, sharex=True, sharey=True)
-                fig.suptitle(f'Receptor {r + 1} [GPU]')
-                ax[0].plot(sensor_vx_gpu[:, r])
-                ax[0].set_title(r'$V_x$')
-                ax[1].plot(sensor_vy_gpu[:, r])
-                ax[1].set_title(r'$V_y$')
-                ax[2].plot(sensor_vz_gpu[:, r])
-                ax[2].set_title(r'$V_z$')
-                ax[3].plot(sensor_vx_gpu[:, r] + sensor_vy_gpu[:, r] + sensor_vz_gpu[:, r], 'tab:orange')
-                ax[3].set_title(r'$V_x + V_y + V_z$')
-                sensor_gpu_result.append(fig)
-
-            if show_results:
-                plt.show(block=False)
-
-        if plot_results and plot_bscan:
-            gpu_bscan_sim_result = plt.figure()
-            plt.title(f'GPU simulation B-scan\n[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
-            plt.imshow(sensor_vx_gpu + sensor_vy_gpu, aspect='auto', cmap='viridis')
-            plt.colorbar()
-
-            if show_results:
-                plt.show(block=False)
-
-        if save_bscan:
-            name = f'results/bscan_2D_elast_CPML_{datetime.now().strftime("%Y%m%d-%H%M%S")}_GPU'
-            np.save(name, sensor_vx_gpu + sensor_vy_gpu)
+    for kernel in gpu_kernels:
+        times_gpu = list()
+        for n in range(n_iter_gpu):
+            print(f'Simulacao WEBGPU')
+            print(f'wsx = {wsx}, wsy = {wsy}, wsz = {wsz}, thread_map = {thread_map}')
+            print(f'Kernels: {kernel}')
+            print(f'Iteracao {n}')
+            t_gpu = time()
+            (vx_gpu, vy_gpu, vz_gpu, sensor_vx_gpu, sensor_vy_gpu, sensor_vz_gpu,
+             v_solid_norm_gpu, gpu_str) = sim_webgpu(device_gpu, f'3D_elast_CPML_GPU_{kernel}_iter_{n}', kernel)
+            times_gpu.append(time() - t_gpu)
+            print(gpu_str)
+            print(f'{times_gpu[-1]:.3}s')
+
+            # Plota as velocidades tomadas no sensores
+            if plot_results and plot_sensors:
+                for r in range(NREC):
+                    fig, ax = plt.subplots(4, sharex=True, sharey=True)
+                    fig.suptitle(f'Receptor {r + 1} [GPU]')
+                    ax[0].plot(sensor_vx_gpu[:, r])
+                    ax[0].set_title(r'$V_x$')
+                    ax[1].plot(sensor_vy_gpu[:, r])
+                    ax[1].set_title(r'$V_y$')
+                    ax[2].plot(sensor_vz_gpu[:, r])
+                    ax[2].set_title(r'$V_z$')
+                    ax[3].plot(sensor_vx_gpu[:, r] + sensor_vy_gpu[:, r] + sensor_vz_gpu[:, r], 'tab:orange')
+                    ax[3].set_title(r'$V_x + V_y + V_z$')
+                    sensor_gpu_result.append(fig)
+
+                if show_results:
+                    plt.show(block=False)
+
+            if plot_results and plot_bscan:
+                gpu_bscan_sim_result = plt.figure()
+                plt.title(f'GPU simulation B-scan\n[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
+                plt.imshow(sensor_vx_gpu + sensor_vy_gpu, aspect='auto', cmap='viridis')
+                plt.colorbar()
+
+                if show_results:
+                    plt.show(block=False)
+
+            if save_bscan:
+                name = f'results/bscan_2D_elast_CPML_{datetime.now().strftime("%Y%m%d-%H%M%S")}_GPU'
+                np.save(name, sensor_vx_gpu + sensor_vy_gpu)
+
+        times_gpu_kernels[kernel] = np.array(times_gpu)
 
 # CPU
 if do_sim_cpu:
@@ -1866,7 +1710,7 @@ if do_sim_cpu:
         print(f'SIMULACAO CPU')
         print(f'Iteracao {n}')
         t_cpu = time()
-        sim_cpu()
+        sim_cpu(f'3D_elast_CPML_CPU_iter_{n}')
         times_cpu.append(time() - t_cpu)
         print(f'{times_cpu[-1]:.3}s')
 
@@ -1901,17 +1745,18 @@ if do_sim_cpu:
             name = f'results/bscan_3D_elast_CPML_{datetime.now().strftime("%Y%m%d-%H%M%S")}_CPU'
             np.save(name, sisvx + sisvy)
 
-if show_anim and App:
-    App.exit()
+for viewer in [viewer_cpu, viewer_gpu]:
+    if viewer is not None:
+        viewer.close()
 
-times_gpu = np.array(times_gpu)
 times_cpu = np.array(times_cpu)
 if do_sim_gpu:
     print(f'workgroups X: {wsx}; workgroups Y: {wsy}; workgroups Z: {wsz}')
 
 print(f'TEMPO - {NSTEP} pontos de tempo')
 if do_sim_gpu and n_iter_gpu > 5:
-    print(f'GPU: {times_gpu[5:].mean():.3}s (std = {times_gpu[5:].std()})')
+    for kernel, t_k in times_gpu_kernels.items():
+        print(f'GPU [{kernel}]: {t_k[5:].mean():.3}s (std = {t_k[5:].std()})')
 
 if do_sim_cpu and n_iter_cpu > 5:
     print(f'CPU: {times_cpu[5:].mean():.3}s (std = {times_cpu[5:].std()})')
@@ -2326,24 +2171,29 @@ if save_results:
                 vy_comp_sim_yz_result.savefig(name + 'Vy_YZ_comp_cpu_gpu_' + gpu_type + '.png')
                 vz_comp_sim_yz_result.savefig(name + 'Vz_YZ_comp_cpu_gpu_' + gpu_type + '.png')
 
-    np.savetxt(name + '_GPU_' + gpu_type + '.csv', times_gpu, '%10.3f', delimiter=',')
+    # Um arquivo de tempos por tipo de kernel
+    for kernel, t_k in times_gpu_kernels.items():
+        np.savetxt(name + f'_GPU_{kernel}_' + gpu_type + '.csv', t_k, '%10.3f', delimiter=',')
     np.savetxt(name + '_CPU.csv', times_cpu, '%10.3f', delimiter=',')
     with open(name + '_desc.txt', 'w') as f:
         f.write('Parametros do ensaio\n')
         f.write('--------------------\n')
         f.write('\n')
         f.write(f'Quantidade de iteracoes no tempo: {NSTEP}\n')
+        f.write(f'Decimacao dos sinais dos receptores: {rec_decim} ({NSTEP_REC} amostras)\n')
         f.write(f'Tamanho da ROI: {simul_roi.get_len_x()}x{simul_roi.get_len_y()}x{simul_roi.get_len_z()}\n')
         f.write(f'Refletores na ROI: {"Sim" if use_refletors else "Nao"}\n')
         f.write(f'Simulacao GPU: {"Sim" if do_sim_gpu else "Nao"}\n')
         if do_sim_gpu:
             f.write(f'GPU: {gpu_str}\n')
             f.write(f'Numero de simulacoes GPU: {n_iter_gpu}\n')
-            if n_iter_gpu > 5:
-                f.write(f'Tempo medio de execucao: {times_gpu[5:].mean():.3}s\n')
-                f.write(f'Desvio padrao: {times_gpu[5:].std()}\n')
-            else:
-                f.write(f'Tempo execucao: {times_gpu[0]:.3}s\n')
+            f.write(f'Kernels GPU: {", ".join(gpu_kernels)}\n')
+            for kernel, t_k in times_gpu_kernels.items():
+                if n_iter_gpu > 5:
+                    f.write(f'Tempo medio de execucao [{kernel}]: {t_k[5:].mean():.3}s\n')
+                    f.write(f'Desvio padrao [{kernel}]: {t_k[5:].std()}\n')
+                else:
+                    f.write(f'Tempo execucao [{kernel}]: {t_k[0]:.3}s\n')
 
         f.write(f'Simulacao CPU: {"Sim" if do_sim_cpu else "Nao"}\n')
         if do_sim_cpu:
@@ -1,329 +1,1337 @@
 import wgpu
+
 if wgpu.version_info[1] > 11:
     import wgpu.backends.wgpu_native  # Select backend 0.13.X
 else:
     import wgpu.backends.rs  # Select backend 0.9.5
 
+from datetime import datetime
 import numpy as np
-# from sklearn.metrics import mean_squared_error
-# import matplotlib.pyplot as plt
+import argparse
+import ast
+from scipy.sparse import csr_matrix
+import matplotlib.pyplot as plt
 from time import time
-# from datetime import datetime
-from PyQt6.QtWidgets import *
-import pyqtgraph as pg
-from pyqtgraph.widgets.RawImageWidget import RawImageWidget
-
+from simul_utils import SimulationROI, SimulationProbeLinearArray, get_decimation_filter, get_decimated_idx
+from simul_utils import get_material_table, pack_material_grid
+from simul_utils import load_map, get_map_grid
+from simul_utils import get_host_ram, get_max_rec_decimation, get_memory_plan, print_memory_plan
+from simul_utils import get_fd_tables, get_shader_code, get_x_slabs, pack_pml_coeffs, StagingPool
+from simul_utils import get_bind_group, get_slab_entries, get_storage_bindings
+from simul_utils import get_sls_relaxation_times
+from simul_utils import CheckpointWriter, get_checkpoint_signature, load_checkpoint
+from simul_viewer import SimulationViewer
 
 # ==========================================================
-# Esse arquivo contém as simulações realizadas dentro da GPU.
+# Esse arquivo contem as simulacoes realizadas dentro da GPU.
+# Modelo viscoelastico com n_sls solidos lineares padrao.
 # ==========================================================
+flt32 = np.float32
 
-# Código para visualização da janela de simulação
-# Image View class
-class ImageView(pg.ImageView):
-    # constructor which inherit original
-    # ImageView
-    def __init__(self, *args, **kwargs):
-        pg.ImageView.__init__(self, *args, **kwargs)
+# Tamanho do workgroup do kernel de fontes (um thread por ponto da grade com fonte)
+WS_SRC = 64
 
+# Arrays do estado do simulador em CPU gravados nos checkpoints
+CPU_STATE = ["vx", "vy", "vz", "sigmaxx", "sigmayy", "sigmazz", "sigmaxy", "sigmaxz", "sigmayz",
+             "memory_dvx_dx", "memory_dvx_dy", "memory_dvx_dz",
+             "memory_dvy_dx", "memory_dvy_dy", "memory_dvy_dz",
+             "memory_dvz_dx", "memory_dvz_dy", "memory_dvz_dz",
+             "memory_dsigmaxx_dx", "memory_dsigmayy_dy", "memory_dsigmazz_dz",
+             "memory_dsigmaxy_dx", "memory_dsigmaxy_dy",
+             "memory_dsigmaxz_dx", "memory_dsigmaxz_dz",
+             "memory_dsigmayz_dy", "memory_dsigmayz_dz",
+             "sisvx", "sisvy", "sisvz", "v_solid_norm",
+             "e1", "e11", "e22", "e12", "e13", "e23"]
 
-# Window class
-class Window(QMainWindow):
-    def __init__(self, title=None):
-        super().__init__()
 
-        # setting title
-        if title is None:
-            self.setWindowTitle(f"{ny}x{nx} Grid x {NSTEP} iterations - dx = {dx} m x dy = {dy} m x dt = {dt} s")
+# --------------------------
+# Funcao do simulador em CPU
+# --------------------------
+def sim_cpu(ckpt_tag):
+    global simul_probes, coefs
+    global a_x, a_x_half, b_x, b_x_half, k_x, k_x_half
+    global a_y, a_y_half, b_y, b_y_half, k_y, k_y_half
+    global a_z, a_z_half, b_z, b_z_half, k_z, k_z_half
+    global vx, vy, vz, sigmaxx, sigmayy, sigmazz, sigmaxy, sigmaxz, sigmayz
+    global memory_dvx_dx, memory_dvx_dy, memory_dvx_dz
+    global memory_dvy_dx, memory_dvy_dy, memory_dvy_dz
+    global memory_dvz_dx, memory_dvz_dy, memory_dvz_dz
+    global memory_dsigmaxx_dx, memory_dsigmayy_dy, memory_dsigmazz_dz
+    global memory_dsigmaxy_dx, memory_dsigmaxy_dy
+    global memory_dsigmaxz_dx, memory_dsigmaxz_dz
+    global memory_dsigmayz_dy, memory_dsigmayz_dz
+    global sisvx, sisvy, sisvz
+    global src_nodes, rec_nodes, op_src, op_rec, delay_recv
+    global v_solid_norm
+    global rho_grid_vx, cp_grid_vx, cs_grid_vx, mat_grid, mat_table
+    global e1, e11, e22, e12, e13, e23, idx_att_grid
+    global viewer_cpu
+
+    _ord = coefs.shape[0]
+    one_d = [one_dx, one_dy, one_dz]
+
+    ix_min = simul_roi.get_ix_min()
+    ix_max = simul_roi.get_ix_max()
+    iy_min = simul_roi.get_iy_min()
+    iy_max = simul_roi.get_iy_max()
+    iz_min = simul_roi.get_iz_min()
+    iz_max = simul_roi.get_iz_max()
+
+    # Obtem os termos de fonte dos transdutores (uma coluna por elemento de cada transdutor)
+    source_term = list()
+    for _pr in simul_probes:
+        if source_env:
+            source_term.append(_pr.get_source_term(samples=NSTEP, dt=dt, out='e'))
         else:
-            self.setWindowTitle(title)
-
-        # setting geometry
-        # self.setGeometry(200, 50, 1600, 800)
-        self.setGeometry(200, 50, 500, 500)
-
-        # setting animation
-        self.isAnimated()
-
-        # setting image
-        self.image = np.random.normal(size=(500, 500))
-
-        # showing all the widgets
-        self.show()
+            source_term.append(_pr.get_source_term(samples=NSTEP, dt=dt))
+
+    # Source terms
+    source_term = np.concatenate(source_term, axis=1)
+    if save_sources:
+        np.save(f'results/sources_3D_viscoelast_CPML_{datetime.now().strftime("%Y%m%d-%H%M%S")}_CPU', source_term)
+
+    # Regiao de atualizacao de um campo, como em is_inside() do shader: em cada eixo, [ord - 1, n - ord) no meio
+    # grid (half) ou [ord, n - ord + 1) no grid inteiro
+    def get_region(half):
+        return tuple(slice(_ord - 1, n - _ord) if h else slice(_ord, n - _ord + 1) for n, h in zip((nx, ny, nz), half))
+
+    # Derivada de f ao longo do eixo ax nos pontos da regiao rgn (estencil do meio grid se half)
+    def get_diff(f, ax, rgn, half):
+        d = 0.0
+        for c in range(_ord):
+            o_a, o_b = (c + 1, -c) if half else (c, -c - 1)
+            s_a = list(rgn)
+            s_b = list(rgn)
+            s_a[ax] = slice(rgn[ax].start + o_a, rgn[ax].stop + o_a)
+            s_b[ax] = slice(rgn[ax].start + o_b, rgn[ax].stop + o_b)
+            d = d + coefs[c] * (f[tuple(s_a)] - f[tuple(s_b)]) * one_d[ax]
+        return d
+
+    # Aplica a CPML na derivada d (eixo ax, regiao rgn), atualizando a variavel de memoria mem.
+    # Os perfis de amortecimento comecam no ponto ord - 1 do grid
+    pml = {(0, False): (a_x, b_x, k_x), (0, True): (a_x_half, b_x_half, k_x_half),
+           (1, False): (a_y, b_y, k_y), (1, True): (a_y_half, b_y_half, k_y_half),
+           (2, False): (a_z, b_z, k_z), (2, True): (a_z_half, b_z_half, k_z_half)}
+
+    def get_cpml(d, mem, ax, rgn, half):
+        s = [slice(None)] * 3
+        s[ax] = slice(rgn[ax].start - _ord + 1, rgn[ax].stop - _ord + 1)
+        a, b, k = [p[tuple(s)] for p in pml[(ax, half)]]
+        mem[rgn] = b * mem[rgn] + a * d
+        return d / k + mem[rgn]
+
+    # Evolucao de uma variavel de memoria de um SLS por um passo de tempo (Crank-Nicolson, como no shader)
+    def evolve_sls(un, sn, inv_tau_sigma):
+        return (un + dt * (sn - 0.5 * inv_tau_sigma * un)) / (1.0 + dt * 0.5 * inv_tau_sigma)
+
+    # Valor de p no ponto seguinte ao longo do eixo ax (zero fora do dominio, como o material nulo do shader)
+    def get_next(p, ax):
+        p_n = np.zeros_like(p)
+        s = [slice(None)] * 3
+        s_n = [slice(None)] * 3
+        s[ax] = slice(1, None)
+        s_n[ax] = slice(None, -1)
+        p_n[tuple(s_n)] = p[tuple(s)]
+        return p_n
+
+    # Celulas com atenuacao de uma regiao (mascara e indices compactos nas variaveis de memoria dos SLS)
+    def get_att(rgn):
+        idx = idx_att_grid[rgn]
+        return idx != -1, idx[idx != -1]
+
+    # Propriedades do meio no grid de vx (com mapa de materiais, lidas da tabela de materiais)
+    if mat_grid is not None:
+        rho_c, cp_c, cs_c = [mat_table[mat_grid, _p] for _p in (2, 0, 1)]
+    else:
+        rho_c, cp_c, cs_c = rho_grid_vx, cp_grid_vx, cs_grid_vx
+    att_c = idx_att_grid != -1
+
+    # Parametros de Lame relaxados e nao relaxados (Carcione pagina 111) das tensoes normais.
+    # As celulas elasticas usam apenas os parametros relaxados
+    lambda_r = rho_c * (cp_c * cp_c - 2.0 * cs_c * cs_c)
+    mu_r = rho_c * (cs_c * cs_c)
+    kappa_r = lambda_r + 2.0 / 3.0 * mu_r
+    lambda_n = np.where(att_c, kappa_r * Mu_nu1 - 2.0 / 3.0 * mu_r * Mu_nu2, lambda_r)
+    mu_n = np.where(att_c, mu_r * Mu_nu2, mu_r)
+
+    # Modulos de cisalhamento relaxados nos pontos das tensoes de cisalhamento (media dos 4 pontos vizinhos)
+    mu_r_sh = list()
+    for ax_a, ax_b in [(0, 1), (0, 2), (1, 2)]:
+        rho_s = 0.25 * (get_next(rho_c, ax_a) + rho_c + get_next(rho_c, ax_b) + get_next(get_next(rho_c, ax_a), ax_b))
+        cs_s = 0.25 * (get_next(cs_c, ax_a) + cs_c + get_next(cs_c, ax_b) + get_next(get_next(cs_c, ax_a), ax_b))
+        mu_r_sh.append(rho_s * (cs_s * cs_s))
+    mu_r_xy, mu_r_xz, mu_r_yz = mu_r_sh
+    mu_xy, mu_xz, mu_yz = [np.where(att_c, _m * Mu_nu2, _m) for _m in mu_r_sh]
+
+    # dt/rho nos pontos das velocidades (sem atualizacao onde a densidade e nula)
+    dt_rho = list()
+    for ax in range(3):
+        rho_h = 0.5 * (get_next(rho_c, ax) + rho_c)
+        dt_rho.append(np.divide(dt, rho_h, out=np.zeros_like(rho_h), where=rho_h > 0.0))
+    dt_rho_x, dt_rho_y, dt_rho_z = dt_rho
+
+    # Regioes de atualizacao de cada campo e suas celulas com atenuacao
+    rgn_n = get_region((True, False, False))
+    rgn_xy = get_region((False, True, True))
+    rgn_xz = get_region((False, True, True))
+    rgn_yz = get_region((True, True, True))
+    rgn_vx = get_region((False, False, False))
+    rgn_vy = get_region((True, True, False))
+    rgn_vz = get_region((True, False, True))
+    m_n, ia_n = get_att(rgn_n)
+    m_xy, ia_xy = get_att(rgn_xy)
+    m_xz, ia_xz = get_att(rgn_xz)
+    m_yz, ia_yz = get_att(rgn_yz)
+    kappa_r_att = kappa_r[rgn_n][m_n]
+    mu_r_att = mu_r[rgn_n][m_n]
+
+    # Checkpoints: com --resume, o estado e restaurado do ultimo checkpoint gravado, e o estado e gravado a cada
+    # ckpt_interval passos de tempo
+    it_ini, state = load_checkpoint(ckpt_dir, ckpt_tag, ckpt_sig) if args.resume else (0, None)
+    if state is not None:
+        globals().update(state)
+    ckpt = CheckpointWriter(ckpt_dir, ckpt_tag, ckpt_sig) if ckpt_interval > 0 or state is not None else None
 
-        # creating a widget object
-        self.widget = QWidget()
-
-        # setting configuration options
-        pg.setConfigOptions(antialias=True)
+    # Inicio do laco de tempo
+    for it in range(it_ini + 1, NSTEP + 1):
+        # Calculo da tensao [stress] - {sigma} (equivalente a pressao nos gases-liquidos)
+        # sigma_ii -> tensoes normais; sigma_ij -> tensoes cisalhantes
+        # Tensoes normais: meio grid em x, grid inteiro em y e z
+        dvx_dx = get_cpml(get_diff(vx, 0, rgn_n, True), memory_dvx_dx, 0, rgn_n, True)
+        dvy_dy = get_cpml(get_diff(vy, 1, rgn_n, False), memory_dvy_dy, 1, rgn_n, False)
+        dvz_dz = get_cpml(get_diff(vz, 2, rgn_n, False), memory_dvz_dz, 2, rgn_n, False)
+
+        # Variaveis de memoria dos SLS (apenas nas celulas com atenuacao)
+        div = (dvx_dx + dvy_dy + dvz_dz)[m_n]
+        for l in range(n_sls):
+            e1[l, ia_n] = evolve_sls(e1[l, ia_n], div * phi_nu1[l], inv_tau_sigma_nu1[l])
+            e11[l, ia_n] = evolve_sls(e11[l, ia_n], (dvx_dx[m_n] - div / 3.0) * phi_nu2[l], inv_tau_sigma_nu2[l])
+            e22[l, ia_n] = evolve_sls(e22[l, ia_n], (dvy_dy[m_n] - div / 3.0) * phi_nu2[l], inv_tau_sigma_nu2[l])
+        sum_e1 = np.sum(e1[:, ia_n], axis=0)
+        sum_e11 = np.sum(e11[:, ia_n], axis=0)
+        sum_e22 = np.sum(e22[:, ia_n], axis=0)
+
+        # Tensoes com os parametros nao relaxados, somadas as variaveis de memoria com os parametros relaxados.
+        # A variavel de memoria desviadora e33 e -(e11 + e22)
+        lambda_ = lambda_n[rgn_n]
+        lambdaplus2mu = lambda_ + 2.0 * mu_n[rgn_n]
+        dsigmaxx = lambdaplus2mu * dvx_dx + lambda_ * (dvy_dy + dvz_dz)
+        dsigmayy = lambda_ * (dvx_dx + dvz_dz) + lambdaplus2mu * dvy_dy
+        dsigmazz = lambda_ * (dvx_dx + dvy_dy) + lambdaplus2mu * dvz_dz
+        dsigmaxx[m_n] += kappa_r_att * sum_e1 + 2.0 * mu_r_att * sum_e11
+        dsigmayy[m_n] += kappa_r_att * sum_e1 + 2.0 * mu_r_att * sum_e22
+        dsigmazz[m_n] += kappa_r_att * sum_e1 - 2.0 * mu_r_att * (sum_e11 + sum_e22)
+        sigmaxx[rgn_n] += dsigmaxx * dt
+        sigmayy[rgn_n] += dsigmayy * dt
+        sigmazz[rgn_n] += dsigmazz * dt
+
+        # sigma_xy: grid inteiro em x, meio grid em y e z
+        dvy_dx = get_cpml(get_diff(vy, 0, rgn_xy, False), memory_dvy_dx, 0, rgn_xy, False)
+        dvx_dy = get_cpml(get_diff(vx, 1, rgn_xy, True), memory_dvx_dy, 1, rgn_xy, True)
+        exy = dvx_dy + dvy_dx
+        for l in range(n_sls):
+            e12[l, ia_xy] = evolve_sls(e12[l, ia_xy], exy[m_xy] * phi_nu2[l], inv_tau_sigma_nu2[l])
+        dsigmaxy = mu_xy[rgn_xy] * exy
+        dsigmaxy[m_xy] += mu_r_xy[rgn_xy][m_xy] * np.sum(e12[:, ia_xy], axis=0)
+        sigmaxy[rgn_xy] += dsigmaxy * dt
+
+        # sigma_xz: grid inteiro em x, meio grid em y e z
+        dvz_dx = get_cpml(get_diff(vz, 0, rgn_xz, False), memory_dvz_dx, 0, rgn_xz, False)
+        dvx_dz = get_cpml(get_diff(vx, 2, rgn_xz, True), memory_dvx_dz, 2, rgn_xz, True)
+        exz = dvx_dz + dvz_dx
+        for l in range(n_sls):
+            e13[l, ia_xz] = evolve_sls(e13[l, ia_xz], exz[m_xz] * phi_nu2[l], inv_tau_sigma_nu2[l])
+        dsigmaxz = mu_xz[rgn_xz] * exz
+        dsigmaxz[m_xz] += mu_r_xz[rgn_xz][m_xz] * np.sum(e13[:, ia_xz], axis=0)
+        sigmaxz[rgn_xz] += dsigmaxz * dt
+
+        # sigma_yz: meio grid nos tres eixos
+        dvz_dy = get_cpml(get_diff(vz, 1, rgn_yz, True), memory_dvz_dy, 1, rgn_yz, True)
+        dvy_dz = get_cpml(get_diff(vy, 2, rgn_yz, True), memory_dvy_dz, 2, rgn_yz, True)
+        eyz = dvy_dz + dvz_dy
+        for l in range(n_sls):
+            e23[l, ia_yz] = evolve_sls(e23[l, ia_yz], eyz[m_yz] * phi_nu2[l], inv_tau_sigma_nu2[l])
+        dsigmayz = mu_yz[rgn_yz] * eyz
+        dsigmayz[m_yz] += mu_r_yz[rgn_yz][m_yz] * np.sum(e23[:, ia_yz], axis=0)
+        sigmayz[rgn_yz] += dsigmayz * dt
 
-        # creating image view view object
-        self.imv = RawImageWidget()
+        # Calculo da velocidade
+        # vx: grid inteiro nos tres eixos
+        dsigmaxx_dx = get_cpml(get_diff(sigmaxx, 0, rgn_vx, False), memory_dsigmaxx_dx, 0, rgn_vx, False)
+        dsigmaxy_dy = get_cpml(get_diff(sigmaxy, 1, rgn_vx, False), memory_dsigmaxy_dy, 1, rgn_vx, False)
+        dsigmaxz_dz = get_cpml(get_diff(sigmaxz, 2, rgn_vx, False), memory_dsigmaxz_dz, 2, rgn_vx, False)
+        vx[rgn_vx] += (dsigmaxx_dx + dsigmaxy_dy + dsigmaxz_dz) * dt_rho_x[rgn_vx]
+
+        # vy: meio grid em x e y, grid inteiro em z
+        dsigmaxy_dx = get_cpml(get_diff(sigmaxy, 0, rgn_vy, True), memory_dsigmaxy_dx, 0, rgn_vy, True)
+        dsigmayy_dy = get_cpml(get_diff(sigmayy, 1, rgn_vy, True), memory_dsigmayy_dy, 1, rgn_vy, True)
+        dsigmayz_dz = get_cpml(get_diff(sigmayz, 2, rgn_vy, False), memory_dsigmayz_dz, 2, rgn_vy, False)
+        vy[rgn_vy] += (dsigmaxy_dx + dsigmayy_dy + dsigmayz_dz) * dt_rho_y[rgn_vy]
+
+        # vz: meio grid em x e z, grid inteiro em y
+        dsigmaxz_dx = get_cpml(get_diff(sigmaxz, 0, rgn_vz, True), memory_dsigmaxz_dx, 0, rgn_vz, True)
+        dsigmayz_dy = get_cpml(get_diff(sigmayz, 1, rgn_vz, False), memory_dsigmayz_dy, 1, rgn_vz, False)
+        dsigmazz_dz = get_cpml(get_diff(sigmazz, 2, rgn_vz, True), memory_dsigmazz_dz, 2, rgn_vz, True)
+        vz[rgn_vz] += (dsigmaxz_dx + dsigmayz_dy + dsigmazz_dz) * dt_rho_z[rgn_vz]
+
+        # add the source (force vector injected at the grid points by the sparse operator)
+        vz.flat[src_nodes] += (op_src @ source_term[it - 1]) * dt_rho_z.flat[src_nodes]
 
-        # setting image to image view
-        self.imv.setImage(self.image, levels=[-0.1, 0.1])
+        # implement Dirichlet boundary conditions on the six edges of the grid
+        # which is the right condition to implement in order for C-PML to remain stable at long times
+        for v in [vx, vy, vz]:
+            v[:_ord, :, :] = ZERO
+            v[-_ord:, :, :] = ZERO
+            v[:, :_ord, :] = ZERO
+            v[:, -_ord:, :] = ZERO
+            v[:, :, :_ord] = ZERO
+            v[:, :, -_ord:] = ZERO
 
-        # Creating a grid layout
-        self.layout = QGridLayout()
+        # Store seismograms
+        # Os valores nos receptores sao interpolados pelo operador esparso (apos o atraso de recepcao de cada um).
+        # A amostra e filtrada (anti-aliasing) e acumulada nas amostras decimadas que recebem sua contribuicao
+        _m, _j = get_decimated_idx(it - 1, rec_decim, dec_filter.shape[0], NSTEP_REC)
+        _h = dec_filter[_j]
+        _on = (it - 1) >= delay_recv
+        rec_vx = np.where(_on, op_rec @ vx.flat[rec_nodes], ZERO)
+        rec_vy = np.where(_on, op_rec @ vy.flat[rec_nodes], ZERO)
+        rec_vz = np.where(_on, op_rec @ vz.flat[rec_nodes], ZERO)
+        for _irec in range(NREC):
+            sisvx[_m, _irec] += _h * rec_vx[_irec]
+            sisvy[_m, _irec] += _h * rec_vy[_irec]
+            sisvz[_m, _irec] += _h * rec_vz[_irec]
 
-        # setting this layout to the widget
-        self.widget.setLayout(self.layout)
+        v_2 = vx[:, :, :] ** 2 + vy[:, :, :] ** 2 + vz[:, :, :] ** 2
+        v_solid_norm[it - 1] = np.sqrt(np.max(v_2))
+        if (it % IT_DISPLAY) == 0 or it == 5:
+            if show_debug:
+                print(f'Time step # {it} out of {NSTEP}')
+                print(f'Max Vx = {np.max(vx)}, Vy = {np.max(vy)}, Vz = {np.max(vz)}')
+                print(f'Min Vx = {np.min(vx)}, Vy = {np.min(vy)}, Vz = {np.min(vz)}')
+                print(f'Max norm velocity vector V (m/s) = {v_solid_norm[it - 1]}')
+
+            if show_anim:
+                frames = list()
+                if show_xy:
+                    frames += [v[ix_min:ix_max, iy_min:iy_max, z_plane_idx] for v in [vx, vy, vz]]
+                if show_xz:
+                    frames += [v[ix_min:ix_max, y_plane_idx, iz_min:iz_max] for v in [vx, vy, vz]]
+                if show_yz:
+                    frames += [v[x_plane_idx, iy_min:iy_max, iz_min:iz_max] for v in [vx, vy, vz]]
+                viewer_cpu.update(frames)
 
-        # plot window goes on right side, spanning 3 rows
-        self.layout.addWidget(self.imv, 0, 0, 4, 1)
+        # Verifica a estabilidade da simulacao
+        if v_solid_norm[it - 1] > STABILITY_THRESHOLD:
+            print("Simulacao tornando-se instavel")
+            exit(2)
 
-        # setting this widget as central widget of the main window
-        self.setCentralWidget(self.widget)
+        # Grava o checkpoint (copias do estado, gravadas em segundo plano)
+        if ckpt_interval > 0 and it % ckpt_interval == 0 and it < NSTEP:
+            ckpt.save(it, {_k: np.copy(globals()[_k]) for _k in CPU_STATE})
 
+    # Simulacao concluida, os checkpoints nao sao mais necessarios
+    if ckpt is not None:
+        ckpt.clear()
 
-# TODO: portar essa funcao
-def compute_attenuation_coeffs(is_kappa):  #  n, q_kappa, f0, f_min,f_max):
-    if is_kappa:
-        return (np.array([3.4331474384407847E-002, 3.6311125270723529E-003], dtype=flt32),
-                np.array([2.9287653312114702E-002, 3.0503144159812171E-003], dtype=flt32))
 
-    return (np.array([3.7739400980721378E-002, 4.1548430957513323E-003], dtype=flt32),
-            np.array([2.7848924623855534E-002, 2.8973181158942259E-003], dtype=flt32))
+# -----------------------------
+# Funcao do simulador em WebGPU
+# -----------------------------
+def sim_webgpu(device, ckpt_tag, kernel="cell"):
+    global simul_probes, coefs
+    global a_x, a_x_half, b_x, b_x_half, k_x, k_x_half
+    global a_y, a_y_half, b_y, b_y_half, k_y, k_y_half
+    global a_z, a_z_half, b_z, b_z_half, k_z, k_z_half
+    global vx, vy, vz, sigmaxx, sigmayy, sigmazz, sigmaxy, sigmaxz, sigmayz
+    global memory_dvx_dx, memory_dvx_dy, memory_dvx_dz
+    global memory_dvy_dx, memory_dvy_dy, memory_dvy_dz
+    global memory_dvz_dx, memory_dvz_dy, memory_dvz_dz
+    global memory_dsigmaxx_dx, memory_dsigmayy_dy, memory_dsigmazz_dz
+    global memory_dsigmaxy_dx, memory_dsigmaxy_dy
+    global memory_dsigmaxz_dx, memory_dsigmaxz_dz
+    global memory_dsigmayz_dy, memory_dsigmayz_dz
+    global sisvx, sisvy, sisvz
+    global op_src_idx, op_src_col, op_src_w, op_rec_idx, op_rec_col, op_rec_w
+    global v_solid_norm
+    global simul_roi, rho_grid_vx, cp_grid_vx, cs_grid_vx
+    global e1, e11, e22, e12, e13, e23, att_coef, idx_att_grid, n_att
+    global viewer_gpu
+
+    # Obtem os termos de fonte dos transdutores (uma coluna por elemento de cada transdutor)
+    source_term = list()
+    for _pr in simul_probes:
+        if source_env:
+            source_term.append(_pr.get_source_term(samples=NSTEP, dt=dt, out='e'))
+        else:
+            source_term.append(_pr.get_source_term(samples=NSTEP, dt=dt))
+
+    # Source terms
+    source_term = np.concatenate(source_term, axis=1)
+    if save_sources:
+        np.save(f'results/sources_3D_viscoelast_CPML_{datetime.now().strftime("%Y%m%d-%H%M%S")}_GPU', source_term)
+
+    # Tabela de pesos das fontes (ponto da grade, coluna do termo de fonte, peso), ordenada pelo ponto da grade.
+    # ptr_src_pt indica, para cada ponto da grade com fonte, a primeira entrada da tabela
+    src_node = np.ravel_multi_index(op_src_idx.T, (nx, ny, nz))
+    order = np.lexsort((op_src_col, src_node))
+    src_node = src_node[order].astype(np.int32)
+    info_src_pt = np.column_stack((src_node, op_src_col[order])).astype(np.int32)
+    weight_src_pt = op_src_w[order].astype(flt32)
+    ptr_src_pt = np.unique(src_node, return_index=True)[1].astype(np.int32)
+    n_pto_src = np.int32(src_node.shape[0])
+    n_nd_src = np.int32(ptr_src_pt.shape[0])
+
+    # Receivers
+    # Tabela dos pontos receptores (x, y, z, sensor) e seus pesos de interpolacao, ordenada pelo sensor
+    order = np.argsort(op_rec_col, kind='stable')
+    info_rec_pt = np.column_stack((op_rec_idx[order], op_rec_col[order])).astype(np.int32)
+    weight_rec_pt = op_rec_w[order].astype(flt32)
+    offset_sensors = np.searchsorted(info_rec_pt[:, 3], np.arange(NREC)).astype(np.int32)
+    n_pto_rec = np.int32(info_rec_pt.shape[0])
+
+    # Checkpoints: com --resume, o estado e restaurado do ultimo checkpoint gravado (inclusive o passo de tempo
+    # da GPU), e o estado e gravado a cada ckpt_interval passos de tempo
+    it_ini, state = load_checkpoint(ckpt_dir, ckpt_tag, ckpt_sig) if args.resume else (0, None)
+    ckpt = CheckpointWriter(ckpt_dir, ckpt_tag, ckpt_sig) if ckpt_interval > 0 or state is not None else None
+
+    # Arrays com parametros inteiros (i32) e ponto flutuante (f32) para rodar o simulador
+    _ord = coefs.shape[0]
+    params_i32 = np.array([nx, ny, nz, NSTEP, source_term.shape[1], sisvx.shape[1], n_pto_rec, _ord,
+                           NSTEP_REC, rec_decim, dec_filter.shape[0], n_sls, n_att, n_pto_src, n_nd_src, it_ini],
+                          dtype=np.int32)
+    params_f32 = np.array([dx, dy, dz, dt, Mu_nu1, Mu_nu2], dtype=flt32)
+
+    # Mapeamento das threads dos kernels ``cell'': com thread_z_fast, o eixo mais rapido das threads percorre z,
+    # que e o eixo contiguo na memoria (acessos coalescidos)
+    ws_th = (wsz, wsy, wsx) if thread_z_fast else (wsx, wsy, wsz)
+
+    # Fatias (slabs) do grid ao longo de x: campos maiores que o limite de tamanho de um binding do dispositivo
+    # sao amarrados por fatia (com um halo do alcance do estencil) e os kernels rodam em passadas sequenciais
+    fld_plane = ny * nz * np.dtype(flt32).itemsize
+    lbl_plane = ny * nz * mat_bits // 8
+    slabs = get_x_slabs(nx, [fld_plane] + ([lbl_plane] if mat_grid is not None else []),
+                        device.limits["max-storage-buffer-binding-size"], _ord,
+                        align=device.limits["min-storage-buffer-offset-alignment"], x_mult=wsx,
+                        max_buffer=device.limits["max-buffer-size"])
+    if len(slabs) > 1:
+        print(f'Grid dividido em {len(slabs)} fatias ao longo de x (limite de binding do dispositivo)')
+
+    # Indices dos pontos do estencil das diferencas finitas (grids intercalados)
+    idx_fd = np.array([[c + 1, c, -c, -c - 1] for c in range(_ord)], dtype=np.int32)
+
+    # Cria o shader para calculo a partir do modelo ``shader_3D_viscoelast_cpml.wgsl'', especializado para a ordem,
+    # os tamanhos do grid e o numero de SLS (estencil desenrolado, com os coeficientes como constantes)
+    cshader_string = get_shader_code('shader_3D_viscoelast_cpml.wgsl',
+                                     tokens={'wsx': wsx, 'wsy': wsy, 'wsz': wsz, 'ws_th0': ws_th[0], 'ws_th1': ws_th[1],
+                                             'ws_th2': ws_th[2], 'th_map_z_fast': thread_z_fast,
+                                             'idx_rec_offset': NREC, 'mz_fd_coeff': _ord, 'mz_z_len': nz,
+                                             'mat_ids_on': mat_grid is not None, 'mat_lbl_bits': mat_bits,
+                                             'mat_num': mat_num, 'ws_src': WS_SRC, 'fd_num': _ord},
+                                     consts={'sim_int_par.x_sz': nx, 'sim_int_par.y_sz': ny, 'sim_int_par.z_sz': nz,
+                                             'sim_int_par.fd_coeff': _ord, 'sim_int_par.n_sls': n_sls,
+                                             'sim_int_par.n_att': n_att},
+                                     fd_tables=get_fd_tables(coefs, idx_fd))
+    cshader = device.create_shader_module(code=cshader_string)
+
+    # Definicao dos buffers que terao informacoes compartilhadas entre CPU e GPU
+    # ------- Buffers para o binding de parametros -------------
+    # Buffer de parametros com valores em ponto flutuante
+    # [UNIFORM | COPY_SRC] pois sao valores pequenos, constantes e passados para a GPU
+    b_param_flt32 = device.create_buffer_with_data(data=params_f32, usage=wgpu.BufferUsage.UNIFORM |
+                                                                          wgpu.BufferUsage.COPY_SRC)
+
+    # Forcas da fonte
+    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
+    b_force = device.create_buffer_with_data(data=source_term,
+                                             usage=wgpu.BufferUsage.STORAGE |
+                                                   wgpu.BufferUsage.COPY_SRC)
+
+    # Indices dos pontos da grade com fonte na tabela de pesos das fontes (um elemento extra evita buffer vazio)
+    b_idx_src = device.create_buffer_with_data(data=np.append(ptr_src_pt, np.int32(0)),
+                                               usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+
+    # Tabela de pesos das fontes
+    b_info_src_pt = device.create_buffer_with_data(data=info_src_pt, usage=wgpu.BufferUsage.STORAGE |
+                                                                           wgpu.BufferUsage.COPY_SRC)
+    b_weight_src_pt = device.create_buffer_with_data(data=weight_src_pt, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_SRC)
+
+    # Coeficientes de absorcao, empacotados por eixo ([a, b, k, -] nos grids cheio e intercalado de cada ponto)
+    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
+    b_pml_x = device.create_buffer_with_data(data=pack_pml_coeffs(a_x, b_x, k_x, a_x_half, b_x_half, k_x_half),
+                                             usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+    b_pml_y = device.create_buffer_with_data(data=pack_pml_coeffs(a_y, b_y, k_y, a_y_half, b_y_half, k_y_half),
+                                             usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+    b_pml_z = device.create_buffer_with_data(data=pack_pml_coeffs(a_z, b_z, k_z, a_z_half, b_z_half, k_z_half),
+                                             usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+
+    # Buffer de parametros com valores inteiros
+    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
+    b_param_int32 = device.create_buffer_with_data(data=params_i32, usage=wgpu.BufferUsage.STORAGE |
+                                                                          wgpu.BufferUsage.COPY_SRC)
+
+    # Buffers com os indices para o calculo das derivadas com acuracia maior
+    # [UNIFORM | COPY_SRC] pois sao valores pequenos, constantes e passados para a GPU
+    b_idx_fd = device.create_buffer_with_data(data=idx_fd, usage=wgpu.BufferUsage.UNIFORM | wgpu.BufferUsage.COPY_SRC)
+
+    # Buffer com os mapas de velocidade e densidade da ROI
+    # Com mapa de materiais, as propriedades sao lidas da tabela (com um material nulo fora do dominio)
+    # e os mapas densos nao sao usados
+    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
+    if mat_grid is not None:
+        mat_packed = pack_material_grid(mat_grid)[0]
+        mat_coef = np.vstack((mat_table, np.zeros((1, mat_table.shape[1])))).astype(flt32)
+        rho_gpu = cp_gpu = cs_gpu = np.zeros(1, dtype=flt32)
+    else:
+        mat_packed = np.zeros(1, dtype=np.uint32)
+        mat_coef = np.zeros(1, dtype=flt32)
+        rho_gpu, cp_gpu, cs_gpu = rho_grid_vx, cp_grid_vx, cs_grid_vx
+    b_rho_map = device.create_buffer_with_data(data=rho_gpu, usage=wgpu.BufferUsage.STORAGE |
+                                                                   wgpu.BufferUsage.COPY_SRC)
+    b_cp_map = device.create_buffer_with_data(data=cp_gpu, usage=wgpu.BufferUsage.STORAGE |
+                                                                 wgpu.BufferUsage.COPY_SRC)
+    b_cs_map = device.create_buffer_with_data(data=cs_gpu, usage=wgpu.BufferUsage.STORAGE |
+                                                                 wgpu.BufferUsage.COPY_SRC)
+    b_mat_map = device.create_buffer_with_data(data=mat_packed, usage=wgpu.BufferUsage.STORAGE |
+                                                                      wgpu.BufferUsage.COPY_SRC)
+    b_mat_coef = device.create_buffer_with_data(data=mat_coef, usage=wgpu.BufferUsage.STORAGE |
+                                                                    wgpu.BufferUsage.COPY_SRC)
+
+    # Buffer com os coeficientes para ao calculo das derivadas (completados ate um multiplo de 4, array de vec4)
+    # [UNIFORM | COPY_SRC] pois sao valores pequenos, constantes e passados para a GPU
+    b_fd_coeffs = device.create_buffer_with_data(data=np.pad(coefs, (0, (-_ord) % 4)), usage=wgpu.BufferUsage.UNIFORM |
+                                                                                             wgpu.BufferUsage.COPY_SRC)
+
+    # Buffers com os arrays de simulacao
+    # Velocidades
+    # [STORAGE | COPY_DST | COPY_SRC] pois sao valores passados para a GPU e tambem retornam a CPU [COPY_DST]
+    b_vx = device.create_buffer_with_data(data=vx, usage=wgpu.BufferUsage.STORAGE |
+                                                         wgpu.BufferUsage.COPY_DST |
+                                                         wgpu.BufferUsage.COPY_SRC)
+    b_vy = device.create_buffer_with_data(data=vy, usage=wgpu.BufferUsage.STORAGE |
+                                                         wgpu.BufferUsage.COPY_DST |
+                                                         wgpu.BufferUsage.COPY_SRC)
+    b_vz = device.create_buffer_with_data(data=vz, usage=wgpu.BufferUsage.STORAGE |
+                                                         wgpu.BufferUsage.COPY_DST |
+                                                         wgpu.BufferUsage.COPY_SRC)
+    # Historico do maximo do quadrado da norma da velocidade (um valor por passo de tempo, reduzido na GPU)
+    b_v_max_hist = device.create_buffer_with_data(data=np.zeros(NSTEP, dtype=np.uint32),
+                                                  usage=wgpu.BufferUsage.STORAGE |
+                                                        wgpu.BufferUsage.COPY_DST |
+                                                        wgpu.BufferUsage.COPY_SRC)
+
+    # Estresses
+    # [STORAGE | COPY_DST | COPY_SRC] pois sao valores passados para a GPU e tambem retornam a CPU [COPY_DST]
+    b_sigmaxx = device.create_buffer_with_data(data=sigmaxx, usage=wgpu.BufferUsage.STORAGE |
+                                                                   wgpu.BufferUsage.COPY_DST |
+                                                                   wgpu.BufferUsage.COPY_SRC)
+    b_sigmayy = device.create_buffer_with_data(data=sigmayy, usage=wgpu.BufferUsage.STORAGE |
+                                                                   wgpu.BufferUsage.COPY_DST |
+                                                                   wgpu.BufferUsage.COPY_SRC)
+    b_sigmazz = device.create_buffer_with_data(data=sigmazz, usage=wgpu.BufferUsage.STORAGE |
+                                                                   wgpu.BufferUsage.COPY_DST |
+                                                                   wgpu.BufferUsage.COPY_SRC)
+    b_sigmaxy = device.create_buffer_with_data(data=sigmaxy, usage=wgpu.BufferUsage.STORAGE |
+                                                                   wgpu.BufferUsage.COPY_DST |
+                                                                   wgpu.BufferUsage.COPY_SRC)
+    b_sigmaxz = device.create_buffer_with_data(data=sigmaxz, usage=wgpu.BufferUsage.STORAGE |
+                                                                   wgpu.BufferUsage.COPY_DST |
+                                                                   wgpu.BufferUsage.COPY_SRC)
+    b_sigmayz = device.create_buffer_with_data(data=sigmayz, usage=wgpu.BufferUsage.STORAGE |
+                                                                   wgpu.BufferUsage.COPY_DST |
+                                                                   wgpu.BufferUsage.COPY_SRC)
+
+    # Arrays de memoria do simulador
+    # [STORAGE | COPY_DST | COPY_SRC] pois sao valores passados para a GPU e restaurados dos checkpoints [COPY_DST]
+    b_mdvx_dx = device.create_buffer_with_data(data=memory_dvx_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
+                                                                         wgpu.BufferUsage.COPY_SRC)
+    b_mdvy_dx = device.create_buffer_with_data(data=memory_dvy_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
+                                                                         wgpu.BufferUsage.COPY_SRC)
+    b_mdvz_dx = device.create_buffer_with_data(data=memory_dvz_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
+                                                                         wgpu.BufferUsage.COPY_SRC)
+    b_mdvx_dy = device.create_buffer_with_data(data=memory_dvx_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
+                                                                         wgpu.BufferUsage.COPY_SRC)
+    b_mdvy_dy = device.create_buffer_with_data(data=memory_dvy_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
+                                                                         wgpu.BufferUsage.COPY_SRC)
+    b_mdvz_dy = device.create_buffer_with_data(data=memory_dvz_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
+                                                                         wgpu.BufferUsage.COPY_SRC)
+    b_mdvx_dz = device.create_buffer_with_data(data=memory_dvx_dz, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
+                                                                         wgpu.BufferUsage.COPY_SRC)
+    b_mdvy_dz = device.create_buffer_with_data(data=memory_dvy_dz, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
+                                                                         wgpu.BufferUsage.COPY_SRC)
+    b_mdvz_dz = device.create_buffer_with_data(data=memory_dvz_dz, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_DST |
+                                                                         wgpu.BufferUsage.COPY_SRC)
+
+    b_mdsxx_dx = device.create_buffer_with_data(data=memory_dsigmaxx_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
+                                                                               wgpu.BufferUsage.COPY_SRC)
+    b_mdsxy_dy = device.create_buffer_with_data(data=memory_dsigmaxy_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
+                                                                               wgpu.BufferUsage.COPY_SRC)
+    b_mdsxz_dz = device.create_buffer_with_data(data=memory_dsigmaxz_dz, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
+                                                                               wgpu.BufferUsage.COPY_SRC)
+    b_mdsxy_dx = device.create_buffer_with_data(data=memory_dsigmaxy_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
+                                                                               wgpu.BufferUsage.COPY_SRC)
+    b_mdsyy_dy = device.create_buffer_with_data(data=memory_dsigmayy_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
+                                                                               wgpu.BufferUsage.COPY_SRC)
+    b_mdsyz_dz = device.create_buffer_with_data(data=memory_dsigmayz_dz, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
+                                                                               wgpu.BufferUsage.COPY_SRC)
+    b_mdsxz_dx = device.create_buffer_with_data(data=memory_dsigmaxz_dx, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
+                                                                               wgpu.BufferUsage.COPY_SRC)
+    b_mdsyz_dy = device.create_buffer_with_data(data=memory_dsigmayz_dy, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
+                                                                               wgpu.BufferUsage.COPY_SRC)
+    b_mdszz_dz = device.create_buffer_with_data(data=memory_dsigmazz_dz, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_DST |
+                                                                               wgpu.BufferUsage.COPY_SRC)
+
+    # Sinal do sensor
+    # [STORAGE | COPY_DST | COPY_SRC] pois sao valores passados para a GPU e tambem retornam a CPU [COPY_DST]
+    b_sens_x = device.create_buffer_with_data(data=sisvx, usage=wgpu.BufferUsage.STORAGE |
+                                                                wgpu.BufferUsage.COPY_DST |
+                                                                wgpu.BufferUsage.COPY_SRC)
+    b_sens_y = device.create_buffer_with_data(data=sisvy, usage=wgpu.BufferUsage.STORAGE |
+                                                                wgpu.BufferUsage.COPY_DST |
+                                                                wgpu.BufferUsage.COPY_SRC)
+    b_sens_z = device.create_buffer_with_data(data=sisvz, usage=wgpu.BufferUsage.STORAGE |
+                                                                wgpu.BufferUsage.COPY_DST |
+                                                                wgpu.BufferUsage.COPY_SRC)
+
+    # Tempo de espera para recepcao nos sensores
+    b_delay_rec = device.create_buffer_with_data(data=delay_recv, usage=wgpu.BufferUsage.STORAGE |
+                                                                        wgpu.BufferUsage.COPY_SRC)
+
+    # Informacoes dos pontos receptores
+    b_info_rec_pt = device.create_buffer_with_data(data=info_rec_pt, usage=wgpu.BufferUsage.STORAGE |
+                                                                           wgpu.BufferUsage.COPY_SRC)
+    b_offset_sensors = device.create_buffer_with_data(data=offset_sensors, usage=wgpu.BufferUsage.STORAGE |
+                                                                                 wgpu.BufferUsage.COPY_SRC)
+    b_weight_rec_pt = device.create_buffer_with_data(data=weight_rec_pt, usage=wgpu.BufferUsage.STORAGE |
+                                                                               wgpu.BufferUsage.COPY_SRC)
+
+    # Coeficientes do filtro de decimacao dos sinais dos sensores
+    b_dec_filter = device.create_buffer_with_data(data=dec_filter, usage=wgpu.BufferUsage.STORAGE |
+                                                                         wgpu.BufferUsage.COPY_SRC)
+
+    # Planos de pre-visualizacao (ROI decimada) extraidos na GPU, para que a exibicao leia apenas esses planos
+    ix_min = simul_roi.get_ix_min()
+    ix_max = simul_roi.get_ix_max()
+    iy_min = simul_roi.get_iy_min()
+    iy_max = simul_roi.get_iy_max()
+    iz_min = simul_roi.get_iz_min()
+    iz_max = simul_roi.get_iz_max()
+    pv_nx = -(-(ix_max - ix_min) // preview_dec)
+    pv_ny = -(-(iy_max - iy_min) // preview_dec)
+    pv_nz = -(-(iz_max - iz_min) // preview_dec)
+    pv_sz = [pv_nx * pv_ny, pv_nx * pv_nz, pv_ny * pv_nz]
+    b_preview = device.create_buffer(size=3 * sum(pv_sz) * np.dtype(flt32).itemsize,
+                                     usage=wgpu.BufferUsage.STORAGE | wgpu.BufferUsage.COPY_SRC)
+    b_pv_par = device.create_buffer_with_data(data=np.array([ix_min, iy_min, iz_min, pv_nx, pv_ny, pv_nz,
+                                                             x_plane_idx, y_plane_idx, z_plane_idx, preview_dec],
+                                                            dtype=np.int32),
+                                              usage=wgpu.BufferUsage.UNIFORM | wgpu.BufferUsage.COPY_SRC)
+
+    # Coeficientes de atenuacao [inv_tau_sigma_nu1, phi_nu1, inv_tau_sigma_nu2, phi_nu2]
+    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
+    b_att_coef = device.create_buffer_with_data(data=att_coef, usage=wgpu.BufferUsage.STORAGE |
+                                                                     wgpu.BufferUsage.COPY_SRC)
+
+    # Indices compactos das celulas com atenuacao (-1 nas celulas elasticas)
+    # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
+    b_idx_att = device.create_buffer_with_data(data=idx_att_grid, usage=wgpu.BufferUsage.STORAGE |
+                                                                        wgpu.BufferUsage.COPY_SRC)
+
+    # Variaveis de memoria dos solidos lineares padrao
+    # [STORAGE | COPY_DST | COPY_SRC] pois sao valores passados para a GPU e tambem retornam a CPU [COPY_DST]
+    b_e1 = device.create_buffer_with_data(data=e1, usage=wgpu.BufferUsage.STORAGE |
+                                                         wgpu.BufferUsage.COPY_DST |
+                                                         wgpu.BufferUsage.COPY_SRC)
+    b_e11 = device.create_buffer_with_data(data=e11, usage=wgpu.BufferUsage.STORAGE |
+                                                           wgpu.BufferUsage.COPY_DST |
+                                                           wgpu.BufferUsage.COPY_SRC)
+    b_e22 = device.create_buffer_with_data(data=e22, usage=wgpu.BufferUsage.STORAGE |
+                                                           wgpu.BufferUsage.COPY_DST |
+                                                           wgpu.BufferUsage.COPY_SRC)
+    b_e12 = device.create_buffer_with_data(data=e12, usage=wgpu.BufferUsage.STORAGE |
+                                                           wgpu.BufferUsage.COPY_DST |
+                                                           wgpu.BufferUsage.COPY_SRC)
+    b_e13 = device.create_buffer_with_data(data=e13, usage=wgpu.BufferUsage.STORAGE |
+                                                           wgpu.BufferUsage.COPY_DST |
+                                                           wgpu.BufferUsage.COPY_SRC)
+    b_e23 = device.create_buffer_with_data(data=e23, usage=wgpu.BufferUsage.STORAGE |
+                                                           wgpu.BufferUsage.COPY_DST |
+                                                           wgpu.BufferUsage.COPY_SRC)
+
+    # Buffers do estado do simulador gravados nos checkpoints, restaurados ao retomar a simulacao
+    gpu_state = {"vx": b_vx, "vy": b_vy, "vz": b_vz, "sigmaxx": b_sigmaxx, "sigmayy": b_sigmayy, "sigmazz": b_sigmazz,
+                 "sigmaxy": b_sigmaxy, "sigmaxz": b_sigmaxz, "sigmayz": b_sigmayz, "memory_dvx_dx": b_mdvx_dx,
+                 "memory_dvx_dy": b_mdvx_dy, "memory_dvx_dz": b_mdvx_dz, "memory_dvy_dx": b_mdvy_dx,
+                 "memory_dvy_dy": b_mdvy_dy, "memory_dvy_dz": b_mdvy_dz, "memory_dvz_dx": b_mdvz_dx,
+                 "memory_dvz_dy": b_mdvz_dy, "memory_dvz_dz": b_mdvz_dz, "memory_dsigmaxx_dx": b_mdsxx_dx,
+                 "memory_dsigmaxy_dy": b_mdsxy_dy, "memory_dsigmaxz_dz": b_mdsxz_dz, "memory_dsigmaxy_dx": b_mdsxy_dx,
+                 "memory_dsigmayy_dy": b_mdsyy_dy, "memory_dsigmayz_dz": b_mdsyz_dz, "memory_dsigmaxz_dx": b_mdsxz_dx,
+                 "memory_dsigmayz_dy": b_mdsyz_dy, "memory_dsigmazz_dz": b_mdszz_dz, "v_max_hist": b_v_max_hist,
+                 "sisvx": b_sens_x, "sisvy": b_sens_y, "sisvz": b_sens_z, "e1": b_e1, "e11": b_e11, "e22": b_e22,
+                 "e12": b_e12, "e13": b_e13, "e23": b_e23}
+    if state is not None:
+        for _k, _b in gpu_state.items():
+            device.queue.write_buffer(_b, 0, state[_k])
+
+    # Esquema de amarracao dos buffers (bindings, na ordem das listas) e grupos de amarracao
+    rw = wgpu.BufferBindingType.storage
+    ro = wgpu.BufferBindingType.read_only_storage
+    uni = wgpu.BufferBindingType.uniform
+
+    # Parametros
+    bl_params = [(b_param_int32, rw), (b_param_flt32, uni), (b_force, ro), (b_idx_src, ro),
+                 (b_pml_x, ro), (b_pml_y, ro), (b_pml_z, ro), (b_idx_fd, uni), (b_fd_coeffs, uni),
+                 (b_rho_map, ro), (b_cp_map, ro), (b_cs_map, ro), (b_mat_map, ro), (b_mat_coef, ro),
+                 (b_info_src_pt, ro), (b_weight_src_pt, ro)]
+
+    # Arrays da simulacao
+    bl_sim_arrays = [(b_vx, rw), (b_vy, rw), (b_vz, rw), (b_v_max_hist, rw),
+                     (b_sigmaxx, rw), (b_sigmayy, rw), (b_sigmazz, rw), (b_sigmaxy, rw), (b_sigmaxz, rw),
+                     (b_sigmayz, rw), (b_mdvx_dx, rw), (b_mdvy_dx, rw), (b_mdvz_dx, rw), (b_mdvx_dy, rw),
+                     (b_mdvy_dy, rw), (b_mdvz_dy, rw), (b_mdvx_dz, rw), (b_mdvy_dz, rw), (b_mdvz_dz, rw),
+                     (b_mdsxx_dx, rw), (b_mdsxy_dy, rw), (b_mdsxz_dz, rw), (b_mdsxy_dx, rw), (b_mdsyy_dy, rw),
+                     (b_mdsyz_dz, rw), (b_mdsxz_dx, rw), (b_mdsyz_dy, rw), (b_mdszz_dz, rw),
+                     (b_preview, rw), (b_pv_par, uni)]
+
+    # Sensores
+    bl_sensors = [(b_sens_x, rw), (b_sens_y, rw), (b_sens_z, rw), (b_delay_rec, ro), (b_info_rec_pt, ro),
+                  (b_offset_sensors, ro), (b_dec_filter, ro), (b_weight_rec_pt, ro)]
+
+    # Atenuacao
+    bl_attenuation = [(b_att_coef, ro), (b_e1, rw), (b_e11, rw), (b_e22, rw), (b_e12, rw), (b_e13, rw), (b_e23, rw),
+                      (b_idx_att, ro)]
+
+    # Os campos do grid e os mapas do meio sao amarrados um por binding, acima do limite default do WebGPU
+    # (8 storage buffers por estagio): o dispositivo e criado com o limite ``max-storage-buffers-per-shader-stage''
+    # do adaptador
+    n_storage = get_storage_bindings([bl_params, bl_sim_arrays, bl_sensors, bl_attenuation])
+    if n_storage > device.limits["max-storage-buffers-per-shader-stage"]:
+        raise ValueError(f'Simulador requer {n_storage} storage buffers por estagio, dispositivo suporta '
+                         f'{device.limits["max-storage-buffers-per-shader-stage"]}')
+
+    bgl_2, bg_2 = get_bind_group(device, bl_sensors)
+
+    # Grupos de amarracao de cada fatia: os campos do grid e os indices das celulas com atenuacao sao amarrados a
+    # partir do plano x_ofs da fatia e os demais buffers (inclusive as variaveis de memoria compactas) sao
+    # amarrados inteiros
+    slab_bufs = [(b, fld_plane) for b in [b_vx, b_vy, b_vz, b_sigmaxx, b_sigmayy, b_sigmazz, b_sigmaxy,
+                                          b_sigmaxz, b_sigmayz, b_mdvx_dx, b_mdvy_dx, b_mdvz_dx, b_mdvx_dy, b_mdvy_dy,
+                                          b_mdvz_dy, b_mdvx_dz, b_mdvy_dz, b_mdvz_dz, b_mdsxx_dx, b_mdsxy_dy,
+                                          b_mdsxz_dz, b_mdsxy_dx, b_mdsyy_dy, b_mdsyz_dz, b_mdsxz_dx, b_mdsyz_dy,
+                                          b_mdszz_dz, b_idx_att]]
+    if mat_grid is not None:
+        slab_bufs += [(b_mat_map, lbl_plane)]
+    else:
+        slab_bufs += [(b, fld_plane) for b in [b_rho_map, b_cp_map, b_cs_map]]
+
+    bgl_0 = bgl_1 = bgl_3 = None
+    bg_slabs = list()
+    for x_ofs, x_ini, x_end, x_lim in slabs:
+        b_slab_par = device.create_buffer_with_data(data=np.array([x_ofs, x_ini, x_end, 0], dtype=np.int32),
+                                                    usage=wgpu.BufferUsage.UNIFORM | wgpu.BufferUsage.COPY_SRC)
+        bgl_0, bg_0 = get_bind_group(device, get_slab_entries(bl_params, slab_bufs, x_ofs, x_lim), bgl_0)
+        bgl_1, bg_1 = get_bind_group(device, get_slab_entries(bl_sim_arrays, slab_bufs, x_ofs, x_lim) +
+                                     [(b_slab_par, uni)], bgl_1)
+        bgl_3, bg_3 = get_bind_group(device, get_slab_entries(bl_attenuation, slab_bufs, x_ofs, x_lim), bgl_3)
+
+        n_wg_x = (x_end - x_ini) // wsx
+        wg_cell = (nz // wsz, ny // wsy, n_wg_x) if thread_z_fast else (n_wg_x, ny // wsy, nz // wsz)
+        bg_slabs.append((bg_0, bg_1, bg_3, wg_cell, (n_wg_x, ny // wsy, 1) if kernel == "march" else wg_cell))
+    pipeline_layout = device.create_pipeline_layout(bind_group_layouts=[bgl_0, bgl_1, bgl_2, bgl_3])
+
+    # Cria os pipelines de execucao
+    compute_teste_kernel = device.create_compute_pipeline(layout=pipeline_layout,
+                                                          compute={"module": cshader,
+                                                                   "entry_point": "teste_kernel"})
+    # Os kernels ``march'' percorrem o eixo z dentro de cada thread (blocagem 2.5D)
+    kernel_suffix = "_march_kernel" if kernel == "march" else "_kernel"
+    compute_sigma_kernel = device.create_compute_pipeline(layout=pipeline_layout,
+                                                          compute={"module": cshader,
+                                                                   "entry_point": "sigma" + kernel_suffix})
+    compute_velocity_kernel = device.create_compute_pipeline(layout=pipeline_layout,
+                                                             compute={"module": cshader,
+                                                                      "entry_point": "velocity" + kernel_suffix})
+    compute_sources_kernel = device.create_compute_pipeline(layout=pipeline_layout,
+                                                            compute={"module": cshader,
+                                                                     "entry_point": "sources_kernel"})
+    compute_store_sensors_kernel = device.create_compute_pipeline(layout=pipeline_layout,
+                                                                  compute={"module": cshader,
+                                                                           "entry_point": "store_sensors_kernel"})
+    compute_incr_it_kernel = device.create_compute_pipeline(layout=pipeline_layout,
+                                                            compute={"module": cshader,
+                                                                     "entry_point": "incr_it_kernel"})
+    compute_preview_kernel = device.create_compute_pipeline(layout=pipeline_layout,
+                                                            compute={"module": cshader,
+                                                                     "entry_point": "preview_kernel"})
+
+    # Buffers de staging persistentes para as leituras da GPU
+    stg_pool = StagingPool(device)
+
+    # Leitura dos resultados de um passo de apresentacao (historico da norma da velocidade desde o passo
+    # ``it_ini`` e planos de pre-visualizacao) copiados para o staging
+    def check_step(it_rd, it_ini, stg_hist, stg_pv):
+        v_sol_n[it_ini:it_rd] = np.sqrt(stg_pool.read(stg_hist))
+        stg_pool.release(stg_hist)
 
+        # Verifica a estabilidade da simulacao
+        if np.any(v_sol_n[:it_rd] > STABILITY_THRESHOLD):
+            print("Simulacao tornando-se instavel")
+            exit(2)
 
-# Parametros dos ensaios
-flt32 = np.float32
-n_iter_gpu = 1
-n_iter_cpu = 1
-do_sim_gpu = True
-do_sim_cpu = True
-do_comp_fig_cpu_gpu = True
-use_refletors = False
-plot_results = True
-show_results = True
-save_results = True
-gpu_type = "NVIDIA"
+        # Pega resultados intermediarios
+        if (it_rd % IT_DISPLAY) == 0 or it_rd == 5:
+            if show_debug:
+                print(f'Time step # {it_rd} out of {NSTEP}')
+                print(f'Max norm velocity vector V (m/s) = {v_sol_n[it_rd - 1]}')
+
+            if stg_pv is not None:
+                pv = stg_pool.read(stg_pv)
+                pv_xy = pv[:3 * pv_sz[0]].reshape((3, pv_nx, pv_ny))
+                pv_xz = pv[3 * pv_sz[0]:3 * (pv_sz[0] + pv_sz[1])].reshape((3, pv_nx, pv_nz))
+                pv_yz = pv[3 * (pv_sz[0] + pv_sz[1]):].reshape((3, pv_ny, pv_nz))
+
+                frames = list()
+                for show_pl, pv_pl in [(show_xy, pv_xy), (show_xz, pv_xz), (show_yz, pv_yz)]:
+                    if show_pl:
+                        frames += [pv_pl[_f] for _f in range(3)]
+
+                        if show_debug:
+                            print(f'Max Vx = {np.max(pv_pl[0])}, Vy = {np.max(pv_pl[1])}, Vz = {np.max(pv_pl[2])}')
+                            print(f'Min Vx = {np.min(pv_pl[0])}, Vy = {np.min(pv_pl[1])}, Vz = {np.min(pv_pl[2])}')
+                viewer_gpu.update(frames)
+                stg_pool.release(stg_pv)
+
+    v_sol_n = np.zeros(NSTEP, dtype=flt32)
+    it_hist = 0
+    stg_prev = None
+    # Laco de tempo para execucao da simulacao
+    for it in range(it_ini + 1, NSTEP + 1):
+        # Cria o codificador de comandos
+        command_encoder = device.create_command_encoder()
+
+        # Inicia os passos de execucao do decodificador
+        compute_pass = command_encoder.begin_compute_pass()
+
+        # Ajusta os grupos de amarracao
+        compute_pass.set_bind_group(2, bg_2, [], 0, 999999)  # last 2 elements not used
+
+        # Cada etapa percorre as fatias do grid em sequencia (uma unica fatia se os campos cabem em um binding),
+        # para que a etapa seguinte leia os halos ja atualizados das fatias vizinhas
+        # Ativa o pipeline de teste
+        # compute_pass.set_pipeline(compute_teste_kernel)
+        # compute_pass.dispatch_workgroups(*wg_cell)
+
+        # Ativa o pipeline de execucao do calculo dos estresses
+        compute_pass.set_pipeline(compute_sigma_kernel)
+        for bg_0, bg_1, bg_3, wg_cell, wg_fd in bg_slabs:
+            compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(3, bg_3, [], 0, 999999)  # last 2 elements not used
+            compute_pass.dispatch_workgroups(*wg_fd)
+
+        # Ativa o pipeline de execucao do calculo das velocidades
+        compute_pass.set_pipeline(compute_velocity_kernel)
+        for bg_0, bg_1, bg_3, wg_cell, wg_fd in bg_slabs:
+            compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(3, bg_3, [], 0, 999999)  # last 2 elements not used
+            compute_pass.dispatch_workgroups(*wg_fd)
+
+        # Ativa o pipeline de adicao dos termos de fonte (somente sobre os pontos da grade com fonte)
+        compute_pass.set_pipeline(compute_sources_kernel)
+        for bg_0, bg_1, bg_3, wg_cell, wg_fd in bg_slabs:
+            compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(3, bg_3, [], 0, 999999)  # last 2 elements not used
+            compute_pass.dispatch_workgroups(-(-n_nd_src // WS_SRC))
+
+        # Ativa o pipeline de execucao do armazenamento dos sensores
+        compute_pass.set_pipeline(compute_store_sensors_kernel)
+        for bg_0, bg_1, bg_3, wg_cell, wg_fd in bg_slabs:
+            compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+            compute_pass.set_bind_group(3, bg_3, [], 0, 999999)  # last 2 elements not used
+            compute_pass.dispatch_workgroups(1)
+
+        # Ativa o pipeline de extracao dos planos de pre-visualizacao (somente nos passos de exibicao)
+        if show_anim and ((it % IT_DISPLAY) == 0 or it == 5):
+            compute_pass.set_pipeline(compute_preview_kernel)
+            for bg_0, bg_1, bg_3, wg_cell, wg_fd in bg_slabs:
+                compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
+                compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
+                compute_pass.set_bind_group(3, bg_3, [], 0, 999999)  # last 2 elements not used
+                compute_pass.dispatch_workgroups(-(-max(pv_nx, pv_ny) // wsx), -(-max(pv_ny, pv_nz) // wsy), 3)
+
+        # Ativa o pipeline de atualizacao da amostra de tempo
+        compute_pass.set_pipeline(compute_incr_it_kernel)
+        compute_pass.dispatch_workgroups(1)
+
+        # Termina o passo de execucao
+        compute_pass.end()
+
+        # Nos intervalos de apresentacao, copia o historico do maximo da norma da velocidade em bloco (e os planos
+        # de pre-visualizacao) para buffers de staging no mesmo envio dos kernels
+        stg_step = None
+        if (it % IT_DISPLAY) == 0 or it == 5 or it == NSTEP:
+            stg_step = (it, it_hist, stg_pool.copy(command_encoder, b_v_max_hist, it_hist * 4, (it - it_hist) * 4),
+                        stg_pool.copy(command_encoder, b_preview) if show_anim and ((it % IT_DISPLAY) == 0 or it == 5)
+                        else None)
+            it_hist = it
+
+        # Efetua a execucao dos comandos na GPU
+        device.queue.submit([command_encoder.finish()])
+
+        # Le os resultados da apresentacao anterior enquanto a GPU executa o passo atual (o ultimo passo e lido
+        # em seguida)
+        if stg_prev is not None:
+            check_step(*stg_prev)
+        stg_prev = stg_step
+
+        # Grava o checkpoint em segundo plano. O estado do simulador e lido um buffer por vez, reaproveitando um
+        # unico buffer de staging
+        if ckpt_interval > 0 and it % ckpt_interval == 0 and it < NSTEP:
+            ckpt.save(it, stg_pool.fetch_each(gpu_state))
+    if stg_prev is not None:
+        check_step(*stg_prev)
+
+    # Simulacao concluida, os checkpoints nao sao mais necessarios
+    if ckpt is not None:
+        ckpt.clear()
+
+    # Pega os resultados da simulacao (copias codificadas em um unico envio)
+    command_encoder = device.create_command_encoder()
+    stg_res = [stg_pool.copy(command_encoder, _b) for _b in [b_vx, b_vy, b_vz, b_sens_x, b_sens_y, b_sens_z]]
+    device.queue.submit([command_encoder.finish()])
+    vxgpu, vygpu, vzgpu = [stg_pool.fetch(_s, shape=(nx, ny, nz)) for _s in stg_res[:3]]
+    sens_vx, sens_vy, sens_vz = [stg_pool.fetch(_s, shape=(NSTEP_REC, NREC)) for _s in stg_res[3:]]
+    return vxgpu, vygpu, vzgpu, sens_vx, sens_vy, sens_vz, v_sol_n, device.adapter.info["device"]
+
+
+# ----------------------------------------------------------
+# Aqui comeca o codigo principal de execucao dos simuladores
+# ----------------------------------------------------------
+# Constantes
+PI = flt32(np.pi)
+DEGREES_TO_RADIANS = flt32(PI / 180.0)
+ZERO = flt32(0.0)
+STABILITY_THRESHOLD = flt32(1.0e25)  # Limite para considerar que a simulacao esta instavel
+
+# Definicao das constantes para a o calculo das derivadas, seguindo Lui 2009 (10.1111/j.1365-246X.2009.04305.x)
+coefs_Lui = [
+    [9.0 / 8.0, -1.0 / 24.0],
+    [75.0 / 64.0, -25.0 / 384.0, 3.0 / 640.0],
+    [1225.0 / 1024.0, -245.0 / 3072.0, 49.0 / 5120.0, -5.0 / 7168.0],
+    [19845.0 / 16384.0, -735.0 / 8192.0, 567.0 / 40960.0, -405.0 / 229376.0, 35.0 / 294912.0],
+    [160083.0 / 131072.0, -12705.0 / 131072.0, 22869.0 / 1310720.0, -5445.0 / 1835008.0, 847.0 / 2359296.0,
+     -63.0 / 2883584.0]
+]
+
+# ----------------------------------------------------------
+# Avaliacao dos parametros na linha de comando
+# ----------------------------------------------------------
+parser = argparse.ArgumentParser()
+parser.add_argument('-c', '--config', help='Configuration file', default='config.json')
+parser.add_argument('-p', '--plan', help='Print the memory plan and exit, without running the simulation',
+                    action='store_true')
+parser.add_argument('-r', '--resume', help='Resume the simulations from their latest checkpoints',
+                    action='store_true')
+args = parser.parse_args()
+
+# -----------------------
+# Leitura da configuracao no formato JSON
+# -----------------------
+with open(args.config, 'r') as f:
+    configs = ast.literal_eval(f.read())
+    coefs = np.array(coefs_Lui[configs["simul_params"]["ord"] - 2], dtype=flt32)
+
+    # Configuracao do corpo de prova
+    # Recorte dos mapas (indices [inicio, fim] em cada dimensao) e posicao do seu primeiro ponto no grid
+    map_crop = configs["specimen_params"]["map_crop"] if "map_crop" in configs["specimen_params"] else None
+    map_offset = configs["specimen_params"]["map_offset"] if "map_offset" in configs["specimen_params"] \
+        else None
+
+    cp = flt32(5.9)
+    if "cp" in configs["specimen_params"]:
+        cp = flt32(configs["specimen_params"]["cp"])  # [mm/us]
+
+    cp_map = None
+    if "cp_map" in configs["specimen_params"]:
+        cp_map = load_map(configs["specimen_params"]["cp_map"], crop=map_crop)
+
+    cs = flt32(3.23)
+    if "cs" in configs["specimen_params"]:
+        cs = flt32(configs["specimen_params"]["cs"])  # [mm/us]
+
+    cs_map = None
+    if "cs_map" in configs["specimen_params"]:
+        cs_map = load_map(configs["specimen_params"]["cs_map"], crop=map_crop)
+
+    rho = flt32(7800.0)
+    if "rho" in configs["specimen_params"]:
+        rho = flt32(configs["specimen_params"]["rho"])
+
+    rho_map = None
+    if "rho_map" in configs["specimen_params"]:
+        rho_map = load_map(configs["specimen_params"]["rho_map"], crop=map_crop)
+
+    # Mapa de materiais (rotulos uint8/uint16) com a tabela de propriedades de cada material.
+    # Se definido, substitui os mapas de cp, cs e rho
+    mat_map = None
+    mat_table = None
+    if "material_map" in configs["specimen_params"]:
+        mat_map = load_map(configs["specimen_params"]["material_map"], crop=map_crop)
+        if mat_map.dtype not in (np.uint8, np.uint16):
+            raise ValueError(f'material_map deve ser uint8 ou uint16 (e {mat_map.dtype})')
+        mat_table = get_material_table(configs["specimen_params"]["materials"])
+        if mat_map.size > 0 and mat_map.max() >= mat_table.shape[0]:
+            raise ValueError('material_map tem rotulos sem material correspondente em materials')
+
+    # Mascara de atenuacao: as celulas com 1 sao viscoelasticas e as com 0 sao elasticas. Os fatores de qualidade
+    # sao os mesmos (q_kappa e q_mu) em todas as celulas viscoelasticas
+    attenuation_mask = None
+    if "attenuation_mask" in configs["specimen_params"]:
+        attenuation_mask = load_map(configs["specimen_params"]["attenuation_mask"], crop=map_crop)
+        if np.any((attenuation_mask != 0) & (attenuation_mask != 1)):
+            raise ValueError('attenuation_mask deve conter apenas 0 e 1')
+
+    # Fatores de qualidade da atenuacao (modulo volumetrico e de cisalhamento)
+    q_kappa_att = flt32(20.0)
+    if "q_kappa" in configs["specimen_params"]:
+        q_kappa_att = flt32(configs["specimen_params"]["q_kappa"])
+
+    q_mu_att = flt32(10.0)
+    if "q_mu" in configs["specimen_params"]:
+        q_mu_att = flt32(configs["specimen_params"]["q_mu"])
+
+    # Configuracao da ROI
+    simul_roi = SimulationROI(**configs["roi"], pad=coefs.shape[0] - 1,
+                              rho_map=rho_map if mat_map is None else mat_map)
+
+    # Configuracao dos transdutores
+    simul_probes = list()
+    probes_cfg = configs["probes"]
+    for p in probes_cfg:
+        if p["linear"]:
+            simul_probes.append(SimulationProbeLinearArray(**p["linear"]))
+    print(f'Ordem da acuracia: {coefs.shape[0] * 2}')
+
+    # Configuracao da atenuacao (numero de SLS e frequencia central da faixa de atenuacao)
+    n_sls = int(configs["simul_params"]["n_sls"]) if "n_sls" in configs["simul_params"] else 2
+    f0_attenuation = flt32(configs["simul_params"]["f0_attenuation"]) \
+        if "f0_attenuation" in configs["simul_params"] else flt32(simul_probes[0].get_freq())
+    sls_cache_dir = configs["simul_params"]["sls_cache_dir"] \
+        if "sls_cache_dir" in configs["simul_params"] else "sls_cache"
+
+    # Configuracao geral dos ensaios
+    n_iter_gpu = configs["simul_configs"]["n_iter_gpu"]
+    n_iter_cpu = configs["simul_configs"]["n_iter_cpu"]
+    do_sim_gpu = bool(configs["simul_configs"]["do_sim_gpu"])
+    do_sim_cpu = bool(configs["simul_configs"]["do_sim_cpu"])
+    do_comp_fig_cpu_gpu = bool(configs["simul_configs"]["do_comp_fig_cpu_gpu"])
+    use_refletors = bool(configs["simul_configs"]["use_refletors"])
+    show_anim = bool(configs["simul_configs"]["show_anim"])
+    show_xy = bool(configs["simul_configs"]["show_xy"])
+    show_xz = bool(configs["simul_configs"]["show_xz"])
+    show_yz = bool(configs["simul_configs"]["show_yz"])
+    show_debug = bool(configs["simul_configs"]["show_debug"])
+    plot_results = bool(configs["simul_configs"]["plot_results"])
+    plot_sensors = bool(configs["simul_configs"]["plot_sensors"])
+    plot_bscan = bool(configs["simul_configs"]["plot_bscan"])
+    save_bscan = bool(configs["simul_configs"]["save_bscan"])
+    save_sources = bool(configs["simul_configs"]["save_sources"])
+    show_results = bool(configs["simul_configs"]["show_results"])
+    save_results = bool(configs["simul_configs"]["save_results"])
+    gpu_type = configs["simul_configs"]["gpu_type"]
+    sim_interactive = bool(configs["simul_configs"]["sim_interactive"])
+    source_env = bool(configs["simul_configs"]["source_env"])
+    src_rec_interp = configs["simul_configs"]["src_rec_interp"] if "src_rec_interp" in configs["simul_configs"] \
+        else "nearest"
+    gpu_kernels = list(configs["simul_configs"]["gpu_kernels"]) \
+        if "gpu_kernels" in configs["simul_configs"] else ["cell"]
+    for k in gpu_kernels:
+        if k not in ["cell", "march"]:
+            raise ValueError(f'gpu_kernels: tipo de kernel invalido ({k}). Use "cell" ou "march"')
+    thread_map = configs["simul_configs"]["thread_map"] if "thread_map" in configs["simul_configs"] else "z_fast"
+    if thread_map not in ("x_fast", "z_fast"):
+        raise ValueError(f'thread_map: {thread_map} nao e um mapeamento valido (x_fast, z_fast)')
+    thread_z_fast = thread_map == "z_fast"
+    ckpt_interval = int(configs["simul_configs"]["checkpoint_interval"]) \
+        if "checkpoint_interval" in configs["simul_configs"] else 0
+    ckpt_dir = configs["simul_configs"]["checkpoint_dir"] if "checkpoint_dir" in configs["simul_configs"] \
+        else "checkpoints"
+    ckpt_sig = get_checkpoint_signature(configs)
+
+# -----------------------
+# Inicializacao do WebGPU
+# -----------------------
+adapter = None
+device_gpu = None
+if do_sim_gpu or args.plan:
+    # =====================
+    # webgpu configurations
+    # Os limites de tamanho de buffer e de storage buffers por estagio sao os do adaptador, em vez dos limites
+    # default do WebGPU
+    power_pref = "high-performance" if gpu_type == "high-perf" else "low-power"
+    if wgpu.version_info[1] > 11:
+        adapter = wgpu.gpu.request_adapter(power_preference=power_pref)  # 0.13.X
+    else:
+        adapter = wgpu.request_adapter(canvas=None, power_preference=power_pref)  # 0.9.5
+
+    # No planejamento de memoria apenas os limites do adaptador sao consultados
+    if not args.plan:
+        device_gpu = adapter.request_device(required_limits={_l: adapter.limits[_l] for _l in
+                                                             ["max-buffer-size", "max-storage-buffer-binding-size",
+                                                              "max-storage-buffers-per-shader-stage"]})
+
+    # Escolha dos valores de wsx, wsy e wsz (GPU)
+    wsx = np.gcd(simul_roi.get_nx(), 8)
+    wsy = np.gcd(simul_roi.get_ny(), 8)
+    wsz = np.gcd(simul_roi.get_nz(), 4)
 
 # Parametros da simulacao
-nx = 70  # colunas
-ny = 70  # linhas
-nz = 24   # altura
+nx = simul_roi.get_nx()
+ny = simul_roi.get_ny()
+nz = simul_roi.get_nz()
+
+# Escala do grid (valor do passo no espaco em milimetros)
+dx = flt32(simul_roi.w_step)
+dy = flt32(simul_roi.d_step)
+dz = flt32(simul_roi.h_step)
+one_dx = flt32(1.0 / dx)
+one_dy = flt32(1.0 / dy)
+one_dz = flt32(1.0 / dz)
+
+# Indices do primeiro ponto da ROI no grid
+roi_ini = [simul_roi.get_ix_min(), simul_roi.get_iy_min(), simul_roi.get_iz_min()]
+
+# Inicializa o mapa de materiais do meio
+# mat_grid e a matriz dos rotulos dos materiais no mesmo grid de vx. Os pontos fora do mapa recebem o material
+# homogeneo do corpo de prova (cp, cs, rho), acrescentado ao fim da tabela
+mat_grid = None
+mat_bits = 8
+mat_num = 1
+if mat_map is not None:
+    mat_table = np.vstack((mat_table, [[cp, cs, rho]])).astype(flt32)
+    if mat_table.shape[0] > 65536:
+        raise ValueError(f'Numero de materiais ({mat_table.shape[0]}) maior que o suportado (65536)')
+    mat_grid = get_map_grid(mat_map, (nx, ny, nz), mat_table.shape[0] - 1, offset=map_offset, roi_ini=roi_ini,
+                            dtype=np.uint8 if mat_table.shape[0] <= 256 else np.uint16)
+
+    mat_bits = 8 * mat_grid.dtype.itemsize
+    mat_num = mat_table.shape[0] + 1
+    rho_grid_vx = cp_grid_vx = cs_grid_vx = None
+    print(f'Mapa de materiais com {mat_table.shape[0]} materiais ({mat_bits} bits por ponto)')
+else:
+    # Inicializa os mapas de densidade e velocidades do meio no mesmo grid de vx
+    rho_grid_vx = get_map_grid(rho_map, (nx, ny, nz), rho, offset=map_offset, roi_ini=roi_ini)
+    cp_grid_vx = get_map_grid(cp_map, (nx, ny, nz), cp, offset=map_offset, roi_ini=roi_ini)
+    cs_grid_vx = get_map_grid(cs_map, (nx, ny, nz), cs, offset=map_offset, roi_ini=roi_ini)
 
-# Tamanho do grid (aparentemente em metros)
-dx = 4.0
-dz = dy = dx
-one_dx = one_dy = one_dz = 1.0/dx
+# att_grid indica as celulas com atenuacao. Sem attenuation_mask, todo o meio e viscoelastico
+att_grid = np.ones((nx, ny, nz), dtype=bool)
+if attenuation_mask is not None:
+    att_grid = get_map_grid(attenuation_mask, (nx, ny, nz), False, offset=map_offset, roi_ini=roi_ini, dtype=bool)
 
-# Constantes
-PI = np.pi
-DEGREES_TO_RADIANS = PI / 180.0
-ZERO = 0.0
-HUGEVAL = 1.0e30  # Valor enorme para o maximo da pressao
-STABILITY_THRESHOLD = 1.0e25  # Limite para considerar que a simulacao esta instavel
-
-# flags to add PML layers to the edges of the grid
-USE_PML_XMIN = True
-USE_PML_XMAX = True
-USE_PML_YMIN = True
-USE_PML_YMAX = True
-USE_PML_ZMIN = True
-USE_PML_ZMAX = True
-
-# Espessura da PML in pixels
-npoints_pml = 10
-
-# Velocidades do som e densidade do meio
-cp = 3000.0  # [m/s]
-cs = 2000.0  # [m/s]
-rho = 2000.0
-mu = rho * cs * cs
-lambda_ = rho * (cp * cp - 2.0 * cs * cs)
-lambdaplus2mu = rho * cp * cp
+# idx_att_grid e o indice compacto de cada celula com atenuacao (-1 nas celulas elasticas)
+n_att = int(np.count_nonzero(att_grid))
+idx_att_grid = -np.ones((nx, ny, nz), dtype=np.int32)
+idx_att_grid[att_grid] = np.arange(n_att, dtype=np.int32)
 
 # Numero total de passos de tempo
-NSTEP = 1000
+NSTEP = configs["simul_params"]["time_steps"]
 
-# Passo de tempo em segundos
-dt = 4.0e-4
+# Passo de tempo em microssegundos
+dt = flt32(configs["simul_params"]["dt"])
 
 # Numero de iteracoes de tempo para apresentar e armazenar informacoes
-IT_DISPLAY = 10
-
-# Parametros da fonte
-f0 = 18.0  # frequencia
-t0 = 1.20 / f0  # delay
-factor = 1.0e7
-a = PI**2 * f0**2
-t = np.arange(NSTEP) * dt
-ANGLE_FORCE = 0.0
-
-# First derivative of a Gaussian
-source_term = -(factor * 2.0 * a * (t - t0) * np.exp(-a * (t - t0)**2)).astype(flt32)
-
-# Funcao de Ricker (segunda derivada de uma gaussiana)
-# source_term = (factor * (1.0 - 2.0 * a * (t - t0) ** 2) * np.exp(-a * (t - t0) ** 2)).astype(flt32)
-
-force_x = np.sin(ANGLE_FORCE * DEGREES_TO_RADIANS) * source_term
-force_y = np.cos(ANGLE_FORCE * DEGREES_TO_RADIANS) * source_term
-
-# Parametro de atenuacao
-N_SLS = 2
-
-# Qp approximately equal to 13, Qkappa approximately to 20 and Qmu / Qs approximately to 10
-q_kappa_att = 20.0
-q_mu_att = 10.0
-f0_attenuation = 16  # in Hz
-
-# Posicao da fonte
-isource = int(nx / 4)
-jsource = int(ny / 2)
-ksource = int(nz / 2)
-xsource = isource * dx
-ysource = jsource * dy
-zsource = ksource * dz
-
-# Receptores
-NREC = 3
-# xdeb = xsource - 100.0  # em unidade de distancia
-# ydeb = 2300.0  # em unidade de distancia
-# xfin = xsource
-# yfin = 300.0
-xrec = xsource + np.array([40.0, 0.0, 40.0])
-yrec = ysource + np.array([40.0, 100.0, 100.0])
-# sens_x = int(xdeb / dx) + 1
-# sens_y = int(ydeb / dy) + 1
-# sensor = np.zeros(NSTEP, dtype=flt32)  # buffer para sinal do sensor
-sisvx = np.zeros((NSTEP, NREC), dtype=flt32)
-sisvy = np.zeros((NSTEP, NREC), dtype=flt32)
+IT_DISPLAY = configs["simul_params"]["it_display"]
+
+# Fator de decimacao dos planos de pre-visualizacao
+preview_dec = max(int(configs["simul_configs"]["preview_decimation"]), 1) \
+    if "preview_decimation" in configs["simul_configs"] else 1
+
+# Fator de decimacao dos sinais dos receptores (armazena uma amostra a cada ``rec_decim`` passos de tempo)
+rec_decim = max(int(configs["simul_params"]["record_decimation"]), 1) \
+    if "record_decimation" in configs["simul_params"] else 1
+NSTEP_REC = (NSTEP + rec_decim - 1) // rec_decim
+dec_filter = get_decimation_filter(rec_decim)
+
+# Pega os operadores de injecao das fontes e de interpolacao dos receptores de todos os transdutores configurados.
+# Cada entrada relaciona um ponto da grade a uma coluna (termo de fonte ou receptor) com um peso.
+op_src_idx = list()
+op_src_col = list()
+op_src_w = list()
+op_rec_idx = list()
+op_rec_col = list()
+op_rec_w = list()
+delay_recv = list()
+NREC = 0
+n_src_col = 0
+for pr in simul_probes:
+    _idx, _col, _w = pr.get_interp_operator(simul_roi, simul_type="3d", dir="e", interp=src_rec_interp)
+    op_src_idx.append(_idx)
+    op_src_col.append(_col + n_src_col)
+    op_src_w.append(_w)
+    _idx, _col, _w = pr.get_interp_operator(simul_roi, simul_type="3d", dir="r", interp=src_rec_interp)
+    op_rec_idx.append(_idx)
+    op_rec_col.append(_col + NREC)
+    op_rec_w.append(_w)
+    delay_recv += pr.get_delay_rx()
+    NREC += pr.receivers.count(True)
+    n_src_col += pr.num_elem
+
+op_src_idx = np.concatenate(op_src_idx)
+op_src_col = np.concatenate(op_src_col)
+op_src_w = np.concatenate(op_src_w)
+op_rec_idx = np.concatenate(op_rec_idx)
+op_rec_col = np.concatenate(op_rec_col)
+op_rec_w = np.concatenate(op_rec_w)
+
+# Operadores esparsos para a CPU, sobre os pontos da grade (indices lineares) que sao fontes ou receptores
+src_nodes, inv = np.unique(np.ravel_multi_index(op_src_idx.T, (nx, ny, nz)), return_inverse=True)
+op_src = csr_matrix((op_src_w, (inv.flatten(), op_src_col)), shape=(src_nodes.shape[0], n_src_col), dtype=flt32)
+rec_nodes, inv = np.unique(np.ravel_multi_index(op_rec_idx.T, (nx, ny, nz)), return_inverse=True)
+op_rec = csr_matrix((op_rec_w, (op_rec_col, inv.flatten())), shape=(NREC, rec_nodes.shape[0]), dtype=flt32)
+NSRC = src_nodes.shape[0]
+
+# Calcula o delay de recepcao dos receptores
+delay_recv = (np.array(delay_recv) / dt + 1.0).astype(np.int32)
 
 # for evolution of total energy in the medium
-epsilon_xx = epsilon_yy = epsilon_zz = epsilon_xy = epsilon_xz = epsilon_yz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-total_energy = np.zeros(NSTEP, dtype=flt32)
-total_energy_kinetic = np.zeros(NSTEP, dtype=flt32)
-total_energy_potential = np.zeros(NSTEP, dtype=flt32)
-
-# Valor da potencia para calcular "d0"
-NPOWER = 2.0
+v_solid_norm = np.zeros(NSTEP, dtype=flt32)
 
-# from Stephen Gedney's unpublished class notes for class EE699, lecture 8, slide 8-11
-K_MAX_PML = 7.0
-ALPHA_MAX_PML = 2.0 * PI * (f0 / 2.0)  # from Festa and Vilotte
-
-# Escolha do valor de wsx (GPU)
-wsx = 1
-for n in range(15, 0, -1):
-    if (ny % n) == 0:
-        wsx = n  # workgroup x size
-        break
-
-# Escolha do valor de wsy (GPU)
-wsy = 1
-for n in range(15, 0, -1):
-    if (nx % n) == 0:
-        wsy = n  # workgroup x size
-        break
-
-# TODO: Escolha do valor de wsz (GPU) --- Verificar necessidade
-wsz = 1
-for n in range(15, 0, -1):
-    if (nz % n) == 0:
-        wsz = n  # workgroup x size
-        break
+print(f'3D viscoelastic finite-difference code in velocity and stress formulation with C-PML')
+print(f'NX = {nx}')
+print(f'NY = {ny}')
+print(f'NZ = {nz}')
+print(f'Total de pontos no grid = {nx * ny * nz}')
+print(f'Pontos com atenuacao = {n_att} ({100.0 * n_att / (nx * ny * nz):.1f}%)\n')
+
+# Plano de memoria do host e da GPU (quantidade e tamanho em bytes dos arrays), verificado com os limites do
+# adaptador e com a RAM do host antes das alocacoes
+fld_sz = nx * ny * nz * np.dtype(flt32).itemsize
+sens_sz = NSTEP_REC * NREC * np.dtype(flt32).itemsize
+src_sz = NSTEP * n_src_col * np.dtype(flt32).itemsize
+sls_sz = n_sls * max(n_att, 1) * np.dtype(flt32).itemsize
+map_key = "mapa de materiais" if mat_grid is not None else "mapas do meio"
+host_arrays = {"campos": (9, fld_sz), "memorias da CPML": (18, fld_sz),
+               map_key: (1, mat_grid.nbytes) if mat_grid is not None else (3, fld_sz),
+               "indices de atenuacao": (1, fld_sz), "variaveis de memoria dos SLS": (6, sls_sz),
+               "sinais dos receptores": (3, sens_sz)}
+if do_sim_cpu:
+    host_arrays.update({"parametros do meio (CPU)": (14, fld_sz), "derivadas (CPU)": (6, fld_sz)})
+gpu_buffers = dict()
+slab_args = None
+if do_sim_gpu or args.plan:
+    pv_pts = [-(-(simul_roi.get_ix_max() - simul_roi.get_ix_min()) // preview_dec),
+              -(-(simul_roi.get_iy_max() - simul_roi.get_iy_min()) // preview_dec),
+              -(-(simul_roi.get_iz_max() - simul_roi.get_iz_min()) // preview_dec)]
+    host_arrays.update({"termos de fonte": (1, src_sz),
+                        "resultados da GPU": (3, fld_sz)})
+    gpu_buffers = {"campos": (9, fld_sz), "memorias da CPML": (18, fld_sz),
+                   map_key: (1, -(-mat_grid.size * mat_bits // 32) * 4) if mat_grid is not None else (3, fld_sz),
+                   "indices de atenuacao": (1, fld_sz), "variaveis de memoria dos SLS": (6, sls_sz),
+                   "termos de fonte": (1, src_sz), "pesos das fontes": (1, op_src_w.shape[0] * 12 + (NSRC + 1) * 4),
+                   "sinais dos receptores": (3, sens_sz), "pesos dos receptores": (1, op_rec_w.shape[0] * 20),
+                   "historico da norma": (1, NSTEP * np.dtype(np.uint32).itemsize),
+                   "pre-visualizacao": (1, 3 * (pv_pts[0] * pv_pts[1] + pv_pts[0] * pv_pts[2] + pv_pts[1] * pv_pts[2]) *
+                                        np.dtype(flt32).itemsize),
+                   "perfis da CPML": (1, (nx + ny + nz) * 32)}
+    slab_args = dict(nx=nx, plane_bytes=[ny * nz * np.dtype(flt32).itemsize] +
+                                        ([ny * nz * mat_bits // 8] if mat_grid is not None else []),
+                     halo=coefs.shape[0], x_mult=wsx)
+
+# Checkpoints: uma copia do estado do simulador no host e um buffer de staging reaproveitado na GPU
+if ckpt_interval > 0:
+    host_arrays["estado do checkpoint"] = (1, 27 * fld_sz + 3 * sens_sz + NSTEP * 4 + 6 * sls_sz)
+    if gpu_buffers:
+        gpu_buffers["staging do checkpoint"] = (1, max(fld_sz, sens_sz, sls_sz, NSTEP * 4))
+adapter_limits = None if adapter is None else \
+    {_l: adapter.limits[_l] for _l in ["max-buffer-size", "max-storage-buffer-binding-size",
+                                       "min-storage-buffer-offset-alignment"]}
+mem_plan = get_memory_plan(host_arrays, gpu_buffers, limits=adapter_limits, host_ram=get_host_ram(),
+                           cpu_fallback=True, slabs=slab_args,
+                           slab_keys=["campos", "memorias da CPML", map_key, "indices de atenuacao",
+                                      "staging do checkpoint"],
+                           rec_keys=["sinais dos receptores"], rec_decim=rec_decim,
+                           rec_decim_max=get_max_rec_decimation(simul_probes, dt),
+                           f16=adapter is not None and "shader-f16" in adapter.features)
+print_memory_plan(mem_plan)
+if args.plan:
+    exit(0)
 
 # Arrays para as variaveis de memoria do calculo
-memory_dvx_dx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dvx_dy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dvx_dz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dvy_dx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dvy_dy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dvy_dz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dvz_dx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dvz_dy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dvz_dz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dsigmaxx_dx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dsigmayy_dy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dsigmazz_dz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dsigmaxy_dx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dsigmaxy_dy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dsigmaxz_dx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dsigmaxz_dz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dsigmayz_dy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-memory_dsigmayz_dz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-
-vx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-vy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-vz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-sigmaxx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-sigmayy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-sigmazz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-sigmaxy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-sigmaxz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-sigmayz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-sigmaxx_r = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-sigmayy_r = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-sigmazz_r = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-sigmaxy_r = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-sigmaxz_r = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-sigmayz_r = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-
-e1 = np.zeros((N_SLS, nx + 2, ny + 2, nz + 2), dtype=flt32)
-e11 = np.zeros((N_SLS, nx + 2, ny + 2, nz + 2), dtype=flt32)
-e22 = np.zeros((N_SLS, nx + 2, ny + 2, nz + 2), dtype=flt32)
-e12 = np.zeros((N_SLS, nx + 2, ny + 2, nz + 2), dtype=flt32)
-e13 = np.zeros((N_SLS, nx + 2, ny + 2, nz + 2), dtype=flt32)
-e23 = np.zeros((N_SLS, nx + 2, ny + 2, nz + 2), dtype=flt32)
-
-# Total de arrays
-N_ARRAYS = 9 + 2*9 + 12
-
-value_dvx_dx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dvx_dy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dvx_dz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dvy_dx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dvy_dy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dvy_dz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dvz_dx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dvz_dy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dvz_dz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dsigmaxx_dx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dsigmayy_dy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dsigmazz_dz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dsigmaxy_dx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dsigmaxy_dy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dsigmaxz_dx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dsigmaxz_dz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dsigmayz_dy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-value_dsigmayz_dz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-
-duxdx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-duxdy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-duxdz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-duydx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-duydy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-duydz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-duzdx = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-duzdy = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-duzdz = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-div = np.zeros((nx + 2, ny + 2, nz + 2), dtype=flt32)
-
-# Inicializacao dos parametros da PML (definicao dos perfis de absorcao na regiao da PML)
-thickness_pml_x = npoints_pml * dx
-thickness_pml_y = npoints_pml * dy
-thickness_pml_z = npoints_pml * dz
-
-# Coeficiente de reflexao (INRIA report section 6.1) http://hal.inria.fr/docs/00/07/32/19/PDF/RR-3471.pdf
-rcoef = 0.0001
+memory_dvx_dx = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dvx_dy = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dvx_dz = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dvy_dx = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dvy_dy = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dvy_dz = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dvz_dx = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dvz_dy = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dvz_dz = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dsigmaxx_dx = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dsigmaxy_dy = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dsigmaxz_dz = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dsigmaxy_dx = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dsigmayy_dy = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dsigmayz_dz = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dsigmaxz_dx = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dsigmayz_dy = np.zeros((nx, ny, nz), dtype=flt32)
+memory_dsigmazz_dz = np.zeros((nx, ny, nz), dtype=flt32)
+
+vx = np.zeros((nx, ny, nz), dtype=flt32)
+vy = np.zeros((nx, ny, nz), dtype=flt32)
+vz = np.zeros((nx, ny, nz), dtype=flt32)
+sigmaxx = np.zeros((nx, ny, nz), dtype=flt32)
+sigmayy = np.zeros((nx, ny, nz), dtype=flt32)
+sigmazz = np.zeros((nx, ny, nz), dtype=flt32)
+sigmaxy = np.zeros((nx, ny, nz), dtype=flt32)
+sigmaxz = np.zeros((nx, ny, nz), dtype=flt32)
+sigmayz = np.zeros((nx, ny, nz), dtype=flt32)
+
+# Variaveis de memoria dos solidos lineares padrao, armazenadas apenas nas celulas com atenuacao
+# (ao menos um elemento, pois a GPU nao aceita buffers vazios)
+e1 = np.zeros((n_sls, max(n_att, 1)), dtype=flt32)
+e11 = np.zeros((n_sls, max(n_att, 1)), dtype=flt32)
+e22 = np.zeros((n_sls, max(n_att, 1)), dtype=flt32)
+e12 = np.zeros((n_sls, max(n_att, 1)), dtype=flt32)
+e13 = np.zeros((n_sls, max(n_att, 1)), dtype=flt32)
+e23 = np.zeros((n_sls, max(n_att, 1)), dtype=flt32)
 
 # Calculo da faixa de atenuacao em frequencia: f_max/f_min=12 and (log(f_min)+log(f_max))/2 = log(f0)
-f_min_attenuation = np.exp(np.log(f0_attenuation) - np.log(12.0)/2.0)
+f_min_attenuation = np.exp(np.log(f0_attenuation) - np.log(12.0) / 2.0)
 f_max_attenuation = 12.0 * f_min_attenuation
 
-# use new SolvOpt nonlinear optimization with constraints from Emilie Blanc, Bruno Lombard and Dimitri Komatitsch
-# to compute attenuation mechanisms
-# tau_epsilon_nu1, tau_sigma_nu1 = compute_attenuation_coeffs(N_SLS, q_kappa_att, f0_attenuation,
-#                                                             f_min_attenuation,f_max_attenuation)
-# tau_epsilon_nu2, tau_sigma_nu2 = compute_attenuation_coeffs(N_SLS, q_mu_att, f0_attenuation,
-#                                                             f_min_attenuation, f_max_attenuation)
-tau_epsilon_nu1, tau_sigma_nu1 = compute_attenuation_coeffs(is_kappa=True)
-tau_epsilon_nu2, tau_sigma_nu2 = compute_attenuation_coeffs(is_kappa=False)
-
-print(f'\nAtenuacao calculada pela nova rotina SolvOpt:')
-print(f'NSLs = {N_SLS}, QKappa_att = {q_kappa_att}, QMu_att = {q_mu_att}')
+# Mecanismos de atenuacao (ajuste por minimos quadrados, guardado em cache no disco)
+(tau_epsilon_nu1, tau_epsilon_nu2), (tau_sigma_nu1, tau_sigma_nu2) = \
+    get_sls_relaxation_times(n_sls, [q_kappa_att, q_mu_att], f_min_attenuation, f_max_attenuation,
+                             cache_dir=sls_cache_dir)
+tau_epsilon_nu1 = tau_epsilon_nu1.astype(flt32)
+tau_epsilon_nu2 = tau_epsilon_nu2.astype(flt32)
+tau_sigma_nu1 = tau_sigma_nu1.astype(flt32)
+tau_sigma_nu2 = tau_sigma_nu2.astype(flt32)
+
+print(f'Atenuacao:')
+print(f'NSLs = {n_sls}, QKappa_att = {q_kappa_att}, QMu_att = {q_mu_att}')
 print(f'f0_attenuation = {f0_attenuation}, f_min_attenuation = {f_min_attenuation}, '
       f'f_max_attenuation = {f_max_attenuation}')
 print(f'tau_epsilon_nu1 = {tau_epsilon_nu1}')
@@ -331,1439 +1339,698 @@ print(f'tau_sigma_nu1 = {tau_sigma_nu1}')
 print(f'tau_epsilon_nu2 = {tau_epsilon_nu2}')
 print(f'tau_sigma_nu2 = {tau_sigma_nu2}\n')
 
-tau1 = tau_sigma_nu1[0]/tau_epsilon_nu1[0]
-tau2 = tau_sigma_nu2[0]/tau_epsilon_nu2[0]
-tau3 = tau_sigma_nu1[1]/tau_epsilon_nu1[1]
-tau4 = tau_sigma_nu2[1]/tau_epsilon_nu2[1]
-
-taumax = np.max([1.0/tau1, 1.0/tau2, 1.0/tau3, 1.0/tau4])
-taumin = np.min([1.0/tau1, 1.0/tau2, 1.0/tau3, 1.0/tau4])
-
-inv_tau_sigma_nu1 = 1.0/tau_sigma_nu1
-inv_tau_sigma_nu2 = 1.0/tau_sigma_nu2
+# Maior razao entre os modulos nao relaxado e relaxado (velocidade maxima no meio)
+taumax = flt32(np.max(np.concatenate((tau_epsilon_nu1 / tau_sigma_nu1, tau_epsilon_nu2 / tau_sigma_nu2))))
 
-phi_nu1 = (1.0 - tau_epsilon_nu1 / tau_sigma_nu1) / tau_sigma_nu1
-phi_nu2 = (1.0 - tau_epsilon_nu2 / tau_sigma_nu2) / tau_sigma_nu2
+# Coeficientes das variaveis de memoria [inv_tau_sigma_nu1, phi_nu1, inv_tau_sigma_nu2, phi_nu2]
+inv_tau_sigma_nu1 = flt32(1.0) / tau_sigma_nu1
+inv_tau_sigma_nu2 = flt32(1.0) / tau_sigma_nu2
+phi_nu1 = (flt32(1.0) - tau_epsilon_nu1 / tau_sigma_nu1) / tau_sigma_nu1
+phi_nu2 = (flt32(1.0) - tau_epsilon_nu2 / tau_sigma_nu2) / tau_sigma_nu2
+att_coef = np.vstack((inv_tau_sigma_nu1, phi_nu1, inv_tau_sigma_nu2, phi_nu2)).astype(flt32)
 
-Mu_nu1 = 1.0 - (1.0 - tau_epsilon_nu1[0] / tau_sigma_nu1[0]) - (1.0 - tau_epsilon_nu1[1] / tau_sigma_nu1[1])
-Mu_nu2 = 1.0 - (1.0 - tau_epsilon_nu2[0] / tau_sigma_nu2[0]) - (1.0 - tau_epsilon_nu2[1] / tau_sigma_nu2[1])
-
-print(f'3D elastic finite-difference code in velocity and stress formulation with C-PML')
-print(f'NX = {nx}')
-print(f'NY = {ny}')
-print(f'NZ = {nz}\n')
-print(f'Tamanho do modelo ao longo do eixo X = {(nx + 1) * dx}')
-print(f'Tamanho do modelo ao longo do eixo Y = {(ny + 1) * dy}')
-print(f'Tamanho do modelo ao longo do eixo Z = {(nz + 1) * dz}')
-print(f'Total de pontos no grid = {(nx+2) * (ny+2) * (nz+2)}')
-print(f'Number of points of all the arrays = {(nx+2)*(ny+2)*(nz+2)*N_ARRAYS}')
-print(f'Size in GB of all the arrays = {(nx+2)*(ny+2)*(nz+2)*N_ARRAYS*4/(1024*1024*1024)}\n')
+# Fatores dos modulos nao relaxados
+Mu_nu1 = flt32(1.0 - np.sum(1.0 - tau_epsilon_nu1 / tau_sigma_nu1))
+Mu_nu2 = flt32(1.0 - np.sum(1.0 - tau_epsilon_nu2 / tau_sigma_nu2))
 
+# Valor da potencia para calcular "d0"
+NPOWER = flt32(configs["simul_params"]["npower"])
 if NPOWER < 1:
     raise ValueError('NPOWER deve ser maior que 1')
 
-# Calculo de d0 do relatorio da INRIA section 6.1 http://hal.inria.fr/docs/00/07/32/19/PDF/RR-3471.pdf
-d0_x = -(NPOWER + 1) * cp * np.sqrt(taumax) * np.log(rcoef) / (2.0 * thickness_pml_x)
-d0_y = -(NPOWER + 1) * cp * np.sqrt(taumax) * np.log(rcoef) / (2.0 * thickness_pml_y)
-d0_z = -(NPOWER + 1) * cp * np.sqrt(taumax) * np.log(rcoef) / (2.0 * thickness_pml_z)
+# Coeficiente de reflexao e calculo de d0 do relatorio da INRIA section 6.1
+# http://hal.inria.fr/docs/00/07/32/19/PDF/RR-3471.pdf
+rcoef = flt32(configs["simul_params"]["rcoef"])
+d0_x = flt32(-(NPOWER + 1) * cp * np.sqrt(taumax) * np.log(rcoef) / simul_roi.get_pml_thickness_x())
+d0_y = flt32(-(NPOWER + 1) * cp * np.sqrt(taumax) * np.log(rcoef) / simul_roi.get_pml_thickness_y())
+d0_z = flt32(-(NPOWER + 1) * cp * np.sqrt(taumax) * np.log(rcoef) / simul_roi.get_pml_thickness_z())
 
 print(f'd0_x = {d0_x}')
 print(f'd0_y = {d0_y}')
 print(f'd0_z = {d0_z}\n')
 
-# Amortecimento na direcao "x" (horizontal)
-# Origem da PML (posicao das bordas direita e esquerda menos a espessura, em unidades de distancia)
-x_orig_left = thickness_pml_x
-x_orig_right = (nx - 1) * dx - thickness_pml_x
+# Calculo dos coeficientes de amortecimento para a PML
+# from Stephen Gedney's unpublished class notes for class EE699, lecture 8, slide 8-11
+K_MAX_PML = flt32(configs["simul_params"]["k_max_pml"])
+ALPHA_MAX_PML = flt32(2.0 * PI * (simul_probes[0].get_freq() / 2.0))  # from Festa and Vilotte
 
 # Perfil de amortecimento na direcao "x" dentro do grid
-i = np.arange(nx)
-xval = dx * i
-xval_pml_left = x_orig_left - xval
-xval_pml_right = xval - x_orig_right
-x_pml_mask_left = np.where(xval_pml_left < 0.0, False, True)
-x_pml_mask_right = np.where(xval_pml_right < 0.0, False, True)
-x_mask = np.logical_or(x_pml_mask_left, x_pml_mask_right)
-x_pml = np.zeros(nx)
-x_pml[x_pml_mask_left] = xval_pml_left[x_pml_mask_left]
-x_pml[x_pml_mask_right] = xval_pml_right[x_pml_mask_right]
-x_norm = x_pml / thickness_pml_x
-d_x = np.expand_dims((d0_x * x_norm ** NPOWER).astype(flt32), axis=(1, 2))
-k_x = np.expand_dims((1.0 + (K_MAX_PML - 1.0) * x_norm ** NPOWER).astype(flt32), axis=(1, 2))
-alpha_x = np.expand_dims((ALPHA_MAX_PML * (1.0 - np.where(x_mask, x_norm, 1.0))).astype(flt32), axis=(1, 2))
-b_x = np.exp(-(d_x / k_x + alpha_x) * dt).astype(flt32)
-i = np.where(d_x > 1e-6)
-a_x = np.zeros((nx, 1, 1), dtype=flt32)
-a_x[i] = d_x[i] * (b_x[i] - 1.0) / (k_x[i] * (d_x[i] + k_x[i] * alpha_x[i]))
+a_x, b_x, k_x = simul_roi.calc_pml_array(axis='x', grid='f', dt=dt, d0=d0_x,
+                                         npower=NPOWER, k_max=K_MAX_PML, alpha_max=ALPHA_MAX_PML)
+a_x = np.expand_dims(a_x.astype(flt32), axis=(1, 2))
+b_x = np.expand_dims(b_x.astype(flt32), axis=(1, 2))
+k_x = np.expand_dims(k_x.astype(flt32), axis=(1, 2))
 
 # Perfil de amortecimento na direcao "x" dentro do meio grid (staggered grid)
-xval_pml_left = x_orig_left - (xval + dx / 2.0)
-xval_pml_right = (xval + dx / 2.0) - x_orig_right
-x_pml_mask_left = np.where(xval_pml_left < 0.0, False, True)
-x_pml_mask_right = np.where(xval_pml_right < 0.0, False, True)
-x_mask_half = np.logical_or(x_pml_mask_left, x_pml_mask_right)
-x_pml = np.zeros(nx)
-x_pml[x_pml_mask_left] = xval_pml_left[x_pml_mask_left]
-x_pml[x_pml_mask_right] = xval_pml_right[x_pml_mask_right]
-x_norm = x_pml / thickness_pml_x
-d_x_half = np.expand_dims((d0_x * x_norm ** NPOWER).astype(flt32), axis=(1, 2))
-k_x_half = np.expand_dims((1.0 + (K_MAX_PML - 1.0) * x_norm ** NPOWER).astype(flt32), axis=(1, 2))
-alpha_x_half = np.expand_dims((ALPHA_MAX_PML * (1.0 - np.where(x_mask_half, x_norm, 1.0))).astype(flt32), axis=(1, 2))
-b_x_half = np.exp(-(d_x_half / k_x_half + alpha_x_half) * dt).astype(flt32)
-i = np.where(d_x_half > 1e-6)
-a_x_half = np.zeros((nx, 1, 1), dtype=flt32)
-a_x_half[i] = d_x_half[i] * (b_x_half[i] - 1.0) / (k_x_half[i] * (d_x_half[i] + k_x_half[i] * alpha_x_half[i]))
-
-# Amortecimento na direcao "y" (vertical)
-# Origem da PML (posicao das bordas superior e inferior menos a espessura, em unidades de distancia)
-y_orig_top = thickness_pml_y
-y_orig_bottom = (ny - 1) * dy - thickness_pml_y
+a_x_half, b_x_half, k_x_half = simul_roi.calc_pml_array(axis='x', grid='h', dt=dt, d0=d0_x,
+                                                        npower=NPOWER, k_max=K_MAX_PML, alpha_max=ALPHA_MAX_PML)
+a_x_half = np.expand_dims(a_x_half.astype(flt32), axis=(1, 2))
+b_x_half = np.expand_dims(b_x_half.astype(flt32), axis=(1, 2))
+k_x_half = np.expand_dims(k_x_half.astype(flt32), axis=(1, 2))
 
 # Perfil de amortecimento na direcao "y" dentro do grid
-j = np.arange(ny)
-yval = dy * j
-y_pml_top = y_orig_top - yval
-y_pml_bottom = yval - y_orig_bottom
-y_pml_mask_top = np.where(y_pml_top < 0.0, False, True)
-y_pml_mask_bottom = np.where(y_pml_bottom < 0.0, False, True)
-y_mask = np.logical_or(y_pml_mask_top, y_pml_mask_bottom)
-y_pml = np.zeros(ny)
-y_pml[y_pml_mask_top] = y_pml_top[y_pml_mask_top]
-y_pml[y_pml_mask_bottom] = y_pml_bottom[y_pml_mask_bottom]
-y_norm = y_pml / thickness_pml_y
-d_y = np.expand_dims((d0_y * y_norm ** NPOWER).astype(flt32), axis=(0, 2))
-k_y = np.expand_dims((1.0 + (K_MAX_PML - 1.0) * y_norm ** NPOWER).astype(flt32), axis=(0, 2))
-alpha_y = np.expand_dims((ALPHA_MAX_PML * (1.0 - np.where(y_mask, y_norm, 1.0))).astype(flt32), axis=(0, 2))
-b_y = np.exp(-(d_y / k_y + alpha_y) * dt).astype(flt32)
-j = np.where(d_y > 1e-6)
-a_y = np.zeros((1, ny, 1), dtype=flt32)
-a_y[j] = d_y[j] * (b_y[j] - 1.0) / (k_y[j] * (d_y[j] + k_y[j] * alpha_y[j]))
+a_y, b_y, k_y = simul_roi.calc_pml_array(axis='y', grid='f', dt=dt, d0=d0_y,
+                                         npower=NPOWER, k_max=K_MAX_PML, alpha_max=ALPHA_MAX_PML)
+a_y = np.expand_dims(a_y.astype(flt32), axis=(0, 2))
+b_y = np.expand_dims(b_y.astype(flt32), axis=(0, 2))
+k_y = np.expand_dims(k_y.astype(flt32), axis=(0, 2))
 
 # Perfil de amortecimento na direcao "y" dentro do meio grid (staggered grid)
-y_pml_top = y_orig_top - (yval + dy / 2.0)
-y_pml_bottom = (yval + dy / 2.0) - y_orig_bottom
-y_pml_mask_top = np.where(y_pml_top < 0.0, False, True)
-y_pml_mask_bottom = np.where(y_pml_bottom < 0.0, False, True)
-y_mask_half = np.logical_or(y_pml_mask_top, y_pml_mask_bottom)
-y_pml = np.zeros(ny)
-y_pml[y_pml_mask_top] = y_pml_top[y_pml_mask_top]
-y_pml[y_pml_mask_bottom] = y_pml_bottom[y_pml_mask_bottom]
-y_norm = y_pml / thickness_pml_y
-d_y_half = np.expand_dims((d0_y * y_norm ** NPOWER).astype(flt32), axis=(0, 2))
-k_y_half = np.expand_dims((1.0 + (K_MAX_PML - 1.0) * y_norm ** NPOWER).astype(flt32), axis=(0, 2))
-alpha_y_half = np.expand_dims((ALPHA_MAX_PML * (1.0 - np.where(y_mask_half, y_norm, 1.0))).astype(flt32), axis=(0, 2))
-b_y_half = np.exp(-(d_y_half / k_y_half + alpha_y_half) * dt).astype(flt32)
-j = np.where(d_y_half > 1e-6)
-a_y_half = np.zeros((1, ny, 1), dtype=flt32)
-a_y_half[j] = d_y_half[j] * (b_y_half[j] - 1.0) / (k_y_half[j] * (d_y_half[j] + k_y_half[j] * alpha_y_half[j]))
+a_y_half, b_y_half, k_y_half = simul_roi.calc_pml_array(axis='y', grid='h', dt=dt, d0=d0_y,
+                                                        npower=NPOWER, k_max=K_MAX_PML, alpha_max=ALPHA_MAX_PML)
+a_y_half = np.expand_dims(a_y_half.astype(flt32), axis=(0, 2))
+b_y_half = np.expand_dims(b_y_half.astype(flt32), axis=(0, 2))
+k_y_half = np.expand_dims(k_y_half.astype(flt32), axis=(0, 2))
 
 # Amortecimento na direcao "z" (profundidade)
-# Origem da PML (posicao das bordas frontal e fundos menos a espessura, em unidades de distancia)
-z_orig_front = thickness_pml_z
-z_orig_back = (nz - 1) * dz - thickness_pml_z
-
-# Perfil de amortecimento na direcao "z" dentro do grid
-k = np.arange(nz)
-zval = dz * k
-z_pml_front = z_orig_front - zval
-z_pml_back = zval - z_orig_back
-z_pml_mask_front = np.where(z_pml_front < 0.0, False, True)
-z_pml_mask_back = np.where(z_pml_back < 0.0, False, True)
-z_mask = np.logical_or(z_pml_mask_front, z_pml_mask_back)
-z_pml = np.zeros(nz)
-z_pml[z_pml_mask_front] = z_pml_front[z_pml_mask_front]
-z_pml[z_pml_mask_back] = z_pml_back[z_pml_mask_back]
-z_norm = z_pml / thickness_pml_z
-d_z = np.expand_dims((d0_z * z_norm ** NPOWER).astype(flt32), axis=(0, 1))
-k_z = np.expand_dims((1.0 + (K_MAX_PML - 1.0) * z_norm ** NPOWER).astype(flt32), axis=(0, 1))
-alpha_z = np.expand_dims((ALPHA_MAX_PML * (1.0 - np.where(z_mask, z_norm, 1.0))).astype(flt32), axis=(0, 1))
-b_z = np.exp(-(d_z / k_z + alpha_z) * dt).astype(flt32)
-k = np.where(d_z > 1e-6)
-a_z = np.zeros((1, 1, nz), dtype=flt32)
-a_z[k] = d_z[k] * (b_z[k] - 1.0) / (k_z[k] * (d_z[k] + k_z[k] * alpha_z[k]))
+a_z, b_z, k_z = simul_roi.calc_pml_array(axis='z', grid='f', dt=dt, d0=d0_z,
+                                         npower=NPOWER, k_max=K_MAX_PML, alpha_max=ALPHA_MAX_PML)
+a_z = np.expand_dims(a_z.astype(flt32), axis=(0, 1))
+b_z = np.expand_dims(b_z.astype(flt32), axis=(0, 1))
+k_z = np.expand_dims(k_z.astype(flt32), axis=(0, 1))
 
 # Perfil de amortecimento na direcao "z" dentro do meio grid (staggered grid)
-z_pml_front = z_orig_front - (zval + dz / 2.0)
-z_pml_back = (zval + dz / 2.0) - z_orig_back
-z_pml_mask_front = np.where(z_pml_front < 0.0, False, True)
-z_pml_mask_back = np.where(z_pml_back < 0.0, False, True)
-z_mask_half = np.logical_or(z_pml_mask_front, z_pml_mask_back)
-z_pml = np.zeros(nz)
-z_pml[z_pml_mask_front] = z_pml_front[z_pml_mask_front]
-z_pml[z_pml_mask_back] = z_pml_back[z_pml_mask_back]
-z_norm = z_pml / thickness_pml_z
-d_z_half = np.expand_dims((d0_z * z_norm ** NPOWER).astype(flt32), axis=(0, 1))
-k_z_half = np.expand_dims((1.0 + (K_MAX_PML - 1.0) * z_norm ** NPOWER).astype(flt32), axis=(0, 1))
-alpha_z_half = np.expand_dims((ALPHA_MAX_PML * (1.0 - np.where(z_mask_half, z_norm, 1.0))).astype(flt32), axis=(0, 1))
-b_z_half = np.exp(-(d_z_half / k_z_half + alpha_z_half) * dt).astype(flt32)
-k = np.where(d_z_half > 1e-6)
-a_z_half = np.zeros((1, 1, nz), dtype=flt32)
-a_z_half[k] = d_z_half[k] * (b_z_half[k] - 1.0) / (k_z_half[k] * (d_z_half[k] + k_z_half[k] * alpha_z_half[k]))
-
-# Imprime a posicao da fonte
-print(f'Posicao da fonte:')
-print(f'x = {xsource}')
-print(f'y = {ysource}')
-print(f'z = {zsource}\n')
-
-# Define a localizacao dos receptores
+a_z_half, b_z_half, k_z_half = simul_roi.calc_pml_array(axis='z', grid='h', dt=dt, d0=d0_z,
+                                                        npower=NPOWER, k_max=K_MAX_PML, alpha_max=ALPHA_MAX_PML)
+a_z_half = np.expand_dims(a_z_half.astype(flt32), axis=(0, 1))
+b_z_half = np.expand_dims(b_z_half.astype(flt32), axis=(0, 1))
+k_z_half = np.expand_dims(k_z_half.astype(flt32), axis=(0, 1))
+
+# Imprime a quantidade de fontes e receptores
+print(f'Existem {NSRC} fontes')
 print(f'Existem {NREC} receptores')
 
-# Find closest grid point for each receiver
-ix_rec = np.zeros(NREC, dtype=int)
-iy_rec = np.zeros(NREC, dtype=int)
-for irec in range(NREC):
-    dist = HUGEVAL
-    for j in range(ny):
-        for i in range(nx):
-            distval = np.sqrt((dx * i - xrec[irec])**2 + (dx * j - yrec[irec])**2)
-            if distval < dist:
-                dist = distval
-                ix_rec[irec] = i
-                iy_rec[irec] = j
-
-    print(f'receiver {irec}: x_target = {xrec[irec]}, y_target = {yrec[irec]}')
-    print(f'Ponto mais perto do grid encontrado na distancia {dist}, em i = {ix_rec[irec]}, j = {iy_rec[irec]}\n')
+# Arrays para armazenamento dos sinais dos sensores
+print(f'Sinais dos receptores com {NSTEP_REC} amostras (decimacao {rec_decim}, dt = {dt * rec_decim})')
+sisvx = np.zeros((NSTEP_REC, NREC), dtype=flt32)
+sisvy = np.zeros((NSTEP_REC, NREC), dtype=flt32)
+sisvz = np.zeros((NSTEP_REC, NREC), dtype=flt32)
+
+# Define os indices dos planos de visualizacao
+# x_plane_idx = int(nx / 2) if show_yz else 0
+# y_plane_idx = int(ny / 2) if show_xz else 0
+# z_plane_idx = int(nz / 2) if show_xy else 0
+x_plane_idx = int(simul_roi.get_nearest_grid_idx(simul_probes[0].coord_center)[0]) if show_yz else 0
+y_plane_idx = int(simul_roi.get_nearest_grid_idx(simul_probes[0].coord_center)[1]) if show_xz else 0
+z_plane_idx = int(simul_roi.get_nearest_grid_idx(simul_probes[0].coord_center)[2]) if show_xy else 0
+
 
 # Verifica a condicao de estabilidade de Courant
 # R. Courant et K. O. Friedrichs et H. Lewy (1928)
-courant_number = cp * np.sqrt(taumax) * dt * np.sqrt(1.0 / dx ** 2 + 1.0 / dy ** 2 + 1.0 / dz ** 2)
-print(f'Numero de Courant e {courant_number}')
-print(f'Vpmax = {cp * np.sqrt(taumax)}')
+courant_number = flt32(cp * np.sqrt(taumax) * dt * np.sqrt(1.0 / dx ** 2 + 1.0 / dy ** 2 + 1.0 / dz ** 2))
+print(f'\nNumero de Courant e {courant_number}')
 if courant_number > 1:
-    print("O passo de tempo e muito longo, a simulação sera instavel")
+    print("O passo de tempo e muito longo, a simulacao sera instavel")
     exit(1)
-print(f'Number of points per wavelength = {cs * np.sqrt(taumin)/(2.5 * f0)/dx}, Vsmin = {cs * np.sqrt(taumin)}')
-
 
-def sim_cpu():
-    global vx, vy, vz, sigmaxx, sigmayy, sigmazz, sigmaxx_r, sigmayy_r, sigmazz_r
-    global sigmaxy, sigmaxz, sigmayz, sigmaxy_r, sigmaxz_r, sigmayz_r
-    global e1, e11, e12, e13, e23, e22
-    global memory_dvx_dx, memory_dvx_dy, memory_dvx_dz
-    global memory_dvy_dx, memory_dvy_dy, memory_dvy_dz
-    global memory_dvz_dx, memory_dvz_dy, memory_dvz_dz
-    global memory_dsigmaxx_dx, memory_dsigmayy_dy, memory_dsigmazz_dz
-    global memory_dsigmaxy_dx, memory_dsigmaxy_dy
-    global memory_dsigmaxz_dx, memory_dsigmaxz_dz
-    global memory_dsigmayz_dy, memory_dsigmayz_dz
-    global sisvx, sisvy
-    global total_energy, total_energy_kinetic, total_energy_potential
-    global value_dvx_dx, value_dvy_dy, value_dvz_dz
-    global a_x, a_x_half, b_x, b_x_half, k_x, k_x_half
-    global a_y, a_y_half, b_y, b_y_half, k_y, k_y_half
-    global a_z, a_z_half, b_z, b_z_half, k_z, k_z_half
-    global duxdx, duxdy, duxdz, duydx, duydy, duydz, duzdx, duzdy, duzdz, div
-    global value_dsigmaxx_dx, value_dsigmaxy_dy, value_dsigmaxz_dz
-    global memory_dsigmaxx_dx, memory_dsigmaxy_dy, memory_dsigmaxz_dz
-    global value_dsigmaxy_dx, value_dsigmayy_dy, value_dsigmayz_dz
-    global source_term, force_x, force_y, total_energy
-    global epsilon_xx, epsilon_yy, epsilon_zz, epsilon_xy, epsilon_xz, epsilon_yz
-
-    # Configuracao e inicializacao da janela de exibicao
-    App = pg.QtWidgets.QApplication([])
-    windowVx = Window('Vx')
-    windowVy = Window('Vy')
-    # windowVz = Window('Vz')
-
-    DELTAT_over_rho = dt / rho
-
-    # Inicio do laco de tempo
-    for it in range(1, NSTEP+1):
-        print(f'it = {it}')
-
-        # Calculo da tensao [stress] - {sigma} (equivalente a pressao nos gases-liquidos)
-        # sigma_ii -> tensoes normais; sigma_ij -> tensoes cisalhantes
-        # Primeiro "laco" i: 1,NX-1; j: 2,NY; k: 2,NZ -> [1:-2, 2:-1, 2:-1]
-        mul_relaxed = np.float32(mu)
-        lambdal_relaxed = np.float32(lambda_)
-        lambdalplus2mul_relaxed = np.float32(lambdal_relaxed + 2.0 * mul_relaxed)
-        lambdal_unrelaxed = np.float32((lambdal_relaxed + 2.0/3.0 * mul_relaxed) * Mu_nu1 -
-                                       2.0/3.0 * mul_relaxed * Mu_nu2)
-        mul_unrelaxed = np.float32(mul_relaxed * Mu_nu2)
-        lambdalplus2mul_unrelaxed = np.float32(lambdal_unrelaxed + 2.0 * mul_unrelaxed)
-
-        value_dvx_dx[1:-2, 2:-1, 2:-1] = (27.0*(vx[2:-1, 2:-1, 2:-1] - vx[1:-2, 2:-1, 2:-1]) -
-                                          vx[3:, 2:-1, 2:-1] + vx[:-3, 2:-1, 2:-1]) * one_dx/24.0
-        value_dvy_dy[1:-2, 2:-1, 2:-1] = (27.0*(vy[1:-2, 2:-1, 2:-1] - vy[1:-2, 1:-2, 2:-1]) -
-                                          vy[1:-2, 3:, 2:-1] + vy[1:-2, :-3, 2:-1]) * one_dy/24.0
-        value_dvz_dz[1:-2, 2:-1, 2:-1] = (27.0*(vz[1:-2, 2:-1, 2:-1] - vz[1:-2, 2:-1, 1:-2]) -
-                                          vz[1:-2, 2:-1, 3:] + vz[1:-2, 2:-1, :-3]) * one_dz/24.0
-
-        memory_dvx_dx[1:-2, 2:-1, 2:-1] = (b_x_half[:-1, :, :] * memory_dvx_dx[1:-2, 2:-1, 2:-1] +
-                                           a_x_half[:-1, :, :] * value_dvx_dx[1:-2, 2:-1, 2:-1])
-        memory_dvy_dy[1:-2, 2:-1, 2:-1] = (b_y[:, -1, :] * memory_dvy_dy[1:-2, 2:-1, 2:-1] +
-                                           a_y[:, -1, :] * value_dvy_dy[1:-2, 2:-1, 2:-1])
-        memory_dvz_dz[1:-2, 2:-1, 2:-1] = (b_z[:, :, -1] * memory_dvz_dz[1:-2, 2:-1, 2:-1] +
-                                           a_z[:, :, -1] * value_dvz_dz[1:-2, 2:-1, 2:-1])
-
-        duxdx[1:-2, 2:-1, 2:-1] = value_dvx_dx[1:-2, 2:-1, 2:-1] / k_x_half[:-1, :, :] + memory_dvx_dx[1:-2, 2:-1, 2:-1]
-        duydy[1:-2, 2:-1, 2:-1] = value_dvy_dy[1:-2, 2:-1, 2:-1] / k_y[:, :-1, :] + memory_dvy_dy[1:-2, 2:-1, 2:-1]
-        duzdz[1:-2, 2:-1, 2:-1] = value_dvz_dz[1:-2, 2:-1, 2:-1] / k_z[:, :, :-1] + memory_dvz_dz[1:-2, 2:-1, 2:-1]
-
-        div = duxdx + duydy + duzdz
-
-        # evolution e1(0)
-        tauinv = - inv_tau_sigma_nu1[0]
-        Un = e1[0]
-        Sn = div * phi_nu1[0]
-        tauinvUn = tauinv * Un
-        Unp1 = (Un + dt * (Sn + 0.5 * tauinvUn)) / (1.0 - dt * 0.5 * tauinv)
-        e1[0] = Unp1
-
-        # evolution e1(1)
-        tauinv = - inv_tau_sigma_nu1[1]
-        Un = e1[1]
-        Sn = div * phi_nu1[1]
-        tauinvUn = tauinv * Un
-        Unp1 = (Un + dt * (Sn + 0.5 * tauinvUn)) / (1.0 - dt * 0.5 * tauinv)
-        e1[1] = Unp1
-
-        # evolution e11(0)
-        tauinv = - inv_tau_sigma_nu2[0]
-        Un = e11[0]
-        Sn = (duxdx - div / np.float32(3.0)) * phi_nu2[0]
-        tauinvUn = tauinv * Un
-        Unp1 = (Un + dt * (Sn + 0.5 * tauinvUn)) / (1.0 - dt * 0.5 * tauinv)
-        e11[1] = Unp1
-
-        # evolution e11(1)
-        tauinv = - inv_tau_sigma_nu2[1]
-        Un = e11[1]
-        Sn = (duxdx - div / np.float32(3.0)) * phi_nu2[1]
-        tauinvUn = tauinv * Un
-        Unp1 = (Un + dt * (Sn + 0.5 * tauinvUn)) / (1.0 - dt * 0.5 * tauinv)
-        e11[1] = Unp1
-
-        # evolution e22(0)
-        tauinv = - inv_tau_sigma_nu2[0]
-        Un = e22[0]
-        Sn = (duydy - div / np.float32(3.0)) * phi_nu2[0]
-        tauinvUn = tauinv * Un
-        Unp1 = (Un + dt * (Sn + 0.5 * tauinvUn)) / (1.0 - dt * 0.5 * tauinv)
-        e22[0] = Unp1
-
-        # evolution e22(1)
-        tauinv = - inv_tau_sigma_nu2[1]
-        Un = e22[1]
-        Sn = (duydy - div / np.float32(3.0)) * phi_nu2[1]
-        tauinvUn = tauinv * Un
-        Unp1 = (Un + dt * (Sn + 0.5 * tauinvUn)) / (1.0 - dt * 0.5 * tauinv)
-        e22[1] = Unp1
-
-        # add the memory variables using the relaxed parameters (Carcione page 111)
-        # : there is a bug in Carcione's equation for sigma_zz
-        sigmaxx = sigmaxx + dt * ((lambdal_relaxed + 2.0/3.0 * mul_relaxed) * (e1[0] + e1[1]) +
-                                  2.0 * mul_relaxed * (e11[0] + e11[1]))
-        sigmayy = sigmayy + dt * ((lambdal_relaxed + 2.0/3.0 * mul_relaxed) * (e1[0] + e1[1]) +
-                                  2.0 * mul_relaxed * (e22[0] + e22[1]))
-        sigmazz = sigmazz + dt * ((lambdal_relaxed + np.float32(2.0) * mul_relaxed) * (e1[0] + e1[1]) -
-                                  2.0/3.0 * mul_relaxed * (e11[0] + e11[1] + e22[0] + e22[1]))
-
-        # compute the stress using the unrelaxed Lame parameters (Carcione page 111)
-        sigmaxx = sigmaxx + (lambdalplus2mul_unrelaxed*duxdx + lambdal_unrelaxed*duydy + lambdal_unrelaxed*duzdz) * dt
-        sigmayy = sigmayy + (lambdal_unrelaxed*duxdx + lambdalplus2mul_unrelaxed*duydy + lambdal_unrelaxed*duzdz) * dt
-        sigmazz = sigmazz + (lambdal_unrelaxed*duxdx + lambdal_unrelaxed*duydy + lambdalplus2mul_unrelaxed*duzdz) * dt
-        sigmaxx_r = sigmaxx_r + (lambdalplus2mul_relaxed*duxdx + lambdal_relaxed*duydy + lambdal_relaxed*duzdz) * dt
-        sigmayy_r = sigmayy_r + (lambdal_relaxed*duxdx + lambdalplus2mul_relaxed*duydy + lambdal_relaxed*duzdz) * dt
-        sigmazz_r = sigmazz_r + (lambdal_relaxed*duxdx + lambdal_relaxed*duydy + lambdalplus2mul_relaxed*duzdz) * dt
-
-        # Segundo "laco" i: 2,NX; j: 1,NY-1; k: 1,NZ -> [2:-1, 1:-2, 1:-1]
-        mul_relaxed = np.float32(mu)
-        mul_unrelaxed = np.float32(mul_relaxed * Mu_nu2)
-
-        value_dvy_dx[2:-1, 1:-2, 1:-1] = (27.0*(vy[2:-1, 1:-2, 1:-1] - vy[1:-2, 1:-2, 1:-1]) -
-                                          vy[3:, 1:-2, 1:-1] + vy[:-3, 1:-2, 1:-1]) * one_dx/24.0
-        value_dvx_dy[2:-1, 1:-2, 1:-1] = (27.0*(vx[2:-1, 2:-1, 1:-1] - vx[2:-1, 1:-2, 1:-1]) -
-                                          vx[2:-1, 3:, 1:-1] + vx[2:-1, :-3, 1:-1]) * one_dy/24.0
-
-        memory_dvy_dx[2:-1, 1:-2, 1:-1] = (b_x[:-1, :, :] * memory_dvy_dx[2:-1, 1:-2, 1:-1] +
-                                           a_x[:-1, :, :] * value_dvy_dx[2:-1, 1:-2, 1:-1])
-        memory_dvx_dy[2:-1, 1:-2, 1:-1] = (b_y_half[:, :-1, :] * memory_dvx_dy[2:-1, 1:-2, 1:-1] +
-                                           a_y_half[:, :-1, :] * value_dvx_dy[2:-1, 1:-2, 1:-1])
-
-        duydx[2:-1, 1:-2, 1:-1] = value_dvy_dx[2:-1, 1:-2, 1:-1]/k_x[:-1, :, :] + memory_dvy_dx[2:-1, 1:-2, 1:-1]
-        duxdy[2:-1, 1:-2, 1:-1] = value_dvx_dy[2:-1, 1:-2, 1:-1]/k_y_half[:, :-1, :] + memory_dvx_dy[2:-1, 1:-2, 1:-1]
-
-        # evolution e12(0)
-        tauinv = - inv_tau_sigma_nu2[0]
-        Un = e12[0]
-        Sn = (duxdy + duydx) * phi_nu2[0]
-        tauinvUn = tauinv * Un
-        Unp1 = (Un + dt * (Sn + 0.5 * tauinvUn)) / (1.0 - dt * 0.5 * tauinv)
-        e12[0] = Unp1
-
-        # evolution e12(1)
-        tauinv = - inv_tau_sigma_nu2[1]
-        Un = e12[1]
-        Sn = (duxdy + duydx) * phi_nu2[1]
-        tauinvUn = tauinv * Un
-        Unp1 = (Un + dt * (Sn + 0.5 * tauinvUn)) / (1.0 - dt * 0.5 * tauinv)
-        e12[1] = Unp1
-
-        sigmaxy = sigmaxy + dt * mul_relaxed * (e12[0] + e12[1])
-        sigmaxy = sigmaxy + mul_unrelaxed * (duxdy + duydx) * dt
-        sigmaxy_r = sigmaxy_r + mul_relaxed * (duxdy + duydx) * dt
-
-        # Terceiro "laco" k: 1,NZ-1;
-        # primeira parte:  i: 2,NX; j: 1,NY -> [2:-1, 1:-1, 1:-2]
-        mul_relaxed = np.float32(mu)
-        mul_unrelaxed = np.float32(mul_relaxed * Mu_nu2)
-
-        value_dvz_dx[2:-1, 1:-1, 1:-2] = (27.0*(vz[2:-1, 1:-1, 1:-2] - vz[1:-2, 1:-1, 1:-2]) -
-                                          vz[3:, 1:-1, 1:-2] + vz[:-3, 1:-1, 1:-2]) * one_dx/24.0
-        value_dvx_dz[2:-1, 1:-1, 1:-2] = (27.0*(vx[2:-1, 1:-1, 2:-1] - vx[2:-1, 1:-1, 1:-2]) -
-                                          vx[2:-1, 1:-1, 3:] + vx[2:-1, 1:-1, :-3]) * one_dz/24.0
-
-        memory_dvz_dx[2:-1, 1:-1, 1:-2] = (b_x[:-1, :, :] * memory_dvz_dx[2:-1, 1:-1, 1:-2] +
-                                           a_x[:-1, :, :] * value_dvz_dx[2:-1, 1:-1, 1:-2])
-        memory_dvx_dz[2:-1, 1:-1, 1:-2] = (b_z_half[:, :, :-1] * memory_dvx_dz[2:-1, 1:-1, 1:-2] +
-                                           a_z_half[:, :, :-1] * value_dvx_dz[2:-1, 1:-1, 1:-2])
-
-        duzdx[2:-1, 1:-1, 1:-2] = value_dvz_dx[2:-1, 1:-1, 1:-2]/k_x[:-1, :, :] + memory_dvz_dx[2:-1, 1:-1, 1:-2]
-        duxdz[2:-1, 1:-1, 1:-2] = value_dvx_dz[2:-1, 1:-1, 1:-2]/k_z_half[:, :, :-1] + memory_dvx_dz[2:-1, 1:-1, 1:-2]
-
-        # evolution e13(0)
-        tauinv = - inv_tau_sigma_nu2[0]
-        Un = e13[0]
-        Sn = (duxdz + duzdx) * phi_nu2[0]
-        tauinvUn = tauinv * Un
-        Unp1 = (Un + dt * (Sn + 0.5 * tauinvUn)) / (1.0 - dt * 0.5 * tauinv)
-        e13[0] = Unp1
-
-        # evolution e13[1]
-        tauinv = - inv_tau_sigma_nu2[1]
-        Un = e13[1]
-        Sn = (duxdz + duzdx) * phi_nu2[1]
-        tauinvUn = tauinv * Un
-        Unp1 = (Un + dt * (Sn + 0.5 * tauinvUn)) / (1.0 - dt * 0.5 * tauinv)
-        e13[1] = Unp1
-
-        sigmaxz = sigmaxz + dt * mul_relaxed * (e13[0] + e13[1])
-        sigmaxz = sigmaxz + mul_unrelaxed * (duxdz + duzdx) * dt
-        sigmaxz_r = sigmaxz_r + mul_relaxed * (duxdz + duzdx) * dt
-
-        # segunda parte:  i: 1,NX; j: 1,NY-1 -> [1:-1, 1:-2, 1:-2]
-        mul_relaxed = np.float32(mu)
-        mul_unrelaxed = np.float32(mul_relaxed * Mu_nu2)
-
-        value_dvz_dy[1:-1, 1:-2, 1:-2] = (27.0*(vz[1:-1, 2:-1, 1:-2] - vz[1:-1, 1:-2, 1:-2]) -
-                                          vz[1:-1, 3:, 1:-2] + vz[1:-1, :-3, 1:-2]) * one_dy/24.0
-        value_dvy_dz[1:-1, 1:-2, 1:-2] = (27.0*(vy[1:-1, 1:-2, 2:-1] -vy[1:-1, 1:-2, 1:-2]) -
-                                          vy[1:-1, 1:-2, 3:] + vy[1:-1, 1:-2, :-3]) * one_dz/24.0
-
-        memory_dvz_dy[1:-1, 1:-2, 1:-2] = (b_y_half[:, :-1, :] * memory_dvz_dy[1:-1, 1:-2, 1:-2] +
-                                           a_y_half[:, :-1, :] * value_dvz_dy[1:-1, 1:-2, 1:-2])
-        memory_dvy_dz[1:-1, 1:-2, 1:-2] = (b_z_half[:, :, :-1] * memory_dvy_dz[1:-1, 1:-2, 1:-2] +
-                                           a_z_half[:, :, :-1] * value_dvy_dz[1:-1, 1:-2, 1:-2])
-
-        duzdy[1:-1, 1:-2, 1:-2] = value_dvz_dy[1:-1, 1:-2, 1:-2]/k_y_half[:, :-1, :] + memory_dvz_dy[1:-1, 1:-2, 1:-2]
-        duydz[1:-1, 1:-2, 1:-2] = value_dvy_dz[1:-1, 1:-2, 1:-2]/k_z_half[:, :, :-1] + memory_dvy_dz[1:-1, 1:-2, 1:-2]
-
-        # evolution e23(0)
-        tauinv = - inv_tau_sigma_nu2[0]
-        Un = e23[0]
-        Sn = (duydz + duzdy) * phi_nu2[0]
-        tauinvUn = tauinv * Un
-        Unp1 = (Un + dt * (Sn + 0.5 * tauinvUn)) / (1.0 - dt * 0.5 * tauinv)
-        e23[0] = Unp1
-
-        # evolution e23(1)
-        tauinv = - inv_tau_sigma_nu2[1]
-        Un = e23[1]
-        Sn = (duydz + duzdy) * phi_nu2[1]
-        tauinvUn = tauinv * Un
-        Unp1 = (Un + dt * (Sn + 0.5 * tauinvUn)) / (1.0 - dt * 0.5 * tauinv)
-        e23[1] = Unp1
-
-        sigmayz = sigmayz + dt * mul_relaxed * (e23[0] + e23[1])
-        sigmayz = sigmayz + mul_unrelaxed * (duydz + duzdy) * dt
-        sigmayz_r = sigmayz_r + mul_relaxed * (duydz + duzdy) * dt
-
-        # Calculo da velocidade
-        # Primeiro "laco" k: 2,NZ;
-        # primeira parte:  i: 2,NX; j: 2,NY -> [2:-1, 2:-1, 2:-1]
-        value_dsigmaxx_dx[2:-1, 2:-1, 2:-1] = (27.0*(sigmaxx[2:-1, 2:-1, 2:-1] - sigmaxx[1:-2, 2:-1, 2:-1]) -
-                                               sigmaxx[3:, 2:-1, 2:-1] + sigmaxx[:-3, 2:-1, 2:-1]) * one_dx/24.0
-        value_dsigmaxy_dy[2:-1, 2:-1, 2:-1] = (27.0*(sigmaxy[2:-1, 2:-1, 2:-1] - sigmaxy[2:-1, 1:-2, 2:-1]) -
-                                               sigmaxy[2:-1, 3:, 2:-1] + sigmaxy[2:-1, :-3, 2:-1]) * one_dy/24.0
-        value_dsigmaxz_dz[2:-1, 2:-1, 2:-1] = (27.0*(sigmaxz[2:-1, 2:-1, 2:-1] - sigmaxz[2:-1, 2:-1, 1:-2]) -
-                                               sigmaxz[2:-1, 2:-1, 3:] + sigmaxz[2:-1, 2:-1, :-3]) * one_dz/24.0
-
-        memory_dsigmaxx_dx[2:-1, 2:-1, 2:-1] = (b_x[:-1, :,:] * memory_dsigmaxx_dx[2:-1, 2:-1, 2:-1] +
-                                                a_x[:-1, :, :] * value_dsigmaxx_dx[2:-1, 2:-1, 2:-1])
-        memory_dsigmaxy_dy[2:-1, 2:-1, 2:-1] = (b_y[:, :-1, :] * memory_dsigmaxy_dy[2:-1, 2:-1, 2:-1] +
-                                                a_y[:, :-1, :] * value_dsigmaxy_dy[2:-1, 2:-1, 2:-1])
-        memory_dsigmaxz_dz[2:-1, 2:-1, 2:-1] = (b_z[:, :, :-1] * memory_dsigmaxz_dz[2:-1, 2:-1, 2:-1] +
-                                                a_z[:, :, :-1] * value_dsigmaxz_dz[2:-1, 2:-1, 2:-1])
-
-        value_dsigmaxx_dx[2:-1, 2:-1, 2:-1] = (value_dsigmaxx_dx[2:-1, 2:-1, 2:-1]/k_x[:-1, :, :] +
-                                               memory_dsigmaxx_dx[2:-1, 2:-1, 2:-1])
-        value_dsigmaxy_dy[2:-1, 2:-1, 2:-1] = (value_dsigmaxy_dy[2:-1, 2:-1, 2:-1]/k_y[:, :-1, :] +
-                                               memory_dsigmaxy_dy[2:-1, 2:-1, 2:-1])
-        value_dsigmaxz_dz[2:-1, 2:-1, 2:-1] = (value_dsigmaxz_dz[2:-1, 2:-1, 2:-1]/k_z[:, :, :-1] +
-                                               memory_dsigmaxz_dz[2:-1, 2:-1, 2:-1])
-
-        vx = DELTAT_over_rho * (value_dsigmaxx_dx + value_dsigmaxy_dy + value_dsigmaxz_dz) + vx
-
-        # segunda parte:  i: 1,NX-1; j: 1,NY-1 -> [1:-2, 1:-2, 2:-1]
-        value_dsigmaxy_dx[1:-2, 1:-2, 2:-1] = (27.0*(sigmaxy[2:-1, 1:-2, 2:-1] - sigmaxy[1:-2, 1:-2, 2:-1]) -
-                                               sigmaxy[3:, 1:-2, 2:-1] + sigmaxy[:-3, 1:-2, 2:-1]) * one_dx/24.0
-        value_dsigmayy_dy[1:-2, 1:-2, 2:-1] = (27.0*(sigmayy[1:-2, 2:-1, 2:-1] - sigmayy[1:-2, 1:-2, 2:-1]) -
-                                               sigmayy[1:-2, 3:, 2:-1] + sigmayy[1:-2, :-3, 2:-1]) * one_dy/24.0
-        value_dsigmayz_dz[1:-2, 1:-2, 2:-1] = (27.0*(sigmayz[1:-2, 1:-2, 2:-1] - sigmayz[1:-2, 1:-2, 1:-2]) -
-                                               sigmayz[1:-2, 1:-2, 3:] + sigmayz[1:-2, 1:-2, :-3]) * one_dz/24.0
-
-        memory_dsigmaxy_dx[1:-2, 1:-2, 2:-1] = (b_x_half[:-1, :, :] * memory_dsigmaxy_dx[1:-2, 1:-2, 2:-1] +
-                                                a_x_half[:-1, :, :] * value_dsigmaxy_dx[1:-2, 1:-2, 2:-1])
-        memory_dsigmayy_dy[1:-2, 1:-2, 2:-1] = (b_y_half[:, :-1, :] * memory_dsigmayy_dy[1:-2, 1:-2, 2:-1] +
-                                                a_y_half[:, :-1, :] * value_dsigmayy_dy[1:-2, 1:-2, 2:-1])
-        memory_dsigmayz_dz[1:-2, 1:-2, 2:-1] = (b_z[:, :, :-1] * memory_dsigmayz_dz[1:-2, 1:-2, 2:-1] +
-                                                a_z[:, :, :-1] * value_dsigmayz_dz[1:-2, 1:-2, 2:-1])
-
-        value_dsigmaxy_dx[1:-2, 1:-2, 2:-1] = (value_dsigmaxy_dx[1:-2, 1:-2, 2:-1]/k_x_half[:-1, :, :] +
-                                               memory_dsigmaxy_dx[1:-2, 1:-2, 2:-1])
-        value_dsigmayy_dy[1:-2, 1:-2, 2:-1] = (value_dsigmayy_dy[1:-2, 1:-2, 2:-1]/k_y_half[:, :-1, :] +
-                                               memory_dsigmayy_dy[1:-2, 1:-2, 2:-1])
-        value_dsigmayz_dz[1:-2, 1:-2, 2:-1] = (value_dsigmayz_dz[1:-2, 1:-2, 2:-1]/k_z[:, :, :-1] +
-                                               memory_dsigmayz_dz[1:-2, 1:-2, 2:-1])
-
-        vy = DELTAT_over_rho * (value_dsigmaxy_dx + value_dsigmayy_dy + value_dsigmayz_dz) + vy
-
-        # Segundo "laco" i: 1,NX-1; j: 2,NY; k: 1,NZ-1; -> [1:-2, 2:-1, 1:-2]
-        value_dsigmaxz_dx[1:-2, 2:-1, 1:-2] = (27.0*(sigmaxz[2:-1, 2:-1, 1:-2] - sigmaxz[1:-2, 2:-1, 1:-2]) -
-                                               sigmaxz[3:, 2:-1, 1:-2] + sigmaxz[:-3, 2:-1, 1:-2]) * one_dx/24.0
-        value_dsigmayz_dy[1:-2, 2:-1, 1:-2] = (27.0*(sigmayz[1:-2, 2:-1, 1:-2] - sigmayz[1:-2, 1:-2, 1:-2]) -
-                                               sigmayz[1:-2, 3:, 1:-2] + sigmayz[1:-2, :-3, 1:-2]) * one_dy/24.0
-        value_dsigmazz_dz[1:-2, 2:-1, 1:-2] = (27.0*(sigmazz[1:-2, 2:-1, 2:-1] - sigmazz[1:-2, 2:-1, 1:-2]) -
-                                               sigmazz[1:-2, 2:-1, 3:] + sigmazz[1:-2, 2:-1, :-3]) * one_dz/24.0
-
-        memory_dsigmaxz_dx[1:-2, 2:-1, 1:-2] = (b_x_half[:-1, :, :] * memory_dsigmaxz_dx[1:-2, 2:-1, 1:-2] +
-                                                a_x_half[:-1, :, :] * value_dsigmaxz_dx[1:-2, 2:-1, 1:-2])
-        memory_dsigmayz_dy[1:-2, 2:-1, 1:-2] = (b_y[:, :-1, :] * memory_dsigmayz_dy[1:-2, 2:-1, 1:-2] +
-                                                a_y[:, :-1, :] * value_dsigmayz_dy[1:-2, 2:-1, 1:-2])
-        memory_dsigmazz_dz[1:-2, 2:-1, 1:-2] = (b_z_half[:, :, :-1] * memory_dsigmazz_dz[1:-2, 2:-1, 1:-2] +
-                                                a_z_half[:, :, :-1] * value_dsigmazz_dz[1:-2, 2:-1, 1:-2])
-
-        value_dsigmaxz_dx[1:-2, 2:-1, 1:-2] = (value_dsigmaxz_dx[1:-2, 2:-1, 1:-2]/k_x_half[:-1, :, :] +
-                                               memory_dsigmaxz_dx[1:-2, 2:-1, 1:-2])
-        value_dsigmayz_dy[1:-2, 2:-1, 1:-2] = (value_dsigmayz_dy[1:-2, 2:-1, 1:-2]/k_y[:, :-1, :] +
-                                               memory_dsigmayz_dy[1:-2, 2:-1, 1:-2])
-        value_dsigmazz_dz[1:-2, 2:-1, 1:-2] = (value_dsigmazz_dz[1:-2, 2:-1, 1:-2]/k_z_half[:, :, :-1] +
-                                               memory_dsigmazz_dz[1:-2, 2:-1, 1:-2])
-
-        vz = DELTAT_over_rho * (value_dsigmaxz_dx + value_dsigmayz_dy + value_dsigmazz_dz) + vz
-
-        # add the source (force vector located at a given grid point)
-        vx[isource, jsource, ksource] += force_x[it - 1] * dt/rho
-        vy[isource, jsource, ksource] += force_y[it - 1] * dt/rho
-
-        # implement Dirichlet boundary conditions on the six edges of the grid
-        # which is the right condition to implement in order for C-PML to remain stable at long times
-        # xmin
-        vx[0:1, :, :] = ZERO
-        vy[0:1, :, :] = ZERO
-        vz[0:1, :, :] = ZERO
-
-        # xmax
-        vx[-2:-1, :, :] = ZERO
-        vy[-2:-1, :, :] = ZERO
-        vz[-2:-1, :, :] = ZERO
-
-        # ymin
-        vx[:, 0:1, :] = ZERO
-        vy[:, 0:1, :] = ZERO
-        vz[:, 0:1, :] = ZERO
-
-        # ymax
-        vx[:, -2:-1, :] = ZERO
-        vy[:, -2:-1, :] = ZERO
-        vz[:, -2:-1, :] = ZERO
-
-        # zmin
-        vx[:, :, 0:1] = ZERO
-        vy[:, :, 0:1] = ZERO
-        vz[:, :, 0:1] = ZERO
-
-        # zmax
-        vx[:, :, -2:-1] = ZERO
-        vy[:, :, -2:-1] = ZERO
-        vz[:, :, -2:-1] = ZERO
-
-        # Store seismograms
-        for _irec in range(NREC):
-            sisvx[it - 1, _irec] = vx[ix_rec[_irec], iy_rec[_irec], ksource]
-            sisvy[it - 1, _irec] = vy[ix_rec[_irec], iy_rec[_irec], ksource]
-
-        # Compute total energy in the medium (without the PML layers)
-        imin = npoints_pml
-        imax = nx - npoints_pml + 1
-        jmin = npoints_pml
-        jmax = ny - npoints_pml + 1
-        kmin = npoints_pml
-        kmax = nz - npoints_pml + 1
-
-        local_energy_kinetic = 0.5 * rho * (np.sum(vx[imin: imax, jmin: jmax, kmin: kmax] ** 2) +
-                                            np.sum(vy[imin: imax, jmin: jmax, kmin: kmax] ** 2) +
-                                            np.sum(vz[imin: imax, jmin: jmax, kmin: kmax] ** 2))
-
-        # compute total field from split components
-        epsilon_xx[imin: imax, jmin: jmax, kmin: kmax] =(
-                (2.0 * (lambda_ + mu) * sigmaxx[imin: imax, jmin: jmax, kmin: kmax] -
-                 lambda_ * sigmayy[imin: imax, jmin: jmax, kmin: kmax] -
-                 lambda_ * sigmazz[imin: imax, jmin: jmax, kmin: kmax])/(2.0 * mu * (3.0 * lambda_ + 2.0 * mu)))
-        epsilon_yy[imin: imax, jmin: jmax, kmin: kmax] =(
-                (2.0 * (lambda_ + mu) * sigmayy[imin: imax, jmin: jmax, kmin: kmax] -
-                 lambda_ * sigmaxx[imin: imax, jmin: jmax, kmin: kmax] -
-                 lambda_ * sigmazz[imin: imax, jmin: jmax, kmin: kmax])/(2.0 * mu * (3.0 * lambda_ + 2.0 * mu)))
-        epsilon_zz[imin: imax, jmin: jmax, kmin: kmax] =(
-                (2.0 * (lambda_ + mu) * sigmazz[imin: imax, jmin: jmax, kmin: kmax] -
-                 lambda_ * sigmaxx[imin: imax, jmin: jmax, kmin: kmax] -
-                 lambda_ * sigmayy[imin: imax, jmin: jmax, kmin: kmax])/(2.0 * mu * (3.0 * lambda_ + 2.0 * mu)))
-        epsilon_xy[imin: imax, jmin: jmax, kmin: kmax] = sigmaxy_r[imin: imax, jmin: jmax, kmin: kmax]/(2.0 * mu)
-        epsilon_xz[imin: imax, jmin: jmax, kmin: kmax] = sigmaxz_r[imin: imax, jmin: jmax, kmin: kmax]/(2.0 * mu)
-        epsilon_yz[imin: imax, jmin: jmax, kmin: kmax] = sigmayz_r[imin: imax, jmin: jmax, kmin: kmax]/(2.0 * mu)
-
-        local_energy_potential = 0.5 * np.sum(epsilon_xx * sigmaxx_r +
-                                              epsilon_yy * sigmayy_r +
-                                              epsilon_zz * sigmazz_r +
-                                              2.0 * epsilon_xy * sigmaxy_r +
-                                              2.0 * epsilon_xz * sigmaxz_r +
-                                              2.0 * epsilon_yz * sigmayz_r)
-
-        total_energy[it - 1] = local_energy_kinetic + local_energy_potential
-
-        v_solid_norm = np.max(np.sqrt(vx[:, :, 1: -1] ** 2 + vy[:, :, 1: -1] ** 2 + vz[:, :, 1: -1] ** 2))
-        if (it % IT_DISPLAY) == 0 or it == 5:
-            print(f'Time step # {it} out of {NSTEP}')
-            print(f'Max Vx = {np.max(vx)}, Vy = {np.max(vy)}, Vz = {np.max(vz)}')
-            print(f'Min Vx = {np.min(vx)}, Vy = {np.min(vy)}, Vz = {np.min(vz)}')
-            print(f'Max norm velocity vector V (m/s) = {v_solid_norm}')
-            print(f'Total energy = {total_energy[it - 1]}')
-
-        windowVx.imv.setImage(vx[:, :, ksource], levels=[-0.5, 0.5])
-        # windowVx.imv.setImage(vx[:, :, ksource], levels=[np.min(vx), np.max(vx)])
-        windowVy.imv.setImage(vy[:, :, ksource], levels=[-6.0, 6.0])
-        # windowVy.imv.setImage(vy[:, :, ksource], levels=[np.min(vy), np.max(vy)])
-        # windowVz.imv.setImage(vz[:, :, ksource], levels=[-1.0, 1.0])
-        App.processEvents()
-
-        # Verifica a estabilidade da simulacao
-        if v_solid_norm > STABILITY_THRESHOLD:
-            print("Simulacao tornando-se instável")
-            exit(2)
-
-    App.exit()
-
-    # End of the main loop
-    print("Simulacao terminada.")
-
-
-# --------------------------
-# Shader [kernel] para a simulação em WEBGPU
-shader_test = f"""
-    struct SimIntValues {{
-        y_sz: i32,          // Y field size
-        x_sz: i32,          // X field size
-        y_sens: i32,        // Y sensor
-        x_sens: i32,        // X sensor
-        k: i32              // iteraction
-    }};
-    
-    struct SimFltValues {{
-        cp_unrelaxed: f32,  // sound speed
-        dx: f32,            // delta x
-        dy: f32,            // delta y
-        dt: f32             // delta t
-    }};
-
-    // Group 0 - parameters
-    @group(0) @binding(0)   // param_flt32
-    var<storage,read> sim_flt_par: SimFltValues;
-
-    @group(0) @binding(1) // source term
-    var<storage,read> src: array<f32>;
-    
-    @group(0) @binding(2) // kronecker_src, rho_half_x, rho_half_y, kappa
-    var<storage,read> img_params: array<f32>;
-
-    @group(0) @binding(3) // a_x, b_x, k_x, a_x_h, b_x_h, k_x_h
-    var<storage,read> coef_x: array<f32>;
-    
-    @group(0) @binding(4) // a_y, b_y, k_y, a_y_h, b_y_h, k_y_h
-    var<storage,read> coef_y: array<f32>;
-    
-    @group(0) @binding(5) // param_int32
-    var<storage,read_write> sim_int_par: SimIntValues;
-
-    // Group 1 - simulation arrays
-    @group(1) @binding(6) // pressure future (p_0)
-    var<storage,read_write> pr_future: array<f32>;
-
-    @group(1) @binding(7) // pressure fields p_1, p_2
-    var<storage,read_write> pr_fields: array<f32>;
-
-    @group(1) @binding(8) // derivative fields x (v_x, mdp_x, dp_x, dmdp_x)
-    var<storage,read_write> der_x: array<f32>;
-
-    @group(1) @binding(9) // derivative fields y (v_y, mdp_y, dp_y, dmdp_y)
-    var<storage,read_write> der_y: array<f32>;
-
-    // Group 2 - sensors arrays
-    @group(2) @binding(10) // sensor signal
-    var<storage,read_write> sensor: array<f32>;
-
-    // function to convert 2D [y,x] index into 1D [yx] index
-    fn yx(y: i32, x: i32) -> i32 {{
-        let index = y + x * sim_int_par.y_sz;
-
-        return select(-1, index, y >= 0 && y < sim_int_par.y_sz && x >= 0 && x < sim_int_par.x_sz);
-    }}
-    
-    // function to convert 2D [i,j] index into 1D [] index
-    fn ij(i: i32, j: i32, i_max: i32, j_max: i32) -> i32 {{
-        let index = j + i * j_max;
-
-        return select(-1, index, i >= 0 && i < i_max && j >= 0 && j < j_max);
-    }}
-    
-    // function to convert 3D [i,j,k] index into 1D [] index
-    fn ijk(i: i32, j: i32, k: i32, i_max: i32, j_max: i32, k_max: i32) -> i32 {{
-        let index = j + i * j_max + k * j_max * i_max;
-
-        return select(-1, index, i >= 0 && i < i_max && j >= 0 && j < j_max && k >= 0 && k < k_max);
-    }}
-    
-    // function to get a kappa array value
-    fn get_kappa(i: i32, j: i32) -> f32 {{
-        let index: i32 = ijk(i, j, 3, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        return select(0.0, img_params[index], index != -1);
-    }}
-    
-    // function to get a kronecker_src array value
-    fn get_kronecker_src(i: i32, j: i32) -> f32 {{
-        let index: i32 = ijk(i, j, 0, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        return select(0.0, img_params[index], index != -1);
-    }}
-    
-    // function to get a rho_h_x array value
-    fn get_rho_h_x(i: i32, j: i32) -> f32 {{
-        let index: i32 = ijk(i, j, 1, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        return select(0.0, img_params[index], index != -1);
-    }}
-    
-    // function to get a rho_h_y array value
-    fn get_rho_h_y(i: i32, j: i32) -> f32 {{
-        let index: i32 = ijk(i, j, 2, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        return select(0.0, img_params[index], index != -1);
-    }}
-    
-    // function to get a src array value
-    fn get_src(n: i32) -> f32 {{
-        return select(0.0, src[n], n >= 0);
-    }}
-    
-    // function to get a a_x array value
-    fn get_a_x(n: i32) -> f32 {{
-        let index: i32 = ij(0, n, 6, sim_int_par.x_sz);
-        
-        return select(0.0, coef_x[index], index != -1);
-    }}
-    
-    // function to get a b_x array value
-    fn get_b_x(n: i32) -> f32 {{
-        let index: i32 = ij(1, n, 6, sim_int_par.x_sz);
-        
-        return select(0.0, coef_x[index], index != -1);
-    }}
-    
-    // function to get a k_x array value
-    fn get_k_x(n: i32) -> f32 {{
-        let index: i32 = ij(2, n, 6, sim_int_par.x_sz);
-        
-        return select(0.0, coef_x[index], index != -1);
-    }}
-    
-    // function to get a a_y array value
-    fn get_a_y(n: i32) -> f32 {{
-        let index: i32 = ij(0, n, 6, sim_int_par.y_sz);
-        
-        return select(0.0, coef_y[index], index != -1);
-    }}
-    
-    // function to get a b_y array value
-    fn get_b_y(n: i32) -> f32 {{
-        let index: i32 = ij(1, n, 6, sim_int_par.y_sz);
-        
-        return select(0.0, coef_y[index], index != -1);
-    }}
-    
-    // function to get a k_y array value
-    fn get_k_y(n: i32) -> f32 {{
-        let index: i32 = ij(2, n, 6, sim_int_par.y_sz);
-        
-        return select(0.0, coef_y[index], index != -1);
-    }}
-    
-    // function to get a a_x_h array value
-    fn get_a_x_h(n: i32) -> f32 {{
-        let index: i32 = ij(3, n, 6, sim_int_par.x_sz);
-        
-        return select(0.0, coef_x[index], index != -1);
-    }}
-    
-    // function to get a b_x_h array value
-    fn get_b_x_h(n: i32) -> f32 {{
-        let index: i32 = ij(4, n, 6, sim_int_par.x_sz);
-        
-        return select(0.0, coef_x[index], index != -1);
-    }}
-    
-    // function to get a k_x_h array value
-    fn get_k_x_h(n: i32) -> f32 {{
-        let index: i32 = ij(5, n, 6, sim_int_par.x_sz);
-        
-        return select(0.0, coef_x[index], index != -1);
-    }}
-    
-    // function to get a a_y_h array value
-    fn get_a_y_h(n: i32) -> f32 {{
-        let index: i32 = ij(3, n, 6, sim_int_par.y_sz);
-        
-        return select(0.0, coef_y[index], index != -1);
-    }}
-    
-    // function to get a b_y_h array value
-    fn get_b_y_h(n: i32) -> f32 {{
-        let index: i32 = ij(4, n, 6, sim_int_par.y_sz);
-        
-        return select(0.0, coef_y[index], index != -1);
-    }}
-    
-    // function to get a k_y_h array value
-    fn get_k_y_h(n: i32) -> f32 {{
-        let index: i32 = ij(5, n, 6, sim_int_par.y_sz);
-        
-        return select(0.0, coef_y[index], index != -1);
-    }}
-
-    // function to get an p_0 (pr_future) array value
-    fn get_p_0(y: i32, x: i32) -> f32 {{
-        let index: i32 = yx(y, x);
-
-        return select(0.0, pr_future[index], index != -1);
-    }}
-
-    // function to set a p_0 array value
-    fn set_p_0(y: i32, x: i32, val : f32) {{
-        let index: i32 = yx(y, x);
-
-        if(index != -1) {{
-            pr_future[index] = val;
-        }}
-    }}
-
-    // function to get an p_1 array value
-    fn get_p_1(y: i32, x: i32) -> f32 {{
-        let index: i32 = ijk(y, x, 0, sim_int_par.y_sz, sim_int_par.x_sz, 2);
-
-        return select(0.0, pr_fields[index], index != -1);
-    }}
-
-    // function to set a p_1 array value
-    fn set_p_1(y: i32, x: i32, val : f32) {{
-        let index: i32 = ijk(y, x, 0, sim_int_par.y_sz, sim_int_par.x_sz, 2);
-
-        if(index != -1) {{
-            pr_fields[index] = val;
-        }}
-    }}
-
-    // function to get an p_2 array value
-    fn get_p_2(y: i32, x: i32) -> f32 {{
-        let index: i32 = ijk(y, x, 1, sim_int_par.y_sz, sim_int_par.x_sz, 2);
-
-        return select(0.0, pr_fields[index], index != -1);
-    }}
-
-    // function to set a p_2 array value
-    fn set_p_2(y: i32, x: i32, val : f32) {{
-        let index: i32 = ijk(y, x, 1, sim_int_par.y_sz, sim_int_par.x_sz, 2);
-
-        if(index != -1) {{
-            pr_fields[index] = val;
-        }}
-    }}
-    
-    // function to get an v_x array value
-    fn get_v_x(y: i32, x: i32) -> f32 {{
-        let index: i32 = ijk(y, x, 0, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        return select(0.0, der_x[index], index != -1);
-    }}
-
-    // function to set a v_x array value
-    fn set_v_x(y: i32, x: i32, val : f32) {{
-        let index: i32 = ijk(y, x, 0, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        if(index != -1) {{
-            der_x[index] = val;
-        }}
-    }}
-    
-    // function to get an v_y array value
-    fn get_v_y(y: i32, x: i32) -> f32 {{
-        let index: i32 = ijk(y, x, 0, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        return select(0.0, der_y[index], index != -1);
-    }}
-
-    // function to set a v_y array value
-    fn set_v_y(y: i32, x: i32, val : f32) {{
-        let index: i32 = ijk(y, x, 0, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        if(index != -1) {{
-            der_y[index] = val;
-        }}
-    }}
-    
-    // function to get an mdp_x array value
-    fn get_mdp_x(y: i32, x: i32) -> f32 {{
-        let index: i32 = ijk(y, x, 1, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        return select(0.0, der_x[index], index != -1);
-    }}
-
-    // function to set a mdp_x array value
-    fn set_mdp_x(y: i32, x: i32, val : f32) {{
-        let index: i32 = ijk(y, x, 1, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        if(index != -1) {{
-            der_x[index] = val;
-        }}
-    }}
-    
-    // function to get an mdp_y array value
-    fn get_mdp_y(y: i32, x: i32) -> f32 {{
-        let index: i32 = ijk(y, x, 1, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        return select(0.0, der_y[index], index != -1);
-    }}
-
-    // function to set a mdp_y array value
-    fn set_mdp_y(y: i32, x: i32, val : f32) {{
-        let index: i32 = ijk(y, x, 1, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        if(index != -1) {{
-            der_y[index] = val;
-        }}
-    }}
-    
-    // function to get an dp_x array value
-    fn get_dp_x(y: i32, x: i32) -> f32 {{
-        let index: i32 = ijk(y, x, 2, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        return select(0.0, der_x[index], index != -1);
-    }}
-
-    // function to set a dp_x array value
-    fn set_dp_x(y: i32, x: i32, val : f32) {{
-        let index: i32 = ijk(y, x, 2, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        if(index != -1) {{
-            der_x[index] = val;
-        }}
-    }}
-    
-    // function to get an dp_y array value
-    fn get_dp_y(y: i32, x: i32) -> f32 {{
-        let index: i32 = ijk(y, x, 2, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        return select(0.0, der_y[index], index != -1);
-    }}
-
-    // function to set a dp_y array value
-    fn set_dp_y(y: i32, x: i32, val : f32) {{
-        let index: i32 = ijk(y, x, 2, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        if(index != -1) {{
-            der_y[index] = val;
-        }}
-    }}
-    
-    // function to get an dmdp_x array value
-    fn get_dmdp_x(y: i32, x: i32) -> f32 {{
-        let index: i32 = ijk(y, x, 3, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        return select(0.0, der_x[index], index != -1);
-    }}
-
-    // function to set a dmdp_x array value
-    fn set_dmdp_x(y: i32, x: i32, val : f32) {{
-        let index: i32 = ijk(y, x, 3, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        if(index != -1) {{
-            der_x[index] = val;
-        }}
-    }}
-    
-    // function to get an dmdp_y array value
-    fn get_dmdp_y(y: i32, x: i32) -> f32 {{
-        let index: i32 = ijk(y, x, 3, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        return select(0.0, der_y[index], index != -1);
-    }}
-
-    // function to set a dmdp_y array value
-    fn set_dmdp_y(y: i32, x: i32, val : f32) {{
-        let index: i32 = ijk(y, x, 3, sim_int_par.y_sz, sim_int_par.x_sz, 4);
-
-        if(index != -1) {{
-            der_y[index] = val;
-        }}
-    }}
-
-    // function to calculate first derivatives
-    @compute
-    @workgroup_size({wsy}, {wsx})
-    fn space_sim1(@builtin(global_invocation_id) index: vec3<u32>) {{
-        let y: i32 = i32(index.x);          // y thread index
-        let x: i32 = i32(index.y);          // x thread index
-        var vdp_x: f32 = 0.0;
-        var vdp_y: f32 = 0.0;
-        
-        // Calcula a primeira derivada espacial dividida pela densidade
-        vdp_x = (get_p_1(y + 1, x) - get_p_1(y, x)) / sim_flt_par.dx;
-        set_mdp_x(y, x, get_b_x_h(y)*get_mdp_x(y, x) + get_a_x_h(y)*vdp_x);
-        vdp_y = (get_p_1(y, x + 1) - get_p_1(y, x)) / sim_flt_par.dy;
-        set_mdp_y(y, x, get_b_y_h(x)*get_mdp_y(y, x) + get_a_y_h(x)*vdp_y);
-        set_dp_x(y, x, (vdp_x / get_k_x_h(y) + get_mdp_x(y, x))/get_rho_h_x(y, x));
-        set_dp_y(y, x, (vdp_y / get_k_y_h(x) + get_mdp_y(y, x))/get_rho_h_y(y, x));      
-    }}
-    
-    // function to calculate second derivatives
-    @compute
-    @workgroup_size({wsy}, {wsx})
-    fn space_sim2(@builtin(global_invocation_id) index: vec3<u32>) {{
-        let y: i32 = i32(index.x);          // y thread index
-        let x: i32 = i32(index.y);          // x thread index
-        var vdp_xx: f32 = 0.0;
-        var vdp_yy: f32 = 0.0;
-            
-        // Calcula a segunda derivada espacial
-        vdp_xx = (get_dp_x(y, x) - get_dp_x(y - 1, x)) / sim_flt_par.dx;
-        set_dmdp_x(y, x, get_b_x(y)*get_dmdp_x(y, x) + get_a_x(y)*vdp_xx);
-        vdp_yy = (get_dp_y(y, x) - get_dp_y(y, x - 1)) / sim_flt_par.dy;
-        set_dmdp_y(y, x, get_b_y(x)*get_dmdp_y(y, x) + get_a_y(x)*vdp_yy);
-        set_v_x(y, x, vdp_xx / get_k_x(y) + get_dmdp_x(y, x));
-        set_v_y(y, x, vdp_yy / get_k_y(x) + get_dmdp_y(y, x));        
-    }}
-
-    @compute
-    @workgroup_size(1)
-    fn incr_k() {{
-        sim_int_par.k += 1;
-    }}
-
-    @compute
-    @workgroup_size({wsy}, {wsx})
-    fn time_sim(@builtin(global_invocation_id) index: vec3<u32>) {{
-        var add_src: f32 = 0.0;             // Source term
-        let y: i32 = i32(index.x);          // y thread index
-        let x: i32 = i32(index.y);          // x thread index
-        let dt: f32 = sim_flt_par.dt;
-        let pi_4: f32 = 12.5663706144;
-
-        // --------------------
-        // Update pressure field
-        add_src = pi_4*sim_flt_par.cp_unrelaxed*sim_flt_par.cp_unrelaxed*src[sim_int_par.k]*get_kronecker_src(y, x);
-        set_p_0(y, x, -1.0*get_p_2(y, x) + 2.0*get_p_1(y, x) +
-            dt*dt*((get_v_x(y, x) + get_v_y(y, x))*get_kappa(y, x) + add_src));
-
-        // Aplly Dirichlet conditions
-        if(y == 0 || y == (sim_int_par.y_sz - 1) || x == 0 || x == (sim_int_par.x_sz - 1)) {{
-            set_p_0(y, x, 0.0);
-        }}
-            
-        // --------------------
-        // Circular buffer
-        set_p_2(y, x, get_p_1(y, x));
-        set_p_1(y, x, get_p_0(y, x));
-
-        if(y == sim_int_par.y_sens && x == sim_int_par.x_sens) {{
-            sensor[sim_int_par.k] = get_p_0(y, x);
-        }}
-    }}
-    """
-
-
-# Simulação completa em WEB GPU
-# def sim_webgpu():
-#     global p_2, p_1, p_0, mdp_x, mdp_y, dp_x, dp_y, dmdp_x, dmdp_y, v_x, v_y, a_x, NSTEP
-#
-#     # Arrays com parametros inteiros (i32) e ponto flutuante (f32) para rodar o simulador
-#     params_i32 = np.array([ny, nx, sens_y, sens_x, 0], dtype=np.int32)
-#     params_f32 = np.array([cp_unrelaxed, dx, dy, dt], dtype=flt32)
-#
-#     # =====================
-#     # webgpu configurations
-#     if gpu_type == "NVIDIA":
-#         device = wgpu.utils.get_default_device()
-#     else:
-#         adapter = wgpu.request_adapter(canvas=None, power_preference="low-power")
-#         device = adapter.request_device()
-#
-#     # Cria o shader para calculo contido na string ``shader_test''
-#     cshader = device.create_shader_module(code=shader_test)
-#
-#     # Definicao dos buffers que terao informacoes compartilhadas entre CPU e GPU
-#     # ------- Buffers para o binding de parametros -------------
-#     # Buffer de parametros com valores em ponto flutuante
-#     # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-#     # Binding 0
-#     b_param_flt32 = device.create_buffer_with_data(data=params_f32,
-#                                                    usage=wgpu.BufferUsage.STORAGE |
-#                                                          wgpu.BufferUsage.COPY_SRC)
-#
-#     # Termo de fonte
-#     # Binding 1
-#     # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-#     b_src = device.create_buffer_with_data(data=source_term,
-#                                            usage=wgpu.BufferUsage.STORAGE |
-#                                                  wgpu.BufferUsage.COPY_SRC)
-#
-#     # Mapa da posicao das fontes
-#     # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-#     # Binding 2
-#     b_img_params = device.create_buffer_with_data(data=np.vstack((kronecker_source,
-#                                                                   rho_half_x,
-#                                                                   rho_half_y,
-#                                                                   kappa_unrelaxed)),
-#                                                    usage=wgpu.BufferUsage.STORAGE |
-#                                                          wgpu.BufferUsage.COPY_SRC)
-#
-#     # Coeficientes de absorcao
-#     # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-#     # Binding 3
-#     b_coef_x = device.create_buffer_with_data(data=np.row_stack((a_x, b_x, k_x, a_x_half, b_x_half, k_x_half)),
-#                                               usage=wgpu.BufferUsage.STORAGE |
-#                                                     wgpu.BufferUsage.COPY_SRC)
-#
-#     # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-#     # Binding 4
-#     b_coef_y = device.create_buffer_with_data(data=np.row_stack((a_y, b_y, k_y, a_y_half, b_y_half, k_y_half)),
-#                                               usage=wgpu.BufferUsage.STORAGE |
-#                                                     wgpu.BufferUsage.COPY_SRC)
-#
-#     # Buffer de parametros com valores inteiros
-#     # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-#     # Binding 5
-#     b_param_int32 = device.create_buffer_with_data(data=params_i32,
-#                                                    usage=wgpu.BufferUsage.STORAGE |
-#                                                          wgpu.BufferUsage.COPY_SRC)
-#
-#     # Buffers com os campos de pressao
-#     # Pressao futura (amostra de tempo n+1)
-#     # [STORAGE | COPY_DST | COPY_SRC] pois sao valores passados para a GPU e tambem retornam a CPU [COPY_DST]
-#     # Binding 6
-#     b_p_0 = device.create_buffer_with_data(data=p_0,
-#                                            usage=wgpu.BufferUsage.STORAGE |
-#                                                  wgpu.BufferUsage.COPY_DST |
-#                                                  wgpu.BufferUsage.COPY_SRC)
-#     # Campos de pressao atual
-#     # [STORAGE | COPY_SRC] pois sao valores passados para a GPU, mas nao necessitam retornar a CPU
-#     # Binding 7
-#     b_pr_fields = device.create_buffer_with_data(data=np.vstack((p_1, p_2)),
-#                                                  usage=wgpu.BufferUsage.STORAGE |
-#                                                        wgpu.BufferUsage.COPY_SRC)
-#     # Matrizes para o calculo das derivadas (primeira e segunda)
-#     # Binding 8 - matrizes para o eixo x
-#     b_der_x = device.create_buffer_with_data(data=np.vstack((v_x, mdp_x, dp_x, dmdp_x)),
-#                                              usage=wgpu.BufferUsage.STORAGE |
-#                                                    wgpu.BufferUsage.COPY_SRC)
-#     # Binding 9 - matrizes para o eixo y
-#     b_der_y = device.create_buffer_with_data(data=np.vstack((v_y, mdp_y, dp_y, dmdp_y)),
-#                                              usage=wgpu.BufferUsage.STORAGE |
-#                                                    wgpu.BufferUsage.COPY_SRC)
-#
-#     # Sinal do sensor
-#     # [STORAGE | COPY_DST | COPY_SRC] pois sao valores passados para a GPU e tambem retornam a CPU [COPY_DST]
-#     # Binding 10
-#     b_sens = device.create_buffer_with_data(data=sensor,
-#                                             usage=wgpu.BufferUsage.STORAGE |
-#                                                   wgpu.BufferUsage.COPY_DST |
-#                                                   wgpu.BufferUsage.COPY_SRC)
-#
-#     # Esquema de amarracao dos parametros (binding layouts [bl])
-#     # Parametros
-#     bl_params = [
-#         {"binding": ii,
-#          "visibility": wgpu.ShaderStage.COMPUTE,
-#          "buffer": {
-#              "type": wgpu.BufferBindingType.read_only_storage}
-#          } for ii in range(5)
-#     ]
-#     # b_param_i32
-#     bl_params.append({
-#                          "binding": 5,
-#                          "visibility": wgpu.ShaderStage.COMPUTE,
-#                          "buffer": {
-#                              "type": wgpu.BufferBindingType.storage,
-#                          },
-#                      })
-#
-#     # Arrays da simulacao
-#     bl_sim_arrays = [
-#         {"binding": ii,
-#          "visibility": wgpu.ShaderStage.COMPUTE,
-#          "buffer": {
-#              "type": wgpu.BufferBindingType.storage}
-#          } for ii in range(6, 10)
-#     ]
-#
-#     # Sensores
-#     bl_sensors = [
-#         {
-#             "binding": 10,
-#             "visibility": wgpu.ShaderStage.COMPUTE,
-#             "buffer": {
-#                 "type": wgpu.BufferBindingType.storage,
-#             },
-#         },
-#     ]
-#
-#     # Configuracao das amarracoes (bindings)
-#     b_params = [
-#         {
-#             "binding": 0,
-#             "resource": {"buffer": b_param_flt32, "offset": 0, "size": b_param_flt32.size},
-#         },
-#         {
-#             "binding": 1,
-#             "resource": {"buffer": b_src, "offset": 0, "size": b_src.size},
-#         },
-#         {
-#             "binding": 2,
-#             "resource": {"buffer": b_img_params, "offset": 0, "size": b_img_params.size},
-#         },
-#         {
-#             "binding": 3,
-#             "resource": {"buffer": b_coef_x, "offset": 0, "size": b_coef_x.size},
-#         },
-#         {
-#             "binding": 4,
-#             "resource": {"buffer": b_coef_y, "offset": 0, "size": b_coef_y.size},
-#         },
-#         {
-#             "binding": 5,
-#             "resource": {"buffer": b_param_int32, "offset": 0, "size": b_param_int32.size},
-#         },
-#     ]
-#     b_sim_arrays = [
-#         {
-#             "binding": 6,
-#             "resource": {"buffer": b_p_0, "offset": 0, "size": b_p_0.size},
-#         },
-#         {
-#             "binding": 7,
-#             "resource": {"buffer": b_pr_fields, "offset": 0, "size": b_pr_fields.size},
-#         },
-#         {
-#             "binding": 8,
-#             "resource": {"buffer": b_der_x, "offset": 0, "size": b_der_x.size},
-#         },
-#         {
-#             "binding": 9,
-#             "resource": {"buffer": b_der_y, "offset": 0, "size": b_der_y.size},
-#         },
-#     ]
-#     b_sensors = [
-#         {
-#             "binding": 10,
-#             "resource": {"buffer": b_sens, "offset": 0, "size": b_sens.size},
-#         },
-#     ]
-#
-#     # Coloca tudo junto
-#     bgl_0 = device.create_bind_group_layout(entries=bl_params)
-#     bgl_1 = device.create_bind_group_layout(entries=bl_sim_arrays)
-#     bgl_2 = device.create_bind_group_layout(entries=bl_sensors)
-#     pipeline_layout = device.create_pipeline_layout(bind_group_layouts=[bgl_0, bgl_1, bgl_2])
-#     bg_0 = device.create_bind_group(layout=bgl_0, entries=b_params)
-#     bg_1 = device.create_bind_group(layout=bgl_1, entries=b_sim_arrays)
-#     bg_2 = device.create_bind_group(layout=bgl_2, entries=b_sensors)
-#
-#     # Cria os pipelines de execucao
-#     compute_space_sim1 = device.create_compute_pipeline(layout=pipeline_layout,
-#                                                         compute={"module": cshader, "entry_point": "space_sim1"})
-#     compute_space_sim2 = device.create_compute_pipeline(layout=pipeline_layout,
-#                                                         compute={"module": cshader, "entry_point": "space_sim2"})
-#     compute_time_sim = device.create_compute_pipeline(layout=pipeline_layout,
-#                                                       compute={"module": cshader, "entry_point": "time_sim"})
-#     compute_incr_k = device.create_compute_pipeline(layout=pipeline_layout,
-#                                                     compute={"module": cshader, "entry_point": "incr_k"})
-#
-#     # Configuracao e inicializacao da janela de exibicao
-#     App = pg.QtWidgets.QApplication([])
-#     window = Window()
-#
-#     # Laco de tempo para execucao da simulacao
-#     for it in range(NSTEP):
-#         # Cria o codificador de comandos
-#         command_encoder = device.create_command_encoder()
-#
-#         # Inicia os passos de execucao do decodificador
-#         compute_pass = command_encoder.begin_compute_pass()
-#
-#         # Ajusta os grupos de amarracao
-#         compute_pass.set_bind_group(0, bg_0, [], 0, 999999)  # last 2 elements not used
-#         compute_pass.set_bind_group(1, bg_1, [], 0, 999999)  # last 2 elements not used
-#         compute_pass.set_bind_group(2, bg_2, [], 0, 999999)  # last 2 elements not used
-#
-#         # Ativa o pipeline de execucao da simulacao no espaco (calculo da primeira derivada espacial)
-#         compute_pass.set_pipeline(compute_space_sim1)
-#         compute_pass.dispatch_workgroups(ny // wsy, nx // wsx)
-#
-#         # Ativa o pipeline de execucao da simulacao no espaco (calculo da segunda derivada espacial)
-#         compute_pass.set_pipeline(compute_space_sim2)
-#         compute_pass.dispatch_workgroups(ny // wsy, nx // wsx)
-#
-#         # Ativa o pipeline de execucao da simulacao no tempo (calculo das derivadas temporais)
-#         compute_pass.set_pipeline(compute_time_sim)
-#         compute_pass.dispatch_workgroups(ny // wsy, nx // wsx)
-#
-#         # Ativa o pipeline de atualizacao da amostra de tempo
-#         compute_pass.set_pipeline(compute_incr_k)
-#         compute_pass.dispatch_workgroups(1)
-#
-#         # Termina o passo de execucao
-#         compute_pass.end()
-#
-#         # Efetua a execucao dos comandos na GPU
-#         device.queue.submit([command_encoder.finish()])
-#
-#         # Pega o resultado do campo de pressao
-#         if (it % 10) == 0:
-#             out = device.queue.read_buffer(b_p_0).cast("f")  # reads from buffer 3
-#             window.imv.setImage(np.asarray(out).reshape((ny, nx)).T, levels=[-1.0, 1.0])
-#             App.processEvents()
-#
-#     App.exit()
-#
-#     # Pega o sinal do sensor
-#     sens = np.array(device.queue.read_buffer(b_sens).cast("f"))
-#     adapter_info = device.adapter.request_adapter_info()
-#     return sens, adapter_info["device"]
-
-
-times_webgpu = list()
+# Listas para armazenamento de resultados (tempos de execucao e sinais nos sensores)
+times_gpu = list()
+times_gpu_kernels = dict()
 times_cpu = list()
+sensor_gpu_result = list()
+sensor_cpu_result = list()
+
+# Configuracao e inicializacao da janela de exibicao (em um processo separado)
+viewer_cpu = None
+viewer_gpu = None
+if show_anim and sim_interactive:
+    planes = [("XY", show_xy, (simul_roi.get_nx(), simul_roi.get_ny()), (simul_roi.get_len_x(), simul_roi.get_len_y())),
+              ("XZ", show_xz, (simul_roi.get_nx(), simul_roi.get_nz()), (simul_roi.get_len_x(), simul_roi.get_len_z())),
+              ("YZ", show_yz, (simul_roi.get_ny(), simul_roi.get_nz()), (simul_roi.get_len_y(), simul_roi.get_len_z()))]
+    if do_sim_cpu:
+        x_pos = 200 + np.arange(3) * (nx + 50)
+        y_pos = 500 + np.arange(3) * (ny + 50)
+        viewer_cpu = SimulationViewer([
+            {"title": f"{f} - Plano {pl} [CPU]", "geometry": (x_pos[i_f], y_pos[i_pl], *win_size), "shape": roi_size}
+            for i_pl, (pl, show_pl, win_size, roi_size) in enumerate(planes) if show_pl
+            for i_f, f in enumerate(["Vx", "Vy", "Vz"])
+        ])
+
+    if do_sim_gpu:
+        x_pos = 200 + np.arange(3) * (nx + 50)
+        y_pos = 100 + np.arange(3) * (ny + 50)
+        viewer_gpu = SimulationViewer([
+            {"title": f"{f} - Plano {pl} [GPU]", "geometry": (x_pos[i_f], y_pos[i_pl], *win_size),
+             "shape": tuple(-(-d // preview_dec) for d in roi_size)}
+            for i_pl, (pl, show_pl, win_size, roi_size) in enumerate(planes) if show_pl
+            for i_f, f in enumerate(["Vx", "Vy", "Vz"])
+        ])
 
 # WebGPU
-# if do_sim_gpu:
-#     for n in range(n_iter_gpu):
-#         print(f'Simulacao WEBGPU')
-#         print(f'Iteracao {n}')
-#         t_webgpu = time()
-#         sensor, gpu_str = sim_webgpu()
-#         times_webgpu.append(time() - t_webgpu)
-#         print(gpu_str)
-#         print(f'{times_webgpu[-1]:.3}s')
+if do_sim_gpu:
+    for kernel in gpu_kernels:
+        times_gpu = list()
+        for n in range(n_iter_gpu):
+            print(f'Simulacao WEBGPU')
+            print(f'wsx = {wsx}, wsy = {wsy}, wsz = {wsz}, thread_map = {thread_map}')
+            print(f'Kernels: {kernel}')
+            print(f'Iteracao {n}')
+            t_gpu = time()
+            (vx_gpu, vy_gpu, vz_gpu, sensor_vx_gpu, sensor_vy_gpu, sensor_vz_gpu,
+             v_solid_norm_gpu, gpu_str) = sim_webgpu(device_gpu, f'3D_viscoelast_CPML_GPU_{kernel}_iter_{n}', kernel)
+            times_gpu.append(time() - t_gpu)
+            print(gpu_str)
+            print(f'{times_gpu[-1]:.3}s')
+
+            # Plota as velocidades tomadas no sensores
+            if plot_results and plot_sensors:
+                for r in range(NREC):
+                    fig, ax = plt.subplots(4, sharex=True, sharey=True)
+                    fig.suptitle(f'Receptor {r + 1} [GPU]')
+                    ax[0].plot(sensor_vx_gpu[:, r])
+                    ax[0].set_title(r'$V_x$')
+                    ax[1].plot(sensor_vy_gpu[:, r])
+                    ax[1].set_title(r'$V_y$')
+                    ax[2].plot(sensor_vz_gpu[:, r])
+                    ax[2].set_title(r'$V_z$')
+                    ax[3].plot(sensor_vx_gpu[:, r] + sensor_vy_gpu[:, r] + sensor_vz_gpu[:, r], 'tab:orange')
+                    ax[3].set_title(r'$V_x + V_y + V_z$')
+                    sensor_gpu_result.append(fig)
+
+                if show_results:
+                    plt.show(block=False)
+
+            if plot_results and plot_bscan:
+                gpu_bscan_sim_result = plt.figure()
+                plt.title(f'GPU simulation B-scan\n[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
+                plt.imshow(sensor_vx_gpu + sensor_vy_gpu, aspect='auto', cmap='viridis')
+                plt.colorbar()
+
+                if show_results:
+                    plt.show(block=False)
+
+            if save_bscan:
+                name = f'results/bscan_3D_viscoelast_CPML_{datetime.now().strftime("%Y%m%d-%H%M%S")}_GPU'
+                np.save(name, sensor_vx_gpu + sensor_vy_gpu)
+
+        times_gpu_kernels[kernel] = np.array(times_gpu)
 
 # CPU
 if do_sim_cpu:
     for n in range(n_iter_cpu):
-        print(f'SIMULAÇÃO CPU')
+        print(f'SIMULACAO CPU')
         print(f'Iteracao {n}')
-        t_ser = time()
-        sim_cpu()
-        times_cpu.append(time() - t_ser)
+        t_cpu = time()
+        sim_cpu(f'3D_viscoelast_CPML_CPU_iter_{n}')
+        times_cpu.append(time() - t_cpu)
         print(f'{times_cpu[-1]:.3}s')
 
-# times_for = np.array(times_for)
-# times_ser = np.array(times_ser)
-# if do_sim_gpu:
-#     print(f'workgroups X: {wsx}; workgroups Y: {wsy}')
-#
-# print(f'TEMPO - {nt} pontos de tempo')
-# if do_sim_gpu and n_iter_gpu > 5:
-#     print(f'GPU: {times_for[5:].mean():.3}s (std = {times_for[5:].std()})')
-#
-# if do_sim_cpu and n_iter_cpu > 5:
-#     print(f'CPU: {times_ser[5:].mean():.3}s (std = {times_ser[5:].std()})')
-#
-# if do_sim_gpu and do_sim_cpu:
-#     print(f'MSE entre as simulações: {mean_squared_error(u_ser, u_for)}')
-#
-# if plot_results:
-#     if do_sim_gpu:
-#         gpu_sim_result = plt.figure()
-#         plt.title(f'GPU simulation ({nz}x{nx})')
-#         plt.imshow(u_for, aspect='auto', cmap='turbo_r')
-#
-#         sensor_gpu_result = plt.figure()
-#         plt.title(f'Sensor at z = {sens_z} and x = {sens_x}')
-#         plt.plot(t, sensor)
-#
-#     if do_sim_cpu:
-#         cpu_sim_result = plt.figure()
-#         plt.title(f'CPU simulation ({nz}x{nx})')
-#         plt.imshow(u_ser, aspect='auto', cmap='turbo_r')
-#
-#     if do_comp_fig_cpu_gpu and do_sim_cpu and do_sim_gpu:
-#         comp_sim_result = plt.figure()
-#         plt.title(f'CPU vs GPU ({gpu_type}) error simulation ({nz}x{nx})')
-#         plt.imshow(u_ser - u_for, aspect='auto', cmap='turbo_r')
-#         plt.colorbar()
-#
-#     if show_results:
-#         plt.show()
-#
-# if save_results:
-#     now = datetime.now()
-#     name = f'results/result_{now.strftime("%Y%m%d-%H%M%S")}_{nz}x{nx}_{nt}_iter'
-#     if plot_results:
-#         if do_sim_gpu:
-#             gpu_sim_result.savefig(name + '_gpu_' + gpu_type + '.png')
-#             sensor_gpu_result.savefig(name + '_sensor_' + gpu_type + '.png')
-#
-#         if do_sim_cpu:
-#             cpu_sim_result.savefig(name + 'cpu.png')
-#
-#         if do_comp_fig_cpu_gpu and do_sim_cpu and do_sim_gpu:
-#             comp_sim_result.savefig(name + 'comp_cpu_gpu_' + gpu_type + '.png')
-#
-#     np.savetxt(name + '_GPU_' + gpu_type + '.csv', times_for, '%10.3f', delimiter=',')
-#     np.savetxt(name + '_CPU.csv', times_ser, '%10.3f', delimiter=',')
-#     with open(name + '_desc.txt', 'w') as f:
-#         f.write('Parametros do ensaio\n')
-#         f.write('--------------------\n')
-#         f.write('\n')
-#         f.write(f'Quantidade de iteracoes no tempo: {nt}\n')
-#         f.write(f'Tamanho da ROI: {nz}x{nx}\n')
-#         f.write(f'Refletores na ROI: {"Sim" if use_refletors else "Nao"}\n')
-#         f.write(f'Simulacao GPU: {"Sim" if do_sim_gpu else "Nao"}\n')
-#         if do_sim_gpu:
-#             f.write(f'GPU: {gpu_str}\n')
-#             f.write(f'Numero de simulacoes GPU: {n_iter_gpu}\n')
-#             if n_iter_gpu > 5:
-#                 f.write(f'Tempo medio de execucao: {times_for[5:].mean():.3}s\n')
-#                 f.write(f'Desvio padrao: {times_for[5:].std()}\n')
-#             else:
-#                 f.write(f'Tempo execucao: {times_for[0]:.3}s\n')
-#
-#         f.write(f'Simulacao CPU: {"Sim" if do_sim_cpu else "Nao"}\n')
-#         if do_sim_cpu:
-#             f.write(f'Numero de simulacoes CPU: {n_iter_cpu}\n')
-#             if n_iter_cpu > 5:
-#                 f.write(f'Tempo medio de execucao: {times_ser[5:].mean():.3}s\n')
-#                 f.write(f'Desvio padrao: {times_ser[5:].std()}\n')
-#             else:
-#                 f.write(f'Tempo execucao: {times_ser[0]:.3}s\n')
-#
-#         if do_sim_gpu and do_sim_cpu:
-#             f.write(f'MSE entre as simulacoes: {mean_squared_error(u_ser, u_for)}')
+        # Plota as velocidades tomadas no sensores
+        if plot_results and plot_sensors:
+            for r in range(NREC):
+                fig, ax = plt.subplots(4, sharex=True, sharey=True)
+                fig.suptitle(f'Receptor {r + 1} [CPU]')
+                ax[0].plot(sisvx[:, r])
+                ax[0].set_title(r'$V_x$')
+                ax[1].plot(sisvy[:, r])
+                ax[1].set_title(r'$V_y$')
+                ax[2].plot(sisvz[:, r])
+                ax[2].set_title(r'$V_z$')
+                ax[3].plot(sisvx[:, r] + sisvy[:, r] + sisvz[:, r], 'tab:orange')
+                ax[3].set_title(r'$V_x + V_y + V_z$')
+                sensor_cpu_result.append(fig)
+
+            if show_results:
+                plt.show(block=False)
+
+        if plot_results and plot_bscan:
+            cpu_bscan_sim_result = plt.figure()
+            plt.title(f'CPU simulation B-scan\n[CPU] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
+            plt.imshow(sisvx + sisvy, aspect='auto', cmap='viridis')
+            plt.colorbar()
+
+            if show_results:
+                plt.show(block=False)
+
+        if save_bscan:
+            name = f'results/bscan_3D_viscoelast_CPML_{datetime.now().strftime("%Y%m%d-%H%M%S")}_CPU'
+            np.save(name, sisvx + sisvy)
+
+for viewer in [viewer_cpu, viewer_gpu]:
+    if viewer is not None:
+        viewer.close()
+
+times_cpu = np.array(times_cpu)
+if do_sim_gpu:
+    print(f'workgroups X: {wsx}; workgroups Y: {wsy}; workgroups Z: {wsz}')
+
+print(f'TEMPO - {NSTEP} pontos de tempo')
+if do_sim_gpu and n_iter_gpu > 5:
+    for kernel, t_k in times_gpu_kernels.items():
+        print(f'GPU [{kernel}]: {t_k[5:].mean():.3}s (std = {t_k[5:].std()})')
+
+if do_sim_cpu and n_iter_cpu > 5:
+    print(f'CPU: {times_cpu[5:].mean():.3}s (std = {times_cpu[5:].std()})')
+
+if do_sim_gpu and do_sim_cpu:
+    print(f'MSE entre as simulacoes [Vx]: {np.sum((vx_gpu - vx) ** 2) / vx.size}')
+    print(f'MSE entre as simulacoes [Vy]: {np.sum((vy_gpu - vy) ** 2) / vy.size}')
+    print(f'MSE entre as simulacoes [Vz]: {np.sum((vz_gpu - vz) ** 2) / vz.size}')
+
+if plot_results:
+    if do_sim_gpu:
+        if show_xy:
+            vx_gpu_sim_xy_result = plt.figure()
+            plt.title(f'GPU simulation Vx - Plane XY\n[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_y()})')
+            plt.imshow(vx_gpu[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(),
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(), z_plane_idx].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.d_points[-1], simul_roi.d_points[0])
+                       )
+            plt.colorbar()
+
+            vy_gpu_sim_xy_result = plt.figure()
+            plt.title(f'GPU simulation Vy - Plane XY\n[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_y()})')
+            plt.imshow(vy_gpu[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(),
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(), z_plane_idx].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.d_points[-1], simul_roi.d_points[0])
+                       )
+            plt.colorbar()
+
+            vz_gpu_sim_xy_result = plt.figure()
+            plt.title(f'GPU simulation Vz - Plane XY\n[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_y()})')
+            plt.imshow(vz_gpu[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(),
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(), z_plane_idx].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.d_points[-1], simul_roi.d_points[0])
+                       )
+            plt.colorbar()
+
+        if show_xz:
+            vx_gpu_sim_xz_result = plt.figure()
+            plt.title(f'GPU simulation Vx - Plane XZ\n[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
+            plt.imshow(vx_gpu[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(), y_plane_idx,
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+            vy_gpu_sim_xz_result = plt.figure()
+            plt.title(f'GPU simulation Vy - Plane XZc ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
+            plt.imshow(vy_gpu[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(), y_plane_idx,
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+            vz_gpu_sim_xz_result = plt.figure()
+            plt.title(f'GPU simulation Vz - Plane XZ\n[{gpu_type}] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
+            plt.imshow(vz_gpu[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(), y_plane_idx,
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+        if show_yz:
+            vx_gpu_sim_yz_result = plt.figure()
+            plt.title(f'GPU simulation Vx - Plane YZ\n[{gpu_type}] ({simul_roi.get_len_y()}x{simul_roi.get_len_z()})')
+            plt.imshow(vx_gpu[x_plane_idx,
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(),
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.d_points[0], simul_roi.d_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+            vy_gpu_sim_yz_result = plt.figure()
+            plt.title(f'GPU simulation Vy - Plane YZ\n[{gpu_type}] ({simul_roi.get_len_y()}x{simul_roi.get_len_z()})')
+            plt.imshow(vy_gpu[x_plane_idx,
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(),
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.d_points[0], simul_roi.d_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+            vz_gpu_sim_yz_result = plt.figure()
+            plt.title(f'GPU simulation Vz - Plane YZ\n[{gpu_type}] ({simul_roi.get_len_y()}x{simul_roi.get_len_z()})')
+            plt.imshow(vz_gpu[x_plane_idx,
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(),
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.d_points[0], simul_roi.d_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+    if do_sim_cpu:
+        if show_xy:
+            vx_cpu_sim_xy_result = plt.figure()
+            plt.title(f'CPU simulation Vx - Plane XY\n[CPU] ({simul_roi.get_len_x()}x{simul_roi.get_len_y()})')
+            plt.imshow(vx[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(),
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(), z_plane_idx].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.d_points[-1], simul_roi.d_points[0])
+                       )
+            plt.colorbar()
+
+            vy_cpu_sim_xy_result = plt.figure()
+            plt.title(f'CPU simulation Vy - Plane XY\n[CPU] ({simul_roi.get_len_x()}x{simul_roi.get_len_y()})')
+            plt.imshow(vy[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(),
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(), z_plane_idx].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.d_points[-1], simul_roi.d_points[0])
+                       )
+            plt.colorbar()
+
+            vz_cpu_sim_xy_result = plt.figure()
+            plt.title(f'CPU simulation Vz - Plane XY\n[CPU] ({simul_roi.get_len_x()}x{simul_roi.get_len_y()})')
+            plt.imshow(vz[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(),
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(), z_plane_idx].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.d_points[-1], simul_roi.d_points[0])
+                       )
+            plt.colorbar()
+
+        if show_xz:
+            vx_cpu_sim_xz_result = plt.figure()
+            plt.title(f'CPU simulation Vx - Plane XZ\n[CPU] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
+            plt.imshow(vx[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(), y_plane_idx,
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+            vy_cpu_sim_xz_result = plt.figure()
+            plt.title(f'CPU simulation Vy - Plane XZ\n[CPU] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
+            plt.imshow(vy[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(), y_plane_idx,
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+            vz_cpu_sim_xz_result = plt.figure()
+            plt.title(f'CPU simulation Vz - Plane XZ\n[CPU] ({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
+            plt.imshow(vz[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(), y_plane_idx,
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+        if show_yz:
+            vx_cpu_sim_yz_result = plt.figure()
+            plt.title(f'CPU simulation Vx - Plane YZ\n[CPU] ({simul_roi.get_len_y()}x{simul_roi.get_len_z()})')
+            plt.imshow(vx[x_plane_idx,
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(),
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.d_points[0], simul_roi.d_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+            vy_cpu_sim_yz_result = plt.figure()
+            plt.title(f'CPU simulation Vy - Plane YZ\n[CPU] ({simul_roi.get_len_y()}x{simul_roi.get_len_z()})')
+            plt.imshow(vy[x_plane_idx,
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(),
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.d_points[0], simul_roi.d_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+            vz_cpu_sim_yz_result = plt.figure()
+            plt.title(f'CPU simulation Vz - Plane YZ\n[CPU] ({simul_roi.get_len_y()}x{simul_roi.get_len_z()})')
+            plt.imshow(vz[x_plane_idx,
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(),
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.d_points[0], simul_roi.d_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+    if do_comp_fig_cpu_gpu and do_sim_cpu and do_sim_gpu:
+        if show_xy:
+            vx_comp_sim_xy_result = plt.figure()
+            plt.title(f'CPU vs GPU Vx - Plane XY\n[{gpu_type}] error simulation '
+                      f'({simul_roi.get_len_x()}x{simul_roi.get_len_y()})')
+            plt.imshow(vx[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(),
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(), z_plane_idx].T -
+                       vx_gpu[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(),
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(), z_plane_idx].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.d_points[-1], simul_roi.d_points[0])
+                       )
+            plt.colorbar()
+
+            vy_comp_sim_xy_result = plt.figure()
+            plt.title(f'CPU vs GPU simulation Vy - Plane XY\n[{gpu_type}] error simulation '
+                      f'({simul_roi.get_len_x()}x{simul_roi.get_len_y()})')
+            plt.imshow(vy[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(),
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(), z_plane_idx].T -
+                       vy_gpu[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(),
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(), z_plane_idx].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.d_points[-1], simul_roi.d_points[0])
+                       )
+            plt.colorbar()
+
+            vz_comp_sim_xy_result = plt.figure()
+            plt.title(f'CPU vs GPU simulation Vz - Plane XY\n[{gpu_type}] error simulation '
+                      f'({simul_roi.get_len_x()}x{simul_roi.get_len_y()})')
+            plt.imshow(vz[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(),
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(), z_plane_idx].T -
+                       vz_gpu[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(),
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(), z_plane_idx].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.d_points[-1], simul_roi.d_points[0])
+                       )
+            plt.colorbar()
+
+        if show_xz:
+            vx_comp_sim_xz_result = plt.figure()
+            plt.title(f'CPU vs GPU simulation Vx - Plane XZ\n[{gpu_type}] error simulation '
+                      f'({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
+            plt.imshow(vx[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(), y_plane_idx,
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T -
+                       vx_gpu[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(), y_plane_idx,
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+            vy_comp_sim_xz_result = plt.figure()
+            plt.title(f'CPU vs GPU simulation Vy - Plane XZ\n[{gpu_type}] error simulation '
+                      f'({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
+            plt.imshow(vy[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(), y_plane_idx,
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T -
+                       vy_gpu[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(), y_plane_idx,
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+            vz_comp_sim_xz_result = plt.figure()
+            plt.title(f'CPU vs GPU simulation Vz - Plane XZ\n[{gpu_type}] error simulation '
+                      f'({simul_roi.get_len_x()}x{simul_roi.get_len_z()})')
+            plt.imshow(vz[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(), y_plane_idx,
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T -
+                       vz_gpu[
+                       simul_roi.get_ix_min():simul_roi.get_ix_max(), y_plane_idx,
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.w_points[0], simul_roi.w_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+        if show_yz:
+            vx_comp_sim_yz_result = plt.figure()
+            plt.title(f'CPU vs GPU simulation Vx - Plane YZ\n[{gpu_type}] error simulation '
+                      f'({simul_roi.get_len_y()}x{simul_roi.get_len_z()})')
+            plt.imshow(vx[x_plane_idx,
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(),
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T -
+                       vx_gpu[x_plane_idx,
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(),
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.d_points[0], simul_roi.d_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+            vy_comp_sim_yz_result = plt.figure()
+            plt.title(f'CPU vs GPU simulation Vy - Plane YZ\n[{gpu_type}] error simulation '
+                      f'({simul_roi.get_len_y()}x{simul_roi.get_len_z()})')
+            plt.imshow(vy[x_plane_idx,
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(),
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T -
+                       vy_gpu[x_plane_idx,
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(),
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.d_points[0], simul_roi.d_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+            vz_comp_sim_yz_result = plt.figure()
+            plt.title(f'CPU vs GPU simulation Vz - Plane YZ\n[{gpu_type}] error simulation '
+                      f'({simul_roi.get_len_y()}x{simul_roi.get_len_z()})')
+            plt.imshow(vz[x_plane_idx,
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(),
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T -
+                       vz_gpu[x_plane_idx,
+                       simul_roi.get_iy_min():simul_roi.get_iy_max(),
+                       simul_roi.get_iz_min():simul_roi.get_iz_max()].T,
+                       aspect='auto', cmap='gray',
+                       extent=(simul_roi.d_points[0], simul_roi.d_points[-1],
+                               simul_roi.h_points[-1], simul_roi.h_points[0])
+                       )
+            plt.colorbar()
+
+if save_results:
+    now = datetime.now()
+    name = (f'results/result_3D_viscoelast_CPML_{now.strftime("%Y%m%d-%H%M%S")}_'
+            f'{simul_roi.get_len_x()}x{simul_roi.get_len_y()}x{simul_roi.get_len_z()}_{NSTEP}_iter_')
+    if plot_results:
+        if do_sim_gpu:
+            if show_xy:
+                vx_gpu_sim_xy_result.savefig(name + 'Vx_XY_gpu_' + gpu_type + '.png')
+                vy_gpu_sim_xy_result.savefig(name + 'Vy_XY_gpu_' + gpu_type + '.png')
+                vz_gpu_sim_xy_result.savefig(name + 'Vz_XY_gpu_' + gpu_type + '.png')
+
+            if show_xz:
+                vx_gpu_sim_xz_result.savefig(name + 'Vx_XZ_gpu_' + gpu_type + '.png')
+                vy_gpu_sim_xz_result.savefig(name + 'Vy_XZ_gpu_' + gpu_type + '.png')
+                vz_gpu_sim_xz_result.savefig(name + 'Vz_XZ_gpu_' + gpu_type + '.png')
+
+            if show_yz:
+                vx_gpu_sim_yz_result.savefig(name + 'Vx_YZ_gpu_' + gpu_type + '.png')
+                vy_gpu_sim_yz_result.savefig(name + 'Vy_YZ_gpu_' + gpu_type + '.png')
+                vz_gpu_sim_yz_result.savefig(name + 'Vz_YZ_gpu_' + gpu_type + '.png')
+
+            for s in range(NREC):
+                sensor_gpu_result[s].savefig(name + f'_sensor_{s}_' + gpu_type + '.png')
+
+        if do_sim_cpu:
+            if show_xy:
+                vx_cpu_sim_xy_result.savefig(name + 'Vx_XY_cpu.png')
+                vy_cpu_sim_xy_result.savefig(name + 'Vy_XY_cpu.png')
+                vz_cpu_sim_xy_result.savefig(name + 'Vz_XY_cpu.png')
+
+            if show_xz:
+                vx_cpu_sim_xz_result.savefig(name + 'Vx_XZ_cpu.png')
+                vy_cpu_sim_xz_result.savefig(name + 'Vy_XZ_cpu.png')
+                vz_cpu_sim_xz_result.savefig(name + 'Vz_XZ_cpu.png')
+
+            if show_yz:
+                vx_cpu_sim_yz_result.savefig(name + 'Vx_YZ_cpu.png')
+                vy_cpu_sim_yz_result.savefig(name + 'Vy_YZ_cpu.png')
+                vz_cpu_sim_yz_result.savefig(name + 'Vz_YZ_cpu.png')
+
+            for s in range(NREC):
+                sensor_cpu_result[s].savefig(name + f'_sensor_{s}_CPU.png')
+
+        if do_comp_fig_cpu_gpu and do_sim_cpu and do_sim_gpu:
+            if show_xy:
+                vx_comp_sim_xy_result.savefig(name + 'Vx_XY_comp_cpu_gpu_' + gpu_type + '.png')
+                vy_comp_sim_xy_result.savefig(name + 'Vy_XY_comp_cpu_gpu_' + gpu_type + '.png')
+                vz_comp_sim_xy_result.savefig(name + 'Vz_XY_comp_cpu_gpu_' + gpu_type + '.png')
+
+            if show_xz:
+                vx_comp_sim_xz_result.savefig(name + 'Vx_XZ_comp_cpu_gpu_' + gpu_type + '.png')
+                vy_comp_sim_xz_result.savefig(name + 'Vy_XZ_comp_cpu_gpu_' + gpu_type + '.png')
+                vz_comp_sim_xz_result.savefig(name + 'Vz_XZ_comp_cpu_gpu_' + gpu_type + '.png')
+
+            if show_yz:
+                vx_comp_sim_yz_result.savefig(name + 'Vx_YZ_comp_cpu_gpu_' + gpu_type + '.png')
+                vy_comp_sim_yz_result.savefig(name + 'Vy_YZ_comp_cpu_gpu_' + gpu_type + '.png')
+                vz_comp_sim_yz_result.savefig(name + 'Vz_YZ_comp_cpu_gpu_' + gpu_type + '.png')
+
+    # Um arquivo de tempos por tipo de kernel
+    for kernel, t_k in times_gpu_kernels.items():
+        np.savetxt(name + f'_GPU_{kernel}_' + gpu_type + '.csv', t_k, '%10.3f', delimiter=',')
+    np.savetxt(name + '_CPU.csv', times_cpu, '%10.3f', delimiter=',')
+    with open(name + '_desc.txt', 'w') as f:
+        f.write('Parametros do ensaio\n')
+        f.write('--------------------\n')
+        f.write('\n')
+        f.write(f'Quantidade de iteracoes no tempo: {NSTEP}\n')
+        f.write(f'Decimacao dos sinais dos receptores: {rec_decim} ({NSTEP_REC} amostras)\n')
+        f.write(f'Tamanho da ROI: {simul_roi.get_len_x()}x{simul_roi.get_len_y()}x{simul_roi.get_len_z()}\n')
+        f.write(f'Refletores na ROI: {"Sim" if use_refletors else "Nao"}\n')
+        f.write(f'Simulacao GPU: {"Sim" if do_sim_gpu else "Nao"}\n')
+        if do_sim_gpu:
+            f.write(f'GPU: {gpu_str}\n')
+            f.write(f'Numero de simulacoes GPU: {n_iter_gpu}\n')
+            f.write(f'Kernels GPU: {", ".join(gpu_kernels)}\n')
+            for kernel, t_k in times_gpu_kernels.items():
+                if n_iter_gpu > 5:
+                    f.write(f'Tempo medio de execucao [{kernel}]: {t_k[5:].mean():.3}s\n')
+                    f.write(f'Desvio padrao [{kernel}]: {t_k[5:].std()}\n')
+                else:
+                    f.write(f'Tempo execucao [{kernel}]: {t_k[0]:.3}s\n')
+
+        f.write(f'Simulacao CPU: {"Sim" if do_sim_cpu else "Nao"}\n')
+        if do_sim_cpu:
+            f.write(f'Numero de simulacoes CPU: {n_iter_cpu}\n')
+            if n_iter_cpu > 5:
+                f.write(f'Tempo medio de execucao: {times_cpu[5:].mean():.3}s\n')
+                f.write(f'Desvio padrao: {times_cpu[5:].std()}\n')
+            else:
+                f.write(f'Tempo execucao: {times_cpu[0]:.3}s\n')
+
+        if do_sim_gpu and do_sim_cpu:
+            f.write(f'MSE entre as simulacoes [Vx]: {np.sum((vx_gpu - vx) ** 2) / vx.size}\n')
+            f.write(f'MSE entre as simulacoes [Vy]: {np.sum((vy_gpu - vy) ** 2) / vy.size}\n')
+            f.write(f'MSE entre as simulacoes [Vz]: {np.sum((vz_gpu - vz) ** 2) / vz.size}\n')
+
+        f.write(f'Atenuacao: {n_sls} SLS, QKappa = {q_kappa_att}, QMu = {q_mu_att}, f0 = {f0_attenuation}\n')
+
+if show_results:
+    plt.show()
@@ -8,6 +8,29 @@ fn ij(i: i32, j: i32, i_max: i32, j_max: i32) -> i32 {
     return select(-1, index, i >= 0 && i < i_max && j >= 0 && j < j_max);
 }
 
+// function to convert 2D [i,j] field index into 1D [] index, without bounds checks
+// the kernels only update the fields inside the border strips of fd_coeff cells, which are the zero halo
+// of the stencils, so every stencil tap falls inside the field buffers by construction
+// the field buffers are bound from the first x plane of the current slab (see SlabValues)
+fn ij_h(i: i32, j: i32) -> i32 {
+    return j + (i - slab_par.x_ofs) * sim_int_par.y_sz;
+}
+
+// thread mapping: with th_y_fast the fastest thread axis (index.x) runs along y, the contiguous axis of ij(),
+// so neighbouring threads of a workgroup access neighbouring words of the field buffers
+const th_y_fast: bool = th_map_y_fast;
+
+// function to convert the thread index into the 2D [x,y] thread grid index
+fn get_thread_xy(index: vec3<u32>) -> vec2<i32> {
+    return select(vec2<i32>(index.xy), vec2<i32>(index.yx), th_y_fast);
+}
+
+// function to convert the thread index of the grid kernels into the 2D [x,y] grid index
+// (the x thread index runs over the x planes updated by the current slab)
+fn get_grid_xy(index: vec3<u32>) -> vec2<i32> {
+    return get_thread_xy(index) + vec2<i32>(slab_par.x_ini, 0);
+}
+
 // ++++++++++++++++++++++++++++++
 // ++++ Group 0 - parameters ++++
 // ++++++++++++++++++++++++++++++
@@ -19,6 +42,12 @@ struct SimIntValues {
     n_rec_el: i32,      // num probes rx elements
     n_rec_pt: i32,      // num rec pto
     fd_coeff: i32,      // num fd coefficients
+    n_rec_smp: i32,     // num decimated sensor samples
+    dec_factor: i32,    // sensor decimation factor
+    n_dec_taps: i32,    // num decimation filter taps
+    rec_qty: i32,       // recorded quantities flags (vx, vy, sigxx, sigyy, sigxy)
+    n_src_pt: i32,      // num src pto
+    n_src_nd: i32,      // num src grid points
     it: i32             // time iteraction
 };
 
@@ -34,7 +63,7 @@ struct SimFltValues {
 };
 
 @group(0) @binding(1)   // param_flt32
-var<storage,read> sim_flt_par: SimFltValues;
+var<uniform> sim_flt_par: SimFltValues;
 
 // -----------------------------------
 // --- Force array access funtions ---
@@ -51,243 +80,263 @@ fn get_source_term(n: i32, e: i32) -> f32 {
 
 // ----------------------------------
 
-@group(0) @binding(3) // source term index
-var<storage,read> idx_src: array<i32>;
-
-// function to get a source term index of a source
-fn get_idx_source_term(x: i32, y: i32) -> i32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
+@group(0) @binding(3) // source grid points offsets
+var<storage,read> ptr_src_pt: array<i32>;
 
-    return select(-1, idx_src[index], index != -1);
-}
-
-// -------------------------------------------------
-// --- CPML X coefficients array access funtions ---
-// -------------------------------------------------
-@group(0) @binding(4) // a_x
-var<storage,read> a_x: array<f32>;
-
-// function to get a a_x array value
-fn get_a_x(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, a_x[n], n >= 0 && n < sim_int_par.x_sz - pad);
+// function to get the first entry in info_src_pt table of a source grid point (n_src_pt past the last one)
+fn get_ptr_src_pt(s: i32) -> i32 {
+    return select(sim_int_par.n_src_pt, ptr_src_pt[s], s >= 0 && s < sim_int_par.n_src_nd);
 }
 
 // ----------------------------------
 
-@group(0) @binding(5) // b_x
-var<storage,read> b_x: array<f32>;
+@group(0) @binding(11) // info src ptos
+var<storage,read> info_src_pt: array<i32>;
 
-// function to get a b_x array value
-fn get_b_x(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+// function to get the grid point (linear index) of a source entry
+fn get_node_src_pt(n: i32) -> i32 {
+    let index: i32 = ij(n, 0, sim_int_par.n_src_pt, 2);
 
-    return select(0.0, b_x[n], n >= 0 && n < sim_int_par.x_sz - pad);
+    return select(-1, info_src_pt[index], index != -1);
 }
 
-// ----------------------------------
-
-@group(0) @binding(6) // k_x
-var<storage,read> k_x: array<f32>;
-
-// function to get a k_x array value
-fn get_k_x(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+// function to get the source term column of a source entry
+fn get_col_src_pt(n: i32) -> i32 {
+    let index: i32 = ij(n, 1, sim_int_par.n_src_pt, 2);
 
-    return select(0.0, k_x[n], n >= 0 && n < sim_int_par.x_sz - pad);
+    return select(-1, info_src_pt[index], index != -1);
 }
 
 // ----------------------------------
 
-@group(0) @binding(7) // a_x_h
-var<storage,read> a_x_h: array<f32>;
+@group(0) @binding(12) // weight src ptos
+var<storage,read> weight_src_pt: array<f32>;
 
-// function to get a a_x_h array value
-fn get_a_x_h(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, a_x_h[n], n >= 0 && n < sim_int_par.x_sz - pad);
+// function to get the injection weight of a source entry
+fn get_weight_src_pt(n: i32) -> f32 {
+    return select(0.0, weight_src_pt[n], n >= 0 && n < sim_int_par.n_src_pt);
 }
 
-// ----------------------------------
+// -----------------------------------------
+// --- CPML coefficients access funtions ---
+// -----------------------------------------
+// CPML coefficients of a grid point, [a, b, k, -] in the full grid and in the half grid
+struct PmlCoefs {
+    f_grid: vec4<f32>,  // [a, b, k, -] full grid
+    h_grid: vec4<f32>,  // [a, b, k, -] half grid
+};
 
-@group(0) @binding(8) // b_x_h
-var<storage,read> b_x_h: array<f32>;
+@group(0) @binding(4) // CPML x coefficients
+var<storage,read> pml_x: array<PmlCoefs>;
 
-// function to get a b_x_h array value
-fn get_b_x_h(n: i32) -> f32 {
+// function to get the CPML x coefficients of a point (zero outside the CPML arrays)
+fn get_pml_x(n: i32) -> PmlCoefs {
     let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+    let ok: bool = n >= 0 && n < sim_int_par.x_sz - pad;
+    let coefs: PmlCoefs = pml_x[select(0, n, ok)];
 
-    return select(0.0, b_x_h[n], n >= 0 && n < sim_int_par.x_sz - pad);
+    return PmlCoefs(select(vec4<f32>(0.0), coefs.f_grid, ok), select(vec4<f32>(0.0), coefs.h_grid, ok));
 }
 
-// ----------------------------------
-
-@group(0) @binding(9) // k_x_h
-var<storage,read> k_x_h: array<f32>;
+// functions to get the CPML x coefficients
+fn get_a_x(n: i32) -> f32 {
+    return get_pml_x(n).f_grid.x;
+}
 
-// function to get a k_x_h array value
-fn get_k_x_h(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+fn get_b_x(n: i32) -> f32 {
+    return get_pml_x(n).f_grid.y;
+}
 
-    return select(0.0, k_x_h[n], n >= 0 && n < sim_int_par.x_sz - pad);
+fn get_k_x(n: i32) -> f32 {
+    return get_pml_x(n).f_grid.z;
 }
 
-// -------------------------------------------------
-// --- CPML Y coefficients array access funtions ---
-// -------------------------------------------------
-@group(0) @binding(10) // a_y
-var<storage,read> a_y: array<f32>;
+fn get_a_x_h(n: i32) -> f32 {
+    return get_pml_x(n).h_grid.x;
+}
 
-// function to get a a_y array value
-fn get_a_y(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+fn get_b_x_h(n: i32) -> f32 {
+    return get_pml_x(n).h_grid.y;
+}
 
-    return select(0.0, a_y[n], n >= 0 && n < sim_int_par.y_sz - pad);
+fn get_k_x_h(n: i32) -> f32 {
+    return get_pml_x(n).h_grid.z;
 }
 
 // ----------------------------------
 
-@group(0) @binding(11) // b_y
-var<storage,read> b_y: array<f32>;
+@group(0) @binding(5) // CPML y coefficients
+var<storage,read> pml_y: array<PmlCoefs>;
 
-// function to get a b_y array value
-fn get_b_y(n: i32) -> f32 {
+// function to get the CPML y coefficients of a point (zero outside the CPML arrays)
+fn get_pml_y(n: i32) -> PmlCoefs {
     let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+    let ok: bool = n >= 0 && n < sim_int_par.y_sz - pad;
+    let coefs: PmlCoefs = pml_y[select(0, n, ok)];
 
-    return select(0.0, b_y[n], n >= 0 && n < sim_int_par.y_sz - pad);
+    return PmlCoefs(select(vec4<f32>(0.0), coefs.f_grid, ok), select(vec4<f32>(0.0), coefs.h_grid, ok));
 }
 
-// ----------------------------------
+// functions to get the CPML y coefficients
+fn get_a_y(n: i32) -> f32 {
+    return get_pml_y(n).f_grid.x;
+}
 
-@group(0) @binding(12) // k_y
-var<storage,read> k_y: array<f32>;
+fn get_b_y(n: i32) -> f32 {
+    return get_pml_y(n).f_grid.y;
+}
 
-// function to get a k_y array value
 fn get_k_y(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, k_y[n], n >= 0 && n < sim_int_par.y_sz - pad);
+    return get_pml_y(n).f_grid.z;
 }
 
-// ----------------------------------
-
-@group(0) @binding(13) // a_y_h
-var<storage,read> a_y_h: array<f32>;
-
-// function to get a a_y_h array value
 fn get_a_y_h(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, a_y_h[n], n >= 0 && n < sim_int_par.y_sz - pad);
+    return get_pml_y(n).h_grid.x;
 }
 
-// ----------------------------------
-
-@group(0) @binding(14) // b_y_h
-var<storage,read> b_y_h: array<f32>;
-
-// function to get a b_y_h array value
 fn get_b_y_h(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, b_y_h[n], n >= 0 && n < sim_int_par.y_sz - pad);
+    return get_pml_y(n).h_grid.y;
 }
 
-// ----------------------------------
-
-@group(0) @binding(15) // k_y_h
-var<storage,read> k_y_h: array<f32>;
-
-// function to get a k_y_h array value
 fn get_k_y_h(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, k_y_h[n], n >= 0 && n < sim_int_par.y_sz - pad);
+    return get_pml_y(n).h_grid.z;
 }
 
 // -------------------------------------------------------------
 // --- Finite difference index limits arrays access funtions ---
 // -------------------------------------------------------------
-@group(0) @binding(16) // idx_fd
-var<storage,read> idx_fd: array<i32>;
+const fd_n: i32 = fd_num;           // num fd coefficients (uniform arrays size)
+
+@group(0) @binding(6) // idx_fd [ini-half, ini-full, fin-half, fin-full]
+var<uniform> idx_fd: array<vec4<i32>, fd_n>;
 
 // function to get an index to ini-half grid
 fn get_idx_ih(c: i32) -> i32 {
-    let index: i32 = ij(c, 0, sim_int_par.fd_coeff, 4);
-
-    return select(-1, idx_fd[index], index != -1);
+    return select(-1, idx_fd[c].x, c >= 0 && c < sim_int_par.fd_coeff);
 }
 
 // function to get an index to ini-full grid
 fn get_idx_if(c: i32) -> i32 {
-    let index: i32 = ij(c, 1, sim_int_par.fd_coeff, 4);
-
-    return select(-1, idx_fd[index], index != -1);
+    return select(-1, idx_fd[c].y, c >= 0 && c < sim_int_par.fd_coeff);
 }
 
 // function to get an index to fin-half grid
 fn get_idx_fh(c: i32) -> i32 {
-    let index: i32 = ij(c, 2, sim_int_par.fd_coeff, 4);
-
-    return select(-1, idx_fd[index], index != -1);
+    return select(-1, idx_fd[c].z, c >= 0 && c < sim_int_par.fd_coeff);
 }
 
 // function to get an index to fin-full grid
 fn get_idx_ff(c: i32) -> i32 {
-    let index: i32 = ij(c, 3, sim_int_par.fd_coeff, 4);
-
-    return select(-1, idx_fd[index], index != -1);
+    return select(-1, idx_fd[c].w, c >= 0 && c < sim_int_par.fd_coeff);
 }
 
 // ----------------------------------
 
-@group(0) @binding(17) // fd_coeff
-var<storage,read> fd_coeffs: array<f32>;
+@group(0) @binding(7) // fd_coeff (4 per vec4)
+var<uniform> fd_coeffs: array<vec4<f32>, (fd_n + 3) / 4>;
 
 // function to get a fd coefficient
 fn get_fdc(c: i32) -> f32 {
-    return select(0.0, fd_coeffs[c], c >= 0 && c < sim_int_par.fd_coeff);
+    return select(0.0, fd_coeffs[c / 4][c % 4], c >= 0 && c < sim_int_par.fd_coeff);
+}
+
+// -------------------------------------------------------
+// --- Staggered material coefficients access funtions ---
+// -------------------------------------------------------
+const mt_ids: bool = mat_ids_on;    // material map (true) or dense coefficient maps (false)
+const mt_bits: u32 = u32(mat_lbl_bits); // bits per material label (8 or 16)
+const mt_n: i32 = mat_num;          // num materials (+1 null material outside the domain)
+
+@group(0) @binding(15) // material map (packed labels)
+var<storage,read> mat_map: array<u32>;
+
+// function to get a material label
+// the material coefficients are only read inside the stress and velocity update ranges, which stop at least one
+// cell before the grid end, so every label read (including the +1 neighbours) falls inside the grid by construction
+fn get_mat(x: i32, y: i32) -> i32 {
+    let n: u32 = u32(ij_h(x, y));
+    let per_word: u32 = 32u / mt_bits;
+
+    return i32((mat_map[n / per_word] >> ((n % per_word) * mt_bits)) & ((1u << mt_bits) - 1u));
+}
+
+// ----------------------------------
+
+@group(0) @binding(16) // material coefficients [lambda, lambda + 2mu, mu_xy (n x n each), 1/rho, rho (n each)]
+var<storage,read> mat_coef: array<f32>;
+
+// ----------------------------------
+
+@group(0) @binding(8) // lambda (normal stresses grid)
+var<storage,read> lambda_map: array<f32>;
+
+// function to get a lambda value
+fn get_lambda(x: i32, y: i32) -> f32 {
+    if(mt_ids) {
+        return mat_coef[get_mat(x, y) * mt_n + get_mat(x + 1, y)];
+    }
+
+    return lambda_map[ij_h(x, y)];
+}
+
+// ----------------------------------
+
+@group(0) @binding(9) // lambda + 2mu (normal stresses grid)
+var<storage,read> lambdaplus2mu_map: array<f32>;
+
+// function to get a lambda + 2mu value
+fn get_lambdaplus2mu(x: i32, y: i32) -> f32 {
+    if(mt_ids) {
+        return mat_coef[mt_n * mt_n + get_mat(x, y) * mt_n + get_mat(x + 1, y)];
+    }
+
+    return lambdaplus2mu_map[ij_h(x, y)];
 }
 
-// ---------------------------------
-// --- Rho map access funtions ---
-// ---------------------------------
-@group(0) @binding(18) // rho
-var<storage,read> rho_map: array<f32>;
+// ----------------------------------
+
+@group(0) @binding(10) // mu (shear stress grid)
+var<storage,read> mu_xy_map: array<f32>;
 
-// function to get a rho value
-fn get_rho(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
+// function to get a mu value
+fn get_mu_xy(x: i32, y: i32) -> f32 {
+    if(mt_ids) {
+        return mat_coef[2 * mt_n * mt_n + get_mat(x, y) * mt_n + get_mat(x, y + 1)];
+    }
 
-    return select(0.0, rho_map[index], index != -1);
+    return mu_xy_map[ij_h(x, y)];
 }
 
-// ---------------------------------
-// --- Cp map access funtions ---
-// ---------------------------------
-@group(0) @binding(19) // cp
-var<storage,read> cp_map: array<f32>;
+// ----------------------------------
 
-// function to get a cp value
-fn get_cp(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
+@group(0) @binding(13) // 1/rho (vx grid)
+var<storage,read> inv_rho_vx_map: array<f32>;
 
-    return select(0.0, cp_map[index], index != -1);
+// function to get a 1/rho value in the vx grid
+fn get_inv_rho_vx(x: i32, y: i32) -> f32 {
+    if(mt_ids) {
+        return mat_coef[3 * mt_n * mt_n + get_mat(x, y)];
+    }
+
+    return inv_rho_vx_map[ij_h(x, y)];
 }
 
-// ---------------------------------
-// --- Cs map access funtions ---
-// ---------------------------------
-@group(0) @binding(20) // cs
-var<storage,read> cs_map: array<f32>;
+// ----------------------------------
+
+@group(0) @binding(14) // 1/rho (vy grid)
+var<storage,read> inv_rho_vy_map: array<f32>;
 
-// function to get a cp value
-fn get_cs(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
+// function to get a 1/rho value in the vy grid
+fn get_inv_rho_vy(x: i32, y: i32) -> f32 {
+    if(mt_ids) {
+        let off: i32 = 3 * mt_n * mt_n + mt_n;
+        let rho: f32 = 0.25 * (mat_coef[off + get_mat(x, y)] + mat_coef[off + get_mat(x + 1, y)] +
+                               mat_coef[off + get_mat(x + 1, y + 1)] + mat_coef[off + get_mat(x, y + 1)]);
 
-    return select(0.0, cs_map[index], index != -1);
+        return select(0.0, 1.0 / rho, rho > 0.0);
+    }
+
+    return inv_rho_vy_map[ij_h(x, y)];
 }
 
 // +++++++++++++++++++++++++++++++++++++
@@ -301,18 +350,12 @@ var<storage,read_write> vx: array<f32>;
 
 // function to get a vx array value
 fn get_vx(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    return select(0.0, vx[index], index != -1);
+    return vx[ij_h(x, y)];
 }
 
 // function to set a vx array value
 fn set_vx(x: i32, y: i32, val : f32) {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    if(index != -1) {
-        vx[index] = val;
-    }
+    vx[ij_h(x, y)] = val;
 }
 
 // ----------------------------------
@@ -322,24 +365,18 @@ var<storage,read_write> vy: array<f32>;
 
 // function to get a vy array value
 fn get_vy(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    return select(0.0, vy[index], index != -1);
+    return vy[ij_h(x, y)];
 }
 
 // function to set a vy array value
 fn set_vy(x: i32, y: i32, val : f32) {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    if(index != -1) {
-        vy[index] = val;
-    }
+    vy[ij_h(x, y)] = val;
 }
 
 // ----------------------------------
 
-@group(1) @binding(2) // v_2
-var<storage,read_write> v_2: f32;
+@group(1) @binding(2) // v_2 (max squared velocity norm, as the bits of a non-negative f32)
+var<storage,read_write> v_2: atomic<u32>;
 
 // -------------------------------------
 // --- Stress arrays access funtions ---
@@ -349,18 +386,12 @@ var<storage,read_write> sigmaxx: array<f32>;
 
 // function to get a sigmaxx array value
 fn get_sigmaxx(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    return select(0.0, sigmaxx[index], index != -1);
+    return sigmaxx[ij_h(x, y)];
 }
 
 // function to set a sigmaxx array value
 fn set_sigmaxx(x: i32, y: i32, val : f32) {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    if(index != -1) {
-        sigmaxx[index] = val;
-    }
+    sigmaxx[ij_h(x, y)] = val;
 }
 
 // ----------------------------------
@@ -370,18 +401,12 @@ var<storage,read_write> sigmayy: array<f32>;
 
 // function to get a sigmayy array value
 fn get_sigmayy(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    return select(0.0, sigmayy[index], index != -1);
+    return sigmayy[ij_h(x, y)];
 }
 
 // function to set a sigmayy array value
 fn set_sigmayy(x: i32, y: i32, val : f32) {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    if(index != -1) {
-        sigmayy[index] = val;
-    }
+    sigmayy[ij_h(x, y)] = val;
 }
 
 // ----------------------------------
@@ -391,18 +416,12 @@ var<storage,read_write> sigmaxy: array<f32>;
 
 // function to get a sigmaxy array value
 fn get_sigmaxy(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    return select(0.0, sigmaxy[index], index != -1);
+    return sigmaxy[ij_h(x, y)];
 }
 
 // function to set a sigmaxy array value
 fn set_sigmaxy(x: i32, y: i32, val : f32) {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    if(index != -1) {
-        sigmaxy[index] = val;
-    }
+    sigmaxy[ij_h(x, y)] = val;
 }
 
 // -------------------------------------
@@ -413,18 +432,12 @@ var<storage,read_write> mdvx_dx: array<f32>;
 
 // function to get a memory_dvx_dx array value
 fn get_mdvx_dx(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    return select(0.0, mdvx_dx[index], index != -1);
+    return mdvx_dx[ij_h(x, y)];
 }
 
 // function to set a memory_dvx_dx array value
 fn set_mdvx_dx(x: i32, y: i32, val : f32) {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    if(index != -1) {
-        mdvx_dx[index] = val;
-    }
+    mdvx_dx[ij_h(x, y)] = val;
 }
 
 // ----------------------------------
@@ -434,18 +447,12 @@ var<storage,read_write> mdvx_dy: array<f32>;
 
 // function to get a memory_dvx_dy array value
 fn get_mdvx_dy(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    return select(0.0, mdvx_dy[index], index != -1);
+    return mdvx_dy[ij_h(x, y)];
 }
 
 // function to set a memory_dvx_dy array value
 fn set_mdvx_dy(x: i32, y: i32, val : f32) {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    if(index != -1) {
-        mdvx_dy[index] = val;
-    }
+    mdvx_dy[ij_h(x, y)] = val;
 }
 
 // ----------------------------------
@@ -455,18 +462,12 @@ var<storage,read_write> mdvy_dx: array<f32>;
 
 // function to get a memory_dvy_dx array value
 fn get_mdvy_dx(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    return select(0.0, mdvy_dx[index], index != -1);
+    return mdvy_dx[ij_h(x, y)];
 }
 
 // function to set a memory_dvy_dx array value
 fn set_mdvy_dx(x: i32, y: i32, val : f32) {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    if(index != -1) {
-        mdvy_dx[index] = val;
-    }
+    mdvy_dx[ij_h(x, y)] = val;
 }
 
 // ----------------------------------
@@ -476,18 +477,12 @@ var<storage,read_write> mdvy_dy: array<f32>;
 
 // function to get a memory_dvy_dy array value
 fn get_mdvy_dy(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    return select(0.0, mdvy_dy[index], index != -1);
+    return mdvy_dy[ij_h(x, y)];
 }
 
 // function to set a memory_dvy_dy array value
 fn set_mdvy_dy(x: i32, y: i32, val : f32) {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    if(index != -1) {
-        mdvy_dy[index] = val;
-    }
+    mdvy_dy[ij_h(x, y)] = val;
 }
 
 // ----------------------------------
@@ -497,18 +492,12 @@ var<storage,read_write> mdsxx_dx: array<f32>;
 
 // function to get a memory_dsigmaxx_dx array value
 fn get_mdsxx_dx(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    return select(0.0, mdsxx_dx[index], index != -1);
+    return mdsxx_dx[ij_h(x, y)];
 }
 
 // function to set a memory_dsigmaxx_dx array value
 fn set_mdsxx_dx(x: i32, y: i32, val : f32) {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    if(index != -1) {
-        mdsxx_dx[index] = val;
-    }
+    mdsxx_dx[ij_h(x, y)] = val;
 }
 
 // ----------------------------------
@@ -518,18 +507,12 @@ var<storage,read_write> mdsyy_dy: array<f32>;
 
 // function to get a memory_dsigmayy_dy array value
 fn get_mdsyy_dy(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    return select(0.0, mdsyy_dy[index], index != -1);
+    return mdsyy_dy[ij_h(x, y)];
 }
 
 // function to set a memory_dsigmayy_dy array value
 fn set_mdsyy_dy(x: i32, y: i32, val : f32) {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    if(index != -1) {
-        mdsyy_dy[index] = val;
-    }
+    mdsyy_dy[ij_h(x, y)] = val;
 }
 
 // ----------------------------------
@@ -539,18 +522,12 @@ var<storage,read_write> mdsxy_dx: array<f32>;
 
 // function to get a memory_dsigmaxy_dx array value
 fn get_mdsxy_dx(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    return select(0.0, mdsxy_dx[index], index != -1);
+    return mdsxy_dx[ij_h(x, y)];
 }
 
 // function to set a memory_dsigmaxy_dx array value
 fn set_mdsxy_dx(x: i32, y: i32, val : f32) {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    if(index != -1) {
-        mdsxy_dx[index] = val;
-    }
+    mdsxy_dx[ij_h(x, y)] = val;
 }
 
 // ----------------------------------
@@ -560,20 +537,61 @@ var<storage,read_write> mdsxy_dy: array<f32>;
 
 // function to get a memory_dsigmaxy_dy array value
 fn get_mdsxy_dy(x: i32, y: i32) -> f32 {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
-
-    return select(0.0, mdsxy_dy[index], index != -1);
+    return mdsxy_dy[ij_h(x, y)];
 }
 
 // function to set a memory_dsigmaxy_dy array value
 fn set_mdsxy_dy(x: i32, y: i32, val : f32) {
-    let index: i32 = ij(x, y, sim_int_par.x_sz, sim_int_par.y_sz);
+    mdsxy_dy[ij_h(x, y)] = val;
+}
+
+// --------------------------------------
+// --- Preview arrays access funtions ---
+// --------------------------------------
+struct PreviewValues {
+    x_ini: i32,         // first x index of the preview region
+    y_ini: i32,         // first y index of the preview region
+    x_sz: i32,          // preview x size
+    y_sz: i32,          // preview y size
+    dec: i32,           // preview decimation factor
+};
+
+@group(1) @binding(15) // preview parameters
+var<uniform> pv_par: PreviewValues;
+
+// ----------------------------------
+
+@group(1) @binding(14) // preview fields [vx, vy]
+var<storage,read_write> preview: array<f32>;
+
+// function to set a preview array value
+fn set_preview(f: i32, x: i32, y: i32, val : f32) {
+    let index: i32 = ij(x, y, pv_par.x_sz, pv_par.y_sz);
 
     if(index != -1) {
-        mdsxy_dy[index] = val;
+        preview[f * pv_par.x_sz * pv_par.y_sz + index] = val;
     }
 }
 
+// -----------------------
+// --- Slab parameters ---
+// -----------------------
+// Grids larger than the max storage binding size run as sequential slab passes along x: the field buffers
+// are bound from plane x_ofs (with a halo of fd_coeff planes) and the kernels update planes [x_ini, x_end)
+struct SlabValues {
+    x_ofs: i32,         // first x plane of the field bindings
+    x_ini: i32,         // first x plane updated by the slab
+    x_end: i32,         // last x plane (exclusive) updated by the slab
+};
+
+@group(1) @binding(16) // slab parameters
+var<uniform> slab_par: SlabValues;
+
+// function to check if a x plane is updated by the current slab
+fn in_slab(x: i32) -> bool {
+    return x >= slab_par.x_ini && x < slab_par.x_end;
+}
+
 // +++++++++++++++++++++++++++++++++++++++++++++++
 // ++++ Group 2 - sensors arrays and energies ++++
 // +++++++++++++++++++++++++++++++++++++++++++++++
@@ -585,14 +603,14 @@ var<storage,read_write> sensors_vx: array<f32>;
 
 // function to get a sens_vx array value
 fn get_sens_vx(n: i32, s: i32) -> f32 {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     return select(0.0, sensors_vx[index], index != -1);
 }
 
 // function to set a sens_vx array value
 fn set_sens_vx(n: i32, s: i32, val : f32) {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     if(index != -1) {
         sensors_vx[index] = val;
@@ -606,14 +624,14 @@ var<storage,read_write> sensors_vy: array<f32>;
 
 // function to get a sens_vy array value
 fn get_sens_vy(n: i32, s: i32) -> f32 {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     return select(0.0, sensors_vy[index], index != -1);
 }
 
 // function to set a sens_vy array value
 fn set_sens_vy(n: i32, s: i32, val : f32) {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     if(index != -1) {
         sensors_vy[index] = val;
@@ -673,14 +691,14 @@ var<storage,read_write> sensors_sigxx: array<f32>;
 
 // function to get a sens_sigxx array value
 fn get_sens_sigxx(n: i32, s: i32) -> f32 {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     return select(0.0, sensors_sigxx[index], index != -1);
 }
 
 // function to set a sens_sigxx array value
 fn set_sens_sigxx(n: i32, s: i32, val : f32) {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     if(index != -1) {
         sensors_sigxx[index] = val;
@@ -694,14 +712,14 @@ var<storage,read_write> sensors_sigyy: array<f32>;
 
 // function to get a sens_sigyy array value
 fn get_sens_sigyy(n: i32, s: i32) -> f32 {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     return select(0.0, sensors_sigyy[index], index != -1);
 }
 
 // function to set a sens_sigyy array value
 fn set_sens_sigyy(n: i32, s: i32, val : f32) {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     if(index != -1) {
         sensors_sigyy[index] = val;
@@ -715,28 +733,73 @@ var<storage,read_write> sensors_sigxy: array<f32>;
 
 // function to get a sens_sigxx array value
 fn get_sens_sigxy(n: i32, s: i32) -> f32 {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     return select(0.0, sensors_sigxy[index], index != -1);
 }
 
 // function to set a sens_sigxy array value
 fn set_sens_sigxy(n: i32, s: i32, val : f32) {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     if(index != -1) {
         sensors_sigxy[index] = val;
     }
 }
 
+// ----------------------------------
+
+@group(2) @binding(8) // decimation filter
+var<storage,read> dec_filter: array<f32>;
+
+// function to get a decimation filter tap value
+fn get_dec_filter(n: i32) -> f32 {
+    return select(0.0, dec_filter[n], n >= 0 && n < sim_int_par.n_dec_taps);
+}
+
+// ----------------------------------
+
+@group(2) @binding(9) // sensors receiving gate
+var<storage,read> rec_gate: array<i32>;
+
+// function to get the first time sample of a sensor receiving gate
+fn get_rec_ini(s: i32) -> i32 {
+    let index: i32 = ij(s, 0, sim_int_par.n_rec_el, 2);
+
+    return select(0, rec_gate[index], index != -1);
+}
+
+// function to get the number of decimated samples of a sensor receiving gate
+fn get_rec_smp(s: i32) -> i32 {
+    let index: i32 = ij(s, 1, sim_int_par.n_rec_el, 2);
+
+    return select(0, rec_gate[index], index != -1);
+}
+
+// function to check if a quantity is recorded
+fn is_rec_qty(q: i32) -> bool {
+    return (sim_int_par.rec_qty & (1 << u32(q))) != 0;
+}
+
+// ----------------------------------
+
+@group(2) @binding(10) // weight rec ptos
+var<storage,read> weight_rec_pt: array<f32>;
+
+// function to get the interpolation weight of a receiver point
+fn get_weight_rec_pt(n: i32) -> f32 {
+    return select(0.0, weight_rec_pt[n], n >= 0 && n < sim_int_par.n_rec_pt);
+}
+
 // ---------------
 // --- Kernels ---
 // ---------------
 @compute
-@workgroup_size(wsx, wsy)
+@workgroup_size(ws_th0, ws_th1)
 fn teste_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
-    let x: i32 = i32(index.x);          // x thread index
-    let y: i32 = i32(index.y);          // y thread index
+    let xy: vec2<i32> = get_grid_xy(index);
+    let x: i32 = xy.x;                  // x grid index
+    let y: i32 = xy.y;                  // y grid index
     let dx: f32 = sim_flt_par.dx;
     let dy: f32 = sim_flt_par.dy;
     let dt: f32 = sim_flt_par.dt;
@@ -750,17 +813,18 @@ fn teste_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
     var id_y_i: i32 = -get_idx_ff(last);
     var id_y_f: i32 = sim_int_par.y_sz - get_idx_if(last);
     if(x >= id_x_i && x < id_x_f && y >= id_y_i && y < id_y_f) {
-        set_vx(x, y, get_rho(x, y));
-        set_vy(x, y, get_cp(x, y));
+        set_vx(x, y, get_inv_rho_vx(x, y));
+        set_vy(x, y, get_lambdaplus2mu(x, y));
     }
 }
 
 // Kernel to calculate stresses [sigmaxx, sigmayy, sigmaxy]
 @compute
-@workgroup_size(wsx, wsy)
+@workgroup_size(ws_th0, ws_th1)
 fn sigma_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
-    let x: i32 = i32(index.x);          // x thread index
-    let y: i32 = i32(index.y);          // y thread index
+    let xy: vec2<i32> = get_grid_xy(index);
+    let x: i32 = xy.x;                  // x grid index
+    let y: i32 = xy.y;                  // y grid index
     let dx: f32 = sim_flt_par.dx;
     let dy: f32 = sim_flt_par.dy;
     let dt: f32 = sim_flt_par.dt;
@@ -789,13 +853,8 @@ fn sigma_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
         set_mdvx_dx(x, y, mdvx_dx_new);
         set_mdvy_dy(x, y, mdvy_dy_new);
 
-        let rho_h_x = 0.5 * (get_rho(x + 1, y) + get_rho(x, y));
-        let cp_h_x = 0.5 * (get_cp(x + 1, y) + get_cp(x, y));
-        let cs_h_x_l = 0.5 * (get_cs(x + 1, y) + get_cs(x, y));
-        let cs_h_x_m = select(cs_h_x_l, 0.0, min(get_cs(x + 1, y), get_cs(x, y)) == 0.0);
-        let lambda: f32 = rho_h_x * (cp_h_x * cp_h_x - 2.0 * cs_h_x_l * cs_h_x_l);
-        let mu: f32 = rho_h_x * (cs_h_x_m * cs_h_x_m);
-        let lambdaplus2mu: f32 = lambda + 2.0 * mu;
+        let lambda: f32 = get_lambda(x, y);
+        let lambdaplus2mu: f32 = get_lambdaplus2mu(x, y);
         let sigmaxx: f32 = get_sigmaxx(x, y) + (lambdaplus2mu * vdvx_dx + lambda        * vdvy_dy)*dt;
         let sigmayy: f32 = get_sigmayy(x, y) + (lambda        * vdvx_dx + lambdaplus2mu * vdvy_dy)*dt;
         set_sigmaxx(x, y, sigmaxx);
@@ -825,25 +884,55 @@ fn sigma_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
         set_mdvy_dx(x, y, mdvy_dx_new);
         set_mdvx_dy(x, y, mdvx_dy_new);
 
-        let rho_h_y = 0.5 * (get_rho(x, y + 1) + get_rho(x, y));
-        let cs_h_y = select(0.5 * (get_cs(x, y + 1) + get_cs(x, y)), 0.0, min(get_cs(x, y + 1), get_cs(x, y)) == 0.0);
-        let mu: f32 = rho_h_y * (cs_h_y * cs_h_y);
+        let mu: f32 = get_mu_xy(x, y);
         let sigmaxy: f32 = get_sigmaxy(x, y) + (vdvx_dy + vdvy_dx) * mu * dt;
         set_sigmaxy(x, y, sigmaxy);
     }
 }
 
+// function to check if a point is in the border strips where the Dirichlet conditions apply
+fn is_dirichlet(x: i32, y: i32) -> bool {
+    let last: i32 = sim_int_par.fd_coeff - 1;
+    let id_x_i: i32 = -get_idx_fh(last);
+    let id_x_f: i32 = sim_int_par.x_sz - get_idx_ih(last);
+    let id_y_i: i32 = -get_idx_fh(last);
+    let id_y_f: i32 = sim_int_par.y_sz - get_idx_ih(last);
+
+    return x <= id_x_i || x >= id_x_f || y <= id_y_i || y >= id_y_f;
+}
+
+// Workgroup max squared velocity norm
+var<workgroup> wg_v_max: atomic<u32>;
+
+// function to reduce the max squared velocity norm, first in the workgroup and then in the v_2 buffer
+// Must be called in uniform control flow
+fn reduce_v_max(v2: f32, l_idx: u32) {
+    if(l_idx == 0u) {
+        atomicStore(&wg_v_max, 0u);
+    }
+    workgroupBarrier();
+    atomicMax(&wg_v_max, bitcast<u32>(v2));
+    workgroupBarrier();
+    if(l_idx == 0u) {
+        atomicMax(&v_2, atomicLoad(&wg_v_max));
+    }
+}
+
 // Kernel to calculate velocities [vx, vy]
+// The Dirichlet conditions are applied as predicated stores and the velocity norm is reduced here
 @compute
-@workgroup_size(wsx, wsy)
-fn velocity_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
-    let x: i32 = i32(index.x);          // x thread index
-    let y: i32 = i32(index.y);          // y thread index
+@workgroup_size(ws_th0, ws_th1)
+fn velocity_kernel(@builtin(global_invocation_id) index: vec3<u32>,
+                   @builtin(local_invocation_index) l_idx: u32) {
+    let xy: vec2<i32> = get_grid_xy(index);
+    let x: i32 = xy.x;                  // x grid index
+    let y: i32 = xy.y;                  // y grid index
     let dt: f32 = sim_flt_par.dt;
     let dx: f32 = sim_flt_par.dx;
     let dy: f32 = sim_flt_par.dy;
     let last: i32 = sim_int_par.fd_coeff - 1;
     let offset: i32 = sim_int_par.fd_coeff - 1;
+    let dirichlet: bool = is_dirichlet(x, y);
 
     // Vx
     var id_x_i: i32 = -get_idx_ff(last);
@@ -867,10 +956,10 @@ fn velocity_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
         set_mdsxx_dx(x, y, mdsxx_dx_new);
         set_mdsxy_dy(x, y, mdsxy_dy_new);
 
-        let rho: f32 = get_rho(x, y);
-        if(rho > 0.0) {
-            let vx: f32 = (vdsigmaxx_dx + vdsigmaxy_dy) * dt / rho + get_vx(x, y);
-            set_vx(x, y, vx);
+        let inv_rho: f32 = get_inv_rho_vx(x, y);
+        if(inv_rho > 0.0) {
+            let vx: f32 = (vdsigmaxx_dx + vdsigmaxy_dy) * dt * inv_rho + get_vx(x, y);
+            set_vx(x, y, select(vx, 0.0, dirichlet));
         }
     }
 
@@ -896,54 +985,52 @@ fn velocity_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
         set_mdsxy_dx(x, y, mdsxy_dx_new);
         set_mdsyy_dy(x, y, mdsyy_dy_new);
 
-        let rho: f32 = 0.25 * (get_rho(x, y) + get_rho(x + 1, y) + get_rho(x + 1, y + 1) + get_rho(x, y + 1));
-        if(rho > 0.0) {
-            let vy: f32 = (vdsigmaxy_dx + vdsigmayy_dy) * dt / rho + get_vy(x, y);
-            set_vy(x, y, vy);
+        let inv_rho: f32 = get_inv_rho_vy(x, y);
+        if(inv_rho > 0.0) {
+            let vy: f32 = (vdsigmaxy_dx + vdsigmayy_dy) * dt * inv_rho + get_vy(x, y);
+            set_vy(x, y, select(vy, 0.0, dirichlet));
         }
     }
+
+    // Compute velocity norm L2
+    reduce_v_max(get_vx(x, y) * get_vx(x, y) + get_vy(x, y) * get_vy(x, y), l_idx);
 }
 
-// Kernel to add the sources forces
+// Kernel to add the sources forces (one thread per source grid point)
 @compute
-@workgroup_size(wsx, wsy)
+@workgroup_size(ws_src)
 fn sources_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
-    let x: i32 = i32(index.x);          // x thread index
-    let y: i32 = i32(index.y);          // y thread index
+    let s: i32 = i32(index.x);          // source grid point index
     let dt: f32 = sim_flt_par.dt;
     let it: i32 = sim_int_par.it;
+    if(s >= sim_int_par.n_src_nd) {
+        return;
+    }
 
     // Add the source force
-    let idx_src_term: i32 = get_idx_source_term(x, y);
-    let rho: f32 = 0.25 * (get_rho(x, y) + get_rho(x + 1, y) + get_rho(x + 1, y + 1) + get_rho(x, y + 1));
-    if(idx_src_term != -1 && rho > 0.0) {
-        let vy: f32 = get_vy(x, y) + get_source_term(it, idx_src_term) * dt / rho;
-        set_vy(x, y, vy);
+    // Sum the weighted source terms injected at this grid point
+    // Each slab adds the sources of its own x planes
+    let node: i32 = get_node_src_pt(get_ptr_src_pt(s));
+    let x: i32 = node / sim_int_par.y_sz;
+    let y: i32 = node % sim_int_par.y_sz;
+    if(!in_slab(x)) {
+        return;
     }
-}
 
-// Kernel to finish iteration term
-@compute
-@workgroup_size(wsx, wsy)
-fn finish_it_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
-    let x: i32 = i32(index.x);          // x thread index
-    let y: i32 = i32(index.y);          // y thread index
-    let last: i32 = sim_int_par.fd_coeff - 1;
-    let id_x_i: i32 = -get_idx_fh(last);
-    let id_x_f: i32 = sim_int_par.x_sz - get_idx_ih(last);
-    let id_y_i: i32 = -get_idx_fh(last);
-    let id_y_f: i32 = sim_int_par.y_sz - get_idx_ih(last);
-    let v_2_old: f32 = v_2;
-
-    // Apply Dirichlet conditions
-    if(x <= id_x_i || x >= id_x_f || y <= id_y_i || y >= id_y_f) {
-        set_vx(x, y, 0.0);
-        set_vy(x, y, 0.0);
+    // The Dirichlet strips are tested first, so the material coefficients are only read inside the grid
+    if(is_dirichlet(x, y)) {
+        return;
     }
 
-    // Compute velocity norm L2
-    let v2: f32 = get_vx(x, y) * get_vx(x, y) + get_vy(x, y) * get_vy(x, y);
-    v_2 = max(v_2_old, v2);
+    let inv_rho: f32 = get_inv_rho_vy(x, y);
+    if(inv_rho > 0.0) {
+        var src: f32 = 0.0;
+        for(var n: i32 = get_ptr_src_pt(s); n < get_ptr_src_pt(s + 1); n++) {
+            src += get_weight_src_pt(n) * get_source_term(it, get_col_src_pt(n));
+        }
+        let vy: f32 = get_vy(x, y) + src * dt * inv_rho;
+        set_vy(x, y, vy);
+    }
 }
 
 // Kernel to store sensors velocity
@@ -953,27 +1040,89 @@ fn store_sensors_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
     let sensor: i32 = i32(index.x);          // x thread index
     let it: i32 = sim_int_par.it;
 
-    // Store sensors velocities
+    // Anti-aliasing filter and decimation
+    // Sample [n] of the receiving gate contributes to decimated samples [m] with tap [m * dec_factor - n_c]
+    let dec_factor: i32 = sim_int_par.dec_factor;
+    let n_c: i32 = it - get_rec_ini(sensor) - (sim_int_par.n_dec_taps - 1) / 2;
+    let m_ini: i32 = select((n_c + dec_factor - 1) / dec_factor, 0, n_c <= 0);
+    let n_e: i32 = n_c + sim_int_par.n_dec_taps - 1;
+    let m_end: i32 = select(min(get_rec_smp(sensor) - 1, n_e / dec_factor), -1, n_e < 0);
+    if(m_end < m_ini || it < get_delay_rec(sensor)) {
+        return;
+    }
+
+    // Sum sensors velocities and stresses
+    var value_vx: f32 = 0.0;
+    var value_vy: f32 = 0.0;
+    var value_sigxx: f32 = 0.0;
+    var value_sigyy: f32 = 0.0;
+    var value_sigxy: f32 = 0.0;
+    // Each slab adds its own points (the decimation filter below is linear)
     for(var pt: i32 = get_offset_sensor(sensor); get_idx_sensor(pt) == sensor; pt++) {
-        if(it >= get_delay_rec(sensor)) {
-            let x: i32 = get_idx_x_sensor(pt);
-            let y: i32 = get_idx_y_sensor(pt);
-
-            let value_sens_vx: f32 = get_sens_vx(it, sensor) + get_vx(x, y);
-            let value_sens_vy: f32 = get_sens_vy(it, sensor) + get_vy(x, y);
-            set_sens_vx(it, sensor, value_sens_vx);
-            set_sens_vy(it, sensor, value_sens_vy);
-
-            let value_sens_sigxx: f32 = get_sens_sigxx(it, sensor) + get_sigmaxx(x, y);
-            let value_sens_sigyy: f32 = get_sens_sigyy(it, sensor) + get_sigmayy(x, y);
-            let value_sens_sigxy: f32 = get_sens_sigxy(it, sensor) + get_sigmaxy(x, y);
-            set_sens_sigxx(it, sensor, value_sens_sigxx);
-            set_sens_sigyy(it, sensor, value_sens_sigyy);
-            set_sens_sigxy(it, sensor, value_sens_sigxy);
+        let x: i32 = get_idx_x_sensor(pt);
+        if(!in_slab(x)) {
+            continue;
+        }
+
+        let y: i32 = get_idx_y_sensor(pt);
+        let w: f32 = get_weight_rec_pt(pt);
+
+        if(is_rec_qty(0)) {
+            value_vx += w * get_vx(x, y);
+        }
+        if(is_rec_qty(1)) {
+            value_vy += w * get_vy(x, y);
+        }
+        if(is_rec_qty(2)) {
+            value_sigxx += w * get_sigmaxx(x, y);
+        }
+        if(is_rec_qty(3)) {
+            value_sigyy += w * get_sigmayy(x, y);
+        }
+        if(is_rec_qty(4)) {
+            value_sigxy += w * get_sigmaxy(x, y);
+        }
+    }
+
+    for(var m: i32 = m_ini; m <= m_end; m++) {
+        let h: f32 = get_dec_filter(m * dec_factor - n_c);
+
+        if(is_rec_qty(0)) {
+            set_sens_vx(m, sensor, get_sens_vx(m, sensor) + h * value_vx);
+        }
+        if(is_rec_qty(1)) {
+            set_sens_vy(m, sensor, get_sens_vy(m, sensor) + h * value_vy);
+        }
+        if(is_rec_qty(2)) {
+            set_sens_sigxx(m, sensor, get_sens_sigxx(m, sensor) + h * value_sigxx);
+        }
+        if(is_rec_qty(3)) {
+            set_sens_sigyy(m, sensor, get_sens_sigyy(m, sensor) + h * value_sigyy);
+        }
+        if(is_rec_qty(4)) {
+            set_sens_sigxy(m, sensor, get_sens_sigxy(m, sensor) + h * value_sigxy);
         }
     }
 }
 
+// Kernel to extract the preview (ROI region, decimated) of the velocity fields
+@compute
+@workgroup_size(ws_th0, ws_th1)
+fn preview_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
+    let xy: vec2<i32> = get_thread_xy(index);
+    let x: i32 = xy.x;                  // x grid index
+    let y: i32 = xy.y;                  // y grid index
+    let x_fld: i32 = pv_par.x_ini + x * pv_par.dec;
+    let y_fld: i32 = pv_par.y_ini + y * pv_par.dec;
+    // Each slab writes the points of its own x planes
+    if(x >= pv_par.x_sz || y >= pv_par.y_sz || !in_slab(x_fld)) {
+        return;
+    }
+
+    set_preview(0, x, y, get_vx(x_fld, y_fld));
+    set_preview(1, x, y, get_vy(x_fld, y_fld));
+}
+
 // Kernel to increase time iteraction [it]
 @compute
 @workgroup_size(1)
@@ -15,6 +15,24 @@ fn ijk(i: i32, j: i32, k: i32, i_max: i32, j_max: i32, k_max: i32) -> i32 {
     return select(-1, index, i >= 0 && i < i_max && j >= 0 && j < j_max && k >= 0 && k < k_max);
 }
 
+// function to convert 3D [i,j,k] field index into 1D [] index, without bounds checks
+// the kernels only update the fields inside the border strips of fd_coeff cells, which are the zero halo
+// of the stencils, so every stencil tap falls inside the field buffers by construction
+// the field buffers are bound from the first x plane of the current slab (see SlabValues)
+fn ijk_h(i: i32, j: i32, k: i32) -> i32 {
+    return k + j * sim_int_par.z_sz + (i - slab_par.x_ofs) * sim_int_par.z_sz * sim_int_par.y_sz;
+}
+
+// thread mapping: with th_z_fast the fastest thread axis (index.x) runs along z, the contiguous axis of ijk(),
+// so neighbouring threads of a workgroup access neighbouring words of the field buffers
+const th_z_fast: bool = th_map_z_fast;
+
+// function to convert the thread index of the cell kernels into the 3D [x,y,z] grid index
+// (the x thread index runs over the x planes updated by the current slab)
+fn get_thread_xyz(index: vec3<u32>) -> vec3<i32> {
+    return select(vec3<i32>(index), vec3<i32>(index.zyx), th_z_fast) + vec3<i32>(slab_par.x_ini, 0, 0);
+}
+
 // ++++++++++++++++++++++++++++++
 // ++++ Group 0 - parameters ++++
 // ++++++++++++++++++++++++++++++
@@ -27,6 +45,11 @@ struct SimIntValues {
     n_rec_el: i32,      // num probes rx elements
     n_rec_pt: i32,      // num rec pto
     fd_coeff: i32,      // num fd coefficients
+    n_rec_smp: i32,     // num decimated sensor samples
+    dec_factor: i32,    // sensor decimation factor
+    n_dec_taps: i32,    // num decimation filter taps
+    n_src_pt: i32,      // num src pto
+    n_src_nd: i32,      // num src grid points
     it: i32             // time iteraction
 };
 
@@ -43,7 +66,7 @@ struct SimFltValues {
 };
 
 @group(0) @binding(1)   // param_flt32
-var<storage,read> sim_flt_par: SimFltValues;
+var<uniform> sim_flt_par: SimFltValues;
 
 // ------------------------------------
 // --- Force array access funtions ---
@@ -60,316 +83,279 @@ fn get_source_term(n: i32, e: i32) -> f32 {
 
 // ----------------------------------
 
-@group(0) @binding(3) // source term index
-var<storage,read> idx_src: array<i32>;
-
-// function to get a source term index of a source
-fn get_idx_source_term(x: i32, y: i32, z: i32) -> i32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(-1, idx_src[index], index != -1);
-}
-
-// -------------------------------------------------
-// --- CPML X coefficients array access funtions ---
-// -------------------------------------------------
-@group(0) @binding(4) // a_x
-var<storage,read> a_x: array<f32>;
-
-// function to get a a_x array value
-fn get_a_x(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+@group(0) @binding(3) // source grid points offsets
+var<storage,read> ptr_src_pt: array<i32>;
 
-    return select(0.0, a_x[n], n >= 0 && n < sim_int_par.x_sz - pad);
+// function to get the first entry in info_src_pt table of a source grid point (n_src_pt past the last one)
+fn get_ptr_src_pt(s: i32) -> i32 {
+    return select(sim_int_par.n_src_pt, ptr_src_pt[s], s >= 0 && s < sim_int_par.n_src_nd);
 }
 
 // ----------------------------------
 
-@group(0) @binding(5) // b_x
-var<storage,read> b_x: array<f32>;
+@group(0) @binding(14) // info src ptos
+var<storage,read> info_src_pt: array<i32>;
 
-// function to get a b_x array value
-fn get_b_x(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+// function to get the grid point (linear index) of a source entry
+fn get_node_src_pt(n: i32) -> i32 {
+    let index: i32 = ij(n, 0, sim_int_par.n_src_pt, 2);
 
-    return select(0.0, b_x[n], n >= 0 && n < sim_int_par.x_sz - pad);
+    return select(-1, info_src_pt[index], index != -1);
 }
 
-// ----------------------------------
+// function to get the source term column of a source entry
+fn get_col_src_pt(n: i32) -> i32 {
+    let index: i32 = ij(n, 1, sim_int_par.n_src_pt, 2);
 
-@group(0) @binding(6) // k_x
-var<storage,read> k_x: array<f32>;
-
-// function to get a k_x array value
-fn get_k_x(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, k_x[n], n >= 0 && n < sim_int_par.x_sz - pad);
+    return select(-1, info_src_pt[index], index != -1);
 }
 
 // ----------------------------------
 
-@group(0) @binding(7) // a_x_h
-var<storage,read> a_x_h: array<f32>;
+@group(0) @binding(15) // weight src ptos
+var<storage,read> weight_src_pt: array<f32>;
 
-// function to get a a_x_h array value
-fn get_a_x_h(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, a_x_h[n], n >= 0 && n < sim_int_par.x_sz - pad);
+// function to get the injection weight of a source entry
+fn get_weight_src_pt(n: i32) -> f32 {
+    return select(0.0, weight_src_pt[n], n >= 0 && n < sim_int_par.n_src_pt);
 }
 
-// ----------------------------------
+// -----------------------------------------
+// --- CPML coefficients access funtions ---
+// -----------------------------------------
+// CPML coefficients of a grid point, [a, b, k, -] in the full grid and in the half grid
+struct PmlCoefs {
+    f_grid: vec4<f32>,  // [a, b, k, -] full grid
+    h_grid: vec4<f32>,  // [a, b, k, -] half grid
+};
 
-@group(0) @binding(8) // b_x_h
-var<storage,read> b_x_h: array<f32>;
+@group(0) @binding(4) // CPML x coefficients
+var<storage,read> pml_x: array<PmlCoefs>;
 
-// function to get a b_x_h array value
-fn get_b_x_h(n: i32) -> f32 {
+// function to get the CPML x coefficients of a point (zero outside the CPML arrays)
+fn get_pml_x(n: i32) -> PmlCoefs {
     let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+    let ok: bool = n >= 0 && n < sim_int_par.x_sz - pad;
+    let coefs: PmlCoefs = pml_x[select(0, n, ok)];
 
-    return select(0.0, b_x_h[n], n >= 0 && n < sim_int_par.x_sz - pad);
+    return PmlCoefs(select(vec4<f32>(0.0), coefs.f_grid, ok), select(vec4<f32>(0.0), coefs.h_grid, ok));
 }
 
-// ----------------------------------
-
-@group(0) @binding(9) // k_x_h
-var<storage,read> k_x_h: array<f32>;
+// functions to get the CPML x coefficients
+fn get_a_x(n: i32) -> f32 {
+    return get_pml_x(n).f_grid.x;
+}
 
-// function to get a k_x_h array value
-fn get_k_x_h(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+fn get_b_x(n: i32) -> f32 {
+    return get_pml_x(n).f_grid.y;
+}
 
-    return select(0.0, k_x_h[n], n >= 0 && n < sim_int_par.x_sz - pad);
+fn get_k_x(n: i32) -> f32 {
+    return get_pml_x(n).f_grid.z;
 }
 
-// -------------------------------------------------
-// --- CPML Y coefficients array access funtions ---
-// -------------------------------------------------
-@group(0) @binding(10) // a_y
-var<storage,read> a_y: array<f32>;
+fn get_a_x_h(n: i32) -> f32 {
+    return get_pml_x(n).h_grid.x;
+}
 
-// function to get a a_y array value
-fn get_a_y(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+fn get_b_x_h(n: i32) -> f32 {
+    return get_pml_x(n).h_grid.y;
+}
 
-    return select(0.0, a_y[n], n >= 0 && n < sim_int_par.y_sz - pad);
+fn get_k_x_h(n: i32) -> f32 {
+    return get_pml_x(n).h_grid.z;
 }
 
 // ----------------------------------
 
-@group(0) @binding(11) // b_y
-var<storage,read> b_y: array<f32>;
+@group(0) @binding(5) // CPML y coefficients
+var<storage,read> pml_y: array<PmlCoefs>;
 
-// function to get a b_y array value
-fn get_b_y(n: i32) -> f32 {
+// function to get the CPML y coefficients of a point (zero outside the CPML arrays)
+fn get_pml_y(n: i32) -> PmlCoefs {
     let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+    let ok: bool = n >= 0 && n < sim_int_par.y_sz - pad;
+    let coefs: PmlCoefs = pml_y[select(0, n, ok)];
 
-    return select(0.0, b_y[n], n >= 0 && n < sim_int_par.y_sz - pad);
+    return PmlCoefs(select(vec4<f32>(0.0), coefs.f_grid, ok), select(vec4<f32>(0.0), coefs.h_grid, ok));
 }
 
-// ----------------------------------
+// functions to get the CPML y coefficients
+fn get_a_y(n: i32) -> f32 {
+    return get_pml_y(n).f_grid.x;
+}
 
-@group(0) @binding(12) // k_y
-var<storage,read> k_y: array<f32>;
+fn get_b_y(n: i32) -> f32 {
+    return get_pml_y(n).f_grid.y;
+}
 
-// function to get a k_y array value
 fn get_k_y(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, k_y[n], n >= 0 && n < sim_int_par.y_sz - pad);
+    return get_pml_y(n).f_grid.z;
 }
 
-// ----------------------------------
-
-@group(0) @binding(13) // a_y_h
-var<storage,read> a_y_h: array<f32>;
-
-// function to get a a_y_h array value
 fn get_a_y_h(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, a_y_h[n], n >= 0 && n < sim_int_par.y_sz - pad);
+    return get_pml_y(n).h_grid.x;
 }
 
-// ----------------------------------
-
-@group(0) @binding(14) // b_y_h
-var<storage,read> b_y_h: array<f32>;
-
-// function to get a b_y_h array value
 fn get_b_y_h(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+    return get_pml_y(n).h_grid.y;
+}
 
-    return select(0.0, b_y_h[n], n >= 0 && n < sim_int_par.y_sz - pad);
+fn get_k_y_h(n: i32) -> f32 {
+    return get_pml_y(n).h_grid.z;
 }
 
 // ----------------------------------
 
-@group(0) @binding(15) // k_y_h
-var<storage,read> k_y_h: array<f32>;
+@group(0) @binding(6) // CPML z coefficients
+var<storage,read> pml_z: array<PmlCoefs>;
 
-// function to get a k_y_h array value
-fn get_k_y_h(n: i32) -> f32 {
+// function to get the CPML z coefficients of a point (zero outside the CPML arrays)
+fn get_pml_z(n: i32) -> PmlCoefs {
     let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
+    let ok: bool = n >= 0 && n < sim_int_par.z_sz - pad;
+    let coefs: PmlCoefs = pml_z[select(0, n, ok)];
 
-    return select(0.0, k_y_h[n], n >= 0 && n < sim_int_par.y_sz - pad);
+    return PmlCoefs(select(vec4<f32>(0.0), coefs.f_grid, ok), select(vec4<f32>(0.0), coefs.h_grid, ok));
 }
 
-// -------------------------------------------------
-// --- CPML Z coefficients array access funtions ---
-// -------------------------------------------------
-@group(0) @binding(16) // a_z
-var<storage,read> a_z: array<f32>;
-
-// function to get a a_z array value
+// functions to get the CPML z coefficients
 fn get_a_z(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, a_z[n], n >= 0 && n < sim_int_par.z_sz - pad);
+    return get_pml_z(n).f_grid.x;
 }
 
-// ----------------------------------
-
-@group(0) @binding(17) // b_z
-var<storage,read> b_z: array<f32>;
-
-// function to get a b_z array value
 fn get_b_z(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, b_z[n], n >= 0 && n < sim_int_par.z_sz - pad);
+    return get_pml_z(n).f_grid.y;
 }
 
-// ----------------------------------
-
-@group(0) @binding(18) // k_z
-var<storage,read> k_z: array<f32>;
-
-// function to get a k_z array value
 fn get_k_z(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, k_z[n], n >= 0 && n < sim_int_par.z_sz - pad);
+    return get_pml_z(n).f_grid.z;
 }
 
-// ----------------------------------
-
-@group(0) @binding(19) // a_z_h
-var<storage,read> a_z_h: array<f32>;
-
-// function to get a a_z_h array value
 fn get_a_z_h(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, a_z_h[n], n >= 0 && n < sim_int_par.z_sz - pad);
+    return get_pml_z(n).h_grid.x;
 }
 
-// ----------------------------------
-
-@group(0) @binding(20) // b_z_h
-var<storage,read> b_z_h: array<f32>;
-
-// function to get a b_z_h array value
 fn get_b_z_h(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, b_z_h[n], n >= 0 && n < sim_int_par.z_sz - pad);
+    return get_pml_z(n).h_grid.y;
 }
 
-// ----------------------------------
-
-@group(0) @binding(21) // k_z_h
-var<storage,read> k_z_h: array<f32>;
-
-// function to get a k_z_h array value
 fn get_k_z_h(n: i32) -> f32 {
-    let pad: i32 = (sim_int_par.fd_coeff - 1) * 2;
-
-    return select(0.0, k_z_h[n], n >= 0 && n < sim_int_par.z_sz - pad);
+    return get_pml_z(n).h_grid.z;
 }
 
 // -------------------------------------------------------------
 // --- Finite difference index limits arrays access funtions ---
 // -------------------------------------------------------------
-@group(0) @binding(22) // idx_fd
-var<storage,read> idx_fd: array<i32>;
+const fd_n: i32 = fd_num;           // num fd coefficients (uniform arrays size)
+
+@group(0) @binding(7) // idx_fd [ini-half, ini-full, fin-half, fin-full]
+var<uniform> idx_fd: array<vec4<i32>, fd_n>;
 
 // function to get an index to ini-half grid
 fn get_idx_ih(c: i32) -> i32 {
-    let index: i32 = ij(c, 0, sim_int_par.fd_coeff, 4);
-
-    return select(-1, idx_fd[index], index != -1);
+    return select(-1, idx_fd[c].x, c >= 0 && c < sim_int_par.fd_coeff);
 }
 
 // function to get an index to ini-full grid
 fn get_idx_if(c: i32) -> i32 {
-    let index: i32 = ij(c, 1, sim_int_par.fd_coeff, 4);
-
-    return select(-1, idx_fd[index], index != -1);
+    return select(-1, idx_fd[c].y, c >= 0 && c < sim_int_par.fd_coeff);
 }
 
 // function to get an index to fin-half grid
 fn get_idx_fh(c: i32) -> i32 {
-    let index: i32 = ij(c, 2, sim_int_par.fd_coeff, 4);
-
-    return select(-1, idx_fd[index], index != -1);
+    return select(-1, idx_fd[c].z, c >= 0 && c < sim_int_par.fd_coeff);
 }
 
 // function to get an index to fin-full grid
 fn get_idx_ff(c: i32) -> i32 {
-    let index: i32 = ij(c, 3, sim_int_par.fd_coeff, 4);
-
-    return select(-1, idx_fd[index], index != -1);
+    return select(-1, idx_fd[c].w, c >= 0 && c < sim_int_par.fd_coeff);
 }
 
 // ----------------------------------
 
-@group(0) @binding(23) // fd_coeff
-var<storage,read> fd_coeffs: array<f32>;
+@group(0) @binding(8) // fd_coeff (4 per vec4)
+var<uniform> fd_coeffs: array<vec4<f32>, (fd_n + 3) / 4>;
 
 // function to get a fd coefficient
 fn get_fdc(c: i32) -> f32 {
-    return select(0.0, fd_coeffs[c], c >= 0 && c < sim_int_par.fd_coeff);
+    return select(0.0, fd_coeffs[c / 4][c % 4], c >= 0 && c < sim_int_par.fd_coeff);
 }
 
+// ------------------------------------
+// --- Material map access funtions ---
+// ------------------------------------
+const mt_ids: bool = mat_ids_on;    // material map (true) or dense property maps (false)
+const mt_bits: u32 = u32(mat_lbl_bits); // bits per material label (8 or 16)
+const mt_n: i32 = mat_num;          // num materials (+1 null material outside the domain)
+
+@group(0) @binding(12) // material map (packed labels)
+var<storage,read> mat_map: array<u32>;
+
+// function to get a material label (null material outside the domain)
+fn get_mat(x: i32, y: i32, z: i32) -> i32 {
+    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
+    let n: u32 = u32(max(ijk_h(x, y, z), 0));
+    let per_word: u32 = 32u / mt_bits;
+    let label: u32 = (mat_map[n / per_word] >> ((n % per_word) * mt_bits)) & ((1u << mt_bits) - 1u);
+
+    return select(mt_n - 1, i32(label), index != -1);
+}
+
+// ----------------------------------
+
+@group(0) @binding(13) // material properties [cp, cs, rho] (n x 3)
+var<storage,read> mat_coef: array<f32>;
+
 // ---------------------------------
 // --- Rho map access funtions ---
 // ---------------------------------
-@group(0) @binding(24) // rho
+@group(0) @binding(9) // rho
 var<storage,read> rho_map: array<f32>;
 
 // function to get a rho value
 fn get_rho(x: i32, y: i32, z: i32) -> f32 {
+    if(mt_ids) {
+        return mat_coef[3 * get_mat(x, y, z) + 2];
+    }
+
     let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
 
-    return select(0.0, rho_map[index], index != -1);
+    return select(0.0, rho_map[ijk_h(x, y, z)], index != -1);
 }
 
 // ---------------------------------
 // --- Cp map access funtions ---
 // ---------------------------------
-@group(0) @binding(25) // cp
+@group(0) @binding(10) // cp
 var<storage,read> cp_map: array<f32>;
 
 // function to get a cp value
 fn get_cp(x: i32, y: i32, z: i32) -> f32 {
+    if(mt_ids) {
+        return mat_coef[3 * get_mat(x, y, z)];
+    }
+
     let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
 
-    return select(0.0, cp_map[index], index != -1);
+    return select(0.0, cp_map[ijk_h(x, y, z)], index != -1);
 }
 
 // ---------------------------------
 // --- Cs map access funtions ---
 // ---------------------------------
-@group(0) @binding(26) // cs
+@group(0) @binding(11) // cs
 var<storage,read> cs_map: array<f32>;
 
 // function to get a cp value
 fn get_cs(x: i32, y: i32, z: i32) -> f32 {
+    if(mt_ids) {
+        return mat_coef[3 * get_mat(x, y, z) + 1];
+    }
+
     let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
 
-    return select(0.0, cs_map[index], index != -1);
+    return select(0.0, cs_map[ijk_h(x, y, z)], index != -1);
 }
 
 // +++++++++++++++++++++++++++++++++++++
@@ -383,18 +369,12 @@ var<storage,read_write> vx: array<f32>;
 
 // function to get a vx array value
 fn get_vx(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, vx[index], index != -1);
+    return vx[ijk_h(x, y, z)];
 }
 
 // function to set a vx array value
 fn set_vx(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        vx[index] = val;
-    }
+    vx[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -404,18 +384,12 @@ var<storage,read_write> vy: array<f32>;
 
 // function to get a vy array value
 fn get_vy(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, vy[index], index != -1);
+    return vy[ijk_h(x, y, z)];
 }
 
 // function to set a vy array value
 fn set_vy(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        vy[index] = val;
-    }
+    vy[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -425,38 +399,24 @@ var<storage,read_write> vz: array<f32>;
 
 // function to get a vz array value
 fn get_vz(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, vz[index], index != -1);
+    return vz[ijk_h(x, y, z)];
 }
 
 // function to set a vz array value
 fn set_vz(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        vz[index] = val;
-    }
+    vz[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
 
-@group(1) @binding(3) // v_2
-var<storage,read_write> v_2: array<f32>;
-
-// function to get a v_2 array value
-fn get_v_2(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, v_2[index], index != -1);
-}
-
-// function to set a v_2 array value
-fn set_v_2(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
+@group(1) @binding(3) // v_max_hist
+var<storage,read_write> v_max_hist: array<atomic<u32>>;
 
-    if(index != -1) {
-        v_2[index] = val;
+// function to update the max squared velocity norm of a time step
+// Non-negative floats keep their order when reinterpreted as u32
+fn update_v_max_hist(n: i32, val: f32) {
+    if(n >= 0 && n < sim_int_par.n_iter) {
+        atomicMax(&v_max_hist[n], bitcast<u32>(val));
     }
 }
 
@@ -468,18 +428,12 @@ var<storage,read_write> sigmaxx: array<f32>;
 
 // function to get a sigmaxx array value
 fn get_sigmaxx(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, sigmaxx[index], index != -1);
+    return sigmaxx[ijk_h(x, y, z)];
 }
 
 // function to set a sigmaxx array value
 fn set_sigmaxx(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        sigmaxx[index] = val;
-    }
+    sigmaxx[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -489,18 +443,12 @@ var<storage,read_write> sigmayy: array<f32>;
 
 // function to get a sigmayy array value
 fn get_sigmayy(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, sigmayy[index], index != -1);
+    return sigmayy[ijk_h(x, y, z)];
 }
 
 // function to set a sigmayy array value
 fn set_sigmayy(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        sigmayy[index] = val;
-    }
+    sigmayy[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -510,18 +458,12 @@ var<storage,read_write> sigmazz: array<f32>;
 
 // function to get a sigmazz array value
 fn get_sigmazz(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, sigmazz[index], index != -1);
+    return sigmazz[ijk_h(x, y, z)];
 }
 
 // function to set a sigmazz array value
 fn set_sigmazz(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        sigmazz[index] = val;
-    }
+    sigmazz[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -531,18 +473,12 @@ var<storage,read_write> sigmaxy: array<f32>;
 
 // function to get a sigmaxy array value
 fn get_sigmaxy(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, sigmaxy[index], index != -1);
+    return sigmaxy[ijk_h(x, y, z)];
 }
 
 // function to set a sigmaxy array value
 fn set_sigmaxy(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        sigmaxy[index] = val;
-    }
+    sigmaxy[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -552,18 +488,12 @@ var<storage,read_write> sigmaxz: array<f32>;
 
 // function to get a sigmaxz array value
 fn get_sigmaxz(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, sigmaxz[index], index != -1);
+    return sigmaxz[ijk_h(x, y, z)];
 }
 
 // function to set a sigmaxz array value
 fn set_sigmaxz(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        sigmaxz[index] = val;
-    }
+    sigmaxz[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -573,18 +503,12 @@ var<storage,read_write> sigmayz: array<f32>;
 
 // function to get a sigmayz array value
 fn get_sigmayz(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, sigmayz[index], index != -1);
+    return sigmayz[ijk_h(x, y, z)];
 }
 
 // function to set a sigmayz array value
 fn set_sigmayz(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        sigmayz[index] = val;
-    }
+    sigmayz[ijk_h(x, y, z)] = val;
 }
 
 // -------------------------------------
@@ -595,18 +519,12 @@ var<storage,read_write> mdvx_dx: array<f32>;
 
 // function to get a memory_dvx_dx array value
 fn get_mdvx_dx(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdvx_dx[index], index != -1);
+    return mdvx_dx[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dvx_dx array value
 fn set_mdvx_dx(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdvx_dx[index] = val;
-    }
+    mdvx_dx[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -616,18 +534,12 @@ var<storage,read_write> mdvy_dx: array<f32>;
 
 // function to get a memory_dvy_dx array value
 fn get_mdvy_dx(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdvy_dx[index], index != -1);
+    return mdvy_dx[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dvy_dx array value
 fn set_mdvy_dx(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdvy_dx[index] = val;
-    }
+    mdvy_dx[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -637,18 +549,12 @@ var<storage,read_write> mdvz_dx: array<f32>;
 
 // function to get a memory_dvz_dx array value
 fn get_mdvz_dx(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdvz_dx[index], index != -1);
+    return mdvz_dx[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dvz_dx array value
 fn set_mdvz_dx(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdvz_dx[index] = val;
-    }
+    mdvz_dx[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -658,18 +564,12 @@ var<storage,read_write> mdvx_dy: array<f32>;
 
 // function to get a memory_dvx_dy array value
 fn get_mdvx_dy(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdvx_dy[index], index != -1);
+    return mdvx_dy[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dvx_dy array value
 fn set_mdvx_dy(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdvx_dy[index] = val;
-    }
+    mdvx_dy[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -679,18 +579,12 @@ var<storage,read_write> mdvy_dy: array<f32>;
 
 // function to get a memory_dvy_dy array value
 fn get_mdvy_dy(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdvy_dy[index], index != -1);
+    return mdvy_dy[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dvy_dy array value
 fn set_mdvy_dy(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdvy_dy[index] = val;
-    }
+    mdvy_dy[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -700,18 +594,12 @@ var<storage,read_write> mdvz_dy: array<f32>;
 
 // function to get a memory_dvz_dy array value
 fn get_mdvz_dy(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdvz_dy[index], index != -1);
+    return mdvz_dy[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dvz_dy array value
 fn set_mdvz_dy(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdvz_dy[index] = val;
-    }
+    mdvz_dy[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -721,18 +609,12 @@ var<storage,read_write> mdvx_dz: array<f32>;
 
 // function to get a memory_dvx_dz array value
 fn get_mdvx_dz(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdvx_dz[index], index != -1);
+    return mdvx_dz[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dvy_dx array value
 fn set_mdvx_dz(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdvx_dz[index] = val;
-    }
+    mdvx_dz[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -742,18 +624,12 @@ var<storage,read_write> mdvy_dz: array<f32>;
 
 // function to get a memory_dvy_dz array value
 fn get_mdvy_dz(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdvy_dz[index], index != -1);
+    return mdvy_dz[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dvy_dz array value
 fn set_mdvy_dz(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdvy_dz[index] = val;
-    }
+    mdvy_dz[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -763,18 +639,12 @@ var<storage,read_write> mdvz_dz: array<f32>;
 
 // function to get a memory_dvz_dz array value
 fn get_mdvz_dz(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdvz_dz[index], index != -1);
+    return mdvz_dz[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dvz_dz array value
 fn set_mdvz_dz(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdvz_dz[index] = val;
-    }
+    mdvz_dz[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -784,18 +654,12 @@ var<storage,read_write> mdsxx_dx: array<f32>;
 
 // function to get a memory_dsigmaxx_dx array value
 fn get_mdsxx_dx(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdsxx_dx[index], index != -1);
+    return mdsxx_dx[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dsigmaxx_dx array value
 fn set_mdsxx_dx(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdsxx_dx[index] = val;
-    }
+    mdsxx_dx[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -805,18 +669,12 @@ var<storage,read_write> mdsxy_dy: array<f32>;
 
 // function to get a memory_dsigmaxy_dy array value
 fn get_mdsxy_dy(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdsxy_dy[index], index != -1);
+    return mdsxy_dy[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dsigmaxy_dy array value
 fn set_mdsxy_dy(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdsxy_dy[index] = val;
-    }
+    mdsxy_dy[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -826,18 +684,12 @@ var<storage,read_write> mdsxz_dz: array<f32>;
 
 // function to get a memory_dsigmaxz_dz array value
 fn get_mdsxz_dz(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdsxz_dz[index], index != -1);
+    return mdsxz_dz[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dsigmaxz_dz array value
 fn set_mdsxz_dz(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdsxz_dz[index] = val;
-    }
+    mdsxz_dz[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -847,18 +699,12 @@ var<storage,read_write> mdsxy_dx: array<f32>;
 
 // function to get a memory_dsigmaxy_dx array value
 fn get_mdsxy_dx(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdsxy_dx[index], index != -1);
+    return mdsxy_dx[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dsigmaxy_dx array value
 fn set_mdsxy_dx(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdsxy_dx[index] = val;
-    }
+    mdsxy_dx[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -868,18 +714,12 @@ var<storage,read_write> mdsyy_dy: array<f32>;
 
 // function to get a memory_dsigmayy_dy array value
 fn get_mdsyy_dy(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdsyy_dy[index], index != -1);
+    return mdsyy_dy[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dsigmayy_dy array value
 fn set_mdsyy_dy(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdsyy_dy[index] = val;
-    }
+    mdsyy_dy[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -889,18 +729,12 @@ var<storage,read_write> mdsyz_dz: array<f32>;
 
 // function to get a memory_dsigmayz_dz array value
 fn get_mdsyz_dz(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdsyz_dz[index], index != -1);
+    return mdsyz_dz[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dsigmayz_dz array value
 fn set_mdsyz_dz(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdsyz_dz[index] = val;
-    }
+    mdsyz_dz[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -910,18 +744,12 @@ var<storage,read_write> mdsxz_dx: array<f32>;
 
 // function to get a memory_dsigmaxz_dx array value
 fn get_mdsxz_dx(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdsxz_dx[index], index != -1);
+    return mdsxz_dx[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dsigmaxz_dx array value
 fn set_mdsxz_dx(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdsxz_dx[index] = val;
-    }
+    mdsxz_dx[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -931,18 +759,12 @@ var<storage,read_write> mdsyz_dy: array<f32>;
 
 // function to get a memory_dsigmayz_dy array value
 fn get_mdsyz_dy(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdsyz_dy[index], index != -1);
+    return mdsyz_dy[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dsigmayz_dy array value
 fn set_mdsyz_dy(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    if(index != -1) {
-        mdsyz_dy[index] = val;
-    }
+    mdsyz_dy[ijk_h(x, y, z)] = val;
 }
 
 // ----------------------------------
@@ -952,20 +774,70 @@ var<storage,read_write> mdszz_dz: array<f32>;
 
 // function to get a memory_dsigmazz_dz array value
 fn get_mdszz_dz(x: i32, y: i32, z: i32) -> f32 {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
-
-    return select(0.0, mdszz_dz[index], index != -1);
+    return mdszz_dz[ijk_h(x, y, z)];
 }
 
 // function to set a memory_dsigmazz_dz array value
 fn set_mdszz_dz(x: i32, y: i32, z: i32, val: f32) {
-    let index: i32 = ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz);
+    mdszz_dz[ijk_h(x, y, z)] = val;
+}
+
+// --------------------------------------
+// --- Preview arrays access funtions ---
+// --------------------------------------
+struct PreviewValues {
+    x_ini: i32,         // first x index of the preview region
+    y_ini: i32,         // first y index of the preview region
+    z_ini: i32,         // first z index of the preview region
+    x_sz: i32,          // preview x size
+    y_sz: i32,          // preview y size
+    z_sz: i32,          // preview z size
+    x_pl: i32,          // x index of the YZ plane
+    y_pl: i32,          // y index of the XZ plane
+    z_pl: i32,          // z index of the XY plane
+    dec: i32,           // preview decimation factor
+};
+
+@group(1) @binding(29) // preview parameters
+var<uniform> pv_par: PreviewValues;
+
+// ----------------------------------
+
+@group(1) @binding(28) // preview planes [XY, XZ, YZ] of [vx, vy, vz]
+var<storage,read_write> preview: array<f32>;
+
+// function to set a preview array value
+fn set_preview(pl: i32, f: i32, a: i32, b: i32, val: f32) {
+    let a_sz: i32 = select(pv_par.x_sz, pv_par.y_sz, pl == 2);
+    let b_sz: i32 = select(pv_par.y_sz, pv_par.z_sz, pl > 0);
+    let offset: i32 = select(0, 3 * pv_par.x_sz * pv_par.y_sz, pl > 0) +
+                      select(0, 3 * pv_par.x_sz * pv_par.z_sz, pl == 2);
+    let index: i32 = ij(a, b, a_sz, b_sz);
 
     if(index != -1) {
-        mdszz_dz[index] = val;
+        preview[offset + f * a_sz * b_sz + index] = val;
     }
 }
 
+// -----------------------
+// --- Slab parameters ---
+// -----------------------
+// Grids larger than the max storage binding size run as sequential slab passes along x: the field buffers
+// are bound from plane x_ofs (with a halo of fd_coeff planes) and the kernels update planes [x_ini, x_end)
+struct SlabValues {
+    x_ofs: i32,         // first x plane of the field bindings
+    x_ini: i32,         // first x plane updated by the slab
+    x_end: i32,         // last x plane (exclusive) updated by the slab
+};
+
+@group(1) @binding(30) // slab parameters
+var<uniform> slab_par: SlabValues;
+
+// function to check if a x plane is updated by the current slab
+fn in_slab(x: i32) -> bool {
+    return x >= slab_par.x_ini && x < slab_par.x_end;
+}
+
 // +++++++++++++++++++++++++++++++++++++++++++++++
 // ++++ Group 2 - sensors arrays and energies ++++
 // +++++++++++++++++++++++++++++++++++++++++++++++
@@ -977,14 +849,14 @@ var<storage,read_write> sensors_vx: array<f32>;
 
 // function to get a sens_vx array value
 fn get_sens_vx(n: i32, s: i32) -> f32 {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     return select(0.0, sensors_vx[index], index != -1);
 }
 
 // function to set a sens_vx array value
 fn set_sens_vx(n: i32, s: i32, val : f32) {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     if(index != -1) {
         sensors_vx[index] = val;
@@ -998,14 +870,14 @@ var<storage,read_write> sensors_vy: array<f32>;
 
 // function to get a sens_vy array value
 fn get_sens_vy(n: i32, s: i32) -> f32 {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     return select(0.0, sensors_vy[index], index != -1);
 }
 
 // function to set a sens_vy array value
 fn set_sens_vy(n: i32, s: i32, val : f32) {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     if(index != -1) {
         sensors_vy[index] = val;
@@ -1019,14 +891,14 @@ var<storage,read_write> sensors_vz: array<f32>;
 
 // function to get a sens_vz array value
 fn get_sens_vz(n: i32, s: i32) -> f32 {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     return select(0.0, sensors_vz[index], index != -1);
 }
 
 // function to set a sens_vz array value
 fn set_sens_vz(n: i32, s: i32, val : f32) {
-    let index: i32 = ij(n, s, sim_int_par.n_iter, sim_int_par.n_rec_el);
+    let index: i32 = ij(n, s, sim_int_par.n_rec_smp, sim_int_par.n_rec_el);
 
     if(index != -1) {
         sensors_vz[index] = val;
@@ -1086,15 +958,254 @@ fn get_offset_sensor(s: i32) -> i32 {
     return select(-1, offset_sensors[s], s >= 0 && s < sim_int_par.n_rec_el);
 }
 
+// ----------------------------------
+
+@group(2) @binding(6) // decimation filter
+var<storage,read> dec_filter: array<f32>;
+
+// function to get a decimation filter tap value
+fn get_dec_filter(n: i32) -> f32 {
+    return select(0.0, dec_filter[n], n >= 0 && n < sim_int_par.n_dec_taps);
+}
+
+// ----------------------------------
+
+@group(2) @binding(7) // weight rec ptos
+var<storage,read> weight_rec_pt: array<f32>;
+
+// function to get the interpolation weight of a receiver point
+fn get_weight_rec_pt(n: i32) -> f32 {
+    return select(0.0, weight_rec_pt[n], n >= 0 && n < sim_int_par.n_rec_pt);
+}
+
+// ---------------------------------------
+// --- Field update functions (per cell) ---
+// ---------------------------------------
+// function to check if a point is inside the update limits of a field
+// For each axis, half selects the half grid limits instead of the full grid limits
+fn is_inside(x: i32, y: i32, z: i32, half_x: bool, half_y: bool, half_z: bool) -> bool {
+    let last: i32 = sim_int_par.fd_coeff - 1;
+    let id_x_i: i32 = select(-get_idx_ff(last), -get_idx_fh(last), half_x);
+    let id_x_f: i32 = sim_int_par.x_sz - select(get_idx_if(last), get_idx_ih(last), half_x);
+    let id_y_i: i32 = select(-get_idx_ff(last), -get_idx_fh(last), half_y);
+    let id_y_f: i32 = sim_int_par.y_sz - select(get_idx_if(last), get_idx_ih(last), half_y);
+    let id_z_i: i32 = select(-get_idx_ff(last), -get_idx_fh(last), half_z);
+    let id_z_f: i32 = sim_int_par.z_sz - select(get_idx_if(last), get_idx_ih(last), half_z);
+
+    return x >= id_x_i && x < id_x_f && y >= id_y_i && y < id_y_f && z >= id_z_i && z < id_z_f;
+}
+
+// function to check if a point is in the border strips where the Dirichlet conditions apply
+fn is_dirichlet(x: i32, y: i32, z: i32) -> bool {
+    let last: i32 = sim_int_par.fd_coeff - 1;
+    let id_x_i: i32 = -get_idx_fh(last);
+    let id_x_f: i32 = sim_int_par.x_sz - get_idx_ih(last);
+    let id_y_i: i32 = -get_idx_fh(last);
+    let id_y_f: i32 = sim_int_par.y_sz - get_idx_ih(last);
+    let id_z_i: i32 = -get_idx_fh(last);
+    let id_z_f: i32 = sim_int_par.z_sz - get_idx_ih(last);
+
+    return x <= id_x_i || x >= id_x_f || y <= id_y_i || y >= id_y_f || z <= id_z_i || z >= id_z_f;
+}
+
+// Workgroup max squared velocity norm
+var<workgroup> wg_v_max: atomic<u32>;
+
+// function to get the squared velocity norm of a point
+fn get_v_2(x: i32, y: i32, z: i32) -> f32 {
+    return get_vx(x, y, z)*get_vx(x, y, z) + get_vy(x, y, z)*get_vy(x, y, z) + get_vz(x, y, z)*get_vz(x, y, z);
+}
+
+// function to reduce the max squared velocity norm, first in the workgroup and then in the history buffer
+// Must be called in uniform control flow
+fn reduce_v_max(v_2: f32, l_idx: u32) {
+    if(l_idx == 0u) {
+        atomicStore(&wg_v_max, 0u);
+    }
+    workgroupBarrier();
+    atomicMax(&wg_v_max, bitcast<u32>(v_2));
+    workgroupBarrier();
+    if(l_idx == 0u) {
+        update_v_max_hist(sim_int_par.it, bitcast<f32>(atomicLoad(&wg_v_max)));
+    }
+}
+
+// function to update the normal stresses [sigmaxx, sigmayy, sigmazz] from the velocity derivatives
+fn update_sigma_normal(x: i32, y: i32, z: i32, dvx_dx: f32, dvy_dy: f32, dvz_dz: f32) {
+    let dt: f32 = sim_flt_par.dt;
+    let offset: i32 = sim_int_par.fd_coeff - 1;
+
+    var mdvx_dx_new: f32 = get_b_x_h(x - offset) * get_mdvx_dx(x, y, z) + get_a_x_h(x - offset) * dvx_dx;
+    var mdvy_dy_new: f32 = get_b_y(y - offset) * get_mdvy_dy(x, y, z) + get_a_y(y - offset) * dvy_dy;
+    var mdvz_dz_new: f32 = get_b_z(z - offset) * get_mdvz_dz(x, y, z) + get_a_z(z - offset) * dvz_dz;
+
+    let vdvx_dx: f32 = dvx_dx/get_k_x_h(x - offset) + mdvx_dx_new;
+    let vdvy_dy: f32 = dvy_dy/get_k_y(y - offset)  + mdvy_dy_new;
+    let vdvz_dz: f32 = dvz_dz/get_k_z(z - offset)  + mdvz_dz_new;
+
+    set_mdvx_dx(x, y, z, mdvx_dx_new);
+    set_mdvy_dy(x, y, z, mdvy_dy_new);
+    set_mdvz_dz(x, y, z, mdvz_dz_new);
+
+    let rho = get_rho(x, y, z);
+    let cp = get_cp(x, y, z);
+    let cs = get_cs(x, y, z);
+    let lambda: f32 = rho * (cp * cp - 2.0 * cs * cs);
+    let mu: f32 = rho * (cs * cs);
+    let lambdaplus2mu: f32 = lambda + 2.0 * mu;
+    let sigmaxx: f32 = get_sigmaxx(x, y, z) + (lambdaplus2mu * vdvx_dx + lambda        * (vdvy_dy + vdvz_dz))*dt;
+    let sigmayy: f32 = get_sigmayy(x, y, z) + (lambda        * (vdvx_dx + vdvz_dz) + lambdaplus2mu * vdvy_dy)*dt;
+    let sigmazz: f32 = get_sigmazz(x, y, z) + (lambda        * (vdvx_dx + vdvy_dy) + lambdaplus2mu * vdvz_dz)*dt;
+    set_sigmaxx(x, y, z, sigmaxx);
+    set_sigmayy(x, y, z, sigmayy);
+    set_sigmazz(x, y, z, sigmazz);
+}
+
+// function to update the shear stress sigmaxy from the velocity derivatives
+fn update_sigma_xy(x: i32, y: i32, z: i32, dvy_dx: f32, dvx_dy: f32) {
+    let dt: f32 = sim_flt_par.dt;
+    let offset: i32 = sim_int_par.fd_coeff - 1;
+
+    var mdvy_dx_new: f32 = get_b_x(x - offset) * get_mdvy_dx(x, y, z) + get_a_x(x - offset) * dvy_dx;
+    var mdvx_dy_new: f32 = get_b_y_h(y - offset) * get_mdvx_dy(x, y, z) + get_a_y_h(y - offset) * dvx_dy;
+
+    let vdvy_dx: f32 = dvy_dx/get_k_x(x - offset)   + mdvy_dx_new;
+    let vdvx_dy: f32 = dvx_dy/get_k_y_h(y - offset) + mdvx_dy_new;
+
+    set_mdvy_dx(x, y, z, mdvy_dx_new);
+    set_mdvx_dy(x, y, z, mdvx_dy_new);
+
+    let rho = 0.25 * (get_rho(x + 1, y, z) + get_rho(x, y, z) + get_rho(x, y + 1, z) + get_rho(x + 1, y + 1, z));
+    let cs = 0.25 * (get_cs(x + 1, y, z) + get_cs(x, y, z) + get_cs(x, y + 1, z) + get_cs(x + 1, y + 1, z));
+    let mu: f32 = rho * (cs * cs);
+    let sigmaxy: f32 = get_sigmaxy(x, y, z) + (vdvx_dy + vdvy_dx) * mu * dt;
+    set_sigmaxy(x, y, z, sigmaxy);
+}
+
+// function to update the shear stress sigmaxz from the velocity derivatives
+fn update_sigma_xz(x: i32, y: i32, z: i32, dvz_dx: f32, dvx_dz: f32) {
+    let dt: f32 = sim_flt_par.dt;
+    let offset: i32 = sim_int_par.fd_coeff - 1;
+
+    var mdvz_dx_new: f32 = get_b_x(x - offset) * get_mdvz_dx(x, y, z) + get_a_x(x - offset) * dvz_dx;
+    var mdvx_dz_new: f32 = get_b_z_h(z - offset) * get_mdvx_dz(x, y, z) + get_a_z_h(z - offset) * dvx_dz;
+
+    let vdvz_dx: f32 = dvz_dx/get_k_x(x - offset)   + mdvz_dx_new;
+    let vdvx_dz: f32 = dvx_dz/get_k_z_h(z - offset) + mdvx_dz_new;
+
+    set_mdvz_dx(x, y, z, mdvz_dx_new);
+    set_mdvx_dz(x, y, z, mdvx_dz_new);
+
+    let rho = 0.25 * (get_rho(x + 1, y, z) + get_rho(x, y, z) + get_rho(x, y, z + 1) + get_rho(x + 1, y, z + 1));
+    let cs = 0.25 * (get_cs(x + 1, y, z) + get_cs(x, y, z) + get_cs(x, y, z + 1) + get_cs(x + 1, y, z + 1));
+    let mu: f32 = rho * (cs * cs);
+    let sigmaxz: f32 = get_sigmaxz(x, y, z) + (vdvx_dz + vdvz_dx) * mu * dt;
+    set_sigmaxz(x, y, z, sigmaxz);
+}
+
+// function to update the shear stress sigmayz from the velocity derivatives
+fn update_sigma_yz(x: i32, y: i32, z: i32, dvz_dy: f32, dvy_dz: f32) {
+    let dt: f32 = sim_flt_par.dt;
+    let offset: i32 = sim_int_par.fd_coeff - 1;
+
+    var mdvz_dy_new: f32 = get_b_y_h(y - offset) * get_mdvz_dy(x, y, z) + get_a_y_h(y - offset) * dvz_dy;
+    var mdvy_dz_new: f32 = get_b_z_h(z - offset) * get_mdvy_dz(x, y, z) + get_a_z_h(z - offset) * dvy_dz;
+
+    let vdvz_dy: f32 = dvz_dy/get_k_y_h(y - offset) + mdvz_dy_new;
+    let vdvy_dz: f32 = dvy_dz/get_k_z_h(z - offset) + mdvy_dz_new;
+
+    set_mdvz_dy(x, y, z, mdvz_dy_new);
+    set_mdvy_dz(x, y, z, mdvy_dz_new);
+
+    let rho = 0.25 * (get_rho(x, y + 1, z) + get_rho(x, y, z) + get_rho(x, y, z + 1) + get_rho(x, y + 1, z + 1));
+    let cs = 0.25 * (get_cs(x, y + 1, z) + get_cs(x, y, z) + get_cs(x, y, z + 1) + get_cs(x, y + 1, z + 1));
+    let mu: f32 = rho * (cs * cs);
+    let sigmayz: f32 = get_sigmayz(x, y, z) + (vdvy_dz + vdvz_dy) * mu * dt;
+    set_sigmayz(x, y, z, sigmayz);
+}
+
+// function to update the velocity vx from the stress derivatives
+fn update_vx(x: i32, y: i32, z: i32, dsigmaxx_dx: f32, dsigmaxy_dy: f32, dsigmaxz_dz: f32) {
+    let dt: f32 = sim_flt_par.dt;
+    let offset: i32 = sim_int_par.fd_coeff - 1;
+
+    var mdsxx_dx_new: f32 = get_b_x(x - offset) * get_mdsxx_dx(x, y, z) + get_a_x(x - offset) * dsigmaxx_dx;
+    var mdsxy_dy_new: f32 = get_b_y(y - offset) * get_mdsxy_dy(x, y, z) + get_a_y(y - offset) * dsigmaxy_dy;
+    var mdsxz_dz_new: f32 = get_b_z(z - offset) * get_mdsxz_dz(x, y, z) + get_a_z(z - offset) * dsigmaxz_dz;
+
+    let vdsigmaxx_dx: f32 = dsigmaxx_dx/get_k_x(x - offset) + mdsxx_dx_new;
+    let vdsigmaxy_dy: f32 = dsigmaxy_dy/get_k_y(y - offset) + mdsxy_dy_new;
+    let vdsigmaxz_dz: f32 = dsigmaxz_dz/get_k_z(z - offset) + mdsxz_dz_new;
+
+    set_mdsxx_dx(x, y, z, mdsxx_dx_new);
+    set_mdsxy_dy(x, y, z, mdsxy_dy_new);
+    set_mdsxz_dz(x, y, z, mdsxz_dz_new);
+
+    let rho: f32 = 0.5 * (get_rho(x + 1, y, z) + get_rho(x, y, z));
+    if(rho > 0.0) {
+        let vx: f32 = (vdsigmaxx_dx + vdsigmaxy_dy + vdsigmaxz_dz) * dt / rho + get_vx(x, y, z);
+        set_vx(x, y, z, select(vx, 0.0, is_dirichlet(x, y, z)));
+    }
+}
+
+// function to update the velocity vy from the stress derivatives
+fn update_vy(x: i32, y: i32, z: i32, dsigmaxy_dx: f32, dsigmayy_dy: f32, dsigmayz_dz: f32) {
+    let dt: f32 = sim_flt_par.dt;
+    let offset: i32 = sim_int_par.fd_coeff - 1;
+
+    var mdsxy_dx_new: f32 = get_b_x_h(x - offset) * get_mdsxy_dx(x, y, z) + get_a_x_h(x - offset) * dsigmaxy_dx;
+    var mdsyy_dy_new: f32 = get_b_y_h(y - offset) * get_mdsyy_dy(x, y, z) + get_a_y_h(y - offset) * dsigmayy_dy;
+    var mdsyz_dz_new: f32 = get_b_z(z - offset)   * get_mdsyz_dz(x, y, z) + get_a_z(z - offset)   * dsigmayz_dz;
+
+    let vdsigmaxy_dx: f32 = dsigmaxy_dx/get_k_x_h(x - offset) + mdsxy_dx_new;
+    let vdsigmayy_dy: f32 = dsigmayy_dy/get_k_y_h(y - offset) + mdsyy_dy_new;
+    let vdsigmayz_dz: f32 = dsigmayz_dz/get_k_z(z - offset)   + mdsyz_dz_new;
+
+    set_mdsxy_dx(x, y, z, mdsxy_dx_new);
+    set_mdsyy_dy(x, y, z, mdsyy_dy_new);
+    set_mdsyz_dz(x, y, z, mdsyz_dz_new);
+
+    let rho: f32 = 0.5*(get_rho(x, y + 1, z) + get_rho(x, y, z));
+    if(rho > 0.0) {
+        let vy: f32 = (vdsigmaxy_dx + vdsigmayy_dy + vdsigmayz_dz) * dt / rho + get_vy(x, y, z);
+        set_vy(x, y, z, select(vy, 0.0, is_dirichlet(x, y, z)));
+    }
+}
+
+// function to update the velocity vz from the stress derivatives
+fn update_vz(x: i32, y: i32, z: i32, dsigmaxz_dx: f32, dsigmayz_dy: f32, dsigmazz_dz: f32) {
+    let dt: f32 = sim_flt_par.dt;
+    let offset: i32 = sim_int_par.fd_coeff - 1;
+
+    var mdsxz_dx_new: f32 = get_b_x_h(x - offset) * get_mdsxz_dx(x, y, z) + get_a_x_h(x - offset) * dsigmaxz_dx;
+    var mdsyz_dy_new: f32 = get_b_y(y - offset)   * get_mdsyz_dy(x, y, z) + get_a_y(y - offset)   * dsigmayz_dy;
+    var mdszz_dz_new: f32 = get_b_z_h(z - offset) * get_mdszz_dz(x, y, z) + get_a_z_h(z - offset) * dsigmazz_dz;
+
+    let vdsigmaxz_dx: f32 = dsigmaxz_dx/get_k_x_h(x - offset) + mdsxz_dx_new;
+    let vdsigmayz_dy: f32 = dsigmayz_dy/get_k_y(y - offset)   + mdsyz_dy_new;
+    let vdsigmazz_dz: f32 = dsigmazz_dz/get_k_z_h(z - offset) + mdszz_dz_new;
+
+    set_mdsxz_dx(x, y, z, mdsxz_dx_new);
+    set_mdsyz_dy(x, y, z, mdsyz_dy_new);
+    set_mdszz_dz(x, y, z, mdszz_dz_new);
+
+    let rho: f32 = 0.5*(get_rho(x, y, z + 1) + get_rho(x, y, z));
+    if(rho > 0.0) {
+        let vz: f32 = (vdsigmaxz_dx + vdsigmayz_dy + vdsigmazz_dz) * dt / rho + get_vz(x, y, z);
+        set_vz(x, y, z, select(vz, 0.0, is_dirichlet(x, y, z)));
+    }
+}
+
 // ---------------
 // --- Kernels ---
 // ---------------
 @compute
-@workgroup_size(wsx, wsy, wsz)
+@workgroup_size(ws_th0, ws_th1, ws_th2)
 fn teste_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
-    let x: i32 = i32(index.x);          // x thread index
-    let y: i32 = i32(index.y);          // y thread index
-    let z: i32 = i32(index.z);          // z thread index
+    let xyz: vec3<i32> = get_thread_xyz(index);
+    let x: i32 = xyz.x;                 // x grid index
+    let y: i32 = xyz.y;                 // y grid index
+    let z: i32 = xyz.z;                 // z grid index
 
     set_vx(x, y, z, f32(x));
     set_vy(x, y, z, f32(y));
@@ -1103,26 +1214,18 @@ fn teste_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
 
 // Kernel to calculate stresses [sigmaxx, sigmayy, sigmaxy]
 @compute
-@workgroup_size(wsx, wsy, wsz)
+@workgroup_size(ws_th0, ws_th1, ws_th2)
 fn sigma_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
-    let x: i32 = i32(index.x);          // x thread index
-    let y: i32 = i32(index.y);          // y thread index
-    let z: i32 = i32(index.z);          // z thread index
+    let xyz: vec3<i32> = get_thread_xyz(index);
+    let x: i32 = xyz.x;                 // x grid index
+    let y: i32 = xyz.y;                 // y grid index
+    let z: i32 = xyz.z;                 // z grid index
     let dx: f32 = sim_flt_par.dx;
     let dy: f32 = sim_flt_par.dy;
     let dz: f32 = sim_flt_par.dz;
-    let dt: f32 = sim_flt_par.dt;
-    let last: i32 = sim_int_par.fd_coeff - 1;
-    let offset: i32 = sim_int_par.fd_coeff - 1;
 
     // Normal stresses
-    var id_x_i: i32 = -get_idx_fh(last);
-    var id_x_f: i32 = sim_int_par.x_sz - get_idx_ih(last);
-    var id_y_i: i32 = -get_idx_ff(last);
-    var id_y_f: i32 = sim_int_par.y_sz - get_idx_if(last);
-    var id_z_i: i32 = -get_idx_ff(last);
-    var id_z_f: i32 = sim_int_par.z_sz - get_idx_if(last);
-    if(x >= id_x_i && x < id_x_f && y >= id_y_i && y < id_y_f && z >= id_z_i && z < id_z_f) {
+    if(is_inside(x, y, z, true, false, false)) {
         var vdvx_dx: f32 = 0.0;
         var vdvy_dy: f32 = 0.0;
         var vdvz_dz: f32 = 0.0;
@@ -1131,150 +1234,59 @@ fn sigma_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
             vdvy_dy += get_fdc(c) * (get_vy(x, y + get_idx_if(c), z) - get_vy(x, y + get_idx_ff(c), z)) / dy;
             vdvz_dz += get_fdc(c) * (get_vz(x, y, z + get_idx_if(c)) - get_vz(x, y, z + get_idx_ff(c))) / dz;
         }
-
-        var mdvx_dx_new: f32 = get_b_x_h(x - offset) * get_mdvx_dx(x, y, z) + get_a_x_h(x - offset) * vdvx_dx;
-        var mdvy_dy_new: f32 = get_b_y(y - offset) * get_mdvy_dy(x, y, z) + get_a_y(y - offset) * vdvy_dy;
-        var mdvz_dz_new: f32 = get_b_z(z - offset) * get_mdvz_dz(x, y, z) + get_a_z(z - offset) * vdvz_dz;
-
-        vdvx_dx = vdvx_dx/get_k_x_h(x - offset) + mdvx_dx_new;
-        vdvy_dy = vdvy_dy/get_k_y(y - offset)  + mdvy_dy_new;
-        vdvz_dz = vdvz_dz/get_k_z(z - offset)  + mdvz_dz_new;
-
-        set_mdvx_dx(x, y, z, mdvx_dx_new);
-        set_mdvy_dy(x, y, z, mdvy_dy_new);
-        set_mdvz_dz(x, y, z, mdvz_dz_new);
-
-        let rho = get_rho(x, y, z);
-        let cp = get_cp(x, y, z);
-        let cs = get_cs(x, y, z);
-        let lambda: f32 = rho * (cp * cp - 2.0 * cs * cs);
-        let mu: f32 = rho * (cs * cs);
-        let lambdaplus2mu: f32 = lambda + 2.0 * mu;
-        let sigmaxx: f32 = get_sigmaxx(x, y, z) + (lambdaplus2mu * vdvx_dx + lambda        * (vdvy_dy + vdvz_dz))*dt;
-        let sigmayy: f32 = get_sigmayy(x, y, z) + (lambda        * (vdvx_dx + vdvz_dz) + lambdaplus2mu * vdvy_dy)*dt;
-        let sigmazz: f32 = get_sigmazz(x, y, z) + (lambda        * (vdvx_dx + vdvy_dy) + lambdaplus2mu * vdvz_dz)*dt;
-        set_sigmaxx(x, y, z, sigmaxx);
-        set_sigmayy(x, y, z, sigmayy);
-        set_sigmazz(x, y, z, sigmazz);
+        update_sigma_normal(x, y, z, vdvx_dx, vdvy_dy, vdvz_dz);
     }
 
     // Shear stresses
     // sigma_xy
-    id_x_i = -get_idx_ff(last);
-    id_x_f = sim_int_par.x_sz - get_idx_if(last);
-    id_y_i = -get_idx_fh(last);
-    id_y_f = sim_int_par.y_sz - get_idx_ih(last);
-    id_z_i = -get_idx_fh(last);
-    id_z_f = sim_int_par.z_sz - get_idx_ih(last);
-    if(x >= id_x_i && x < id_x_f && y >= id_y_i && y < id_y_f && z >= id_z_i && z < id_z_f) {
+    if(is_inside(x, y, z, false, true, true)) {
         var vdvy_dx: f32 = 0.0;
         var vdvx_dy: f32 = 0.0;
         for(var c: i32 = 0; c < sim_int_par.fd_coeff; c++) {
             vdvy_dx += get_fdc(c) * (get_vy(x + get_idx_if(c), y, z) - get_vy(x + get_idx_ff(c), y, z)) / dx;
             vdvx_dy += get_fdc(c) * (get_vx(x, y + get_idx_ih(c), z) - get_vx(x, y + get_idx_fh(c), z)) / dy;
         }
-
-        var mdvy_dx_new: f32 = get_b_x(x - offset) * get_mdvy_dx(x, y, z) + get_a_x(x - offset) * vdvy_dx;
-        var mdvx_dy_new: f32 = get_b_y_h(y - offset) * get_mdvx_dy(x, y, z) + get_a_y_h(y - offset) * vdvx_dy;
-
-        vdvy_dx = vdvy_dx/get_k_x(x - offset)   + mdvy_dx_new;
-        vdvx_dy = vdvx_dy/get_k_y_h(y - offset) + mdvx_dy_new;
-
-        set_mdvy_dx(x, y, z, mdvy_dx_new);
-        set_mdvx_dy(x, y, z, mdvx_dy_new);
-
-        let rho = 0.25 * (get_rho(x + 1, y, z) + get_rho(x, y, z) + get_rho(x, y + 1, z) + get_rho(x + 1, y + 1, z));
-        let cs = 0.25 * (get_cs(x + 1, y, z) + get_cs(x, y, z) + get_cs(x, y + 1, z) + get_cs(x + 1, y + 1, z));
-        let mu: f32 = rho * (cs * cs);
-        let sigmaxy: f32 = get_sigmaxy(x, y, z) + (vdvx_dy + vdvy_dx) * mu * dt;
-        set_sigmaxy(x, y, z, sigmaxy);
+        update_sigma_xy(x, y, z, vdvy_dx, vdvx_dy);
     }
 
     // sigma_xz
-    id_x_i = -get_idx_ff(last);
-    id_x_f = sim_int_par.x_sz - get_idx_if(last);
-    id_y_i = -get_idx_fh(last);
-    id_y_f = sim_int_par.y_sz - get_idx_ih(last);
-    id_z_i = -get_idx_fh(last);
-    id_z_f = sim_int_par.z_sz - get_idx_ih(last);
-    if(x >= id_x_i && x < id_x_f && y >= id_y_i && y < id_y_f && z >= id_z_i && z < id_z_f) {
+    if(is_inside(x, y, z, false, true, true)) {
         var vdvz_dx: f32 = 0.0;
         var vdvx_dz: f32 = 0.0;
         for(var c: i32 = 0; c < sim_int_par.fd_coeff; c++) {
             vdvz_dx += get_fdc(c) * (get_vz(x + get_idx_if(c), y, z) - get_vz(x + get_idx_ff(c), y, z)) / dx;
             vdvx_dz += get_fdc(c) * (get_vx(x, y, z + get_idx_ih(c)) - get_vx(x, y, z + get_idx_fh(c))) / dz;
         }
-
-        var mdvz_dx_new: f32 = get_b_x(x - offset) * get_mdvz_dx(x, y, z) + get_a_x(x - offset) * vdvz_dx;
-        var mdvx_dz_new: f32 = get_b_z_h(z - offset) * get_mdvx_dz(x, y, z) + get_a_z_h(z - offset) * vdvx_dz;
-
-        vdvz_dx = vdvz_dx/get_k_x(x - offset)   + mdvz_dx_new;
-        vdvx_dz = vdvx_dz/get_k_z_h(z - offset) + mdvx_dz_new;
-
-        set_mdvz_dx(x, y, z, mdvz_dx_new);
-        set_mdvx_dz(x, y, z, mdvx_dz_new);
-
-        let rho = 0.25 * (get_rho(x + 1, y, z) + get_rho(x, y, z) + get_rho(x, y, z + 1) + get_rho(x + 1, y, z + 1));
-        let cs = 0.25 * (get_cs(x + 1, y, z) + get_cs(x, y, z) + get_cs(x, y, z + 1) + get_cs(x + 1, y, z + 1));
-        let mu: f32 = rho * (cs * cs);
-        let sigmaxz: f32 = get_sigmaxz(x, y, z) + (vdvx_dz + vdvz_dx) * mu * dt;
-        set_sigmaxz(x, y, z, sigmaxz);
+        update_sigma_xz(x, y, z, vdvz_dx, vdvx_dz);
     }
 
     // sigma_yz
-    id_x_i = -get_idx_fh(last);
-    id_x_f = sim_int_par.x_sz - get_idx_ih(last);
-    id_y_i = -get_idx_fh(last);
-    id_y_f = sim_int_par.y_sz - get_idx_ih(last);
-    id_z_i = -get_idx_fh(last);
-    id_z_f = sim_int_par.z_sz - get_idx_ih(last);
-    if(x >= id_x_i && x < id_x_f && y >= id_y_i && y < id_y_f && z >= id_z_i && z < id_z_f) {
+    if(is_inside(x, y, z, true, true, true)) {
         var vdvz_dy: f32 = 0.0;
         var vdvy_dz: f32 = 0.0;
         for(var c: i32 = 0; c < sim_int_par.fd_coeff; c++) {
             vdvz_dy += get_fdc(c) * (get_vz(x, y + get_idx_ih(c), z) - get_vz(x, y + get_idx_fh(c), z)) / dy;
             vdvy_dz += get_fdc(c) * (get_vy(x, y, z + get_idx_ih(c)) - get_vy(x, y, z + get_idx_fh(c))) / dz;
         }
-
-        var mdvz_dy_new: f32 = get_b_y_h(y - offset) * get_mdvz_dy(x, y, z) + get_a_y_h(y - offset) * vdvz_dy;
-        var mdvy_dz_new: f32 = get_b_z_h(z - offset) * get_mdvy_dz(x, y, z) + get_a_z_h(z - offset) * vdvy_dz;
-
-        vdvz_dy = vdvz_dy/get_k_y_h(y - offset) + mdvz_dy_new;
-        vdvy_dz = vdvy_dz/get_k_z_h(z - offset) + mdvy_dz_new;
-
-        set_mdvz_dy(x, y, z, mdvz_dy_new);
-        set_mdvy_dz(x, y, z, mdvy_dz_new);
-
-        let rho = 0.25 * (get_rho(x, y + 1, z) + get_rho(x, y, z) + get_rho(x, y, z + 1) + get_rho(x, y + 1, z + 1));
-        let cs = 0.25 * (get_cs(x, y + 1, z) + get_cs(x, y, z) + get_cs(x, y, z + 1) + get_cs(x, y + 1, z + 1));
-        let mu: f32 = rho * (cs * cs);
-        let sigmayz: f32 = get_sigmayz(x, y, z) + (vdvy_dz + vdvz_dy) * mu * dt;
-        set_sigmayz(x, y, z, sigmayz);
+        update_sigma_yz(x, y, z, vdvz_dy, vdvy_dz);
     }
 }
 
 // Kernel to calculate velocities [vx, vy, vz]
 @compute
-@workgroup_size(wsx, wsy, wsz)
-fn velocity_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
-    let x: i32 = i32(index.x);          // x thread index
-    let y: i32 = i32(index.y);          // y thread index
-    let z: i32 = i32(index.z);          // z thread index
-    let dt: f32 = sim_flt_par.dt;
+@workgroup_size(ws_th0, ws_th1, ws_th2)
+fn velocity_kernel(@builtin(global_invocation_id) index: vec3<u32>,
+                   @builtin(local_invocation_index) l_idx: u32) {
+    let xyz: vec3<i32> = get_thread_xyz(index);
+    let x: i32 = xyz.x;                 // x grid index
+    let y: i32 = xyz.y;                 // y grid index
+    let z: i32 = xyz.z;                 // z grid index
     let dx: f32 = sim_flt_par.dx;
     let dy: f32 = sim_flt_par.dy;
     let dz: f32 = sim_flt_par.dz;
-    let last: i32 = sim_int_par.fd_coeff - 1;
-    let offset: i32 = sim_int_par.fd_coeff - 1;
 
     // Vx
-    var id_x_i: i32 = -get_idx_ff(last);
-    var id_x_f: i32 = sim_int_par.x_sz - get_idx_if(last);
-    var id_y_i: i32 = -get_idx_ff(last);
-    var id_y_f: i32 = sim_int_par.y_sz - get_idx_if(last);
-    var id_z_i: i32 = -get_idx_ff(last);
-    var id_z_f: i32 = sim_int_par.z_sz - get_idx_if(last);
-    if(x >= id_x_i && x < id_x_f && y >= id_y_i && y < id_y_f && z >= id_z_i && z < id_z_f) {
+    if(is_inside(x, y, z, false, false, false)) {
         var vdsigmaxx_dx: f32 = 0.0;
         var vdsigmaxy_dy: f32 = 0.0;
         var vdsigmaxz_dz: f32 = 0.0;
@@ -1283,34 +1295,11 @@ fn velocity_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
             vdsigmaxy_dy += get_fdc(c) * (get_sigmaxy(x, y + get_idx_if(c), z) - get_sigmaxy(x, y + get_idx_ff(c), z)) / dy;
             vdsigmaxz_dz += get_fdc(c) * (get_sigmaxz(x, y, z + get_idx_if(c)) - get_sigmaxz(x, y, z + get_idx_ff(c))) / dz;
         }
-
-        var mdsxx_dx_new: f32 = get_b_x(x - offset) * get_mdsxx_dx(x, y, z) + get_a_x(x - offset) * vdsigmaxx_dx;
-        var mdsxy_dy_new: f32 = get_b_y(y - offset) * get_mdsxy_dy(x, y, z) + get_a_y(y - offset) * vdsigmaxy_dy;
-        var mdsxz_dz_new: f32 = get_b_z(z - offset) * get_mdsxz_dz(x, y, z) + get_a_z(z - offset) * vdsigmaxz_dz;
-
-        vdsigmaxx_dx = vdsigmaxx_dx/get_k_x(x - offset) + mdsxx_dx_new;
-        vdsigmaxy_dy = vdsigmaxy_dy/get_k_y(y - offset) + mdsxy_dy_new;
-        vdsigmaxz_dz = vdsigmaxz_dz/get_k_z(z - offset) + mdsxz_dz_new;
-
-        set_mdsxx_dx(x, y, z, mdsxx_dx_new);
-        set_mdsxy_dy(x, y, z, mdsxy_dy_new);
-        set_mdsxz_dz(x, y, z, mdsxz_dz_new);
-
-        let rho: f32 = 0.5 * (get_rho(x + 1, y, z) + get_rho(x, y, z));
-        if(rho > 0.0) {
-            let vx: f32 = (vdsigmaxx_dx + vdsigmaxy_dy + vdsigmaxz_dz) * dt / rho + get_vx(x, y, z);
-            set_vx(x, y, z, vx);
-        }
+        update_vx(x, y, z, vdsigmaxx_dx, vdsigmaxy_dy, vdsigmaxz_dz);
     }
 
     // Vy
-    id_x_i = -get_idx_fh(last);
-    id_x_f = sim_int_par.x_sz - get_idx_ih(last);
-    id_y_i = -get_idx_fh(last);
-    id_y_f = sim_int_par.y_sz - get_idx_ih(last);
-    id_z_i = -get_idx_ff(last);
-    id_z_f = sim_int_par.z_sz - get_idx_if(last);
-    if(x >= id_x_i && x < id_x_f && y >= id_y_i && y < id_y_f && z >= id_z_i && z < id_z_f) {
+    if(is_inside(x, y, z, true, true, false)) {
         var vdsigmaxy_dx: f32 = 0.0;
         var vdsigmayy_dy: f32 = 0.0;
         var vdsigmayz_dz: f32 = 0.0;
@@ -1319,34 +1308,11 @@ fn velocity_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
             vdsigmayy_dy += get_fdc(c) * (get_sigmayy(x, y + get_idx_ih(c), z) - get_sigmayy(x, y + get_idx_fh(c), z)) / dy;
             vdsigmayz_dz += get_fdc(c) * (get_sigmayz(x, y, z + get_idx_if(c)) - get_sigmayz(x, y, z + get_idx_ff(c))) / dz;
         }
-
-        var mdsxy_dx_new: f32 = get_b_x_h(x - offset) * get_mdsxy_dx(x, y, z) + get_a_x_h(x - offset) * vdsigmaxy_dx;
-        var mdsyy_dy_new: f32 = get_b_y_h(y - offset) * get_mdsyy_dy(x, y, z) + get_a_y_h(y - offset) * vdsigmayy_dy;
-        var mdsyz_dz_new: f32 = get_b_z(z - offset)   * get_mdsyz_dz(x, y, z) + get_a_z(z - offset)   * vdsigmayz_dz;
-
-        vdsigmaxy_dx = vdsigmaxy_dx/get_k_x_h(x - offset) + mdsxy_dx_new;
-        vdsigmayy_dy = vdsigmayy_dy/get_k_y_h(y - offset) + mdsyy_dy_new;
-        vdsigmayz_dz = vdsigmayz_dz/get_k_z(z - offset)   + mdsyz_dz_new;
-
-        set_mdsxy_dx(x, y, z, mdsxy_dx_new);
-        set_mdsyy_dy(x, y, z, mdsyy_dy_new);
-        set_mdsyz_dz(x, y, z, mdsyz_dz_new);
-
-        let rho: f32 = 0.5*(get_rho(x, y + 1, z) + get_rho(x, y, z));
-        if(rho > 0.0) {
-            let vy: f32 = (vdsigmaxy_dx + vdsigmayy_dy + vdsigmayz_dz) * dt / rho + get_vy(x, y, z);
-            set_vy(x, y, z, vy);
-        }
+        update_vy(x, y, z, vdsigmaxy_dx, vdsigmayy_dy, vdsigmayz_dz);
     }
 
     // Vz
-    id_x_i = -get_idx_fh(last);
-    id_x_f = sim_int_par.x_sz - get_idx_ih(last);
-    id_y_i = -get_idx_ff(last);
-    id_y_f = sim_int_par.y_sz - get_idx_if(last);
-    id_z_i = -get_idx_fh(last);
-    id_z_f = sim_int_par.z_sz - get_idx_ih(last);
-    if(x >= id_x_i && x < id_x_f && y >= id_y_i && y < id_y_f && z >= id_z_i && z < id_z_f) {
+    if(is_inside(x, y, z, true, false, true)) {
         var vdsigmaxz_dx: f32 = 0.0;
         var vdsigmayz_dy: f32 = 0.0;
         var vdsigmazz_dz: f32 = 0.0;
@@ -1355,72 +1321,294 @@ fn velocity_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
             vdsigmayz_dy += get_fdc(c) * (get_sigmayz(x, y + get_idx_if(c), z) - get_sigmayz(x, y + get_idx_ff(c), z)) / dy;
             vdsigmazz_dz += get_fdc(c) * (get_sigmazz(x, y, z + get_idx_ih(c)) - get_sigmazz(x, y, z + get_idx_fh(c))) / dz;
         }
+        update_vz(x, y, z, vdsigmaxz_dx, vdsigmayz_dy, vdsigmazz_dz);
+    }
+
+    // Velocity norm L2 (the Dirichlet conditions were applied by the updates)
+    reduce_v_max(get_v_2(x, y, z), l_idx);
+}
+
+// -------------------------------------------------------------------------
+// --- 2.5D blocking: each thread marches along z keeping a register window
+// --- of the stencil column, and the XY plane is tiled in workgroup memory
+// -------------------------------------------------------------------------
+const mz_fd: i32 = mz_fd_coeff;         // num fd coefficients
+const mz_win: i32 = 2 * mz_fd + 1;      // z register window size
+const mz_z_sz: i32 = mz_z_len;          // z field size
+const mz_tw: i32 = wsx + 2 * mz_fd;     // XY tile width (with halo)
+const mz_th: i32 = wsy + 2 * mz_fd;     // XY tile height (with halo)
+const mz_tile_sz: i32 = mz_tw * mz_th;  // XY tile size
+
+var<workgroup> mz_tile_0: array<f32, mz_tile_sz>;
+var<workgroup> mz_tile_1: array<f32, mz_tile_sz>;
+var<workgroup> mz_tile_2: array<f32, mz_tile_sz>;
+var<workgroup> mz_tile_3: array<f32, mz_tile_sz>;
+var<workgroup> mz_tile_4: array<f32, mz_tile_sz>;
+
+// function to get a field value by its id [vx, vy, vz, sigmaxx, sigmayy, sigmazz, sigmaxy, sigmaxz, sigmayz]
+// (zero outside the grid, for the tile halos and z windows at the grid borders)
+fn get_field(f: i32, x: i32, y: i32, z: i32) -> f32 {
+    var val: f32 = 0.0;
+    if(ijk(x, y, z, sim_int_par.x_sz, sim_int_par.y_sz, sim_int_par.z_sz) == -1) {
+        return val;
+    }
+
+    switch f {
+        case 0: { val = get_vx(x, y, z); }
+        case 1: { val = get_vy(x, y, z); }
+        case 2: { val = get_vz(x, y, z); }
+        case 3: { val = get_sigmaxx(x, y, z); }
+        case 4: { val = get_sigmayy(x, y, z); }
+        case 5: { val = get_sigmazz(x, y, z); }
+        case 6: { val = get_sigmaxy(x, y, z); }
+        case 7: { val = get_sigmaxz(x, y, z); }
+        default: { val = get_sigmayz(x, y, z); }
+    }
+
+    return val;
+}
+
+// function to load the XY tile (with halo) of a field at plane z into workgroup memory
+fn load_tile(t: ptr<workgroup, array<f32, mz_tile_sz>>, f: i32, x0: i32, y0: i32, z: i32, l_idx: i32) {
+    for(var i: i32 = l_idx; i < mz_tile_sz; i += wsx * wsy) {
+        (*t)[i] = get_field(f, x0 + i % mz_tw - mz_fd, y0 + i / mz_tw - mz_fd, z);
+    }
+}
 
-        var mdsxz_dx_new: f32 = get_b_x_h(x - offset) * get_mdsxz_dx(x, y, z) + get_a_x_h(x - offset) * vdsigmaxz_dx;
-        var mdsyz_dy_new: f32 = get_b_y(y - offset)   * get_mdsyz_dy(x, y, z) + get_a_y(y - offset)   * vdsigmayz_dy;
-        var mdszz_dz_new: f32 = get_b_z_h(z - offset) * get_mdszz_dz(x, y, z) + get_a_z_h(z - offset) * vdsigmazz_dz;
+// function to get a value of a XY tile from the local thread coordinates
+fn get_tile(t: ptr<workgroup, array<f32, mz_tile_sz>>, lx: i32, ly: i32) -> f32 {
+    return (*t)[(ly + mz_fd) * mz_tw + lx + mz_fd];
+}
+
+// function to initialize the z register window of a field, centered at z = 0
+fn init_win(w: ptr<function, array<f32, mz_win>>, f: i32, x: i32, y: i32) {
+    for(var k: i32 = 0; k < mz_win; k++) {
+        (*w)[k] = get_field(f, x, y, k - mz_fd);
+    }
+}
 
-        vdsigmaxz_dx = vdsigmaxz_dx/get_k_x_h(x - offset) + mdsxz_dx_new;
-        vdsigmayz_dy = vdsigmayz_dy/get_k_y(y - offset)   + mdsyz_dy_new;
-        vdsigmazz_dz = vdsigmazz_dz/get_k_z_h(z - offset) + mdszz_dz_new;
+// function to move the z register window of a field from plane z to plane z + 1
+fn shift_win(w: ptr<function, array<f32, mz_win>>, f: i32, x: i32, y: i32, z: i32) {
+    for(var k: i32 = 0; k < mz_win - 1; k++) {
+        (*w)[k] = (*w)[k + 1];
+    }
+    (*w)[mz_win - 1] = get_field(f, x, y, z + 1 + mz_fd);
+}
+
+// Kernel to calculate stresses with 2.5D blocking
+@compute
+@workgroup_size(wsx, wsy, 1)
+fn sigma_march_kernel(@builtin(global_invocation_id) index: vec3<u32>,
+                      @builtin(local_invocation_id) l_id: vec3<u32>,
+                      @builtin(workgroup_id) wg_id: vec3<u32>,
+                      @builtin(local_invocation_index) l_idx: u32) {
+    let x: i32 = i32(index.x) + slab_par.x_ini;             // x thread index
+    let y: i32 = i32(index.y);                              // y thread index
+    let lx: i32 = i32(l_id.x);                              // x local thread index
+    let ly: i32 = i32(l_id.y);                              // y local thread index
+    let x0: i32 = i32(wg_id.x) * wsx + slab_par.x_ini;      // x index of the tile origin
+    let y0: i32 = i32(wg_id.y) * wsy;                       // y index of the tile origin
+    let dx: f32 = sim_flt_par.dx;
+    let dy: f32 = sim_flt_par.dy;
+    let dz: f32 = sim_flt_par.dz;
+
+    // z register windows [vx, vy, vz]
+    var w_vx: array<f32, mz_win>;
+    var w_vy: array<f32, mz_win>;
+    var w_vz: array<f32, mz_win>;
+    init_win(&w_vx, 0, x, y);
+    init_win(&w_vy, 1, x, y);
+    init_win(&w_vz, 2, x, y);
+
+    for(var z: i32 = 0; z < mz_z_sz; z++) {
+        // XY tiles [vx, vy, vz] of plane z
+        workgroupBarrier();
+        load_tile(&mz_tile_0, 0, x0, y0, z, i32(l_idx));
+        load_tile(&mz_tile_1, 1, x0, y0, z, i32(l_idx));
+        load_tile(&mz_tile_2, 2, x0, y0, z, i32(l_idx));
+        workgroupBarrier();
+
+        // Normal stresses
+        if(is_inside(x, y, z, true, false, false)) {
+            var vdvx_dx: f32 = 0.0;
+            var vdvy_dy: f32 = 0.0;
+            var vdvz_dz: f32 = 0.0;
+            for(var c: i32 = 0; c < sim_int_par.fd_coeff; c++) {
+                vdvx_dx += get_fdc(c) * (get_tile(&mz_tile_0, lx + get_idx_ih(c), ly) -
+                                         get_tile(&mz_tile_0, lx + get_idx_fh(c), ly)) / dx;
+                vdvy_dy += get_fdc(c) * (get_tile(&mz_tile_1, lx, ly + get_idx_if(c)) -
+                                         get_tile(&mz_tile_1, lx, ly + get_idx_ff(c))) / dy;
+                vdvz_dz += get_fdc(c) * (w_vz[mz_fd + get_idx_if(c)] - w_vz[mz_fd + get_idx_ff(c)]) / dz;
+            }
+            update_sigma_normal(x, y, z, vdvx_dx, vdvy_dy, vdvz_dz);
+        }
+
+        // sigma_xy
+        if(is_inside(x, y, z, false, true, true)) {
+            var vdvy_dx: f32 = 0.0;
+            var vdvx_dy: f32 = 0.0;
+            for(var c: i32 = 0; c < sim_int_par.fd_coeff; c++) {
+                vdvy_dx += get_fdc(c) * (get_tile(&mz_tile_1, lx + get_idx_if(c), ly) -
+                                         get_tile(&mz_tile_1, lx + get_idx_ff(c), ly)) / dx;
+                vdvx_dy += get_fdc(c) * (get_tile(&mz_tile_0, lx, ly + get_idx_ih(c)) -
+                                         get_tile(&mz_tile_0, lx, ly + get_idx_fh(c))) / dy;
+            }
+            update_sigma_xy(x, y, z, vdvy_dx, vdvx_dy);
+        }
 
-        set_mdsxz_dx(x, y, z, mdsxz_dx_new);
-        set_mdsyz_dy(x, y, z, mdsyz_dy_new);
-        set_mdszz_dz(x, y, z, mdszz_dz_new);
+        // sigma_xz
+        if(is_inside(x, y, z, false, true, true)) {
+            var vdvz_dx: f32 = 0.0;
+            var vdvx_dz: f32 = 0.0;
+            for(var c: i32 = 0; c < sim_int_par.fd_coeff; c++) {
+                vdvz_dx += get_fdc(c) * (get_tile(&mz_tile_2, lx + get_idx_if(c), ly) -
+                                         get_tile(&mz_tile_2, lx + get_idx_ff(c), ly)) / dx;
+                vdvx_dz += get_fdc(c) * (w_vx[mz_fd + get_idx_ih(c)] - w_vx[mz_fd + get_idx_fh(c)]) / dz;
+            }
+            update_sigma_xz(x, y, z, vdvz_dx, vdvx_dz);
+        }
 
-        let rho: f32 = 0.5*(get_rho(x, y, z + 1) + get_rho(x, y, z));
-        if(rho > 0.0) {
-            let vz: f32 = (vdsigmaxz_dx + vdsigmayz_dy + vdsigmazz_dz) * dt / rho + get_vz(x, y, z);
-            set_vz(x, y, z, vz);
+        // sigma_yz
+        if(is_inside(x, y, z, true, true, true)) {
+            var vdvz_dy: f32 = 0.0;
+            var vdvy_dz: f32 = 0.0;
+            for(var c: i32 = 0; c < sim_int_par.fd_coeff; c++) {
+                vdvz_dy += get_fdc(c) * (get_tile(&mz_tile_2, lx, ly + get_idx_ih(c)) -
+                                         get_tile(&mz_tile_2, lx, ly + get_idx_fh(c))) / dy;
+                vdvy_dz += get_fdc(c) * (w_vy[mz_fd + get_idx_ih(c)] - w_vy[mz_fd + get_idx_fh(c)]) / dz;
+            }
+            update_sigma_yz(x, y, z, vdvz_dy, vdvy_dz);
         }
+
+        shift_win(&w_vx, 0, x, y, z);
+        shift_win(&w_vy, 1, x, y, z);
+        shift_win(&w_vz, 2, x, y, z);
     }
 }
 
-// Kernel to add the sources forces
+// Kernel to calculate velocities with 2.5D blocking
 @compute
-@workgroup_size(wsx, wsy, wsz)
-fn sources_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
-    let x: i32 = i32(index.x);          // x thread index
-    let y: i32 = i32(index.y);          // y thread index
-    let z: i32 = i32(index.z);          // y thread index
-    let dt: f32 = sim_flt_par.dt;
-    let it: i32 = sim_int_par.it;
+@workgroup_size(wsx, wsy, 1)
+fn velocity_march_kernel(@builtin(global_invocation_id) index: vec3<u32>,
+                         @builtin(local_invocation_id) l_id: vec3<u32>,
+                         @builtin(workgroup_id) wg_id: vec3<u32>,
+                         @builtin(local_invocation_index) l_idx: u32) {
+    let x: i32 = i32(index.x) + slab_par.x_ini;             // x thread index
+    let y: i32 = i32(index.y);                              // y thread index
+    let lx: i32 = i32(l_id.x);                              // x local thread index
+    let ly: i32 = i32(l_id.y);                              // y local thread index
+    let x0: i32 = i32(wg_id.x) * wsx + slab_par.x_ini;      // x index of the tile origin
+    let y0: i32 = i32(wg_id.y) * wsy;                       // y index of the tile origin
+    let dx: f32 = sim_flt_par.dx;
+    let dy: f32 = sim_flt_par.dy;
+    let dz: f32 = sim_flt_par.dz;
 
-    // Add the source force
-    let idx_src_term: i32 = get_idx_source_term(x, y, z);
-    let rho: f32 = 0.5*(get_rho(x, y, z) + get_rho(x, y, z + 1));
-    if(idx_src_term != -1 && rho > 0.0) {
-        let vz: f32 = get_vz(x, y, z) + get_source_term(it, idx_src_term) * dt / rho;
-        set_vz(x, y, z, vz);
+    // z register windows [sigmazz, sigmaxz, sigmayz]
+    var w_szz: array<f32, mz_win>;
+    var w_sxz: array<f32, mz_win>;
+    var w_syz: array<f32, mz_win>;
+    init_win(&w_szz, 5, x, y);
+    init_win(&w_sxz, 7, x, y);
+    init_win(&w_syz, 8, x, y);
+
+    var v_2_max: f32 = 0.0;
+    for(var z: i32 = 0; z < mz_z_sz; z++) {
+        // XY tiles [sigmaxx, sigmayy, sigmaxy, sigmaxz, sigmayz] of plane z
+        workgroupBarrier();
+        load_tile(&mz_tile_0, 3, x0, y0, z, i32(l_idx));
+        load_tile(&mz_tile_1, 4, x0, y0, z, i32(l_idx));
+        load_tile(&mz_tile_2, 6, x0, y0, z, i32(l_idx));
+        load_tile(&mz_tile_3, 7, x0, y0, z, i32(l_idx));
+        load_tile(&mz_tile_4, 8, x0, y0, z, i32(l_idx));
+        workgroupBarrier();
+
+        // Vx
+        if(is_inside(x, y, z, false, false, false)) {
+            var vdsigmaxx_dx: f32 = 0.0;
+            var vdsigmaxy_dy: f32 = 0.0;
+            var vdsigmaxz_dz: f32 = 0.0;
+            for(var c: i32 = 0; c < sim_int_par.fd_coeff; c++) {
+                vdsigmaxx_dx += get_fdc(c) * (get_tile(&mz_tile_0, lx + get_idx_if(c), ly) -
+                                              get_tile(&mz_tile_0, lx + get_idx_ff(c), ly)) / dx;
+                vdsigmaxy_dy += get_fdc(c) * (get_tile(&mz_tile_2, lx, ly + get_idx_if(c)) -
+                                              get_tile(&mz_tile_2, lx, ly + get_idx_ff(c))) / dy;
+                vdsigmaxz_dz += get_fdc(c) * (w_sxz[mz_fd + get_idx_if(c)] - w_sxz[mz_fd + get_idx_ff(c)]) / dz;
+            }
+            update_vx(x, y, z, vdsigmaxx_dx, vdsigmaxy_dy, vdsigmaxz_dz);
+        }
+
+        // Vy
+        if(is_inside(x, y, z, true, true, false)) {
+            var vdsigmaxy_dx: f32 = 0.0;
+            var vdsigmayy_dy: f32 = 0.0;
+            var vdsigmayz_dz: f32 = 0.0;
+            for(var c: i32 = 0; c < sim_int_par.fd_coeff; c++) {
+                vdsigmaxy_dx += get_fdc(c) * (get_tile(&mz_tile_2, lx + get_idx_ih(c), ly) -
+                                              get_tile(&mz_tile_2, lx + get_idx_fh(c), ly)) / dx;
+                vdsigmayy_dy += get_fdc(c) * (get_tile(&mz_tile_1, lx, ly + get_idx_ih(c)) -
+                                              get_tile(&mz_tile_1, lx, ly + get_idx_fh(c))) / dy;
+                vdsigmayz_dz += get_fdc(c) * (w_syz[mz_fd + get_idx_if(c)] - w_syz[mz_fd + get_idx_ff(c)]) / dz;
+            }
+            update_vy(x, y, z, vdsigmaxy_dx, vdsigmayy_dy, vdsigmayz_dz);
+        }
+
+        // Vz
+        if(is_inside(x, y, z, true, false, true)) {
+            var vdsigmaxz_dx: f32 = 0.0;
+            var vdsigmayz_dy: f32 = 0.0;
+            var vdsigmazz_dz: f32 = 0.0;
+            for(var c: i32 = 0; c < sim_int_par.fd_coeff; c++) {
+                vdsigmaxz_dx += get_fdc(c) * (get_tile(&mz_tile_3, lx + get_idx_ih(c), ly) -
+                                              get_tile(&mz_tile_3, lx + get_idx_fh(c), ly)) / dx;
+                vdsigmayz_dy += get_fdc(c) * (get_tile(&mz_tile_4, lx, ly + get_idx_if(c)) -
+                                              get_tile(&mz_tile_4, lx, ly + get_idx_ff(c))) / dy;
+                vdsigmazz_dz += get_fdc(c) * (w_szz[mz_fd + get_idx_ih(c)] - w_szz[mz_fd + get_idx_fh(c)]) / dz;
+            }
+            update_vz(x, y, z, vdsigmaxz_dx, vdsigmayz_dy, vdsigmazz_dz);
+        }
+        v_2_max = max(v_2_max, get_v_2(x, y, z));
+
+        shift_win(&w_szz, 5, x, y, z);
+        shift_win(&w_sxz, 7, x, y, z);
+        shift_win(&w_syz, 8, x, y, z);
     }
+
+    // Velocity norm L2 (the Dirichlet conditions were applied by the updates)
+    reduce_v_max(v_2_max, l_idx);
 }
 
-// Kernel to finish iteration term
+// Kernel to add the sources forces (one thread per source grid point)
 @compute
-@workgroup_size(wsx, wsy, wsz)
-fn finish_it_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
-    let x: i32 = i32(index.x);          // x thread index
-    let y: i32 = i32(index.y);          // y thread index
-    let z: i32 = i32(index.z);          // y thread index
+@workgroup_size(ws_src)
+fn sources_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
+    let s: i32 = i32(index.x);          // source grid point index
+    let dt: f32 = sim_flt_par.dt;
     let it: i32 = sim_int_par.it;
-    let last: i32 = sim_int_par.fd_coeff - 1;
-    let id_x_i: i32 = -get_idx_fh(last);
-    let id_x_f: i32 = sim_int_par.x_sz - get_idx_ih(last);
-    let id_y_i: i32 = -get_idx_fh(last);
-    let id_y_f: i32 = sim_int_par.y_sz - get_idx_ih(last);
-    let id_z_i: i32 = -get_idx_fh(last);
-    let id_z_f: i32 = sim_int_par.z_sz - get_idx_ih(last);
+    if(s >= sim_int_par.n_src_nd) {
+        return;
+    }
 
-    // Apply Dirichlet conditions
-     if(x <= id_x_i || x >= id_x_f || y <= id_y_i || y >= id_y_f || z <= id_z_i || z >= id_z_f) {
-        set_vx(x, y, z, 0.0);
-        set_vy(x, y, z, 0.0);
-        set_vz(x, y, z, 0.0);
+    // Add the source force
+    // Sum the weighted source terms injected at this grid point
+    let node: i32 = get_node_src_pt(get_ptr_src_pt(s));
+    let x: i32 = node / (sim_int_par.y_sz * sim_int_par.z_sz);
+    let y: i32 = (node / sim_int_par.z_sz) % sim_int_par.y_sz;
+    let z: i32 = node % sim_int_par.z_sz;
+
+    // Each slab adds the sources of its own x planes
+    if(!in_slab(x)) {
+        return;
     }
 
-    // Compute velocity norm L2
-    let v_2: f32 = get_vx(x, y, z)*get_vx(x, y, z) + get_vy(x, y, z)*get_vy(x, y, z) + get_vz(x, y, z)*get_vz(x, y, z);
-    set_v_2(x, y, z, v_2);
+    let rho: f32 = 0.5*(get_rho(x, y, z) + get_rho(x, y, z + 1));
+    if(rho > 0.0 && !is_dirichlet(x, y, z)) {
+        var src: f32 = 0.0;
+        for(var n: i32 = get_ptr_src_pt(s); n < get_ptr_src_pt(s + 1); n++) {
+            src += get_weight_src_pt(n) * get_source_term(it, get_col_src_pt(n));
+        }
+        let vz: f32 = get_vz(x, y, z) + src * dt / rho;
+        set_vz(x, y, z, vz);
+    }
 }
 
 // Kernel to store sensors velocity
@@ -1430,20 +1618,72 @@ fn store_sensors_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
     let sensor: i32 = i32(index.x);          // x thread index
     let it: i32 = sim_int_par.it;
 
-    // Store sensors velocities
+    // Sum sensors velocities (weighted by the interpolation weights of the receiver points)
+    var value_vx: f32 = 0.0;
+    var value_vy: f32 = 0.0;
+    var value_vz: f32 = 0.0;
     for(var pt: i32 = get_offset_sensor(sensor); get_idx_sensor(pt) == sensor; pt++) {
-        if(it >= get_delay_rec(sensor)) {
-            let x: i32 = get_idx_x_sensor(pt);
+        // Each slab adds its own points (the decimation filter below is linear)
+        let x: i32 = get_idx_x_sensor(pt);
+        if(it >= get_delay_rec(sensor) && in_slab(x)) {
             let y: i32 = get_idx_y_sensor(pt);
             let z: i32 = get_idx_z_sensor(pt);
-            let value_sens_vx: f32 = get_sens_vx(it, sensor) + get_vx(x, y, z);
-            let value_sens_vy: f32 = get_sens_vy(it, sensor) + get_vy(x, y, z);
-            let value_sens_vz: f32 = get_sens_vz(it, sensor) + get_vz(x, y, z);
-            set_sens_vx(it, sensor, value_sens_vx);
-            set_sens_vy(it, sensor, value_sens_vy);
-            set_sens_vz(it, sensor, value_sens_vz);
+            let w: f32 = get_weight_rec_pt(pt);
+            value_vx += w * get_vx(x, y, z);
+            value_vy += w * get_vy(x, y, z);
+            value_vz += w * get_vz(x, y, z);
         }
     }
+
+    // Anti-aliasing filter and decimation
+    // Sample [it] contributes to decimated samples [m] with tap [m * dec_factor - n_c]
+    let dec_factor: i32 = sim_int_par.dec_factor;
+    let n_c: i32 = it - (sim_int_par.n_dec_taps - 1) / 2;
+    let m_ini: i32 = select((n_c + dec_factor - 1) / dec_factor, 0, n_c <= 0);
+    let m_end: i32 = min(sim_int_par.n_rec_smp - 1, (n_c + sim_int_par.n_dec_taps - 1) / dec_factor);
+    for(var m: i32 = m_ini; m <= m_end; m++) {
+        let h: f32 = get_dec_filter(m * dec_factor - n_c);
+
+        set_sens_vx(m, sensor, get_sens_vx(m, sensor) + h * value_vx);
+        set_sens_vy(m, sensor, get_sens_vy(m, sensor) + h * value_vy);
+        set_sens_vz(m, sensor, get_sens_vz(m, sensor) + h * value_vz);
+    }
+}
+
+// Kernel to extract the preview planes (ROI region, decimated) of the velocity fields
+@compute
+@workgroup_size(wsx, wsy, 1)
+fn preview_kernel(@builtin(global_invocation_id) index: vec3<u32>) {
+    let a: i32 = i32(index.x);          // first plane axis index
+    let b: i32 = i32(index.y);          // second plane axis index
+    let pl: i32 = i32(index.z);         // plane [XY, XZ, YZ]
+    var x: i32 = pv_par.x_pl;
+    var y: i32 = pv_par.y_pl;
+    var z: i32 = pv_par.z_pl;
+
+    switch pl {
+        case 0: {
+            x = pv_par.x_ini + a * pv_par.dec;
+            y = pv_par.y_ini + b * pv_par.dec;
+        }
+        case 1: {
+            x = pv_par.x_ini + a * pv_par.dec;
+            z = pv_par.z_ini + b * pv_par.dec;
+        }
+        default: {
+            y = pv_par.y_ini + a * pv_par.dec;
+            z = pv_par.z_ini + b * pv_par.dec;
+        }
+    }
+
+    // Each slab writes the points of its own x planes
+    if(!in_slab(x)) {
+        return;
+    }
+
+    set_preview(pl, 0, a, b, get_field(0, x, y, z));
+    set_preview(pl, 1, a, b, get_field(1, x, y, z));
+    set_preview(pl, 2, a, b, get_field(2, x, y, z));
 }
 
 // Kernel to increase time iteraction [it]
@@ -168,7 +168,7 @@ IT_DISPLAY = configs["simul_params"]["it_display"]
 
 # Define a posicao das fontes
 NSRC = data_src.shape[0]
-i_src = np.array([simul_roi.get_nearest_grid_idx(p[0:3]) for p in data_src])
+i_src = simul_roi.get_nearest_grid_idx_batch(data_src[:, 0:3])
 ix_src = i_src[:, 0].astype(np.int32)
 
 # Parametros da fonte
@@ -182,7 +182,7 @@ source_term = factor * flt32(gausspulse((t - t0), fc=f0, bw=source_term_cfg["bw"
 
 # Define a localizacao dos receptores
 NREC = data_rec.shape[0]
-i_rec = np.array([simul_roi.get_nearest_grid_idx(p[0:3]) for p in data_rec])
+i_rec = simul_roi.get_nearest_grid_idx_batch(data_rec[:, 0:3])
 ix_rec = i_rec[:, 0].astype(np.int32)
 
 # for evolution of total energy in the medium
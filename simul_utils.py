@@ -1,7 +1,15 @@
+import hashlib
+import os
+import re
+import threading
+from functools import lru_cache
+
 import numpy as np
-from scipy.signal import gausspulse
+from scipy.signal import gausspulse, firwin
 
 HUGEVAL = 1.0e30  # Valor enorme
+MAT_PROPS = ["cp", "cs", "rho"]  # Colunas da tabela de propriedades dos materiais
+FD_IDX_GETTERS = ["get_idx_ih", "get_idx_if", "get_idx_fh", "get_idx_ff"]  # Colunas de idx_fd nos shaders
 
 
 class SimulationROI:
@@ -233,41 +241,121 @@ class SimulationROI:
     def get_pml_thickness_z(self):
         return (self._pml_zmin_len + self._pml_zmax_len) * self.h_step
 
+    def get_key(self):
+        """
+        Função que retorna uma tupla com os parâmetros geométricos da ROI. É utilizada como chave
+        nos *caches* de geometria dos transdutores.
+        """
+        return (tuple(np.asarray(self.coord_ref, dtype=np.float32).flatten().tolist()),
+                float(self.w_step), float(self.d_step), float(self.h_step),
+                self._w_len, self._d_len, self._h_len,
+                self._pml_xmin_len, self._pml_ymin_len, self._pml_zmin_len, self._pad)
+
+    def points_in_roi(self, points):
+        """
+        Função que retorna, para um conjunto de pontos, se cada ponto pertence a ROI.
+
+        :param points: numpy.array
+            Matriz :math:`N` x 3 com as coordenadas cartesianas dos pontos, em mm.
+
+        :return: numpy.array
+        Vetor booleano com :math:`N` posições.
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float32))
+        return ((self.w_points[0] <= points[:, 0]) & (points[:, 0] <= self.w_points[-1]) &
+                (self.d_points[0] <= points[:, 1]) & (points[:, 1] <= self.d_points[-1]) &
+                (self.h_points[0] <= points[:, 2]) & (points[:, 2] <= self.h_points[-1]))
+
     def is_point_in_roi(self, point):
         """
         Função para retornar se o ponto pertence a ROI.
         """
-        if type(point) is not np.ndarray and type(point) is list:
-            point = np.array(point, dtype=np.float32)
-        elif type(point) is np.array:
-            point = point.astype(np.float32)
+        return bool(self.points_in_roi(point)[0])
 
-        if (not (self.w_points[0] <= point[0] <= self.w_points[-1]) or
-                not (self.d_points[0] <= point[1] <= self.d_points[-1]) or
-                not (self.h_points[0] <= point[2] <= self.h_points[-1])):
-            return False
-        else:
-            return True
+    @staticmethod
+    def _nearest_axis(coord, points, step, dec):
+        """
+        Função que retorna, para um eixo da ROI, o índice do ponto da grade mais próximo de cada
+        coordenada. Como a grade é uniforme, o índice é obtido diretamente pelo passo. Os empates
+        são resolvidos para o ponto de menor índice.
+        """
+        pos = (np.round(coord - step / 10.0 ** (dec - 1), decimals=dec) - points[0]) / step
+        return np.clip(np.ceil(pos - 0.5), 0, points.shape[0] - 1).astype(np.int32)
+
+    def get_nearest_grid_idx_batch(self, points):
+        """
+        Função para retornar os índices mais próximos da grade para um conjunto de pontos da ROI.
+
+        :param points: numpy.array
+            Matriz :math:`N` x 3 com as coordenadas cartesianas dos pontos, em mm.
+
+        :return: numpy.array
+        Matriz :math:`N` x 3 com os índices dos pontos na grade de simulação.
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float32))
+        in_roi = self.points_in_roi(points)
+        if not np.all(in_roi):
+            point = points[np.argmin(in_roi)]
+            raise IndexError(f"[{point[0]}, {point[1]}, {point[2]}] out of bounds")
+
+        return np.column_stack((self._nearest_axis(points[:, 0], self.w_points, self.w_step, self.dec_w) +
+                                self.get_ix_min(),
+                                self._nearest_axis(points[:, 1], self.d_points, self.d_step, self.dec_d) +
+                                self.get_iy_min(),
+                                self._nearest_axis(points[:, 2], self.h_points, self.h_step, self.dec_h) +
+                                self.get_iz_min())).astype(np.int32)
 
     def get_nearest_grid_idx(self, point):
         """
         Função para retornar os índices mais próximos da grade para o ponto da ROI fornecido.
         """
-        if type(point) is not np.ndarray and type(point) is list:
-            point = np.array(point, dtype=np.float32)
-        elif type(point) is np.array:
-            point = point.astype(np.float32)
+        return self.get_nearest_grid_idx_batch(point)[0].tolist()
+
+    @staticmethod
+    def _interp_axis(coord, points, step, offset, interp="linear"):
+        """
+        Função que retorna, para um eixo da ROI, os índices dos dois pontos vizinhos da grade e os pesos
+        de interpolação linear de cada coordenada. Se o eixo tiver um único ponto ou ``interp`` for
+        ``nearest``, o segundo peso é nulo.
+        """
+        pos = (coord - points[0]) / step
+        if interp == "nearest" or points.shape[0] == 1:
+            i0 = np.clip(np.ceil(pos - 0.5), 0, points.shape[0] - 1).astype(np.int32)
+            frac = np.zeros_like(pos)
+        else:
+            i0 = np.clip(np.floor(pos), 0, points.shape[0] - 2).astype(np.int32)
+            frac = np.clip(pos - i0, 0.0, 1.0)
+
+        return np.stack((i0, i0 + 1), axis=1) + offset, np.stack((1.0 - frac, frac), axis=1)
+
+    def get_interp_weights(self, points, interp="linear"):
+        """
+        Função que retorna os índices dos pontos da grade e os pesos de interpolação (trilinear) para
+        um conjunto de pontos arbitrários da ROI, que não precisam coincidir com os pontos da grade.
+
+        :param points: numpy.array
+            Matriz :math:`N` x 3 com as coordenadas cartesianas dos pontos, em mm.
+        :param interp: str
+            Tipo de interpolação: ``linear`` ou ``nearest`` (ponto mais próximo da grade).
 
-        if not self.is_point_in_roi(point):
+        :return: tuple
+        Tupla com a matriz :math:`N` x 8 x 3 dos índices dos pontos vizinhos na grade e a matriz
+        :math:`N` x 8 dos pesos correspondentes.
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float32))
+        in_roi = self.points_in_roi(points)
+        if not np.all(in_roi):
+            point = points[np.argmin(in_roi)]
             raise IndexError(f"[{point[0]}, {point[1]}, {point[2]}] out of bounds")
 
-        ix = np.absolute(self.w_points - np.round(point[0] - self.w_step / 10.0 ** (self.dec_w - 1),
-                                                  decimals=self.dec_w)).argmin() + self._pml_xmin_len + self._pad
-        iy = np.absolute(self.d_points - np.round(point[1] - self.d_step / 10.0 ** (self.dec_d - 1),
-                                                  decimals=self.dec_d)).argmin() + self._pml_ymin_len + self._pad
-        iz = np.absolute(self.h_points - np.round(point[2] - self.h_step / 10.0 ** (self.dec_h - 1),
-                                                  decimals=self.dec_h)).argmin() + self._pml_zmin_len + self._pad
-        return [ix, iy, iz]
+        ix, wx = self._interp_axis(points[:, 0], self.w_points, self.w_step, self.get_ix_min(), interp)
+        iy, wy = self._interp_axis(points[:, 1], self.d_points, self.d_step, self.get_iy_min(), interp)
+        iz, wz = self._interp_axis(points[:, 2], self.h_points, self.h_step, self.get_iz_min(), interp)
+        corners = [(a, b, c) for a in range(2) for b in range(2) for c in range(2)]
+        idx = np.stack([np.column_stack((ix[:, a], iy[:, b], iz[:, c])) for a, b, c in corners], axis=1)
+        w = np.column_stack([wx[:, a] * wy[:, b] * wz[:, c] for a, b, c in corners]).astype(np.float32)
+
+        return idx.astype(np.int32), w
 
     def calc_pml_array(self, axis='x', grid='f', dt=1.0, d0=1.0, npower=2.0, alpha_max=30.0, k_max=1.0):
         """
@@ -393,15 +481,39 @@ class ElementRect:
         # Tipo do pulso de excitacao. O unico tipo possivel e: ``gaussian``.
         self.pulse_type = pulse_type
 
+    def get_element_exc_window(self, dt=1.0, t_ini=0.0, out='r'):
+        """
+        Função que retorna o sinal de excitação do elemento apenas no seu suporte compacto (janela em que o
+        pulso não é nulo), e o índice da amostra de tempo em que a janela começa. O pulso é calculado uma única
+        vez para cada combinação de frequência, banda e atraso fracionário, e reaproveitado por deslocamento.
+
+        :param dt: float
+            Passo de tempo da simulação, em us.
+        :param t_ini: float
+            Instante da primeira amostra de tempo, em us.
+        :param out: str
+            ``e`` para a envoltória do pulso. Qualquer outro valor retorna o pulso.
+
+        :return: tuple
+        Tupla com o índice da primeira amostra da janela (pode ser negativo) e o vetor com o sinal na janela.
+        """
+        n_t0 = (np.float64(self.t0) - np.float64(t_ini)) / np.float64(dt)
+        n0 = int(np.floor(n_t0))
+        k_ini, win = _get_exc_window(float(self.freq), float(self.bw), float(dt), round(float(n_t0 - n0), 6),
+                                     out == 'e')
+
+        return n0 + k_ini, (self.gain * win).astype(np.float32)
+
     def get_element_exc_fn(self, t, out='r'):
         dt = t[1] - t[0]
-        gp, _, egp = gausspulse((t - self.t0), fc=self.freq, bw=self.bw, retquad=True, retenv=True)
-        if out == 'e':
-            ss = egp
-        else:
-            ss = gp
+        n_ini, win = self.get_element_exc_window(dt=dt, t_ini=t[0], out=out)
+        ss = np.zeros(t.shape[0], dtype=np.float32)
+        a = max(n_ini, 0)
+        b = min(n_ini + win.shape[0], t.shape[0])
+        if b > a:
+            ss[a:b] = win[a - n_ini:b - n_ini]
 
-        return np.diff(self.gain * np.float32(ss) / dt, append=0.0).astype(np.float32)
+        return ss
 
     def get_num_points_roi(self, sim_roi=SimulationROI(), simul_type="2D"):
         """
@@ -436,37 +548,61 @@ class ElementRect:
                 Cada linha dessa matriz e o indice 3D de um ponto na ROI.
 
         """
-        if type(dir) is str:
-            if (dir.lower() == "e" and not self.tx_en) or (dir.lower() == "r" and not self.rx_en):
-                return list()
-        else:
-            raise ValueError("'dir' must be a string")
+        coords = self.get_coords_roi(sim_roi=sim_roi, probe_center=probe_center, simul_type=simul_type, dir=dir)
+        if coords.shape[0] == 0:
+            return np.zeros((0, 3), dtype=np.int32)
+
+        return sim_roi.get_nearest_grid_idx_batch(coords)
+
+    def get_aperture_offsets(self, sim_roi=SimulationROI(), simul_type="2D"):
+        """
+        Função que retorna as coordenadas cartesianas dos pontos ativos do elemento relativas ao seu
+        centro. Os pontos são espaçados com os passos da grade e centrados no elemento.
+
+        Returns
+        -------
+            : :class:`np.ndarray`
+                Matriz :math:`M` x 3 com as coordenadas relativas, em mm, dos pontos ativos do elemento.
 
+        """
+        simul_type = simul_type.lower()
         dim_p = min(self.elem_dim_p, sim_roi.depth)
-        num_pt_a = int(np.round(self.elem_dim_a / sim_roi.w_step, decimals=sim_roi.dec_w) + 0.5)
-        num_pt_p = int(np.round(dim_p / sim_roi.d_step, decimals=sim_roi.dec_d) + 0.5) if dim_p != 0.0 else 1
-        num_coord = num_pt_a
-        if simul_type.lower() == "3d":
-            num_coord *= num_pt_p
+        num_pt_a = max(int(np.round(self.elem_dim_a / sim_roi.w_step, decimals=sim_roi.dec_w) + 0.5), 1)
+        num_pt_p = max(int(np.round(dim_p / sim_roi.d_step, decimals=sim_roi.dec_d) + 0.5), 1) \
+            if dim_p != 0.0 and simul_type == "3d" else 1
 
-        # Calcula a coordenada do primeiro ponto
-        x_coord = np.float32(self.coord_center[0] - ((self.elem_dim_a - sim_roi.w_step) / 2.0 if num_pt_a // 2 else
-                                                     (self.elem_dim_a / 2.0)))
-        y_coord = np.float32(0.0 if simul_type == "2d" else
-                             (self.coord_center[1] - ((dim_p - sim_roi.d_step) / 2.0) if num_pt_p // 2 else
-                              (dim_p / 2.0)))
-        z_coord = self.coord_center[2]
+        x_coord = (np.arange(num_pt_a, dtype=np.float32) - (num_pt_a - 1) / 2.0) * sim_roi.w_step
+        y_coord = (np.arange(num_pt_p, dtype=np.float32) - (num_pt_p - 1) / 2.0) * sim_roi.d_step
+        offsets = np.zeros((num_pt_a * num_pt_p, 3), dtype=np.float32)
+        offsets[:, 0] = np.tile(x_coord, num_pt_p)
+        offsets[:, 1] = np.repeat(y_coord, num_pt_a)
 
-        # Pega os indices na ROI da coordenada do primeiro ponto
-        point_coord = np.array([x_coord, y_coord, z_coord], np.float32) + probe_center.astype(np.float32)
-        point_0 = sim_roi.get_nearest_grid_idx(point_coord)
+        return offsets
+
+    def get_coords_roi(self, sim_roi=SimulationROI(), probe_center=np.zeros((1, 3)), simul_type="2D", dir="e"):
+        """
+        Função que retorna as coordenadas cartesianas de todos os pontos ativos do elemento, sem
+        aproximá-las para os pontos da grade de simulação. Os pontos são espaçados com os passos
+        da grade e centrados no elemento.
+
+        Returns
+        -------
+            : :class:`np.ndarray`
+                Matriz :math:`M` x 3 com as coordenadas, em mm, dos pontos ativos do elemento.
+
+        """
+        if type(dir) is str:
+            if (dir.lower() == "e" and not self.tx_en) or (dir.lower() == "r" and not self.rx_en):
+                return np.zeros((0, 3), dtype=np.float32)
+        else:
+            raise ValueError("'dir' must be a string")
 
-        # Monta lista de pontos
-        list_out = [ [point_0[0] + (p % num_pt_a),
-                      point_0[1] + 0 if simul_type == "2d" else ((p // num_pt_a) % num_pt_p),
-                      point_0[2]] for p in range(num_coord)]
+        coords = self.get_aperture_offsets(sim_roi=sim_roi, simul_type=simul_type)
+        coords += (self.coord_center.astype(np.float32) + probe_center.astype(np.float32)).reshape((1, 3))
+        if simul_type.lower() == "2d":
+            coords[:, 1] = sim_roi.d_points[0]
 
-        return list_out
+        return coords
 
 
 class SimulationProbeLinearArray(SimulationProbe):
@@ -503,6 +639,14 @@ class SimulationProbeLinearArray(SimulationProbe):
             ``cossquare``, ``hanning`` e ``hamming``. Por padrão, é
             ``gaussian``.
 
+        t_rec_start : int, float
+            Instante inicial da janela de recepção dos sinais, em us. Por padrão, é
+            o menor atraso de recepção (``t0_reception``) dos elementos receptores.
+
+        t_rec_end : int, float
+            Instante final da janela de recepção dos sinais, em us. Por padrão, é
+            ``None`` (até o fim da simulação).
+
     Attributes
     ----------
         num_elem : int
@@ -524,7 +668,8 @@ class SimulationProbeLinearArray(SimulationProbe):
 
     def __init__(self, coord_center=np.zeros((1, 3)), num_elem=32, dim_a=0.5, dim_p=10.0, inter_elem=0.1,
                  freq=5., bw=0.5, gain=1.0, pulse_type="gaussian", id="",
-                 emmiters="all", receivers="all", t0_emission=None, t0_reception=None):
+                 emmiters="all", receivers="all", t0_emission=None, t0_reception=None,
+                 t_rec_start=None, t_rec_end=None):
         # Chama o construtor da classe base.
         super().__init__(coord_center)
 
@@ -595,6 +740,13 @@ class SimulationProbeLinearArray(SimulationProbe):
         else:
             raise ValueError("t0_reception must be either a float [numpy.float32] or a list of floats.")
 
+        # Janela de tempo de recepcao dos sinais
+        if t_rec_start is None:
+            t0_rx = [self.t0_reception[i] for i in range(num_elem) if self.receivers[i]]
+            t_rec_start = min(t0_rx) if len(t0_rx) else 0.0
+        self.t_rec_start = np.float32(t_rec_start)
+        self.t_rec_end = np.float32(t_rec_end) if t_rec_end is not None else None
+
         # Espacamento entre os centros dos elementos.
         self.pitch = np.float32(dim_a + inter_elem)
 
@@ -614,6 +766,9 @@ class SimulationProbeLinearArray(SimulationProbe):
         self._dim_a = dim_a
         self._dim_p = dim_p
 
+        # Cache dos pontos do transdutor na grade de simulacao, indexado pelos parametros da ROI
+        self._geom_cache = dict()
+
         # Parametros eletricos gerais do transdutor
         self._freq = freq
         self._bw = bw
@@ -677,31 +832,139 @@ class SimulationProbeLinearArray(SimulationProbe):
         else:
             return self._freq
 
+    def _get_geom_key(self, sim_roi, simul_type, dir, *args):
+        """
+        Função que retorna a chave do *cache* de geometria do transdutor.
+        """
+        if type(dir) is not str:
+            raise ValueError("'dir' must be a string")
+
+        elem_en = tuple((e.tx_en, e.rx_en) for e in self.elem_list)
+        return (sim_roi.get_key(), simul_type.lower(), dir.lower(),
+                tuple(np.asarray(self.coord_center, dtype=np.float32).flatten().tolist()), elem_en, *args)
+
+    def get_coords_roi(self, sim_roi=SimulationROI(), simul_type="2D", dir="e"):
+        """
+        Função que retorna as coordenadas cartesianas dos pontos ativos de todos os elementos do transdutor,
+        calculadas de uma única vez. Os elementos com algum ponto fora da ROI são descartados.
+
+        Returns
+        -------
+            : tuple
+                Tupla com a matriz :math:`M` x 3 das coordenadas, em mm, dos pontos ativos e o vetor
+                com os :math:`M` índices dos elementos de cada ponto.
+
+        """
+        en = np.array([e.tx_en if dir.lower() == "e" else e.rx_en for e in self.elem_list], dtype=bool)
+        if not np.any(en):
+            return np.zeros((0, 3), dtype=np.float32), np.zeros(0, dtype=np.int32)
+
+        # Todos os elementos do array linear tem a mesma abertura
+        offsets = self.elem_list[0].get_aperture_offsets(sim_roi=sim_roi, simul_type=simul_type)
+        idx_elem = np.flatnonzero(en).astype(np.int32)
+        centers = (np.stack([self.elem_list[i].coord_center for i in idx_elem]).astype(np.float32) +
+                   np.asarray(self.coord_center, dtype=np.float32).reshape((1, 3)))
+        coords = (centers[:, np.newaxis, :] + offsets[np.newaxis, :, :]).reshape((-1, 3))
+        if simul_type.lower() == "2d":
+            coords[:, 1] = sim_roi.d_points[0]
+
+        in_roi = sim_roi.points_in_roi(coords).reshape((idx_elem.shape[0], offsets.shape[0])).all(axis=1)
+        coords = coords.reshape((idx_elem.shape[0], offsets.shape[0], 3))[in_roi].reshape((-1, 3))
+
+        return coords, np.repeat(idx_elem[in_roi], offsets.shape[0])
+
     def get_points_roi(self, sim_roi=SimulationROI(), simul_type="2D", dir="e"):
         """
         Função que retorna as coordenadas de todos os pontos ativos do transdutor no grid de simulação,
-        no formato vetorizado.
+        no formato vetorizado. O resultado é guardado em *cache* para a ROI fornecida.
 
         Returns
         -------
-            : list
-                Lista com :math:`M` pontos ativos (fontes) do transdutor como índices de pontos na ROI.
-                Cada elemento dessa lista é a coordenada cartesiana (como índice) de um ponto na ROI.
+            : tuple
+                Tupla com a matriz :math:`M` x 3 dos pontos ativos (fontes) do transdutor como índices
+                de pontos na ROI e o vetor com os :math:`M` índices dos elementos de cada ponto.
+
+        """
+        key = self._get_geom_key(sim_roi, simul_type, dir, "points")
+        if key not in self._geom_cache:
+            coords, idx_elem = self.get_coords_roi(sim_roi=sim_roi, simul_type=simul_type, dir=dir)
+            idx = sim_roi.get_nearest_grid_idx_batch(coords) if coords.shape[0] else np.zeros((0, 3), np.int32)
+            self._geom_cache[key] = (idx, idx_elem)
+
+        idx, idx_elem = self._geom_cache[key]
+        return idx.copy(), idx_elem.copy()
 
+    def get_interp_operator(self, sim_roi=SimulationROI(), simul_type="2D", dir="e", interp="linear"):
+        """
+        Função que retorna o operador esparso de interpolação (receptores) ou injeção (fontes) do
+        transdutor, no formato de coordenadas (COO). Cada entrada relaciona um ponto da grade de simulação
+        a uma coluna (elemento) com um peso. O resultado é guardado em *cache* para a ROI fornecida.
+
+        :param sim_roi: SimulationROI
+            ROI da simulação.
+        :param simul_type: str
+            Tipo da simulação (``2D`` ou ``3D``).
+        :param dir: str
+            ``e`` para os emissores e ``r`` para os receptores.
+        :param interp: str
+            Tipo de interpolação: ``linear`` ou ``nearest``.
+
+        :return: tuple
+        Tupla com a matriz :math:`K` x 3 dos índices dos pontos da grade, o vetor com os :math:`K` índices
+        das colunas e o vetor com os :math:`K` pesos. Para os emissores a coluna é o índice do elemento no
+        transdutor, e para os receptores é a ordem do elemento entre os elementos receptores.
         """
-        arr_out = list()
-        idx_src = list()
+        key = self._get_geom_key(sim_roi, simul_type, dir, "interp", interp)
+        if key not in self._geom_cache:
+            coords, idx_elem = self.get_coords_roi(sim_roi=sim_roi, simul_type=simul_type, dir=dir)
+            if coords.shape[0] == 0:
+                self._geom_cache[key] = (np.zeros((0, 3), dtype=np.int32), np.zeros(0, dtype=np.int32),
+                                         np.zeros(0, dtype=np.float32))
+            else:
+                if dir.lower() == "e":
+                    col = idx_elem
+                else:
+                    col = (np.cumsum([e.rx_en for e in self.elem_list]) - 1).astype(np.int32)[idx_elem]
+
+                # Pontos da grade repetidos para a mesma coluna tem seus pesos somados
+                idx, w = sim_roi.get_interp_weights(coords, interp=interp)
+                n_corner = w.shape[1]
+                entries = np.column_stack((idx.reshape((-1, 3)), np.repeat(col, n_corner)))
+                w = w.flatten()
+                nz = w > 1.0e-6
+                entries, inv = np.unique(entries[nz], axis=0, return_inverse=True)
+                w = np.bincount(inv.flatten(), weights=w[nz]).astype(np.float32)
+                self._geom_cache[key] = (entries[:, :3].astype(np.int32), entries[:, 3].astype(np.int32), w)
+
+        idx, col, w = self._geom_cache[key]
+        return idx.copy(), col.copy(), w.copy()
+
+    def get_source_windows(self, dt=1.0, out='r'):
+        """
+        Função que retorna os sinais dos termos de fonte do transdutor armazenando apenas a janela não nula
+        (suporte compacto do pulso) de cada elemento.
+
+        :param dt: float
+            Valor do passo de tempo na simulação.
+        :param out: str
+            ``e`` para a envoltória do pulso.
+
+        :return: tuple
+        Tupla com o vetor dos índices da primeira amostra da janela de cada elemento e a matriz com
+        M elementos do transdutor (linhas) por W amostras da janela (colunas). Os elementos que não
+        são emissores têm janela nula.
+        """
+        n_ini = np.zeros(self.num_elem, dtype=np.int32)
+        win = [np.zeros(0, dtype=np.float32)] * self.num_elem
         for idx_st, e in enumerate(self.elem_list):
-            try:
-                arr_elem = e.get_points_roi(sim_roi=sim_roi, probe_center=self.coord_center,
-                                            simul_type=simul_type, dir=dir)
-                arr_out += arr_elem
-                if len(arr_elem):
-                    idx_src += [idx_st for _ in range(len(arr_elem))]
-            except IndexError:
-                pass
+            if e.tx_en:
+                n_ini[idx_st], win[idx_st] = e.get_element_exc_window(dt=dt, out=out)
 
-        return arr_out, idx_src
+        windows = np.zeros((self.num_elem, max(w.shape[0] for w in win)), dtype=np.float32)
+        for idx_st, w in enumerate(win):
+            windows[idx_st, :w.shape[0]] = w
+
+        return n_ini, windows
 
     def get_source_term(self, samples=1000, dt=1.0, out='r'):
         """
@@ -718,11 +981,12 @@ class SimulationProbeLinearArray(SimulationProbe):
         :return: :numpy.array
         Array contém dimensões de N amostras de tempo (linhas) por M elementos do transdutor (colunas).
         """
-        t = np.arange(samples, dtype=np.float32) * dt
         source_term = np.zeros((samples, self.num_elem), dtype=np.float32)
-        for idx_st, e in enumerate(self.elem_list):
-            if e.tx_en:
-                source_term[:, idx_st] = e.get_element_exc_fn(t, out)
+        n_ini, windows = self.get_source_windows(dt=dt, out=out)
+        rows = n_ini[:, np.newaxis] + np.arange(windows.shape[1])[np.newaxis, :]
+        cols = np.broadcast_to(np.arange(self.num_elem)[:, np.newaxis], rows.shape)
+        valid = (rows >= 0) & (rows < samples)
+        source_term[rows[valid], cols[valid]] = windows[valid]
 
         return source_term
 
@@ -732,21 +996,10 @@ class SimulationProbeLinearArray(SimulationProbe):
         :param simul_type:
         :param sim_roi:
 
-        :return: list
-        Lista com o índice do elemento receptor de cada ponto receptor na ROI.
+        :return: numpy.array
+        Vetor com o índice do elemento receptor de cada ponto receptor na ROI.
         """
-        idx_rec = list()
-        # idx_count = 0
-        for idx_st, e in enumerate(self.elem_list):
-            try:
-                arr_elem = e.get_points_roi(sim_roi=sim_roi, probe_center=self.coord_center,
-                                            simul_type=simul_type, dir='r')
-                if len(arr_elem):
-                    idx_rec += [idx_st for _ in range(len(arr_elem))]
-            except IndexError:
-                pass
-
-        return idx_rec
+        return self.get_points_roi(sim_roi=sim_roi, simul_type=simul_type, dir='r')[1]
 
     def get_delay_rx(self):
         """
@@ -763,6 +1016,16 @@ class SimulationProbeLinearArray(SimulationProbe):
 
         return t0_recp
 
+    def get_rec_window(self):
+        """
+        Função que retorna a janela de tempo de recepção dos sinais do transdutor.
+
+        :return: tuple
+        Tupla com os instantes inicial e final, em microssegundos, da janela de recepção. O instante final
+        é ``None`` se a janela se estende até o fim da simulação.
+        """
+        return self.t_rec_start, self.t_rec_end
+
     def set_t0(self, t0_emission=None):
         """
         Função que modifica os valores do atraso na emissão de todos os canais.
@@ -787,3 +1050,1067 @@ class SimulationProbeLinearArray(SimulationProbe):
 
         for idx_e, e in enumerate(self.elem_list):
             e.t0 = self.t0_emission[idx_e]
+
+
+@lru_cache(maxsize=1024)
+def _get_exc_window(freq, bw, dt, frac, env=False, tpr=-100.0):
+    """
+    Função que calcula o pulso gaussiano (ou sua envoltória) derivado no tempo, apenas no seu suporte
+    compacto. O resultado é guardado em *cache* e é reutilizado por todos os elementos e leis focais
+    com os mesmos parâmetros.
+
+    :param freq: float
+        Frequência central do pulso, em MHz.
+    :param bw: float
+        Banda passante fracionária do pulso.
+    :param dt: float
+        Passo de tempo, em us.
+    :param frac: float
+        Atraso fracionário do centro do pulso, em amostras (entre 0 e 1).
+    :param env: bool
+        Se ``True`` retorna a envoltória do pulso.
+    :param tpr: float
+        Nível, em dB, abaixo do qual o pulso é considerado nulo.
+
+    :return: tuple
+    Tupla com o índice da primeira amostra da janela relativo à amostra do centro do pulso e o vetor
+    com o sinal na janela.
+    """
+    k_half = int(np.ceil(gausspulse('cutoff', fc=freq, bw=bw, tpr=tpr) / dt)) + 1
+    k = np.arange(-k_half, k_half + 2, dtype=np.float64)
+    gp, _, egp = gausspulse((k - frac) * dt, fc=freq, bw=bw, retquad=True, retenv=True)
+    ss = egp if env else gp
+    win = np.diff(np.float32(ss) / dt, append=0.0).astype(np.float32)
+    win.setflags(write=False)
+
+    return -k_half, win
+
+
+def get_decimation_filter(factor=1, taps_per_phase=8):
+    """
+    Função que retorna os coeficientes do filtro FIR passa-baixas (*anti-aliasing*) utilizado na
+    decimação dos sinais dos receptores. O filtro tem fase linear e número ímpar de coeficientes,
+    de modo que o seu atraso de grupo é um número inteiro de amostras.
+
+    :param factor: int
+        Fator de decimação. Para ``factor <= 1`` o filtro é o impulso unitário (sem decimação).
+    :param taps_per_phase: int
+        Número de coeficientes por fase do filtro polifásico.
+
+    :return: numpy.array
+    Array com os coeficientes do filtro, com ganho unitário em DC.
+    """
+    factor = int(factor)
+    if factor <= 1:
+        return np.ones(1, dtype=np.float32)
+
+    return firwin(taps_per_phase * factor + 1, 1.0 / factor).astype(np.float32)
+
+
+def get_decimated_idx(n, factor=1, n_taps=1, n_out=1):
+    """
+    Função que retorna os índices das amostras decimadas que recebem contribuição da amostra ``n``
+    do sinal original, e os índices dos coeficientes do filtro correspondentes. A amostra decimada
+    ``m`` corresponde ao instante ``m * factor`` do sinal original (filtro centrado).
+
+    :param n: int
+        Índice da amostra do sinal original.
+    :param factor: int
+        Fator de decimação.
+    :param n_taps: int
+        Número de coeficientes do filtro de decimação.
+    :param n_out: int
+        Número de amostras do sinal decimado.
+
+    :return: tuple
+    Tupla com os arrays de índices das amostras decimadas e dos coeficientes do filtro.
+    """
+    n_c = n - (n_taps - 1) // 2
+    m_ini = max(0, -(-n_c // factor))
+    m_end = min(n_out - 1, (n_c + n_taps - 1) // factor)
+    m = np.arange(m_ini, m_end + 1)
+
+    return m, m * factor - n_c
+
+
+def _get_lame_sig_norm(rho_0, rho_1, cp_0, cp_1, cs_0, cs_1):
+    """
+    Função que retorna ``lambda`` e ``lambda + 2mu`` no ponto médio entre dois pontos do grid de ``vx``
+    (grid das tensões normais). O ``mu`` é nulo se qualquer um dos pontos for fluido (``cs = 0``).
+    """
+    rho_h = 0.5 * (rho_0 + rho_1)
+    cp_h = 0.5 * (cp_0 + cp_1)
+    cs_h_l = 0.5 * (cs_0 + cs_1)
+    cs_h_m = np.where(np.minimum(cs_0, cs_1) == 0.0, 0.0, cs_h_l)
+    lambda_sig = rho_h * (cp_h * cp_h - 2.0 * cs_h_l * cs_h_l)
+
+    return lambda_sig, lambda_sig + 2.0 * rho_h * (cs_h_m * cs_h_m)
+
+
+def _get_mu_sig_xy(rho_0, rho_1, cs_0, cs_1):
+    """
+    Função que retorna ``mu`` no ponto médio entre dois pontos do grid de ``vx`` (grid da tensão de
+    cisalhamento). O ``mu`` é nulo se qualquer um dos pontos for fluido (``cs = 0``).
+    """
+    cs_h = np.where(np.minimum(cs_0, cs_1) == 0.0, 0.0, 0.5 * (cs_0 + cs_1))
+
+    return 0.5 * (rho_0 + rho_1) * (cs_h * cs_h)
+
+
+def get_staggered_coeffs_2d(rho, cp, cs):
+    """
+    Função que calcula, uma única vez, os coeficientes do material nos grids intercalados (*staggered*)
+    da simulação elástica 2D, a partir dos mapas de densidade e velocidades definidos no grid de ``vx``.
+    Os pontos fora do domínio são considerados nulos, da mesma forma que nos *shaders*.
+
+    :param rho: numpy.array
+        Mapa de densidade, com dimensões ``(nx, ny)``.
+    :param cp: numpy.array
+        Mapa de velocidade da onda longitudinal, com dimensões ``(nx, ny)``.
+    :param cs: numpy.array
+        Mapa de velocidade da onda transversal, com dimensões ``(nx, ny)``.
+
+    :return: tuple
+    Tupla com os arrays ``lambda`` e ``lambda + 2mu`` no grid das tensões normais, ``mu`` no grid da
+    tensão de cisalhamento e ``1/rho`` nos grids de ``vx`` e ``vy``. Nos pontos com densidade nula,
+    ``1/rho`` vale zero.
+    """
+    rho = np.asarray(rho, dtype=np.float32)
+    cp = np.asarray(cp, dtype=np.float32)
+    cs = np.asarray(cs, dtype=np.float32)
+    rho_p = np.pad(rho, ((0, 1), (0, 1)))
+    cp_p = np.pad(cp, ((0, 1), (0, 1)))
+    cs_p = np.pad(cs, ((0, 1), (0, 1)))
+
+    # Grid das tensoes normais (media em x)
+    lambda_sig, lambdaplus2mu_sig = _get_lame_sig_norm(rho, rho_p[1:, :-1], cp, cp_p[1:, :-1], cs, cs_p[1:, :-1])
+
+    # Grid da tensao de cisalhamento (media em y)
+    mu_sigxy = _get_mu_sig_xy(rho, rho_p[:-1, 1:], cs, cs_p[:-1, 1:])
+
+    # Inverso da densidade nos grids das velocidades
+    inv_rho_vx = np.divide(1.0, rho, out=np.zeros_like(rho), where=rho > 0.0)
+    rho_vy = 0.25 * (rho + rho_p[1:, :-1] + rho_p[1:, 1:] + rho_p[:-1, 1:])
+    inv_rho_vy = np.divide(1.0, rho_vy, out=np.zeros_like(rho_vy), where=rho_vy > 0.0)
+
+    return tuple(np.ascontiguousarray(c, dtype=np.float32) for c in (lambda_sig, lambdaplus2mu_sig, mu_sigxy,
+                                                                     inv_rho_vx, inv_rho_vy))
+
+
+def load_map(path, crop=None):
+    """
+    Função que abre um mapa (densidade, velocidades, materiais ou atenuação) salvo em um arquivo ``.npy``,
+    mapeado em memória (``mmap_mode='r'``). Nenhum dado é lido ou copiado até o mapa ser posicionado no grid.
+
+    :param path: str
+        Caminho do arquivo ``.npy``.
+    :param crop: list
+        Lista com os índices ``[inicio, fim]`` do recorte em cada dimensão do mapa. Por padrão, o mapa inteiro.
+
+    :return: numpy.memmap
+    Visão (sem cópia) do mapa recortado.
+    """
+    map_data = np.load(path, mmap_mode='r')
+    if crop is not None:
+        if len(crop) != map_data.ndim:
+            raise ValueError(f'crop deve ter {map_data.ndim} intervalos [inicio, fim] para o mapa {path}')
+        map_data = map_data[tuple(slice(*c) for c in crop)]
+
+    return map_data
+
+
+def get_map_grid(map_data, shape, fill, offset=None, roi_ini=None, dtype=np.float32):
+    """
+    Função que posiciona um mapa no grid da simulação. O grid é alocado uma única vez, preenchido com ``fill``,
+    e apenas a região do mapa que cai dentro do grid é copiada (convertida para ``dtype`` na cópia).
+
+    :param map_data: numpy.array
+        Mapa, normalmente retornado por ``load_map``. Se ``None``, o grid é homogêneo.
+    :param shape: tuple
+        Dimensões do grid.
+    :param fill: float
+        Valor dos pontos do grid fora do mapa.
+    :param offset: list
+        Índices, no grid, do primeiro ponto do mapa. Podem ser negativos (o mapa é recortado). Se ``None``,
+        um mapa menor que o grid em todas as dimensões é posicionado em ``roi_ini``, e um mapa maior ou
+        igual é recortado a partir da origem do grid.
+    :param roi_ini: list
+        Índices, no grid, do primeiro ponto da ROI.
+    :param dtype: numpy.dtype
+        Tipo dos elementos do grid.
+
+    :return: numpy.array
+    Grid com o mapa posicionado.
+    """
+    grid = np.full(shape, fill, dtype=dtype)
+    if map_data is None:
+        return grid
+
+    if map_data.ndim != len(shape):
+        raise ValueError(f'Mapa com {map_data.ndim} dimensoes e incompativel com o grid {shape}')
+
+    if offset is None:
+        if all(m < n for m, n in zip(map_data.shape, shape)):
+            offset = roi_ini if roi_ini is not None else [0] * len(shape)
+        elif all(m >= n for m, n in zip(map_data.shape, shape)):
+            offset = [0] * len(shape)
+        else:
+            raise ValueError(f'Mapa com shape {map_data.shape} e incompativel com a ROI')
+
+    dst = tuple(slice(max(o, 0), min(o + m, n)) for o, m, n in zip(offset, map_data.shape, shape))
+    src = tuple(slice(d.start - o, d.stop - o) for d, o in zip(dst, offset))
+    if any(d.stop <= d.start for d in dst):
+        raise ValueError(f'Mapa com shape {map_data.shape} e offset {list(offset)} fica fora do grid {shape}')
+
+    grid[dst] = map_data[src]
+
+    return grid
+
+
+def get_material_table(materials):
+    """
+    Função que monta a tabela de propriedades dos materiais de um mapa de materiais (rótulos).
+    O rótulo de cada material no mapa é a sua posição na lista.
+
+    :param materials: list
+        Lista de dicionários com as chaves ``cp`` e ``cs`` (em mm/us) e ``rho`` de cada material.
+
+    :return: numpy.array
+    Tabela com dimensões ``(n_mat, 3)``, com as colunas na ordem de ``MAT_PROPS``.
+    """
+    return np.array([[m[k] for k in MAT_PROPS] for m in materials], dtype=np.float32).reshape(-1, len(MAT_PROPS))
+
+
+def get_material_maps(mat_grid, mat_table):
+    """
+    Função que expande um mapa de materiais nos mapas densos de propriedades.
+
+    :param mat_grid: numpy.array
+        Mapa com o rótulo do material de cada ponto do grid.
+    :param mat_table: numpy.array
+        Tabela de propriedades dos materiais, retornada por ``get_material_table``.
+
+    :return: tuple
+    Tupla com os mapas de ``cp``, ``cs`` e ``rho``, com as mesmas dimensões de ``mat_grid``.
+    """
+    return tuple(np.ascontiguousarray(mat_table[mat_grid, k], dtype=np.float32) for k in range(len(MAT_PROPS)))
+
+
+def pack_material_grid(mat_grid):
+    """
+    Função que empacota os rótulos de um mapa de materiais em palavras de 32 bits, para envio à GPU.
+    O rótulo do ponto de índice linear ``n`` fica na palavra ``n // (32 // bits)``, a partir do bit
+    ``(n % (32 // bits)) * bits``.
+
+    :param mat_grid: numpy.array
+        Mapa de materiais do tipo ``uint8`` ou ``uint16``.
+
+    :return: tuple
+    Tupla com o array ``uint32`` empacotado e o número de bits de cada rótulo.
+    """
+    if mat_grid.dtype not in (np.uint8, np.uint16):
+        raise ValueError(f'Mapa de materiais do tipo {mat_grid.dtype} nao suportado (uint8 ou uint16)')
+
+    bits = 8 * mat_grid.dtype.itemsize
+    flat = np.ascontiguousarray(mat_grid).ravel()
+    flat = np.pad(flat, (0, (-flat.size) % (32 // bits))).astype(flat.dtype.newbyteorder('<'), copy=False)
+
+    return flat.view('<u4').astype(np.uint32, copy=False), bits
+
+
+def get_staggered_coeffs_2d_table(mat_table):
+    """
+    Função equivalente a ``get_staggered_coeffs_2d`` para um mapa de materiais: calcula os coeficientes
+    para cada par de materiais vizinhos, em vez de para cada ponto do grid. Um material nulo é
+    acrescentado ao fim da tabela para os pontos fora do domínio.
+
+    :param mat_table: numpy.array
+        Tabela de propriedades dos materiais, retornada por ``get_material_table``.
+
+    :return: numpy.array
+    Array concatenado, com ``n = n_mat + 1``: ``lambda`` ``[n, n]`` e ``lambda + 2mu`` ``[n, n]`` (par de
+    materiais em ``x`` e ``x + 1``), ``mu`` ``[n, n]`` (par de materiais em ``y`` e ``y + 1``), ``1/rho`` ``[n]``
+    e ``rho`` ``[n]``.
+    """
+    tab = np.vstack((mat_table, np.zeros((1, len(MAT_PROPS))))).astype(np.float32)
+    cp, cs, rho = (tab[:, MAT_PROPS.index(k)] for k in ["cp", "cs", "rho"])
+
+    lambda_sig, lambdaplus2mu_sig = _get_lame_sig_norm(rho[:, None], rho[None, :], cp[:, None], cp[None, :],
+                                                       cs[:, None], cs[None, :])
+    mu_sigxy = _get_mu_sig_xy(rho[:, None], rho[None, :], cs[:, None], cs[None, :])
+
+    # Os pontos fora do dominio tem coeficientes nulos
+    for c in (lambda_sig, lambdaplus2mu_sig, mu_sigxy):
+        c[-1, :] = 0.0
+    inv_rho = np.divide(1.0, rho, out=np.zeros_like(rho), where=rho > 0.0)
+
+    return np.concatenate((lambda_sig.ravel(), lambdaplus2mu_sig.ravel(), mu_sigxy.ravel(),
+                           inv_rho, rho)).astype(np.float32)
+
+
+def _fit_sls_relaxation_times(n_sls, q_att, f_min, f_max, n_freq=100):
+    """
+    Função que ajusta, por mínimos quadrados, os tempos de relaxação de ``n_sls`` sólidos lineares
+    padrão (*standard linear solids*) para um fator de qualidade constante na faixa [f_min, f_max].
+    Todos os fatores de qualidade são ajustados de uma só vez (vetorizado).
+
+    Os tempos ``tau_sigma`` são distribuídos em escala logarítmica na faixa. Com y = tau_epsilon/tau_sigma - 1,
+    a condição Im(M) = Re(M)/Q do módulo complexo é linear em y, e o sistema é resolvido para todas as
+    frequências da faixa.
+
+    :param n_sls: int
+        Número de sólidos lineares padrão.
+    :param q_att: numpy.array
+        Fatores de qualidade a serem ajustados.
+    :param f_min: float
+        Frequência mínima da faixa de atenuação.
+    :param f_max: float
+        Frequência máxima da faixa de atenuação.
+    :param n_freq: int
+        Número de frequências utilizadas no ajuste.
+
+    :return: tuple
+    Tupla com os arrays de ``tau_epsilon`` e ``tau_sigma``, com dimensões (len(q_att), n_sls).
+    """
+    q_inv = 1.0 / np.asarray(q_att, dtype=np.float64).reshape(-1, 1, 1)
+    tau_sigma = 1.0 / (2.0 * np.pi * np.geomspace(f_min, f_max, n_sls))
+    wt = 2.0 * np.pi * np.geomspace(f_min, f_max, n_freq).reshape(-1, 1) * tau_sigma
+    a = (wt - q_inv * wt ** 2) / (1.0 + wt ** 2)
+    b = np.broadcast_to(q_inv, (q_inv.shape[0], n_freq, 1))
+    y = (np.linalg.pinv(a) @ b)[:, :, 0]
+    if np.any(y <= -1.0):
+        raise ValueError(f'Ajuste dos tempos de relaxacao invalido (n_sls = {n_sls}, Q = {q_att})')
+
+    tau_sigma = np.broadcast_to(tau_sigma, y.shape)
+    return tau_sigma * (1.0 + y), tau_sigma
+
+
+def get_sls_relaxation_times(n_sls, q_att, f_min, f_max, n_freq=100, cache_dir="sls_cache"):
+    """
+    Função que retorna os tempos de relaxação [tau_epsilon, tau_sigma] de ``n_sls`` sólidos lineares
+    padrão que aproximam fatores de qualidade constantes na faixa [f_min, f_max]. Os ajustes são
+    guardados em disco, em ``cache_dir``, com uma chave formada pelos parâmetros de entrada, e apenas os
+    fatores de qualidade ainda não ajustados são calculados.
+
+    :param n_sls: int
+        Número de sólidos lineares padrão.
+    :param q_att: float ou array_like
+        Fator (ou fatores) de qualidade.
+    :param f_min: float
+        Frequência mínima da faixa de atenuação.
+    :param f_max: float
+        Frequência máxima da faixa de atenuação.
+    :param n_freq: int
+        Número de frequências utilizadas no ajuste.
+    :param cache_dir: str
+        Diretório do *cache* em disco. Se ``None``, o *cache* não é utilizado.
+
+    :return: tuple
+    Tupla com os arrays de ``tau_epsilon`` e ``tau_sigma``. Para ``q_att`` escalar, os arrays têm
+    dimensão (n_sls,), senão (len(q_att), n_sls).
+    """
+    q_arr = np.atleast_1d(np.asarray(q_att, dtype=np.float64))
+    tau_epsilon = np.zeros((q_arr.size, n_sls), dtype=np.float64)
+    tau_sigma = np.zeros((q_arr.size, n_sls), dtype=np.float64)
+
+    # Procura os ajustes ja calculados
+    names = list()
+    missing = list()
+    for i, q in enumerate(q_arr):
+        key = f'{int(n_sls)}_{float(q)!r}_{float(f_min)!r}_{float(f_max)!r}_{int(n_freq)}'
+        names.append(None if cache_dir is None else
+                     os.path.join(cache_dir, f'sls_{hashlib.sha1(key.encode()).hexdigest()}.npz'))
+        if names[i] is not None and os.path.isfile(names[i]):
+            with np.load(names[i]) as data:
+                tau_epsilon[i], tau_sigma[i] = data["tau_epsilon"], data["tau_sigma"]
+        else:
+            missing.append(i)
+
+    # Ajusta de uma so vez os fatores de qualidade restantes
+    if len(missing) > 0:
+        tau_epsilon[missing], tau_sigma[missing] = _fit_sls_relaxation_times(n_sls, q_arr[missing],
+                                                                             f_min, f_max, n_freq)
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Grava num arquivo temporario e renomeia, para que outra simulacao nunca leia um ajuste incompleto
+            for i in missing:
+                tmp_name = f'{names[i]}.{os.getpid()}.tmp'
+                with open(tmp_name, "wb") as f:
+                    np.savez(f, tau_epsilon=tau_epsilon[i], tau_sigma=tau_sigma[i])
+                os.replace(tmp_name, names[i])
+
+    if np.ndim(q_att) == 0:
+        return tau_epsilon[0], tau_sigma[0]
+
+    return tau_epsilon, tau_sigma
+
+
+def get_fd_tables(coefs, idx_fd):
+    """
+    Função que monta as tabelas do estêncil de diferenças finitas usadas por ``get_shader_code`` para
+    desenrolar os laços dos shaders, indexadas pelo nome das funções de acesso dos shaders.
+
+    :param coefs: numpy.array
+        Coeficientes das diferenças finitas.
+    :param idx_fd: numpy.array
+        Deslocamentos dos índices do estêncil, com dimensões ``(n_coefs, 4)`` e colunas na ordem
+        de ``FD_IDX_GETTERS``.
+
+    :return: dict
+    Dicionário com as tabelas de ``get_fdc`` e de cada função de ``FD_IDX_GETTERS``.
+    """
+    tables = {"get_fdc": np.asarray(coefs, dtype=np.float32)}
+    tables.update({g: np.asarray(idx_fd)[:, i] for i, g in enumerate(FD_IDX_GETTERS)})
+
+    return tables
+
+
+def pack_pml_coeffs(a, b, k, a_h, b_h, k_h):
+    """
+    Função que empacota os perfis da CPML de um eixo em um único array, com os coeficientes de cada
+    ponto nos grids cheio e intercalado lidos pelos shaders como dois ``vec4<f32>``.
+
+    :param a: numpy.array
+        Coeficientes ``a`` no grid cheio.
+    :param b: numpy.array
+        Coeficientes ``b`` no grid cheio.
+    :param k: numpy.array
+        Coeficientes ``k`` no grid cheio.
+    :param a_h: numpy.array
+        Coeficientes ``a`` no grid intercalado.
+    :param b_h: numpy.array
+        Coeficientes ``b`` no grid intercalado.
+    :param k_h: numpy.array
+        Coeficientes ``k`` no grid intercalado.
+
+    :return: numpy.array
+    Array com dimensões ``(n, 8)`` e colunas ``[a, b, k, 0, a_h, b_h, k_h, 0]``.
+    """
+    zero = np.zeros(np.size(a), dtype=np.float32)
+    cols = [np.ravel(c).astype(np.float32) for c in (a, b, k)] + [zero]
+    cols += [np.ravel(c).astype(np.float32) for c in (a_h, b_h, k_h)] + [zero]
+
+    return np.stack(cols, axis=1)
+
+
+def _get_wgsl_literal(value):
+    """
+    Função que converte um valor Python/numpy em um literal WGSL.
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return str(bool(value)).lower()
+    if isinstance(value, (int, np.integer)):
+        return f'{int(value)}' if value >= 0 else f'({int(value)})'
+    if isinstance(value, (float, np.floating)):
+        lit = repr(float(np.float32(value)))
+        return lit if value >= 0 else f'({lit})'
+
+    return f'{value}'
+
+
+def _unroll_fd_loops(code, fd_tables, fd_bound, loop_var="c"):
+    """
+    Função que desenrola os laços mais internos ``for(var c: i32 = 0; c < fd_bound; c++)`` de um shader,
+    substituindo o índice ``c`` e as chamadas (ou acessos) ``nome(c)`` das tabelas de ``fd_tables``
+    pelos seus valores literais.
+    """
+    n_fd = {len(v) for v in fd_tables.values()}
+    if len(n_fd) != 1:
+        raise ValueError('As tabelas do estencil devem ter o mesmo numero de elementos')
+    n_fd = n_fd.pop()
+
+    loop = re.compile(rf'^([ \t]*)for\s*\(var {loop_var}: i32 = 0; {loop_var} < {re.escape(fd_bound)}; '
+                      rf'{loop_var}\+\+\)\s*\{{[ \t]*\n', re.M)
+    lookup = re.compile(rf'\b({"|".join(map(re.escape, fd_tables))})([(\[])(\d+)[)\]]')
+    out = list()
+    pos = 0
+    for m in loop.finditer(code):
+        # Procura o fim do laco (somente lacos sem blocos internos sao desenrolados)
+        end = code.find('}', m.end())
+        body = code[m.end():end]
+        if '{' in body:
+            continue
+
+        indent = m.group(1)
+        lines = [ln[4:] if ln.startswith(indent + '    ') else ln for ln in body.rstrip().split('\n')]
+        body = '\n'.join(lines) + '\n'
+        unrolled = list()
+        for c in range(n_fd):
+            b = re.sub(rf'\b{loop_var}\b', f'{c}', body)
+            unrolled.append(lookup.sub(lambda t: _get_wgsl_literal(fd_tables[t.group(1)][int(t.group(3))]), b))
+
+        end_ln = code.find('\n', end)
+        out.append(code[pos:m.start()])
+        out.append(''.join(unrolled))
+        pos = end_ln + 1 if end_ln != -1 else len(code)
+
+    out.append(code[pos:])
+    return ''.join(out)
+
+
+def get_shader_code(path, tokens=None, consts=None, fd_tables=None, fd_bound="sim_int_par.fd_coeff"):
+    """
+    Função que gera o código WGSL especializado de um shader. O estêncil de diferenças finitas é
+    desenrolado, com os coeficientes e deslocamentos como literais, e os parâmetros fixos da simulação
+    (tamanhos do grid, ordem, etc.) passam a ser constantes de compilação, em vez de lidos dos buffers.
+
+    :param path: str
+        Caminho do arquivo ``.wgsl`` (modelo do shader).
+    :param tokens: dict
+        Marcadores do modelo (identificadores completos, como ``wsx``) e seus valores.
+    :param consts: dict
+        Expressões do modelo (como ``sim_int_par.x_sz``) substituídas pelos seus valores constantes.
+    :param fd_tables: dict
+        Tabelas do estêncil, normalmente retornadas por ``get_fd_tables``. Se ``None``, os laços não são
+        desenrolados.
+    :param fd_bound: str
+        Expressão do limite dos laços do estêncil no modelo.
+
+    :return: str
+    Código WGSL especializado.
+    """
+    with open(path) as shader_file:
+        code = shader_file.read()
+
+    for k, v in (tokens or dict()).items():
+        code = re.sub(rf'\b{re.escape(k)}\b', lambda _, lit=_get_wgsl_literal(v): lit, code)
+
+    if fd_tables is not None:
+        code = _unroll_fd_loops(code, fd_tables, fd_bound)
+
+    for k, v in (consts or dict()).items():
+        code = re.sub(rf'\b{re.escape(k)}(?!\w)', lambda _, lit=_get_wgsl_literal(v): lit, code)
+
+    return code
+
+
+def get_x_slabs(nx, plane_bytes, max_binding, halo, align=256, x_mult=1, max_buffer=None):
+    """
+    Função que divide o grid em fatias (slabs) ao longo de x, para que campos maiores que o limite de
+    tamanho de um binding de storage buffer sejam processados em passadas sequenciais. Cada fatia amarra
+    os campos a partir de um plano alinhado, com ``halo`` planos vizinhos de cada lado.
+
+    Cada campo continua em um único buffer, amarrado por faixas: o tamanho de cada campo permanece limitado
+    por ``max-buffer-size``, que a divisão em fatias não contorna.
+
+    :param nx: int
+        Número de planos x do grid.
+    :param plane_bytes: list
+        Tamanho em bytes de um plano x de cada tipo de campo amarrado por fatia.
+    :param max_binding: int
+        Tamanho máximo de um binding de storage buffer do dispositivo.
+    :param halo: int
+        Número de planos de halo de cada lado da fatia (alcance do estêncil).
+    :param align: int
+        Alinhamento, em bytes, do offset dos bindings.
+    :param x_mult: int
+        Múltiplo da largura das fatias (tamanho do workgroup em x).
+    :param max_buffer: int
+        Tamanho máximo de um buffer do dispositivo. Se ``None``, não é verificado.
+
+    :return: list
+    Lista de tuplas ``(x_ofs, x_ini, x_end, x_lim)`` com o primeiro plano amarrado, o primeiro plano
+    atualizado, o fim dos planos atualizados e o fim dos planos amarrados de cada fatia.
+    """
+    p_max = max(plane_bytes)
+    if max_buffer is not None and nx * p_max > max_buffer:
+        raise ValueError(f'Campo de {nx * p_max} bytes excede o limite de tamanho de buffer do dispositivo '
+                         f'({max_buffer} bytes)')
+    if nx * p_max <= max_binding:
+        return [(0, 0, nx, nx)]
+
+    # Os offsets dos bindings devem ser alinhados para todos os tipos de campo
+    step = int(np.lcm.reduce([x_mult] + [align // np.gcd(align, p) for p in plane_bytes]))
+    width = (max_binding // p_max - 2 * halo - step) // step * step
+    if width <= 0:
+        raise ValueError(f'Plano x de {p_max} bytes excede o limite de binding do dispositivo ({max_binding} bytes)')
+
+    slabs = list()
+    for x_ini in range(0, nx, width):
+        x_end = min(x_ini + width, nx)
+        slabs.append((max(x_ini - halo, 0) // step * step, x_ini, x_end, min(x_end + halo, nx)))
+
+    return slabs
+
+
+def get_slab_entries(entries, slab_planes, x_ofs, x_lim):
+    """
+    Função que ajusta uma lista de ``get_bind_group`` para uma fatia de ``get_x_slabs``: os buffers amarrados
+    por fatia passam a ser amarrados do plano ``x_ofs`` ao plano ``x_lim`` e os demais são amarrados inteiros.
+
+    :param entries: list
+        Lista de tuplas ``(buffer, tipo)``.
+    :param slab_planes: list
+        Lista de tuplas ``(buffer, bytes de um plano x)`` dos buffers amarrados por fatia.
+    :param x_ofs: int
+        Primeiro plano amarrado da fatia.
+    :param x_lim: int
+        Fim dos planos amarrados da fatia.
+
+    :return: list
+    Lista de tuplas ``(buffer, tipo)`` ou ``(buffer, tipo, offset, size)``.
+    """
+    slab_entries = list()
+    for buf, b_type in entries:
+        plane = next((_p for _b, _p in slab_planes if _b is buf), None)
+        if plane is None:
+            slab_entries.append((buf, b_type))
+        else:
+            offset = x_ofs * plane
+            slab_entries.append((buf, b_type, offset, min(buf.size - offset, -(-(x_lim - x_ofs) * plane // 4) * 4)))
+
+    return slab_entries
+
+
+def get_max_rec_decimation(probes, dt, margin=1.25):
+    """
+    Função que calcula o maior fator de decimação dos sinais dos receptores que preserva a banda dos
+    transdutores, considerando a banda de passagem do filtro de ``get_decimation_filter``.
+
+    :param probes: list
+        Transdutores da simulação.
+    :param dt: float
+        Passo de tempo da simulação.
+    :param margin: float
+        Margem sobre a frequência de Nyquist, para a banda de transição do filtro.
+
+    :return: int
+    Maior fator de decimação.
+    """
+    f_max = max(float(_p.freq) * (1.0 + float(_p.bw) / 2.0) for _p in probes)
+
+    return max(int(1.0 / (2.0 * margin * f_max * float(dt))), 1)
+
+
+def get_host_ram():
+    """
+    Função que consulta a memória RAM física do host.
+
+    :return: int
+    Memória RAM em bytes, ou ``None`` se não puder ser consultada no sistema.
+    """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def get_memory_plan(host_arrays, gpu_buffers, limits=None, host_ram=None, cpu_fallback=False, slabs=None,
+                    slab_keys=(), rec_keys=(), rec_decim=1, rec_decim_max=1, f16=False):
+    """
+    Função que monta o plano de memória de uma simulação antes das alocações: os totais no host e no
+    dispositivo, a verificação dos limites do adaptador e da RAM do host e as recomendações de configuração.
+
+    :param host_arrays: dict
+        Arrays alocados no host, como ``nome: (quantidade, bytes de cada array)``.
+    :param gpu_buffers: dict
+        Buffers alocados no dispositivo, como ``nome: (quantidade, bytes de cada buffer)``. Vazio se a
+        simulação não usa a GPU.
+    :param limits: dict
+        Limites do adaptador (``max-buffer-size``, ``max-storage-buffer-binding-size`` e
+        ``min-storage-buffer-offset-alignment``). Se ``None``, não há adaptador disponível.
+    :param host_ram: int
+        Memória RAM do host em bytes, normalmente retornada por ``get_host_ram``.
+    :param cpu_fallback: bool
+        Se o simulador tem um solver na CPU, recomendado quando a simulação não cabe na GPU.
+    :param slabs: dict
+        Argumentos de ``get_x_slabs`` (exceto ``max_binding`` e ``align``), se o solver divide os campos em
+        fatias ao longo de x.
+    :param slab_keys: list
+        Nomes dos buffers de ``gpu_buffers`` amarrados por fatia ou não amarrados aos shaders (como os
+        buffers de staging), fora da verificação do limite de binding.
+    :param rec_keys: list
+        Nomes dos buffers dos sinais dos receptores em ``gpu_buffers``.
+    :param rec_decim: int
+        Fator de decimação atual dos sinais dos receptores.
+    :param rec_decim_max: int
+        Maior fator de decimação, normalmente retornado por ``get_max_rec_decimation``.
+    :param f16: bool
+        Se o adaptador suporta ``shader-f16``.
+
+    :return: dict
+    Dicionário com os arrays e buffers de entrada, a RAM do host, os totais em bytes (``host``, ``gpu``), o
+    maior buffer (``gpu_max``), o número de fatias (``n_slabs``), as verificações (``host_ok``, ``gpu_ok``,
+    ``None`` se não avaliadas) e as recomendações (``advice``).
+    """
+    mib = float(1 << 20)
+    host = sum(_n * _b for _n, _b in host_arrays.values())
+    gpu = sum(_n * _b for _n, _b in gpu_buffers.values())
+    gpu_max = max(((_k, _b) for _k, (_n, _b) in gpu_buffers.items() if _n > 0), key=lambda _e: _e[1],
+                  default=("", 0))
+    host_ok = None if host_ram is None else host <= host_ram
+    gpu_ok = None
+    n_slabs = 1
+    advice = list()
+
+    if gpu_buffers and limits is None:
+        gpu_ok = False
+        advice.append('Adaptador WebGPU nao disponivel')
+    elif gpu_buffers:
+        max_bind = limits["max-storage-buffer-binding-size"]
+        rest_max = max(((_k, _b) for _k, (_n, _b) in gpu_buffers.items() if _n > 0 and _k not in slab_keys),
+                       key=lambda _e: _e[1], default=("", 0))
+        gpu_ok = gpu_max[1] <= limits["max-buffer-size"] and rest_max[1] <= max_bind
+        bad = rest_max if rest_max[1] > max_bind else gpu_max
+        if gpu_ok and gpu_max[1] > max_bind:
+            try:
+                n_slabs = len(get_x_slabs(**slabs, max_binding=max_bind,
+                                          align=limits["min-storage-buffer-offset-alignment"]))
+                advice.append(f'Campos divididos em {n_slabs} fatias ao longo de x '
+                              f'(limite de binding de {max_bind / mib:.0f} MiB)')
+            except (TypeError, ValueError):
+                gpu_ok = False
+        if not gpu_ok:
+            advice.append(f'Buffer {bad[0]} ({bad[1] / mib:.1f} MiB) excede os limites do adaptador '
+                          f'(binding de {max_bind / mib:.0f} MiB, buffer de {limits["max-buffer-size"] / mib:.0f} MiB)'
+                          f'{"" if slabs is None else " mesmo com a divisao em fatias"}: reduza o grid ou a ROI')
+            if f16:
+                advice.append(f'O adaptador suporta shader-f16: campos em meia precisao reduziriam a memoria da GPU '
+                              f'para cerca de {gpu / 2 / mib:.1f} MiB (nao suportado pelos solvers)')
+
+    if gpu_ok is False and host_ok is False:
+        advice.append('A simulacao tambem nao cabe na RAM do host: reduza o grid, a ROI ou o numero de passos')
+    elif gpu_ok is False and cpu_fallback:
+        advice.append('Execute a simulacao na CPU (do_sim_cpu = 1, do_sim_gpu = 0)')
+    elif host_ok is False:
+        advice.append(f'Memoria do host ({host / mib:.1f} MiB) excede a RAM ({host_ram / mib:.1f} MiB)')
+
+    # Sinais dos receptores: decimacao ate o limite da banda dos transdutores
+    rec = sum(_n * _b for _k, (_n, _b) in gpu_buffers.items() if _k in rec_keys)
+    if rec_decim < rec_decim_max and rec > 0.1 * max(gpu, 1):
+        advice.append(f'Use record_decimation = {rec_decim_max} para reduzir os sinais dos receptores de '
+                      f'{rec / mib:.1f} MiB para {rec * rec_decim / rec_decim_max / mib:.1f} MiB')
+
+    return {"host_arrays": host_arrays, "gpu_buffers": gpu_buffers, "host_ram": host_ram, "host": host, "gpu": gpu,
+            "gpu_max": gpu_max, "n_slabs": n_slabs, "host_ok": host_ok, "gpu_ok": gpu_ok, "advice": advice}
+
+
+def print_memory_plan(plan):
+    """
+    Função que imprime o plano de memória montado por ``get_memory_plan``.
+
+    :param plan: dict
+        Plano de memória.
+    """
+    mib = float(1 << 20)
+    ram = "desconhecida" if plan["host_ram"] is None else f'{plan["host_ram"] / mib:.1f} MiB'
+    print(f'Plano de memoria:')
+    print(f'Host: {plan["host"] / mib:.1f} MiB (RAM: {ram})')
+    for _k, (_n, _b) in plan["host_arrays"].items():
+        print(f'    {_k}: {_n} x {_b / mib:.2f} MiB')
+    if plan["gpu_buffers"]:
+        print(f'GPU: {plan["gpu"] / mib:.1f} MiB (maior buffer: {plan["gpu_max"][0]}, '
+              f'{plan["gpu_max"][1] / mib:.2f} MiB)')
+        for _k, (_n, _b) in plan["gpu_buffers"].items():
+            print(f'    {_k}: {_n} x {_b / mib:.2f} MiB')
+    for _a in plan["advice"]:
+        print(f'* {_a}')
+    print()
+
+
+class StagingPool:
+    """
+    Classe que mantém um conjunto de buffers de *staging* (``MAP_READ | COPY_DST``) persistentes para a leitura
+    dos buffers da GPU, reaproveitados entre as leituras em vez de criados a cada ``queue.read_buffer``.
+
+    As cópias são codificadas no mesmo *command encoder* dos kernels (sem envios extras à fila) e o mapeamento
+    só é feito na leitura, que pode ser adiada para depois do envio dos passos seguintes. ``read`` retorna uma
+    visão NumPy sobre a região mapeada, válida até a devolução do buffer com ``release``.
+
+
+    Parameters
+    ----------
+        device : :class:`wgpu.GPUDevice`
+            Dispositivo dos buffers lidos.
+    """
+
+    def __init__(self, device):
+        import wgpu
+
+        self.device = device
+        self._wgpu = wgpu
+        self._free = list()
+
+    def copy(self, encoder, buffer, offset=0, size=None):
+        """
+        Função que codifica a cópia de uma região de um buffer da GPU para um buffer de staging livre do
+        conjunto (o menor que comporta a região), criando um novo buffer se nenhum estiver livre.
+
+        :param encoder: :class:`wgpu.GPUCommandEncoder`
+            Codificador de comandos, fora de um *compute pass*.
+        :param buffer: :class:`wgpu.GPUBuffer`
+            Buffer lido, com uso ``COPY_SRC``.
+        :param offset: int
+            Deslocamento da região em bytes (múltiplo de 4).
+        :param size: int
+            Tamanho da região em bytes (múltiplo de 4). Se ``None``, até o fim do buffer.
+
+        :return: tuple
+        Buffer de staging e tamanho da região, usados em ``read``, ``fetch`` e ``release``.
+        """
+        size = buffer.size - offset if size is None else size
+        fit = [_b for _b in self._free if _b.size >= size]
+        if fit:
+            stg = min(fit, key=lambda _b: _b.size)
+            self._free.remove(stg)
+        else:
+            stg = self.device.create_buffer(size=-(-size // 8) * 8,
+                                            usage=self._wgpu.BufferUsage.MAP_READ | self._wgpu.BufferUsage.COPY_DST)
+        encoder.copy_buffer_to_buffer(buffer, offset, stg, 0, size)
+        return stg, size
+
+    def read(self, entry, dtype=np.float32, shape=None):
+        """
+        Função que mapeia um buffer de staging (esperando pela cópia na GPU) e retorna uma visão sobre a
+        região mapeada, sem cópias no host.
+
+        :param entry: tuple
+            Buffer de staging retornado por ``copy``.
+        :param dtype: :class:`np.dtype`
+            Tipo dos elementos.
+        :param shape: tuple
+            Formato da visão. Se ``None``, unidimensional.
+
+        :return: :class:`np.ndarray`
+        Visão sobre a região mapeada, válida até ``release``.
+        """
+        stg, size = entry
+        if self._wgpu.version_info[1] > 11:
+            stg.map(self._wgpu.MapMode.READ, 0, size)
+            data = stg.read_mapped(0, size, copy=False)
+        else:
+            data = stg.map_read()[:size]
+        view = np.frombuffer(data, dtype=dtype)
+        return view if shape is None else view.reshape(shape)
+
+    def release(self, entry):
+        """
+        Função que desmapeia um buffer de staging e o devolve ao conjunto. As visões retornadas por ``read``
+        deixam de ser válidas.
+
+        :param entry: tuple
+            Buffer de staging retornado por ``copy``.
+        """
+        stg, _ = entry
+        if self._wgpu.version_info[1] > 11:
+            stg.unmap()
+        self._free.append(stg)
+
+    def fetch(self, entry, dtype=np.float32, shape=None):
+        """
+        Função que lê um buffer de staging para um array do host (uma única cópia, a partir da região
+        mapeada) e o devolve ao conjunto. Usada para os resultados que permanecem após a simulação.
+
+        :param entry: tuple
+            Buffer de staging retornado por ``copy``.
+        :param dtype: :class:`np.dtype`
+            Tipo dos elementos.
+        :param shape: tuple
+            Formato do array. Se ``None``, unidimensional.
+
+        :return: :class:`np.ndarray`
+        Array com os dados lidos.
+        """
+        data = np.array(self.read(entry, dtype=dtype, shape=shape))
+        self.release(entry)
+        return data
+
+    def fetch_each(self, buffers):
+        """
+        Função que lê um conjunto de buffers da GPU para arrays do host, um buffer por vez: cada cópia é
+        enviada e lida antes da seguinte, de modo que um único buffer de staging (do tamanho do maior buffer
+        lido) é reaproveitado, em vez de uma cópia de todo o conjunto na GPU. Usada para os checkpoints.
+
+        :param buffers: dict
+            Buffers lidos, com uso ``COPY_SRC``, por nome.
+
+        :return: dict
+        Arrays (``np.float32``, unidimensionais) com os dados lidos, por nome.
+        """
+        data = dict()
+        for _k, _b in sorted(buffers.items(), key=lambda _e: _e[1].size, reverse=True):
+            encoder = self.device.create_command_encoder()
+            entry = self.copy(encoder, _b)
+            self.device.queue.submit([encoder.finish()])
+            data[_k] = self.fetch(entry)
+        return data
+
+
+def get_bind_group(device, entries, layout=None):
+    """
+    Função que monta o layout e o grupo de amarração de uma lista de buffers, com o *binding* de cada buffer
+    na sua posição da lista.
+
+    :param device: :class:`wgpu.GPUDevice`
+        Dispositivo dos buffers.
+    :param entries: list
+        Lista de tuplas ``(buffer, tipo)`` ou ``(buffer, tipo, offset, size)``, com o tipo de
+        ``wgpu.BufferBindingType``. Sem ``offset`` e ``size``, o buffer é amarrado inteiro.
+    :param layout: :class:`wgpu.GPUBindGroupLayout`
+        Layout já criado para a mesma lista (por exemplo, nas fatias do grid). Se ``None``, é criado.
+
+    :return: tuple
+    Tupla ``(layout, group)`` com o layout e o grupo de amarração.
+    """
+    import wgpu
+
+    if layout is None:
+        layout = device.create_bind_group_layout(entries=[
+            {"binding": i,
+             "visibility": wgpu.ShaderStage.COMPUTE,
+             "buffer": {"type": e[1]}} for i, e in enumerate(entries)
+        ])
+    group = device.create_bind_group(layout=layout, entries=[
+        {"binding": i,
+         "resource": {"buffer": e[0], "offset": e[2] if len(e) > 2 else 0,
+                      "size": e[3] if len(e) > 2 else e[0].size}} for i, e in enumerate(entries)
+    ])
+
+    return layout, group
+
+
+def get_storage_bindings(entries):
+    """
+    Função que conta os *bindings* de *storage buffer* de um conjunto de listas de ``get_bind_group``
+    usadas por um mesmo *pipeline*, comparados com ``max-storage-buffers-per-shader-stage``.
+
+    :param entries: list
+        Listas de tuplas ``(buffer, tipo, ...)`` de cada grupo de amarração.
+
+    :return: int
+    Número de *bindings* de *storage buffer* (leitura e escrita ou somente leitura).
+    """
+    import wgpu
+
+    return sum(e[1] in (wgpu.BufferBindingType.storage, wgpu.BufferBindingType.read_only_storage)
+               for group in entries for e in group)
+
+
+def get_checkpoint_signature(configs, exclude=("checkpoint_interval", "checkpoint_dir")):
+    """
+    Função que retorna a assinatura de uma configuração de simulação, gravada nos checkpoints para que
+    uma simulação só seja retomada com a mesma configuração.
+
+    :param configs: dict
+        Configuração da simulação.
+    :param exclude: tuple
+        Chaves (em qualquer nível da configuração) fora da assinatura. Por padrão, o intervalo e o diretório
+        dos checkpoints, que podem mudar ao retomar a simulação.
+
+    :return: str
+    Assinatura (SHA-1) da configuração.
+    """
+    def _strip(cfg):
+        return {_k: _strip(_v) for _k, _v in cfg.items() if _k not in exclude} if isinstance(cfg, dict) else cfg
+
+    return hashlib.sha1(repr(_strip(configs)).encode()).hexdigest()
+
+
+def _get_checkpoints(base):
+    """
+    Função que retorna os checkpoints gravados com o prefixo ``base``, em ordem crescente do passo de tempo.
+    """
+    ckpt_dir, tag = os.path.split(base)
+    if not os.path.isdir(ckpt_dir or "."):
+        return list()
+    ckpts = [(int(_m.group(1)), os.path.join(ckpt_dir, _f)) for _f in os.listdir(ckpt_dir or ".")
+             for _m in [re.fullmatch(re.escape(tag) + r'_(\d+)\.npz', _f)] if _m is not None]
+    return sorted(ckpts)
+
+
+def load_checkpoint(ckpt_dir, tag, signature):
+    """
+    Função que carrega o último checkpoint de uma simulação.
+
+    :param ckpt_dir: str
+        Diretório dos checkpoints.
+    :param tag: str
+        Identificador da simulação (solver, backend, iteração e lei de emissão).
+    :param signature: str
+        Assinatura da configuração, retornada por ``get_checkpoint_signature``.
+
+    :return: tuple
+    Tupla com o passo de tempo do checkpoint e o dicionário com os arrays do estado do solver, ou
+    ``(0, None)`` se não há checkpoint.
+    """
+    ckpts = _get_checkpoints(os.path.join(ckpt_dir, tag))
+    if len(ckpts) == 0:
+        return 0, None
+
+    it, name = ckpts[-1]
+    with np.load(name, allow_pickle=False) as data:
+        if str(data["signature"]) != signature:
+            raise ValueError(f'Checkpoint {name} gravado com outra configuracao')
+        state = {_k: data[_k] for _k in data.files if _k not in ("it", "signature")}
+    print(f'Retomando a simulacao do checkpoint {name} (passo {it})')
+    return it, state
+
+
+class CheckpointWriter:
+    """
+    Classe que grava periodicamente checkpoints do estado de um solver (campos, variáveis de memória da
+    CPML, sinais dos sensores etc.) em uma *thread* separada, sem bloquear o laço de tempo.
+
+    Cada checkpoint é um arquivo ``<tag>_<passo>.npz`` compactado, escrito em um arquivo temporário e
+    renomeado ao final, de modo que uma interrupção durante a gravação não corrompe o último checkpoint
+    válido. Apenas os ``keep`` checkpoints mais recentes são mantidos.
+
+
+    Parameters
+    ----------
+        ckpt_dir : str
+            Diretório dos checkpoints.
+
+        tag : str
+            Identificador da simulação (solver, backend, iteração e lei de emissão).
+
+        signature : str
+            Assinatura da configuração, retornada por ``get_checkpoint_signature``.
+
+        keep : int
+            Número de checkpoints mantidos. Por padrão, é 2.
+    """
+
+    def __init__(self, ckpt_dir, tag, signature, keep=2):
+        os.makedirs(ckpt_dir, exist_ok=True)
+        self.base = os.path.join(ckpt_dir, tag)
+        self.signature = signature
+        self.keep = max(int(keep), 1)
+        self._thread = None
+
+    def _write(self, it, state):
+        name = f'{self.base}_{it:08d}.npz'
+        with open(name + ".tmp", "wb") as f:
+            np.savez_compressed(f, it=np.int64(it), signature=np.array(self.signature), **state)
+        os.replace(name + ".tmp", name)
+        for _, _f in _get_checkpoints(self.base)[:-self.keep]:
+            os.remove(_f)
+
+    def save(self, it, state):
+        """
+        Função que inicia a gravação de um checkpoint, após o término da gravação anterior.
+
+        :param it: int
+            Passo de tempo já calculado.
+        :param state: dict
+            Arrays do estado do solver. Não devem ser alterados durante a gravação (use cópias).
+        """
+        self.wait()
+        self._thread = threading.Thread(target=self._write, args=(it, state))
+        self._thread.start()
+
+    def wait(self):
+        """
+        Função que espera o término da gravação em andamento.
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def clear(self):
+        """
+        Função que remove os checkpoints da simulação, ao seu término.
+        """
+        self.wait()
+        for _, _f in _get_checkpoints(self.base):
+            os.remove(_f)
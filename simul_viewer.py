@@ -0,0 +1,204 @@
+import json
+import subprocess
+import sys
+
+import numpy as np
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+# ==========================================================================
+# Esse arquivo contem a visualizacao das simulacoes em um processo separado.
+# O simulador escreve os quadros em uma memoria compartilhada e nunca espera
+# pela exibicao. O visualizador mostra sempre o ultimo quadro escrito e
+# descarta os quadros que nao conseguiu exibir a tempo.
+# ==========================================================================
+
+# Cabecalho da memoria compartilhada: [numero de sequencia do quadro, flag de encerramento]
+HEADER_LEN = 2
+
+
+class SimulationViewer:
+    """
+    Classe que abre as janelas de visualização da simulação em um processo separado,
+    alimentado por uma memória compartilhada com o último quadro (*latest-frame-wins*).
+
+    Parameters
+    ----------
+        windows : list
+            Lista de dicionários com as chaves ``title`` (título da janela), ``geometry``
+            (posição e tamanho da janela) e ``shape`` (dimensões da imagem exibida).
+
+        levels : tuple
+            Valores mínimo e máximo da escala de cores. Por padrão, é (-100.0, 100.0).
+
+        poll_ms : int
+            Intervalo, em ms, em que o visualizador verifica se há um novo quadro. Por padrão, é 10 ms.
+
+    """
+
+    def __init__(self, windows, levels=(-100.0, 100.0), poll_ms=10):
+        self.shapes = [tuple(int(d) for d in w["shape"]) for w in windows]
+        self._sizes = [int(np.prod(s)) for s in self.shapes]
+        n_bytes = 8 * HEADER_LEN + 4 * max(sum(self._sizes), 1)
+        self._shm = SharedMemory(create=True, size=n_bytes)
+        self._header = np.ndarray((HEADER_LEN,), dtype=np.int64, buffer=self._shm.buf)
+        self._header[:] = 0
+        self._frames = _get_frame_views(self._shm, self.shapes)
+
+        specs = {"shm": self._shm.name, "levels": list(levels), "poll_ms": int(poll_ms),
+                 "windows": [{"title": w["title"], "geometry": [int(g) for g in w["geometry"]], "shape": s}
+                             for w, s in zip(windows, self.shapes)]}
+        self._proc = subprocess.Popen([sys.executable, __file__, json.dumps(specs)])
+
+    def update(self, frames):
+        """
+        Função que escreve um novo quadro na memória compartilhada. Não espera pelo visualizador.
+
+        :param frames: list
+            Lista com as imagens de cada janela, na mesma ordem de ``windows``.
+
+        :return: None
+        """
+        if len(frames) != len(self._frames):
+            raise ValueError(f"frames deve ter {len(self._frames)} imagens")
+
+        # O numero de sequencia e impar durante a escrita (seqlock)
+        self._header[0] += 1
+        for dst, src in zip(self._frames, frames):
+            dst[...] = src
+        self._header[0] += 1
+
+    def close(self, timeout=5.0):
+        """
+        Função que encerra o processo de visualização e libera a memória compartilhada.
+
+        :param timeout: float
+            Tempo máximo, em segundos, de espera pelo encerramento do processo.
+
+        :return: None
+        """
+        if self._shm is None:
+            return
+
+        self._header[1] = 1
+        try:
+            self._proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+
+        del self._header, self._frames
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+
+def _get_frame_views(shm, shapes):
+    """
+    Função que retorna as visões (sem cópia) das imagens de cada janela na memória compartilhada.
+    """
+    views = list()
+    offset = 8 * HEADER_LEN
+    for s in shapes:
+        views.append(np.ndarray(s, dtype=np.float32, buffer=shm.buf, offset=offset))
+        offset += 4 * int(np.prod(s))
+
+    return views
+
+
+def _viewer_main(specs):
+    """
+    Função principal do processo de visualização.
+    """
+    from PyQt6.QtCore import QTimer
+    from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QGridLayout
+    import pyqtgraph as pg
+    from pyqtgraph.widgets.RawImageWidget import RawImageWidget
+
+    # -----------------------------------------------
+    # Codigo para visualizacao da janela de simulacao
+    # -----------------------------------------------
+    # Window class
+    class Window(QMainWindow):
+        def __init__(self, title, geometry):
+            super().__init__()
+
+            # setting title
+            self.setWindowTitle(title)
+
+            # setting geometry
+            self.setGeometry(*geometry)
+
+            # setting animation
+            self.isAnimated()
+
+            # setting image
+            self.image = np.random.normal(size=(geometry[2], geometry[3]))
+
+            # showing all the widgets
+            self.show()
+
+            # creating a widget object
+            self.widget = QWidget()
+
+            # setting configuration options
+            pg.setConfigOptions(antialias=True)
+
+            # creating image view view object
+            self.imv = RawImageWidget()
+
+            # setting image to image view
+            self.imv.setImage(self.image, levels=[-0.1, 0.1])
+
+            # Creating a grid layout
+            self.layout = QGridLayout()
+
+            # setting this layout to the widget
+            self.widget.setLayout(self.layout)
+
+            # plot window goes on right side, spanning 3 rows
+            self.layout.addWidget(self.imv, 0, 0, 4, 1)
+
+            # setting this widget as central widget of the main window
+            self.setCentralWidget(self.widget)
+
+    # A memoria compartilhada pertence ao simulador, que e quem a libera
+    shm = SharedMemory(name=specs["shm"])
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except (AttributeError, KeyError):
+        pass
+    header = np.ndarray((HEADER_LEN,), dtype=np.int64, buffer=shm.buf)
+    frames = _get_frame_views(shm, [tuple(w["shape"]) for w in specs["windows"]])
+
+    app = QApplication([])
+    windows = [Window(title=w["title"], geometry=w["geometry"]) for w in specs["windows"]]
+    last_seq = [0]
+
+    def poll():
+        if header[1]:
+            app.quit()
+            return
+
+        # Copia o quadro apenas se nao estiver sendo escrito, e descarta-o se foi sobrescrito durante a copia
+        seq = int(header[0])
+        if seq == last_seq[0] or seq % 2:
+            return
+        images = [f.copy() for f in frames]
+        if int(header[0]) != seq:
+            return
+
+        last_seq[0] = seq
+        for w, img in zip(windows, images):
+            w.imv.setImage(img, levels=specs["levels"])
+
+    timer = QTimer()
+    timer.timeout.connect(poll)
+    timer.start(specs["poll_ms"])
+    app.exec()
+
+    del header, frames
+    shm.close()
+
+
+if __name__ == "__main__":
+    _viewer_main(json.loads(sys.argv[1]))